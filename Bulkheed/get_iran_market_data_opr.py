@@ -11,13 +11,17 @@ import pytse_client as tse
 import asyncio
 from pytse_client import download_client_types_records
 import logging
+import os
 from pytse_client import get_stats
+from concurrent.futures import ThreadPoolExecutor, as_completed
 # ======================================================================================================================
 ########################################################################################################################
 # import internal libraries
 # ----------------------------------------------------------------------------------------------------------------------
 
 from RawMaterials.data_base_obj import DataHelper
+from RawMaterials.http_cache_obj import ResponseCache
+from RawMaterials.rate_limiter_obj import TokenBucketRateLimiter
 # ======================================================================================================================
 # ######################################################################################################################
 # A class for fetching and processing financial data related to Iran's stock market and indices.
@@ -31,6 +35,8 @@ class IranFinanceSource(DataHelper):
         price_interval (str, optional): The time interval for price data (e.g., '1d' for daily). Default is '1d'.
         start_date (str, optional): The start date for fetching data. Default is "2000-01-01".
         end_date (str, optional): The end date for fetching data. Default is today's date.
+        offline (bool, optional): Serve every request from the HTTP cache only. Default is the MARKET_MAKER_OFFLINE
+                                  environment variable.
 
     Attributes:
         symbols_list (list): List of unique stock symbols.
@@ -39,6 +45,8 @@ class IranFinanceSource(DataHelper):
         end_date (str): The selected end date for data fetching.
         jalali_start_date (str): The selected start date in Jalali (Persian) calendar.
         jalali_end_date (str): The selected end date in Jalali (Persian) calendar.
+        http_cache (ResponseCache): The disk cache every finpy_tse and pytse_client call goes through; ranges that
+                                    end before today are cached for good.
 
     Methods:
         fetch_iran_stock_price_data(json_filename): Fetches Iran stock price data and saves it in a JSON file.
@@ -46,7 +54,7 @@ class IranFinanceSource(DataHelper):
         fetch_iran_stock_industrial_indices_data(json_filename): Fetches Iran industrial indices data and saves it in a JSON file.
         gregorian_to_jalali(gregorian_date): Converts Gregorian date to Jalali date.
     """
-    def __init__(self, symbols, price_interval=None, start_date=None, end_date=None):
+    def __init__(self, symbols, price_interval=None, start_date=None, end_date=None, offline=None):
         """
         Initializes the IranFinanceSource class with the given parameters.
         Args:
@@ -54,6 +62,7 @@ class IranFinanceSource(DataHelper):
             price_interval (str, optional): The interval for prices (default is '1d' for one day).
             start_date (str, optional): The start date for data (default is "2000-01-01").
             end_date (str, optional): The end date for data (default is today's date).
+            offline (bool, optional): Serve every request from the HTTP cache only.
         """
         super().__init__()
         self.symbols_list = list(set(symbols))
@@ -72,6 +81,7 @@ class IranFinanceSource(DataHelper):
         # Convert Gregorian dates to Jalali dates manually
         self.jalali_start_date = self.gregorian_to_jalali(self.start_date)
         self.jalali_end_date = self.gregorian_to_jalali(self.end_date)
+        self.http_cache = ResponseCache(self.project_path, offline=offline)
     # ------------------------------------------------------------------------------------------------------------------
     def fetch_iran_stock_price_data(self):
         """
@@ -83,9 +93,11 @@ class IranFinanceSource(DataHelper):
         dataframes = []
         for symbol in self.symbols_list:
             try:
-                stock_data = fpy.get_price_history(stock=symbol, start_date=self.jalali_start_date,
-                                                   end_date=self.jalali_end_date, ignore_date=False,
-                                                   adjust_price=True, show_weekday=True, double_date=True)
+                stock_data = self.http_cache.call("get_price_history", fpy.get_price_history,
+                                                  closed_date=self.end_date, stock=symbol,
+                                                  start_date=self.jalali_start_date, end_date=self.jalali_end_date,
+                                                  ignore_date=False, adjust_price=True, show_weekday=True,
+                                                  double_date=True)
                 stock_data = stock_data.reset_index()
                 stock_data["Date"] = stock_data["Date"].dt.strftime("%Y-%m-%d")
                 stock_data["IranSymbol"] = symbol
@@ -131,7 +143,8 @@ class IranFinanceSource(DataHelper):
         dataframes = []
         # --------------------
         # Add TEPIX Index
-        tepix_df = fpy.Get_CWI_History(
+        tepix_df = self.http_cache.call(
+            "index_history", fpy.Get_CWI_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -144,7 +157,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(tepix_df)
         # --------------------
         # Add KolHamvazn Index
-        kol_hamvazn_df = fpy.Get_EWI_History(
+        kol_hamvazn_df = self.http_cache.call(
+            "index_history", fpy.Get_EWI_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -156,7 +170,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(kol_hamvazn_df)
         # --------------------
         # Add vazni_arzeshi_df Index
-        vazni_arzeshi_df = fpy.Get_CWPI_History(
+        vazni_arzeshi_df = self.http_cache.call(
+            "index_history", fpy.Get_CWPI_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -168,7 +183,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(vazni_arzeshi_df)
         # --------------------
         # Add AzadShenavar Index
-        AzadShenavar_df = fpy.Get_FFI_History(
+        AzadShenavar_df = self.http_cache.call(
+            "index_history", fpy.Get_FFI_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -180,7 +196,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(AzadShenavar_df)
         # --------------------
         # Add BazarAval Index
-        BazarAval_df = fpy.Get_MKT1I_History(
+        BazarAval_df = self.http_cache.call(
+            "index_history", fpy.Get_MKT1I_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -192,7 +209,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(BazarAval_df )
         # --------------------
         # Add BazarDovom Index
-        BazarDovom_df = fpy.Get_MKT2I_History(
+        BazarDovom_df = self.http_cache.call(
+            "index_history", fpy.Get_MKT2I_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -204,7 +222,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(BazarDovom_df)
         # --------------------
         # Add Sanat Index
-        Sanat_df = fpy.Get_INDI_History(
+        Sanat_df = self.http_cache.call(
+            "index_history", fpy.Get_INDI_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -216,7 +235,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(Sanat_df)
         # --------------------
         # Add Sherkat50 Index
-        Sherkat50_df = fpy.Get_ACT50_History(
+        Sherkat50_df = self.http_cache.call(
+            "index_history", fpy.Get_ACT50_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -228,7 +248,8 @@ class IranFinanceSource(DataHelper):
         dataframes.append(Sherkat50_df)
         # --------------------
         # Add Sherkat30 Index
-        Sherkat30_df = fpy.Get_LCI30_History(
+        Sherkat30_df = self.http_cache.call(
+            "index_history", fpy.Get_LCI30_History, closed_date=self.end_date,
             start_date=self.jalali_start_date,
             end_date=self.jalali_end_date,
             ignore_date=False,
@@ -264,9 +285,11 @@ class IranFinanceSource(DataHelper):
 
         dataframes = []
         for indx in sectors_list:
-            sector_index_data = fpy.Get_SectorIndex_History(sector=indx, start_date=self.jalali_start_date,
-                                               end_date=self.jalali_end_date, ignore_date=False,
-                                               just_adj_close=False, show_weekday=True, double_date=True)
+            sector_index_data = self.http_cache.call("sector_index_history", fpy.Get_SectorIndex_History,
+                                                     closed_date=self.end_date, sector=indx,
+                                                     start_date=self.jalali_start_date, end_date=self.jalali_end_date,
+                                                     ignore_date=False, just_adj_close=False, show_weekday=True,
+                                                     double_date=True)
             sector_index_data = sector_index_data.reset_index()
             sector_index_data["Date"] = sector_index_data["Date"].dt.strftime("%Y-%m-%d")
             sector_index_data["Symbol"] = indx
@@ -335,6 +358,24 @@ class IranFinanceSource(DataHelper):
                 floating_share = 'NA'  # یا هر مقدار دلخواه دیگر
                 print(f"{symbol} is not supported")
 
+    def write_client_types_csv(self, symbol, records):
+        """
+        Write the client types records of one symbol to the CSV that
+        fetch_iran_stock_individual_corporate_transactions_data reads.
+
+        Args:
+            symbol (str): The Iran symbol.
+            records (dict or pd.DataFrame): The result of download_client_types_records, by symbol.
+        """
+        df = records.get(symbol) if isinstance(records, dict) else records
+        if df is None:
+            raise ValueError(f"No client types records for {symbol}")
+        if df.index.name == "date":
+            df = df.reset_index()
+        csv_path = f"{self.project_path}/main_create_database/client_types_data"
+        os.makedirs(csv_path, exist_ok=True)
+        df.to_csv(f"{csv_path}/{symbol}.csv")
+
     def fetch_csv_individual_corporate_files(self):
         max_runs = 1000
         current_run = 0
@@ -346,7 +387,9 @@ class IranFinanceSource(DataHelper):
             try:
                 for symbol in self.symbols_list:
                     if symbol not in downloaded_symbols:
-                        download_client_types_records(symbol, write_to_csv=True)
+                        # Only the records are cached; the CSV is written from them on every run, hit or miss
+                        records = self.http_cache.call("client_types_records", download_client_types_records, symbol)
+                        self.write_client_types_csv(symbol, records)
                         downloaded_symbols.add(symbol)
 
                 current_run += 1
@@ -397,41 +440,117 @@ class IranFinanceSource(DataHelper):
         else:
             return None  # در صورتی که هیچ دیتافریمی ساخته نشده باشد، None برگردانید
 
-    def fetch_iran_stock_share_holders_data(self):
-        # Todo: This function works correctly, but it is very time-consuming and cannot be used
+    def fetch_symbol_share_holders_history(self, symbol, start_date, rate_limiter=None, window_days=30):
+        """
+        Fetch the shareholder history of one symbol from start_date to end_date in windows of window_days.
+
+        pytse_client requests every day of a range separately, so a window of n days is n requests and takes n tokens
+        from rate_limiter before it goes to the network. Windows served by the HTTP cache take no tokens, and windows
+        that end before today are cached for good.
+
+        Args:
+            symbol (str): The Iran symbol.
+            start_date (str): First day to fetch, 'YYYY-MM-DD'.
+            rate_limiter (TokenBucketRateLimiter, optional): The limiter shared by all workers.
+            window_days (int, optional): Days per request window. Default is 30.
+
+        Returns:
+            pd.DataFrame: The shareholder rows from start_date on, one row per date and shareholder.
+        """
+        ticker = self.select_tickers(symbol)
+        if ticker is None:
+            raise ValueError(f"{symbol} is not supported")
+
+        last_day = datetime.datetime.strptime(self.end_date, "%Y-%m-%d")
+        window_start = datetime.datetime.strptime(start_date, "%Y-%m-%d")
         dataframes = []
-        for symbol in self.symbols_list:
-            try:
-                ticker = self.select_tickers(symbol)
-                df = ticker.get_shareholders_history(
-                    from_when=datetime.timedelta(days=self.days_difference),
-                    to_when=datetime.datetime.now(),
-                    only_trade_days=True,
-                )
-
-                df["IranSymbol"] = symbol
-                df["TimeFrame"] = self.timeframe
-                df = df.rename(columns={"date": "Date", "shareholder_instrument_id": "IranCompanyCode12"})
-                df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
-                df["RawStockShareHoldersKey"] = df["IranSymbol"] + "_" + df["Date"] + "_" + df["TimeFrame"]
+        while window_start <= last_day:
+            window_end = min(window_start + timedelta(days=window_days - 1), last_day)
+
+            def fetch_window(window_start=window_start, window_end=window_end):
+                if rate_limiter is not None:
+                    rate_limiter.acquire((window_end - window_start).days + 1)
+                return ticker.get_shareholders_history(from_when=window_end - window_start, to_when=window_end,
+                                                       only_trade_days=True)
+
+            df = self.http_cache.call(
+                "shareholders_history", fetch_window, closed_date=window_end.strftime("%Y-%m-%d"),
+                cache_arguments={"symbol": symbol, "from_date": window_start.strftime("%Y-%m-%d"),
+                                 "to_date": window_end.strftime("%Y-%m-%d"), "only_trade_days": True})
+            if df is not None and not df.empty:
                 dataframes.append(df)
-                print(symbol)
+            window_start = window_end + timedelta(days=1)
+
+        column_order = ["RawStockShareHoldersKey", "Date", "TimeFrame", "IranSymbol", "shareholder_id",
+                        "shareholder_shares", "shareholder_percentage", "IranCompanyCode12", "shareholder_name",
+                        "change"]
+        if not dataframes:
+            return pd.DataFrame(columns=column_order)
+
+        df = pd.concat(dataframes, ignore_index=True)
+        df["IranSymbol"] = symbol
+        df["TimeFrame"] = self.timeframe
+        df = df.rename(columns={"date": "Date", "shareholder_instrument_id": "IranCompanyCode12"})
+        df["Date"] = pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d")
+        df = df[df["Date"] >= start_date]
+        df["RawStockShareHoldersKey"] = df["IranSymbol"] + "_" + df["Date"] + "_" + df["TimeFrame"] + "_" + \
+            df["shareholder_id"].astype(str)
+        return df.reindex(columns=column_order).drop_duplicates(subset=["RawStockShareHoldersKey"])
+
+    def fetch_iran_stock_share_holders_data(self, last_dates=None, on_symbol=None, max_workers=4,
+                                            requests_per_second=2.0, window_days=30):
+        """
+        Fetch the shareholder history of all symbols concurrently under one shared rate limit.
 
-            except Exception as e:
-                logging.error(f"An error occurred for symbol {symbol}: {e}")
-                print(f"An error occurred for symbol {symbol}: {e}")
-                print(f"Skipping symbol {symbol}")
+        Every symbol is fetched from the day after its last stored date (last_dates), or from start_date when it has
+        none, up to end_date. Symbols run in a thread pool and share a TokenBucketRateLimiter that charges one token
+        per requested day, so adding workers never raises the request rate above requests_per_second. Results are handed to on_symbol
+        in the calling thread as each symbol completes, so they can be written to SQLite right away.
 
-        if dataframes:  # اگر لیست دیتافریم‌ها خالی نباشد
-            combined_dataframe = pd.concat(dataframes, ignore_index=True)
-            column_order = ["RawStockShareHoldersKey", "Date", "TimeFrame", "IranSymbol", "shareholder_id",
-                            "shareholder_shares",
-                            "shareholder_percentage", "IranCompanyCode12", "shareholder_name", "change"
-                            ]
-            combined_dataframe = combined_dataframe.reindex(columns=column_order)
-            return combined_dataframe
-        else:
-            return None  # اگر لیست خالی بود، می‌توانید اینجا یک مقدار دیگر برگردانید یا None
+        Args:
+            last_dates (dict, optional): Last stored 'YYYY-MM-DD' by Iran symbol.
+            on_symbol (callable, optional): Called as on_symbol(symbol, df) for every completed symbol.
+            max_workers (int, optional): Symbols fetched at the same time. Default is 4.
+            requests_per_second (float, optional): Daily requests per second over all workers. Default is 2.0.
+            window_days (int, optional): Days per request window. Default is 30.
+
+        Returns:
+            pd.DataFrame or None: All fetched rows when on_symbol is None; None otherwise or when nothing was fetched.
+        """
+        last_dates = last_dates or {}
+        start_dates = {}
+        for symbol in self.symbols_list:
+            start_date = self.start_date
+            if last_dates.get(symbol):
+                next_day = datetime.datetime.strptime(last_dates[symbol][:10], "%Y-%m-%d") + timedelta(days=1)
+                start_date = max(start_date, next_day.strftime("%Y-%m-%d"))
+            if start_date <= self.end_date:
+                start_dates[symbol] = start_date
+        print(f"Shareholder history: {len(start_dates)} of {len(self.symbols_list)} symbols have days to fetch.")
+
+        rate_limiter = TokenBucketRateLimiter(requests_per_second, capacity=max(max_workers, window_days))
+        dataframes = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.fetch_symbol_share_holders_history, symbol, start_date, rate_limiter,
+                                       window_days): symbol
+                       for symbol, start_date in start_dates.items()}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                symbol = futures[future]
+                try:
+                    df = future.result()
+                    if on_symbol is not None:
+                        on_symbol(symbol, df)
+                    else:
+                        dataframes.append(df)
+                    print(f"{symbol}: {len(df)} rows ({completed}/{len(futures)})")
+                except Exception as e:
+                    logging.error(f"An error occurred for symbol {symbol}: {e}")
+                    print(f"An error occurred for symbol {symbol}: {e}")
+                    print(f"Skipping symbol {symbol}")
+
+        if dataframes:
+            return pd.concat(dataframes, ignore_index=True)
+        return None
 
     def fetch_iran_stock_floating_share_data(self):
         repeat = 50  # تعداد تکرار پیش‌فرض
@@ -455,7 +574,10 @@ class IranFinanceSource(DataHelper):
                     if symbol not in non_dict:
                         try:
                             ticker = self.select_tickers(symbol)
-                            holders = ticker.shareholders.percentage.sum()
+                            shareholders = self.http_cache.call(
+                                "shareholders", lambda: ticker.shareholders,
+                                cache_arguments={"symbol": symbol, "date": datetime.date.today().isoformat()})
+                            holders = shareholders.percentage.sum()
                             floating_share = 100 - holders
                             print(symbol)
                             floating_share_list.append(floating_share)
@@ -484,7 +606,7 @@ class IranFinanceSource(DataHelper):
         return floating_share_df
 
     def fetch_iran_stock_key_stats(self):
-        key_states = get_stats(base_path="hello", to_csv=False)
+        key_states = self.http_cache.call("key_stats", get_stats, base_path="hello", to_csv=False)
         key_states = pd.concat([key_states, pd.DataFrame({
             "Date": [datetime.datetime.today().date().strftime('%Y-%m-%d')] * len(key_states),
             "TimeFrame": [self.timeframe] * len(key_states)
@@ -494,9 +616,9 @@ class IranFinanceSource(DataHelper):
         key_states["KeyStatesID"] = key_states["IranSymbol"] + "_" + key_states["Date"] + "_" + key_states["TimeFrame"]
         return key_states
 
-    @staticmethod
-    def fetch_intra_tse_market_watch():
-        df_market_watch, df_order_book = fpy.Get_MarketWatch(
+    def fetch_intra_tse_market_watch(self):
+        df_market_watch, df_order_book = self.http_cache.call(
+            "market_watch", fpy.Get_MarketWatch,
             save_excel=False,
             save_path='ProFinancialDss')
 
@@ -509,7 +631,8 @@ class IranFinanceSource(DataHelper):
     def fetch_historical_order_book(self):
         dataframes = []
         for symbol in self.symbols_list:
-            df_order_book_historical = fpy.Get_IntradayOB_History(
+            df_order_book_historical = self.http_cache.call(
+                "intraday_order_book_history", fpy.Get_IntradayOB_History, closed_date=self.end_date,
                 stock=symbol,
                 start_date=self.jalali_start_date,
                 end_date=self.jalali_end_date,
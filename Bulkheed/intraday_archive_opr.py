@@ -0,0 +1,247 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import datetime
+import json
+import os
+import sqlite3
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+from RawMaterials.parquet_mirror_obj import PARQUET_AVAILABLE
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+# Compact the per-day market_data_<date> tables of the old intraday collector into a monthly Parquet archive
+# Database: "IranInterDayData.db"
+# ----------------------------------------------------------------------------------------------------------------------
+class IntradayArchiveCompactor(DataHelper):
+    """
+    Fold finished market_data_<YYYY-MM-DD> tables into one Parquet file per month.
+
+    Each month file holds the rows of all its days, with a SnapshotDate column (the date of the source table) and
+    SourceRow (the rowid, the only record of arrival order in those tables), sorted by Ticker, SnapshotDate, Time and
+    SourceRow. Row groups of a sorted file carry min/max statistics, so a symbol or date filter reads only the
+    matching row groups. manifest.json lists every month with its file, row count, days and time range, and every
+    compacted table with its row count.
+
+    A table is dropped only after the new month file has been read back and the row count of its day matches the
+    source table. Today's table is never touched. pyarrow is required to write the archive; without it compact()
+    reports that and leaves the database unchanged.
+
+    Usage:
+        compactor = IntradayArchiveCompactor()
+        compactor.compact()
+        df = compactor.query("2024-01-01", "2024-02-15", symbols=["فولاد"], columns=["Ticker", "Close", "Volume"])
+    """
+
+    TABLE_PREFIX = "market_data_"
+    SORT_COLUMNS = ["Ticker", "SnapshotDate", "Time", "SourceRow"]
+
+    def __init__(self, db_name=None, archive_path=None, row_group_size=100000):
+        super().__init__()
+        self.db_name = db_name or f"{self.project_path}/Warehouse/IranInterDayData.db"
+        self.archive_path = archive_path or f"{self.project_path}/Warehouse/IntradayArchive/market_data"
+        self.manifest_path = f"{self.archive_path}/manifest.json"
+        self.row_group_size = row_group_size
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return {"months": {}, "tables": {}}
+        with open(self.manifest_path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def save_manifest(self, manifest):
+        os.makedirs(self.archive_path, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp-{os.getpid()}"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def month_file(self, month):
+        return f"{self.archive_path}/month={month}.parquet"
+
+    def daily_tables(self, conn, finished_only=True):
+        """
+        The market_data_<date> tables by month; only the days before today when finished_only is True.
+        """
+        today = datetime.date.today().isoformat()
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+                                                 (self.TABLE_PREFIX + "%",)).fetchall()]
+        months = {}
+        for table_name in sorted(tables):
+            table_date = table_name[len(self.TABLE_PREFIX):]
+            try:
+                datetime.date.fromisoformat(table_date)
+            except ValueError:
+                continue
+            if not finished_only or table_date < today:
+                months.setdefault(table_date[:7], []).append(table_name)
+        return months
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def read_daily_table(self, conn, table_name):
+        df = pd.read_sql_query(f'SELECT rowid AS SourceRow, * FROM "{table_name}"', conn)
+        df.insert(0, "SnapshotDate", table_name[len(self.TABLE_PREFIX):])
+        return df
+
+    @staticmethod
+    def harmonize_types(df):
+        """
+        Give every column one Parquet type: text columns that mix values of different days become strings.
+        """
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].astype("string")
+        return df
+
+    def write_month(self, month, month_df):
+        """
+        Write a month file sorted for range scans, through a temporary file that replaces the old one.
+        """
+        os.makedirs(self.archive_path, exist_ok=True)
+        sort_columns = [column for column in self.SORT_COLUMNS if column in month_df.columns]
+        month_df = month_df.sort_values(sort_columns, kind="stable").reset_index(drop=True)
+
+        target_path = self.month_file(month)
+        temp_path = f"{target_path}.tmp-{os.getpid()}"
+        month_df.to_parquet(temp_path, engine="pyarrow", index=False, row_group_size=self.row_group_size)
+        return temp_path, month_df
+
+    def compact_month(self, conn, month, table_names, manifest):
+        """
+        Merge the daily tables of a month into its file, verify the counts and drop the tables.
+
+        Returns:
+            int: Number of rows archived from the tables.
+        """
+        target_path = self.month_file(month)
+        frames = [pd.read_parquet(target_path, engine="pyarrow")] if os.path.isfile(target_path) else []
+        source_counts = {}
+        for table_name in table_names:
+            frames.append(self.read_daily_table(conn, table_name))
+            source_counts[table_name] = len(frames[-1])
+
+        month_df = self.harmonize_types(pd.concat(frames, ignore_index=True))
+        month_df = month_df.drop_duplicates(subset=[column for column in ["SnapshotDate", "SourceRow"]
+                                                    if column in month_df.columns], keep="last")
+        temp_path, month_df = self.write_month(month, month_df)
+
+        # Verify the written file before any table is dropped
+        written_counts = pd.read_parquet(temp_path, engine="pyarrow", columns=["SnapshotDate"])["SnapshotDate"] \
+            .value_counts()
+        for table_name, source_count in source_counts.items():
+            table_date = table_name[len(self.TABLE_PREFIX):]
+            written_count = int(written_counts.get(table_date, 0))
+            if written_count != source_count:
+                os.remove(temp_path)
+                raise ValueError(f"{table_name} has {source_count} rows but {written_count} were archived for "
+                                 f"{table_date}; nothing was dropped")
+        os.replace(temp_path, target_path)
+
+        times = month_df["SnapshotDate"].astype(str) + " " + month_df["Time"].astype(str) \
+            if "Time" in month_df.columns else month_df["SnapshotDate"].astype(str)
+        manifest["months"][month] = {
+            "file": os.path.basename(target_path),
+            "rows": int(len(month_df)),
+            "days": sorted(month_df["SnapshotDate"].astype(str).unique().tolist()),
+            "symbols": int(month_df["Ticker"].nunique()) if "Ticker" in month_df.columns else None,
+            "min_time": str(times.min()),
+            "max_time": str(times.max()),
+            "sort_columns": [column for column in self.SORT_COLUMNS if column in month_df.columns],
+        }
+        compacted_at = datetime.datetime.now().isoformat(timespec="seconds")
+        for table_name, source_count in source_counts.items():
+            manifest["tables"][table_name] = {"month": month, "rows": source_count, "compacted_at": compacted_at}
+        self.save_manifest(manifest)
+
+        for table_name in table_names:
+            conn.execute(f'DROP TABLE "{table_name}"')
+        conn.commit()
+        return sum(source_counts.values())
+
+    def compact(self, vacuum=True):
+        """
+        Archive every finished daily table and drop it from the database.
+
+        Args:
+            vacuum (bool, optional): VACUUM the database afterwards to return the space. Default is True.
+
+        Returns:
+            dict: Archived row count by month.
+        """
+        if not PARQUET_AVAILABLE:
+            print("pyarrow is not installed, the intraday daily tables were not compacted.")
+            return {}
+
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        archived = {}
+        try:
+            manifest = self.load_manifest()
+            for month, table_names in self.daily_tables(conn).items():
+                archived[month] = self.compact_month(conn, month, table_names, manifest)
+                print(f"{len(table_names)} daily tables of {month} archived ({archived[month]} rows).")
+            if vacuum and archived:
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
+        return archived
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def query(self, start_date, end_date, symbols=None, columns=None, include_tables=True):
+        """
+        Read intraday market watch rows of a date range from the archive and the tables not archived yet.
+
+        Args:
+            start_date (str): First day, 'YYYY-MM-DD'.
+            end_date (str): Last day, 'YYYY-MM-DD'.
+            symbols (list, optional): Tickers to keep. Default is all.
+            columns (list, optional): Columns to read. Default is all.
+            include_tables (bool, optional): Also read matching market_data_<date> tables. Default is True.
+
+        Returns:
+            pd.DataFrame: The rows sorted by Ticker, SnapshotDate and Time.
+        """
+        if columns is not None:
+            columns = list(dict.fromkeys(["SnapshotDate", *columns]))
+        filters = [("SnapshotDate", ">=", start_date), ("SnapshotDate", "<=", end_date)]
+        if symbols is not None:
+            filters.append(("Ticker", "in", list(symbols)))
+
+        frames = []
+        if PARQUET_AVAILABLE:
+            for month, month_info in sorted(self.load_manifest()["months"].items()):
+                if month < start_date[:7] or month > end_date[:7]:
+                    continue
+                frames.append(pd.read_parquet(f"{self.archive_path}/{month_info['file']}", engine="pyarrow",
+                                              columns=columns, filters=filters))
+
+        if include_tables and os.path.isfile(self.db_name):
+            conn = sqlite3.connect(self.db_name, timeout=60)
+            try:
+                for table_names in self.daily_tables(conn, finished_only=False).values():
+                    for table_name in table_names:
+                        if start_date <= table_name[len(self.TABLE_PREFIX):] <= end_date:
+                            df = self.read_daily_table(conn, table_name)
+                            if symbols is not None:
+                                df = df[df["Ticker"].isin(symbols)]
+                            frames.append(df[columns] if columns is not None else df)
+            finally:
+                conn.close()
+
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+        sort_columns = [column for column in self.SORT_COLUMNS if column in df.columns]
+        return df.sort_values(sort_columns, kind="stable").reset_index(drop=True)
@@ -1,58 +1,442 @@
 import finpy_tse as fpy
 import pandas as pd
-import schedule
-import time
-from datetime import datetime, timedelta
+import asyncio
+import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
+from RawMaterials.data_base_obj import DataHelper
+from Materials.intraday_snapshot_obj import SnapshotDeltaEncoder
+from Materials.intraday_bars_obj import StreamingBarBuilder
+from Materials.latest_snapshot_store_obj import LatestSnapshotStore
+from Materials.adaptive_sampler_obj import AdaptiveIntradaySampler
+from Materials.order_book_storage_obj import OrderBookLevelStore
+from Foundation.FilterFramesHelper import FilterFramesHelper
 
-class MarketDataCollector:
-    def __init__(self):
+
+class MarketDataCollector(DataHelper):
+    """
+    Collect intraday market watch snapshots on a fixed cadence with asyncio.
+
+    Polls are scheduled on an absolute grid (each tick is the previous scheduled time plus the interval) so a slow
+    poll does not push the following ones back; ticks that could not be served are counted as missed instead of
+    silently drifting. Each poll runs fpy.Get_MarketWatch in a worker thread, so fetching and writing overlap.
+    Snapshots are buffered in a queue and flushed in batched transactions to IntraMarketWatchSnapshotsTbl, one table
+    for all days with a SnapshotDate column, instead of a new market_data_<date> table per day.
+
+    Snapshots are delta-encoded before they are buffered: only the symbols whose values changed since the previous
+    snapshot are stored, with a full keyframe every keyframe_every snapshots and at the start of each day.
+    load_snapshot rebuilds the full market watch at any stored time.
+
+    With build_bars, every full snapshot also feeds a StreamingBarBuilder, and the closed 1, 5 and 15 minute OHLCV
+    bars are written to IntraOHLCVBarsTbl together with the snapshots.
+
+    latest_store always holds the latest row of every ticker in memory, with the market-maker symbols registered as
+    the 'market_maker' group. In-process consumers query it directly; with serve_port it is also served as JSON on
+    127.0.0.1 (see LatestSnapshotStore.start_server).
+
+    With adaptive_sampling, an AdaptiveIntradaySampler decides what is stored: the market-maker watchlist on every
+    poll together with its order book (as level diffs in IntraOrderBookLevelDiffTbl), the other symbols once per
+    slow interval, and symbols at a price limit or with a volume spike like the watchlist until they cool down.
+    While any symbol is hot the poll interval tightens to the sampler's hot interval. Keyframes are always stored
+    in full so load_snapshot still rebuilds the whole market.
+
+    Usage:
+        collector = MarketDataCollector()
+        collector.run()
+    """
+
+    SNAPSHOTS_TABLE = "IntraMarketWatchSnapshotsTbl"
+
+    def __init__(self, db_name=None, interval_seconds=5, start_time="09:00:00", end_time="12:30:00",
+                 flush_rows=20000, flush_seconds=30, max_concurrent_fetches=2, metrics_every_ticks=60,
+                 keyframe_every=60, build_bars=True, serve_port=None, adaptive_sampling=False, final_flush_retries=3,
+                 final_flush_wait_seconds=1):
         """
         Constructor method. Initializes the MarketDataCollector class.
         """
-        # Initialize a connection to the SQLite database
-        self.conn = sqlite3.connect('IranInterDayData.db')
+        super().__init__()
+        self.db_name = db_name or f"{self.project_path}/Warehouse/IranInterDayData.db"
+        self.interval_seconds = interval_seconds
+        self.start_time = datetime.strptime(start_time, '%H:%M:%S').time()
+        self.end_time = datetime.strptime(end_time, '%H:%M:%S').time()
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.metrics_every_ticks = metrics_every_ticks
+        self.final_flush_retries = final_flush_retries
+        self.final_flush_wait_seconds = final_flush_wait_seconds
+
+        self.fetch_executor = ThreadPoolExecutor(max_workers=max_concurrent_fetches)
+        self.write_executor = ThreadPoolExecutor(max_workers=1)
+        self.stop_event = None
+        self.encoder = SnapshotDeltaEncoder("Ticker", ignore_columns=["SnapshotDate", "SnapshotTime"],
+                                            keyframe_every=keyframe_every)
+        self.last_encoded = None
+        self.bar_builder = StreamingBarBuilder(self.db_name, symbol_column="Ticker", date_column="SnapshotDate",
+                                               time_column="SnapshotTime") if build_bars else None
+        self.latest_store = LatestSnapshotStore("Ticker")
+        self.serve_port = serve_port
+        self.sampler = AdaptiveIntradaySampler() if adaptive_sampling else None
+        self.order_book_store = OrderBookLevelStore(self.db_name) if adaptive_sampling else None
+        self.order_book_buffer = []
+        self.metrics = {
+            "polls": 0, "fetch_errors": 0, "missed_ticks": 0, "skipped_polls": 0,
+            "last_poll_latency": 0.0, "max_poll_latency": 0.0, "total_poll_latency": 0.0,
+            "last_tick_lag": 0.0, "max_tick_lag": 0.0,
+            "flushes": 0, "flush_errors": 0, "rows_written": 0, "last_flush_seconds": 0.0, "queue_size": 0,
+            "rows_fetched": 0, "late_snapshots": 0, "bars_written": 0,
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def is_market_open(self, now=None):
+        now = now or datetime.now()
+        return self.start_time <= now.time() <= self.end_time
+
+    def fetch_market_watch(self):
+        """
+        Fetch the market watch, and its order book when the sampler captures order books.
+        """
+        frames = fpy.Get_MarketWatch(save_excel=False, save_path='ProFinancialDss')
+        if self.sampler is None:
+            return frames[0], None
+        order_book_df = frames[1].reset_index()
+        order_book_df["Ticker"] = order_book_df["Ticker"].ffill()
+        return frames[0], order_book_df
 
-    def save_to_database(self):
+    def metrics_snapshot(self):
         """
-        Method to retrieve market data and save it to the database.
+        Return a copy of the collector metrics with the average poll latency.
         """
-        now = datetime.now()
+        metrics = dict(self.metrics)
+        metrics["average_poll_latency"] = metrics["total_poll_latency"] / metrics["polls"] if metrics["polls"] else 0.0
+        return metrics
 
-        # Check if the current time is between 9:00 AM and 12:30 PM
-        if now.time() >= datetime.strptime('09:00:00', '%H:%M:%S').time() and now.time() <= datetime.strptime('12:30:00', '%H:%M:%S').time():
-            # Get the current date and format it as 'YYYY-MM-DD'
-            date_str = now.strftime("%Y-%m-%d")
+    def print_metrics(self):
+        metrics = self.metrics_snapshot()
+        print(f"polls={metrics['polls']} errors={metrics['fetch_errors']} missed={metrics['missed_ticks']} "
+              f"skipped={metrics['skipped_polls']} latency(avg/max)={metrics['average_poll_latency']:.2f}/"
+              f"{metrics['max_poll_latency']:.2f}s lag(max)={metrics['max_tick_lag']:.3f}s "
+              f"queue={metrics['queue_size']} flushes={metrics['flushes']} rows={metrics['rows_written']} "
+              f"fetched={metrics['rows_fetched']} last_flush={metrics['last_flush_seconds']:.2f}s")
+        if self.sampler is not None:
+            sampler_metrics = self.sampler.metrics
+            print(f"sampled={sampler_metrics['rows_kept']}/{sampler_metrics['rows_seen']} "
+                  f"hot={len(self.sampler.hot_symbols)} triggers={sampler_metrics['triggers']}")
 
-            # Create a table name based on the formatted date
-            table_name = f"market_data_{date_str}"
+    # ------------------------------------------------------------------------------------------------------------------
 
+    async def poll_snapshot(self, queue, snapshot_time, semaphore):
+        """
+        Fetch one market watch snapshot in a worker thread and put it on the write queue.
+        """
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            started = loop.time()
             try:
-                # Get market data
-                df = fpy.Get_MarketWatch(
-                    save_excel=False,
-                    save_path='ProFinancialDss')[0]
+                df, order_book_df = await loop.run_in_executor(self.fetch_executor, self.fetch_market_watch)
+            except Exception as e:
+                self.metrics["fetch_errors"] += 1
+                print(f"Market watch poll at {snapshot_time:%H:%M:%S} failed: {e}")
+                return
+            finally:
+                latency = loop.time() - started
+                self.metrics["polls"] += 1
+                self.metrics["last_poll_latency"] = latency
+                self.metrics["total_poll_latency"] += latency
+                self.metrics["max_poll_latency"] = max(self.metrics["max_poll_latency"], latency)
 
-                print(df)
+        df = df.reset_index()
+        df.insert(0, "SnapshotDate", snapshot_time.strftime("%Y-%m-%d"))
+        df.insert(1, "SnapshotTime", snapshot_time.strftime("%H:%M:%S"))
+        if order_book_df is not None:
+            order_book_df.insert(0, "SnapshotDate", df["SnapshotDate"].iat[0] if len(df) else None)
+            order_book_df.insert(1, "SnapshotTime", snapshot_time.strftime("%H:%M:%S"))
+        await queue.put((df, order_book_df))
+        self.metrics["queue_size"] = queue.qsize()
 
-                # Save the data to a table specific to the current date
-                df.to_sql(table_name, self.conn, if_exists='append', index=True)
-            except:
-                print('An error occurred but the program will continue.')
-                time.sleep(5)
+    def current_interval(self):
+        if self.sampler is None:
+            return self.interval_seconds
+        return self.sampler.interval_seconds(self.interval_seconds)
 
-    def run(self):
+    async def poll_loop(self, queue):
+        """
+        Start a poll on every tick of the cadence while the market is open.
+
+        Each tick is scheduled from the previous scheduled time, not from when the previous poll finished, so
+        sleeping always targets the next grid point. When the loop wakes up more than one interval late, the skipped
+        ticks are counted in missed_ticks. A tick whose polls are all still running is skipped rather than queued
+        behind them. With adaptive sampling the interval tightens while the sampler has hot symbols.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+        poll_tasks = set()
+        scheduled = loop.time()
+        tick = 0
+
+        while not self.stop_event.is_set():
+            interval = self.current_interval()
+            delay = scheduled - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+            lag = loop.time() - scheduled
+            self.metrics["last_tick_lag"] = lag
+            self.metrics["max_tick_lag"] = max(self.metrics["max_tick_lag"], lag)
+            if lag >= interval:
+                missed = int(lag // interval)
+                self.metrics["missed_ticks"] += missed
+                scheduled += missed * interval
+
+            now = datetime.now()
+            if self.is_market_open(now):
+                if semaphore.locked():
+                    self.metrics["skipped_polls"] += 1
+                else:
+                    task = asyncio.create_task(self.poll_snapshot(queue, now, semaphore))
+                    poll_tasks.add(task)
+                    task.add_done_callback(poll_tasks.discard)
+
+            scheduled += interval
+            tick += 1
+            if tick % self.metrics_every_ticks == 0:
+                self.print_metrics()
+
+        if poll_tasks:
+            await asyncio.gather(*poll_tasks, return_exceptions=True)
+        await queue.put(None)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def encode_snapshot(self, snapshot_df, order_book_df=None):
         """
-        Main method to schedule data retrieval and database saving.
+        Delta-encode a snapshot in arrival order. A snapshot older than the last encoded one (two polls finishing
+        out of order) is dropped, because deltas must follow time order. With adaptive sampling only the sampled
+        rows are encoded and the order book of the captured symbols is buffered.
         """
+        snapshot_key = (snapshot_df["SnapshotDate"].iat[0], snapshot_df["SnapshotTime"].iat[0])
+        if self.last_encoded is not None:
+            if snapshot_key < self.last_encoded:
+                self.metrics["late_snapshots"] += 1
+                return None
+            if snapshot_key[0] != self.last_encoded[0]:
+                self.encoder.reset()
+                if self.sampler is not None:
+                    self.sampler.reset()
+        self.last_encoded = snapshot_key
+        self.metrics["rows_fetched"] += len(snapshot_df)
+        self.latest_store.update(snapshot_df)
+        if self.bar_builder is not None:
+            self.bar_builder.consume(snapshot_df)
+
+        if self.sampler is not None:
+            hours, minutes, seconds = (int(part) for part in snapshot_key[1].split(":"))
+            keep = self.sampler.select(snapshot_df, hours * 3600 + minutes * 60 + seconds,
+                                       store_all=self.encoder.next_is_keyframe())
+            snapshot_df = snapshot_df[keep]
+            if order_book_df is not None and len(order_book_df):
+                captured_df = order_book_df[order_book_df["Ticker"].astype(str).isin(self.sampler.capture_symbols)]
+                self.order_book_buffer.append(captured_df.rename(
+                    columns={"Ticker": "Symbol", "SnapshotDate": "GDate", "SnapshotTime": "Time"}))
+        return self.encoder.encode(snapshot_df)
+
+    def load_snapshot(self, snapshot_date, snapshot_time):
+        """
+        Rebuild the full market watch snapshot stored at or before snapshot_time of snapshot_date.
+
+        Args:
+            snapshot_date (str): 'YYYY-MM-DD'.
+            snapshot_time (str): 'HH:MM:SS'.
+
+        Returns:
+            pd.DataFrame: One row per ticker.
+        """
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        try:
+            return SnapshotDeltaEncoder.load_snapshot(conn, self.SNAPSHOTS_TABLE, snapshot_time, "SnapshotTime",
+                                                      "Ticker", '"SnapshotDate" = ?', (snapshot_date,))
+        finally:
+            conn.close()
+
+    def write_snapshots(self, snapshots_df, bars_df=None, order_book_df=None):
+        if order_book_df is not None and not order_book_df.empty:
+            self.order_book_store.append_snapshots(order_book_df)
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        try:
+            if not snapshots_df.empty:
+                self.bulk_write_table(snapshots_df, self.SNAPSHOTS_TABLE, conn, mode="append")
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.SNAPSHOTS_TABLE}_SnapshotDate" '
+                             f'ON "{self.SNAPSHOTS_TABLE}" ("SnapshotDate", "SnapshotTime")')
+                # Per-symbol reads in time order, e.g. IntradayReplayEngine
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{self.SNAPSHOTS_TABLE}_Ticker_SnapshotDate" '
+                             f'ON "{self.SNAPSHOTS_TABLE}" ("Ticker", "SnapshotDate", "SnapshotTime")')
+                conn.commit()
+            if bars_df is not None and not bars_df.empty:
+                self.bar_builder.write_bars(bars_df, conn)
+        finally:
+            conn.close()
+
+    async def flush(self, buffer, final=False):
+        loop = asyncio.get_running_loop()
+        snapshots_df = pd.concat(buffer, ignore_index=True) if buffer else pd.DataFrame()
+        bars_df = None
+        if self.bar_builder is not None:
+            if final:
+                self.bar_builder.reset()
+            bars_df = self.bar_builder.pop_closed_bars()
+        order_book_df = pd.concat(self.order_book_buffer, ignore_index=True) if self.order_book_buffer else None
+        self.order_book_buffer = []
+        started = loop.time()
+        try:
+            await loop.run_in_executor(self.write_executor, self.write_snapshots, snapshots_df, bars_df,
+                                       order_book_df)
+        except Exception as e:
+            self.metrics["flush_errors"] += 1
+            print(f"Writing {len(snapshots_df)} snapshot rows failed: {e}")
+            if bars_df is not None and not bars_df.empty:
+                self.bar_builder.closed_bars.insert(0, bars_df)
+            if order_book_df is not None:
+                self.order_book_buffer.insert(0, order_book_df)
+            return False
+        self.metrics["flushes"] += 1
+        self.metrics["bars_written"] += 0 if bars_df is None else len(bars_df)
+        self.metrics["rows_written"] += len(snapshots_df)
+        self.metrics["last_flush_seconds"] = loop.time() - started
+        return True
+
+    async def final_flush(self, buffer):
+        """
+        Flush what is left at shutdown, retrying with a growing wait before giving up.
+
+        When every attempt fails, the unwritten snapshots, bars and order book diffs are spilled to pickle files next
+        to db_name and a RuntimeError is raised, so nothing is dropped silently.
+        """
+        for attempt in range(self.final_flush_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.final_flush_wait_seconds * attempt)
+                print(f"Retrying the final flush ({attempt}/{self.final_flush_retries}).")
+            if await self.flush(buffer, final=True):
+                return
+        spill_path = self.spill_unflushed(buffer)
+        raise RuntimeError(f"The final flush failed {self.final_flush_retries + 1} times; "
+                           f"the unwritten data was spilled to {spill_path}.")
+
+    def spill_unflushed(self, buffer):
+        """
+        Save the unwritten snapshots, bars and order book diffs as pickle files.
+
+        Args:
+            buffer (list): Buffered delta-encoded snapshot frames.
+
+        Returns:
+            str: Prefix of the spilled files; each one ends with -snapshots.pkl, -bars.pkl or -order_book.pkl.
+        """
+        spill_path = f"{os.path.splitext(self.db_name)[0]}_unflushed_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        frames = {
+            "snapshots": pd.concat(buffer, ignore_index=True) if buffer else None,
+            "bars": self.bar_builder.pop_closed_bars() if self.bar_builder is not None else None,
+            "order_book": pd.concat(self.order_book_buffer, ignore_index=True) if self.order_book_buffer else None,
+        }
+        for name, frame in frames.items():
+            if frame is not None and not frame.empty:
+                frame.to_pickle(f"{spill_path}-{name}.pkl")
+                print(f"Spilled {len(frame)} unwritten {name} rows to {spill_path}-{name}.pkl")
+        self.order_book_buffer = []
+        return spill_path
+
+    async def writer_loop(self, queue):
+        """
+        Buffer snapshots and flush them when flush_rows is reached or flush_seconds have passed.
+
+        The flush runs in its own thread; polling keeps going while a batch is written. A failed batch stays in the
+        buffer and is retried with the next flush. At shutdown the remaining data goes through final_flush, which
+        retries final_flush_retries times and then spills it to disk and raises.
+        """
+        loop = asyncio.get_running_loop()
+        buffer = []
+        buffered_rows = 0
+        last_flush = loop.time()
+
         while True:
+            timeout = max(0.0, self.flush_seconds - (loop.time() - last_flush))
             try:
-                self.save_to_database()
-                time.sleep(5)
-            except:
-                print('An error occurred but the program will continue.')
-                time.sleep(5)
+                snapshot = await asyncio.wait_for(queue.get(), timeout=timeout)
+                self.metrics["queue_size"] = queue.qsize()
+                if snapshot is None:
+                    break
+                delta_df = self.encode_snapshot(*snapshot)
+                if delta_df is not None and len(delta_df):
+                    buffer.append(delta_df)
+                    buffered_rows += len(delta_df)
+            except asyncio.TimeoutError:
+                pass
+
+            due = loop.time() - last_flush >= self.flush_seconds
+            if buffer and (due or buffered_rows >= self.flush_rows):
+                if await self.flush(buffer):
+                    buffer = []
+                    buffered_rows = 0
+            if due or not buffer:
+                last_flush = loop.time()
+
+        if buffer or self.bar_builder is not None or self.order_book_buffer:
+            await self.final_flush(buffer)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def register_market_maker_group(self):
+        """
+        Register the market-maker symbols in the latest snapshot store and as the sampler watchlist.
+        """
+        try:
+            market_maker_iran_symbols = FilterFramesHelper().fetch_market_maker_symbols_set()[2]
+        except Exception as e:
+            print(f"Market-maker symbols could not be loaded for the latest snapshot store: {e}")
+            return
+        self.latest_store.set_group("market_maker", market_maker_iran_symbols)
+        if self.sampler is not None:
+            self.sampler.set_watchlist(market_maker_iran_symbols)
+
+    async def run_async(self):
+        self.stop_event = asyncio.Event()
+        queue = asyncio.Queue()
+        self.register_market_maker_group()
+        if self.serve_port is not None:
+            self.latest_store.start_server(self.serve_port)
+        writer = asyncio.create_task(self.writer_loop(queue))
+        try:
+            await self.poll_loop(queue)
+        finally:
+            self.stop_event.set()
+            queue.put_nowait(None)
+            try:
+                await writer
+            finally:
+                self.latest_store.stop_server()
+                self.print_metrics()
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def run(self):
+        """
+        Main method to collect market watch snapshots until interrupted.
+        """
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            print("Market data collection stopped.")
+        finally:
+            self.fetch_executor.shutdown(wait=False)
+            self.write_executor.shutdown(wait=True)
 
 
 if __name__ == "__main__":
@@ -18,7 +18,10 @@ from RawMaterials.data_base_obj import DataHelper
 from Materials.create_df_from_tables import IranMarketMakerTableFrameBuilder
 
 from Foundation.market_maker_tables_preprocessor import DailyYekanReportPreprocessor, FundsProcessor, \
-    FundsInvestorsProcessor, InvestorsProcessor, HoldingsProcessor, GeneralProcessor
+    FundsInvestorsProcessor, InvestorsProcessor, HoldingsProcessor, GeneralProcessor, MarketMakerRollupProcessor
+from Foundation.investor_position_ledger import InvestorPositionLedger
+from RawMaterials.surrogate_keys_obj import SurrogateKeyEncoder
+from RawMaterials.table_schema_obj import TableSchemaRegistry
 
 
 # ======================================================================================================================
@@ -50,17 +53,10 @@ class MarketMakerAssetsRayanYekanTblCreator(DataHelper):
         df = df.drop_duplicates(subset=["IranCompanyCode12"])
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
-            "IranCompanyCode12": "TEXT PRIMARY KEY",
-            "AssetNameYekan": "TEXT",
-            "AssetSymbolYekan": "TEXT",
-            "AssetTypeYekan": "TEXT",
-            "AssetNameRayan": "TEXT" ,
-            "AssetSymbolRayan": "TEXT"
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerAssetsRayanYekanTbl")
 
         # IranSymbol / Symbol
-        df.to_sql("MarketMakerAssetsRayanYekanTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df, "MarketMakerAssetsRayanYekanTbl", conn, dtype=dtyp)
 
 # ######################################################################################################################
 # Table: Create MarketMakerBasicFundsInformationTbl and insert data to it  -> Inheritance from class DataHelper
@@ -83,14 +79,9 @@ class MarketMakerBasicFundsInformationTblCreator(DataHelper):
         df = df.drop_duplicates(subset=["IranCompanyCode12"])
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
-            "MarketMakerFundID": "INTEGER PRIMARY KEY",
-            "IranCompanyCode12": "TEXT",
-            "FundMarketMakerName": "TEXT",
-            "SymbolFundYekan": "TEXT",
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerBasicFundsInformationTbl")
 
-        df.to_sql("MarketMakerBasicFundsInformationTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df, "MarketMakerBasicFundsInformationTbl", conn, dtype=dtyp)
 # ======================================================================================================================
 # ######################################################################################################################
 # Table: Create MarketMakerBasicFundsFiscalYearYekanTbl and insert data to it  -> Inheritance from class DataHelper
@@ -114,13 +105,7 @@ class MarketMakerFundsFiscalYearYekanTblCreator(DataHelper):
         df = df.drop_duplicates(subset=["FundFiscalMarketMakerYekan"])
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
-            "FundFiscalYearID": "INTEGER PRIMARY KEY",
-            "IranCompanyCode12": "TEXT",
-            "MarketMakerFundID": "INTEGER",
-            "SymbolFundYekan": "TEXT",
-            "FundFiscalMarketMakerYekan": "TEXT"
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerFundsFiscalYearYekanTbl")
 
         def split_text(text_):
             split_FundFiscalMarketMakerYekan = text_.split('(')
@@ -130,7 +115,7 @@ class MarketMakerFundsFiscalYearYekanTblCreator(DataHelper):
         df["MarketMakerFundName"] = df[
             "FundFiscalMarketMakerYekan"].apply(split_text)
 
-        df.to_sql("MarketMakerFundsFiscalYearYekanTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df, "MarketMakerFundsFiscalYearYekanTbl", conn, dtype=dtyp)
 
 # ######################################################################################################################
 # Table: Create MarketMakerInvestorsTbl and insert data to it  -> Inheritance from class DataHelper
@@ -152,15 +137,9 @@ class MarketMakerInvestorsYekanTblCreator(DataHelper):
         df = df.drop_duplicates(subset=["InvestorName"])
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerInvestorsYekanTbl")
 
-            "InvestorID": "INTEGER",
-            "InvestorName": "TEXT",
-            "NationalCode_UniversalCode": "TEXT PRIMARY KEY"
-
-        }
-
-        df.to_sql("MarketMakerInvestorsYekanTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df, "MarketMakerInvestorsYekanTbl", conn, dtype=dtyp)
 
 # ======================================================================================================================
 # ######################################################################################################################
@@ -193,23 +172,9 @@ class MarketMakerAnnouncementsInformationTbl(DataHelper):
         self.mapping_columns(df_announcements, basic_fund_df, "SymbolFundYekan", "IranCompanyCode12",
                                          drop_pivot_column=False)
 
-        dtyp = {
-            "AnnouncementID": "TEXT PRIMARY KEY",
-            "AnnouncementJDate": "TEXT",
-            "AnnouncementType": "TEXT",
-            "MarketMakerFundID": "INTEGER",
-            "SymbolFundYekan": "TEXT",
-            "AnnouncementEffectiveJDate": "TEXT",
-            "StartMarketMakingJDate": "TEXT",
-            "FinishMarketMakingJDate": "TEXT",
-            "Commitment": "INTEGER",
-            "CumulativeOrderVolume": "TEXT",
-            "QuoteDomain": "REAL",
-            "StockVolatilityRange": "INTEGER",
-            "IranCompanyCode12": "TEXT"
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerAnnouncementsInformationTbl")
 
-        df_announcements.to_sql("MarketMakerAnnouncementsInformationTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df_announcements, "MarketMakerAnnouncementsInformationTbl", conn, dtype=dtyp)
 
         conn.close()
 
@@ -233,14 +198,9 @@ class MarketMakerHoldingsYekanTblCreator(DataHelper):
         df = df.drop_duplicates(subset=["HoldingName"])
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerHoldingsTbl")
 
-            "HoldingID": "INTEGER PRIMARY KEY",
-            "HoldingName": "TEXT"
-
-        }
-
-        df.to_sql("MarketMakerHoldingsTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df, "MarketMakerHoldingsTbl", conn, dtype=dtyp)
 
 # ======================================================================================================================
 # LiquidityRatioState
@@ -281,19 +241,13 @@ class MarketMakerInvestorsFundsTblCreator(DataHelper):
         # ایجاد ستون جدید با ترکیب دو ستون موجود
         combined_df['InvestorFundsID'] =combined_df['InvestorID'].astype(str) + '-' + combined_df['MarketMakerFundID'].astype(str)
 
-        dtyp = {
-            "InvestorFundsID": "TEXT PRIMARY KEY",
-            "InvestorID": "INTEGER",
-            "MarketMakerFundID": "INTEGER",
-            "InvestorName": "TEXT",
-            "SymbolFundYekan": "TEXT"
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerInvestorsFundsTbl")
 
         new_column_order = ["InvestorFundsID", "InvestorID", "MarketMakerFundID", "InvestorName", "SymbolFundYekan"]
 
         combined_df = combined_df[new_column_order]
 
-        combined_df.to_sql("MarketMakerInvestorsFundsTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(combined_df, "MarketMakerInvestorsFundsTbl", conn, dtype=dtyp)
 
         conn.close()
 
@@ -316,36 +270,21 @@ class MarketMakerDailyYekanReportsTblCreator(DataHelper):
         self.rename_date_excel_files(self.excel_path)
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
-            "ReportID": "TEXT PRIMARY KEY",
-            "JDate": "TEXT",
-            "MarketMakerFundID": "INTEGER",
-            "FundFiscalMarketMakerYekan": "TEXT",
-            "SymbolFundYekan": "TEXT",
-            "NumberOfStock": "INTEGER",
-            "FinalPrice": "REAL",
-            "BreakEvenPoint": "REAL",
-            "NetSalesValue(FinalPrice)": "REAL",
-            "BuyNumber": "REAL",
-            "NetBuyAmount": "REAL",
-            "SellNumber": "REAL",
-            "NetSellAmount": "REAL",
-            "Cash_CurrentBrokerage": "REAL",
-            "Cash_BankDeposit": "REAL",
-            "FundsFixedIncome": "REAL",
-            "BondsFixedIncome": "REAL",
-            "BoughtPower": "REAL",
-            "NetCancellationAssets": "REAL",
-            "TotalUnits": "REAL",
-            "CancellationPrice": "REAL",
-            "IssuePrice": "REAL",
-            "FiscalYearReturn": "TEXT",
-            "GDate": "TEXT",
-            "Symbol": "TEXT",
-            "PriceKey": "TEXT",
-            "AnnouncementID": "TEXT",
-            "HoldingID": "INTEGER"
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerDailyYekanReportsHelperTbl")
+
+        # The lookup tables do not change between days, they are read once
+        df_date = self.build_table_dataframe('BasicDataBase.db', 'DateTbl', 'GDate')
+        df_market_maker_basic = self.build_table_dataframe('IranMarketMaker.db', 'MarketMakerBasicFundsInformationTbl',
+                                                           'MarketMakerFundID')
+        df_market_maker_basic = df_market_maker_basic.dropna()
+        symbol_df = self.build_table_dataframe('IranStockDataBase.db', 'BasicIranSymbolsInformationTbl',
+                                               'IranCompanyCode12')
+        AnnouncementsInformation_df = self.build_table_dataframe('IranMarketMaker.db',
+                                                                 'MarketMakerAnnouncementsInformationTbl',
+                                                                 'AnnouncementID')
+        AnnouncementsInformation_df["ReportID_"] = AnnouncementsInformation_df["AnnouncementID"]
+
+        daily_reports = []
         for j_date in jdate_list:
             try:
                 excel_file = f"{self.excel_path}/DailyReportYekan_{j_date}.xlsx"
@@ -367,18 +306,8 @@ class MarketMakerDailyYekanReportsTblCreator(DataHelper):
 
                 df_report["JDate"] = j_date
 
-                # df_date = self.load_table_as_dataframe("DateTbl", conn_basic_database, "GDate")
-                df_date = self.build_table_dataframe('BasicDataBase.db', 'DateTbl',
-                                                     'GDate')
-
                 df_report = self.mapping_columns(df_report, df_date, "JDate", "GDate", drop_pivot_column=False)
 
-                # df_market_maker_basic = self.load_table_as_dataframe("MarketMakerBasicFundsInformationTbl", conn, "MarketMakerFundID")
-                df_market_maker_basic = self.build_table_dataframe('IranMarketMaker.db',
-                                                                                'MarketMakerBasicFundsInformationTbl',
-                                                                                'MarketMakerFundID')
-                df_market_maker_basic = df_market_maker_basic.dropna()
-
                 df_report = self.mapping_columns(df_report, df_market_maker_basic, "SymbolFundYekan",
                                                  "MarketMakerFundID", drop_pivot_column=False)
                 df_report["IranSymbol"] = df_report["SymbolFundYekan"]
@@ -388,20 +317,12 @@ class MarketMakerDailyYekanReportsTblCreator(DataHelper):
                 # TimeFrame
                 df_report["TimeFrame"] = '1d'
 
-                # symbol_df = self.load_table_as_dataframe("BasicIranSymbolsInformationTbl", conn_iran_stock_database, "IranCompanyCode12")
-                symbol_df = self.build_table_dataframe('IranStockDataBase.db', 'BasicIranSymbolsInformationTbl', 'IranCompanyCode12')
-
                 df_report = self.mapping_columns(df_report, symbol_df, "IranSymbol", "IranCompanyCode12", drop_pivot_column=True)
 
                 df_report = self.mapping_columns(df_report, symbol_df, "IranCompanyCode12","Symbol", drop_pivot_column=False)
 
                 df_report["PriceKey"] = df_report["Symbol"] + "_" + df_report["GDate"] + "_" + df_report["TimeFrame"]
 
-                AnnouncementsInformation_df = self.build_table_dataframe('IranMarketMaker.db',
-                                                                                'MarketMakerAnnouncementsInformationTbl',
-                                                                                'AnnouncementID')
-
-                AnnouncementsInformation_df["ReportID_"] = AnnouncementsInformation_df["AnnouncementID"]
                 df_report["ReportID_"] = df_report["ReportID"]
                 df_report = self.mapping_columns(df_report, AnnouncementsInformation_df, "ReportID_", "AnnouncementID",
                                                  drop_pivot_column=True)
@@ -419,11 +340,17 @@ class MarketMakerDailyYekanReportsTblCreator(DataHelper):
                 df_report = df_report[new_column_order]
                 df_report = df_report.dropna(subset=['MarketMakerFundID'])
 
-                df_report.to_sql("MarketMakerDailyYekanReportsHelperTbl", conn, index=False, if_exists='append', dtype=dtyp)
+                daily_reports.append(df_report)
+
+                print(f"{j_date} was read")
+            except Exception as e:
+                print(f"{j_date} could not be read: {e}")
+
+        # One transaction for all days; reports that are already in the table are skipped by their ReportID
+        if daily_reports:
+            self.bulk_write_table(pd.concat(daily_reports, ignore_index=True), "MarketMakerDailyYekanReportsHelperTbl",
+                                  conn, dtype=dtyp, mode="insert_or_ignore")
 
-                print(f"{j_date} was append")
-            except:
-                print("{j_date} is duplicate data")
 
         self.move_files(self.excel_path, self.archive_path, True)
         conn.close()
@@ -433,63 +360,32 @@ class MarketMakerDailyYekanReportsTblCreator(DataHelper):
         tfm_builder = IranMarketMakerTableFrameBuilder()
         df_report_general = tfm_builder.build_MarketMakerDailyYekanReportsHelperTfm()
 
-        dtyp = {
-            "ReportID": "TEXT PRIMARY KEY",
-            "JDate": "TEXT",
-            "MarketMakerFundID": "INTEGER",
-            "FundFiscalMarketMakerYekan": "TEXT",
-            "SymbolFundYekan": "TEXT",
-            "NumberOfStock": "INTEGER",
-            "FinalPrice": "REAL",
-            "BreakEvenPoint": "REAL",
-            "NetSalesValue(FinalPrice)": "REAL",
-            "BuyNumber": "REAL",
-            "NetBuyAmount": "REAL",
-            "SellNumber": "REAL",
-            "NetSellAmount": "REAL",
-            "Cash_CurrentBrokerage": "REAL",
-            "Cash_BankDeposit": "REAL",
-            "FundsFixedIncome": "REAL",
-            "BondsFixedIncome": "REAL",
-            "BoughtPower": "REAL",
-            "NetCancellationAssets": "REAL",
-            "TotalUnits": "REAL",
-            "CancellationPrice": "REAL",
-            "IssuePrice": "REAL",
-            "FiscalYearReturn": "TEXT",
-            "GDate": "TEXT",
-            "Symbol": "TEXT",
-            "PriceKey": "TEXT",
-            "AnnouncementID": "TEXT",
-            "HoldingID": "INTEGER"
-        }
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerDailyYekanReportsTbl")
 
         df_report_general = df_report_general.sort_values(by='GDate', ascending=True)
         df_report_general = df_report_general.reset_index()
         df_report_general = df_report_general.drop(columns=["index"])
         print(df_report_general)
 
-        # پر کردن مقادیر خالی ستون "AnnouncementID" فقط اگر شرط برقرار باشد
+        # Each report belongs to the announcement of its fund whose [effective, finish] window contains the report date
         AnnouncementsInformation_df = self.build_table_dataframe('IranMarketMaker.db',
                                                                         'MarketMakerAnnouncementsInformationTbl',
                                                                         'AnnouncementID')
 
-        self.mapping_columns(df_report_general, AnnouncementsInformation_df, 'AnnouncementID',
-                             'FinishMarketMakingJDate', False)
-
-        # # پر کردن مقادیر خالی ستون "FinishMarketMakingJDate"
+        report_columns = list(df_report_general.columns)
+        df_report_general = self.interval_join(df_report_general, AnnouncementsInformation_df, 'JDate',
+                                               'AnnouncementEffectiveJDate', 'FinishMarketMakingJDate',
+                                               'MarketMakerFundID', ['AnnouncementID'])
+        df_report_general = df_report_general[report_columns]
 
-        df_report_general['FinishMarketMakingJDate'] = df_report_general.groupby('Symbol', group_keys=False)[
-            'FinishMarketMakingJDate'].ffill()
+        encoder = SurrogateKeyEncoder()
+        df_report_general.insert(1, "ReportKeyID", encoder.build_report_key(df_report_general).values)
+        df_report_general.insert(df_report_general.columns.get_loc("PriceKey") + 1, "PriceKeyID",
+                                 encoder.build_price_key(df_report_general).values)
 
-        # دستیابی به مقدار‌ها با استفاده از یک شرط
-        condition = df_report_general['JDate'] < df_report_general['FinishMarketMakingJDate']
-        df_report_general.loc[condition, 'AnnouncementID'] = \
-            df_report_general.loc[condition].groupby('Symbol', group_keys=False)['AnnouncementID'].ffill()
-
-        df_report_general = df_report_general.drop(columns=['FinishMarketMakingJDate'])
-
-        df_report_general.to_sql("MarketMakerDailyYekanReportsTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df_report_general, "MarketMakerDailyYekanReportsTbl", conn, dtype=dtyp)
+        encoder.create_key_index(conn, "MarketMakerDailyYekanReportsTbl", "ReportKeyID", unique=True)
+        encoder.create_key_index(conn, "MarketMakerDailyYekanReportsTbl", "PriceKeyID")
 
         conn.close()
 
@@ -502,7 +398,7 @@ class PreprocessDailyYekanReportTblCreator(DailyYekanReportPreprocessor):
     def create_PreprocessDailyYekanReportTbl(self):
         conn = sqlite3.connect(self.db_name)
         preprocessed_daily_report_yekan_df = self.build_preprocessed_daily_report_yekan_df()
-        preprocessed_daily_report_yekan_df.to_sql("PreprocessDailyYekanReportTbl", conn, index=False, if_exists='replace')
+        self.bulk_write_table(preprocessed_daily_report_yekan_df, "PreprocessDailyYekanReportTbl", conn)
         conn.close()
 
 
@@ -514,14 +410,20 @@ class FundsProcessedVfmCreator(FundsProcessor):
     def create_funds_processed_vfm(self):
         conn = sqlite3.connect(self.db_name)
         creator = self.build_funds_processed_vfm()
-        creator.to_sql("FundsProcessedVfm", conn, index=False, if_exists='replace')
+
+        encoder = SurrogateKeyEncoder()
+        creator.insert(1, "TimeFrameReportKeyID", encoder.build_time_frame_report_key(creator).values)
+
+        self.bulk_write_table(creator, "FundsProcessedVfm", conn)
+        encoder.create_key_index(conn, "FundsProcessedVfm", "TimeFrameReportKeyID")
         conn.close()
+        self.publish_parquet_mirror(creator, "FundsProcessedVfm")
 
     def create_whole_j_date_daily_yekan_report_helperTfm(self):
         conn = sqlite3.connect(self.db_name)
         creator, week_view_frame = self.build_JDateDailyYekanReportHelperVfm()
-        creator.to_sql("WholeJDateDailyYekanReportHelperTfm", conn, index=False, if_exists='replace')
-        week_view_frame.to_sql("week_view_frame", conn, index=False, if_exists='replace')
+        self.bulk_write_table(creator, "WholeJDateDailyYekanReportHelperTfm", conn)
+        self.bulk_write_table(week_view_frame, "week_view_frame", conn)
         conn.close()
 
 
@@ -533,7 +435,7 @@ class WorldDictTblCreator(DataHelper):
     def create_word_dict_table(self):
         conn = sqlite3.connect(self.db_name)
         word_dict = pd.read_excel(f"{self.project_path}/Mines/WordDictTbl.xlsx")
-        word_dict.to_sql("WordDictTbl", conn, index=True, if_exists='replace', index_label='WordID')
+        self.bulk_write_table(word_dict, "WordDictTbl", conn, index=True, index_label='WordID')
         conn.close()
 # ======================================================================================================================
 # Table: Create MarketMakerIssuanceCancellationTbl and insert data to it
@@ -639,25 +541,10 @@ class FundsInvestorsTblCreator(FundsInvestorsProcessor):
             result_issuance_cancellation['IssuedCancellationPrice']
         )
 
-        dtyp = {
-            "ID": "INTEGER PRIMARY KEY",
-            "FundFiscalMarketMakerYekan": "TEXT",
-            "ShareholdingCode": "TEXT",
-            "InvestorName": "TEXT",
-            "NationalCode_UniversalCode": "TEXT",
-            "OperationType": "TEXT",
-            "DepositPlace": "TEXT",
-            "UnitType": "TEXT",
-            "DateTime": "TEXT",
-            "IssuedCancellationUnitsNumber": "INTEGER",
-            "IssuedCancellationPrice": "INTEGER",
-            "Amount": "INTEGER",
-            "ReceiptNumber": "TEXT",
-            "situation": "TEXT",
-        }
+        dtyp = TableSchemaRegistry.sql_types("RawMarketMakerIssuanceCancellationTbl")
 
-        result_issuance_cancellation.to_sql("RawMarketMakerIssuanceCancellationTbl", conn, index=True,
-                                            if_exists='replace', index_label="ID", dtype=dtyp)
+        self.bulk_write_table(result_issuance_cancellation, "RawMarketMakerIssuanceCancellationTbl", conn,
+                              dtype=dtyp, index=True, index_label="ID")
         conn.close()
 
 
@@ -669,18 +556,46 @@ class FundsInvestorsProcessedVfmCreator(FundsInvestorsProcessor):
     def create_funds_investors_helper_view_frame(self):
         conn = sqlite3.connect(self.db_name)
         funds_investors_helper_df = self.create_funds_investors_processed_helper_vfm()
-        funds_investors_helper_df.to_sql("FundsInvestorsProcessedHelperVfm", conn, index=False,
-                                         if_exists='replace')
+        self.bulk_write_table(funds_investors_helper_df, "FundsInvestorsProcessedHelperVfm", conn)
 
         conn.close()
 
     def create_funds_investors_processed_view_frame(self):
         conn = sqlite3.connect(self.db_name)
         funds_investors_processed_df = self.create_FundsInvestorProcessed_df()
-        funds_investors_processed_df.to_sql("FundsInvestorsProcessedVfm", conn, index=False,
-                                         if_exists='replace')
+
+        # ReportID is 'MarketMakerFundID-JDate', the fund part of the key comes from it
+        encoder = SurrogateKeyEncoder()
+        key_parts_df = pd.DataFrame({
+            "NationalCode_UniversalCode": funds_investors_processed_df["NationalCode_UniversalCode"],
+            "MarketMakerFundID": funds_investors_processed_df["ReportID"].astype(str).str.split('-', n=1).str[0],
+            "JDate": funds_investors_processed_df["JDate"],
+        })
+        key_parts_df["MarketMakerFundID"] = pd.to_numeric(key_parts_df["MarketMakerFundID"], errors='coerce')
+        funds_investors_processed_df.insert(1, "ReportInvestorKeyID",
+                                            encoder.build_report_investor_key(key_parts_df).values)
+
+        self.bulk_write_table(funds_investors_processed_df, "FundsInvestorsProcessedVfm", conn)
+        encoder.create_key_index(conn, "FundsInvestorsProcessedVfm", "ReportInvestorKeyID")
 
         conn.close()
+        self.publish_parquet_mirror(funds_investors_processed_df, "FundsInvestorsProcessedVfm")
+
+class InvestorPositionLedgerTblCreator(InvestorPositionLedger):
+    def __init__(self, db_name):
+        super().__init__()
+        self.db_name = db_name
+
+    def create_investor_position_ledger_tbl(self):
+        conn = sqlite3.connect(self.db_name)
+        ledger_df = self.build_ledger_events()
+
+        dtyp = TableSchemaRegistry.sql_types("InvestorPositionLedgerTbl")
+
+        self.bulk_write_table(ledger_df, "InvestorPositionLedgerTbl", conn, dtype=dtyp)
+
+        conn.close()
+
 
 class InvestorsProcessedVfmCreator(InvestorsProcessor):
     def __init__(self, db_name):
@@ -690,8 +605,7 @@ class InvestorsProcessedVfmCreator(InvestorsProcessor):
     def create_investors_processed_view_frame(self):
         conn = sqlite3.connect(self.db_name)
         investors_processed_df = self.create_investors_process_vfm()
-        investors_processed_df.to_sql("InvestorsProcessedVfm", conn, index=True,
-                                      if_exists='replace', index_label="ID")
+        self.bulk_write_table(investors_processed_df, "InvestorsProcessedVfm", conn, index=True, index_label="ID")
 
         conn.close()
 
@@ -704,8 +618,7 @@ class HoldingsProcessorVfmCreator(HoldingsProcessor):
     def create_holdings_processed_view_frame(self):
         conn = sqlite3.connect(self.db_name)
         investors_processed_df = self.create_holdings_process_vfm()
-        investors_processed_df.to_sql("HoldingsProcessedVfm", conn, index=True,
-                                      if_exists='replace', index_label="ID")
+        self.bulk_write_table(investors_processed_df, "HoldingsProcessedVfm", conn, index=True, index_label="ID")
 
         conn.close()
 
@@ -717,8 +630,22 @@ class GeneralProcessorVfmCreator(GeneralProcessor):
     def create_general_processed_view_frame(self):
         conn = sqlite3.connect(self.db_name)
         general_processed_df = self.create_general_process_vfm()
-        general_processed_df.to_sql("GeneralProcessedVfm", conn, index=True,
-                                      if_exists='replace', index_label="ID")
+        self.bulk_write_table(general_processed_df, "GeneralProcessedVfm", conn, index=True, index_label="ID")
+
+        conn.close()
+
+
+class RollupProcessedVfmCreator(MarketMakerRollupProcessor):
+    def __init__(self, db_name):
+        super().__init__()
+        self.db_name = db_name
+
+    def create_rollup_processed_view_frames(self):
+        rollup_vfms = self.create_rollup_process_vfms()
+
+        conn = sqlite3.connect(self.db_name)
+        for table_name, rollup_vfm in rollup_vfms.items():
+            self.bulk_write_table(rollup_vfm, table_name, conn, index=True, index_label="ID")
 
         conn.close()
 
@@ -13,6 +13,11 @@ import sqlite3
 from RawMaterials.data_base_obj import DataHelper
 from Bulkheed.get_iran_market_data_opr import IranFinanceSource
 from Foundation.price_preprocessor import BasicIranPricePreprocessor
+from RawMaterials.surrogate_keys_obj import SurrogateKeyEncoder
+from RawMaterials.table_schema_obj import TableSchemaRegistry
+from RawMaterials.time_bucket_obj import TimeBucketAggregator
+from Materials.intraday_snapshot_obj import SnapshotDeltaEncoder
+from Materials.order_book_storage_obj import OrderBookLevelStore
 # ======================================================================================================================
 # ######################################################################################################################
 # Database call
@@ -80,24 +85,8 @@ class FirstIranStockSymbolListTblCreator(DataHelper):
         df = df.drop_duplicates(subset=["Company Code(12)"])
         conn = sqlite3.connect(self.db_name)
 
-        dtyp = {
-            'Ticker': 'TEXT',
-            'Name': 'TEXT',
-            'Market': 'TEXT',
-            'Panel': 'TEXT',
-            'Sector': 'TEXT',
-            'Sub-Sector': 'TEXT',
-            'Comment': 'TEXT',
-            'Name(EN)': 'TEXT',
-            'Company Code(12)': 'TEXT PRIMARY KEY',
-            'Ticker(4)': 'TEXT',
-            'Ticker(5)': 'TEXT',
-            'Ticker(12)': 'TEXT',
-            'Sector Code': 'TEXT',
-            'Sub-Sector Code': 'TEXT',
-            'Panel Code': 'TEXT'
-        }
-        df.to_sql("FirstIranStockSymbolListTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        dtyp = TableSchemaRegistry.sql_types("FirstIranStockSymbolListTbl")
+        self.bulk_write_table(df, "FirstIranStockSymbolListTbl", conn, dtype=dtyp)
 
 
 
@@ -181,23 +170,8 @@ class RawIranSymbolsBasicInformationTblCreator(DataHelper):
 
         df = df[new_column_order]
 
-        dtyp = {
-            'IranCompanyCode12': 'TEXT PRIMARY KEY',
-            'IranSymbol':'TEXT',
-            'CompanyPersianName': 'TEXT',
-            'IranMarket': 'TEXT',
-            'IranPanel': 'TEXT',
-            'IranIndustry': 'TEXT',
-            'IranSubIndustry': 'TEXT',
-            'ShortName': 'TEXT',
-            'Symbol': 'TEXT',
-            'Ticker5': 'TEXT',
-            'Ticker12': 'TEXT',
-            'IndustryIranCode': 'TEXT',
-            'SubIndustryIranCode': 'TEXT',
-            'PanelIranCode': 'TEXT'
-        }
-        df.to_sql("RawIranSymbolsBasicInformationTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        dtyp = TableSchemaRegistry.sql_types("RawIranSymbolsBasicInformationTbl")
+        self.bulk_write_table(df, "RawIranSymbolsBasicInformationTbl", conn, dtype=dtyp)
 
         conn.close()
 
@@ -273,22 +247,7 @@ class RawIranPricesTblCreator(DataHelper):
         raw_iran_prices_df["PriceKey"] = raw_iran_prices_df["Symbol"] + "_" + raw_iran_prices_df["Date"] + "_" + \
                                     raw_iran_prices_df["TimeFrame"]
 
-        dtyp = {
-            'PriceKey': 'TEXT  PRIMARY KEY',
-            'Date': 'TEXT',
-            'TimeFrame': 'TEXT',
-            'Open': 'INTEGER',
-            'High': 'INTEGER',
-            'Low': 'INTEGER',
-            'Close': 'INTEGER',
-            'AdjOpen': 'INTEGER',
-            'AdjHigh': 'INTEGER',
-            'AdjLow': 'INTEGER',
-            'AdjClose': 'INTEGER',
-            'Volume': 'INTEGER',
-            'IranSymbol': 'TEXT',
-            'Symbol': 'TEXT'
-        }
+        dtyp = TableSchemaRegistry.sql_types("RawIranPricesTbl")
 
         new_column_order = ['PriceKey', 'Date', 'TimeFrame', 'IranSymbol', 'Symbol', 'Open', 'High', 'Low',
                             'Close', 'AdjOpen', 'AdjHigh', 'AdjLow', 'AdjClose',
@@ -296,7 +255,7 @@ class RawIranPricesTblCreator(DataHelper):
 
         raw_iran_prices_df = raw_iran_prices_df[new_column_order]
 
-        raw_iran_prices_df.to_sql("RawIranPricesTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(raw_iran_prices_df, "RawIranPricesTbl", conn, dtype=dtyp)
 
         conn.close()
 
@@ -362,12 +321,9 @@ class BasicIranIndustriesInformationTblCreator(DataHelper):
         iran_industries_df["IndustryIranName"] = df["IranIndustry"]
         iran_industries_df = iran_industries_df.drop_duplicates(subset=['IndustryIranCode'])
 
-        dtyp = {
-            "IndustryIranCode": "INTEGER PRIMARY KEY",
-            "IndustryIranName": "TEXT"
-        }
+        dtyp = TableSchemaRegistry.sql_types("BasicIranIndustriesInformationTbl")
 
-        iran_industries_df.to_sql("BasicIranIndustriesInformationTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(iran_industries_df, "BasicIranIndustriesInformationTbl", conn, dtype=dtyp)
 
         conn.close()
 
@@ -437,16 +393,11 @@ class BasicIranSubIndustriesInformationTblCreator(DataHelper):
         iran_sub_industries_df = iran_sub_industries_df.drop_duplicates(subset=['SubIndustryIranCode'])
 
         # Define the data types for the new table
-        dtyp = {
-            "SubIndustryIranCode": "INTEGER PRIMARY KEY",
-            "SubIndustryName": "TEXT",
-            "IndustryIranCode": "INTEGER",
-        }
+        dtyp = TableSchemaRegistry.sql_types("BasicIranSubIndustriesInformationTbl")
 
         iran_sub_industries_df = iran_sub_industries_df.dropna()
         # Insert data into BasicIndustriesInformationTbl
-        iran_sub_industries_df.to_sql("BasicIranSubIndustriesInformationTbl", conn, index=False, if_exists='replace',
-                             dtype=dtyp)
+        self.bulk_write_table(iran_sub_industries_df, "BasicIranSubIndustriesInformationTbl", conn, dtype=dtyp)
 
         # Close connections
         conn.close()
@@ -514,18 +465,14 @@ class BasicIranMarketsInformationTblCreator(DataHelper):
         iran_market_df["IranMarketID"] = range(1, len(iran_market_df) + 1)
 
         # Define the data types for the new table
-        dtyp = {
-            "IranMarketID": "INTEGER PRIMARY KEY",
-            "IranMarketName": "TEXT",
-        }
+        dtyp = TableSchemaRegistry.sql_types("BasicIranMarketsInformationTbl")
 
         new_column_order = ["IranMarketID", "IranMarketName"]
         iran_market_df = iran_market_df[new_column_order]
 
         iran_market_df = iran_market_df.dropna()
         # Insert data into BasicIndustriesInformationTbl
-        iran_market_df.to_sql("BasicIranMarketsInformationTbl", conn, index=False, if_exists='replace',
-                                      dtype=dtyp)
+        self.bulk_write_table(iran_market_df, "BasicIranMarketsInformationTbl", conn, dtype=dtyp)
 
         # Close connections
         conn.close()
@@ -604,18 +551,9 @@ class BasicIranSymbolsInformationTbl(DataHelper):
         df_symbol = df_symbol.drop_duplicates(subset=["IranCompanyCode12"], keep="first")
 
 
-        dtyp = {
-            "IranCompanyCode12": "TEXT PRIMARY KEY",
-            "Symbol": "TEXT",
-            "ShortName": "TEXT",
-            "IranSymbol": "TEXT",
-            "CompanyPersianName": "TEXT",
-            "IranMarketID": "INTEGER",
-            "IndustryIranCode": "INTEGER",
-            "SubIndustryIranCode": "INTEGER"
-        }
+        dtyp = TableSchemaRegistry.sql_types("BasicIranSymbolsInformationTbl")
 
-        df_symbol.to_sql("BasicIranSymbolsInformationTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df_symbol, "BasicIranSymbolsInformationTbl", conn, dtype=dtyp)
 
         conn.close()
 
@@ -637,36 +575,15 @@ class PreprocessedIranMarketPricesTblCreator(DataHelper):
         preprocess = BasicIranPricePreprocessor()
         df = preprocess.calculate_normalize_columns()
 
+        encoder = SurrogateKeyEncoder()
+        df.insert(1, 'PriceKeyID', encoder.build_price_key(df).values)
 
-        dtyp = {
-            'PriceKey': 'TEXT PRIMARY KEY',
-            'GDate': 'TEXT',
-            'JDate': 'TEXT',
-            'TimeFrame': 'TEXT',
-            'IranSymbol': 'TEXT',
-            'Symbol': 'TEXT',
-            'IranCompanyCode12': 'TEXT',
-            'Open': 'INTEGER',
-            'High': 'INTEGER',
-            'Low': 'INTEGER',
-            'Close': 'INTEGER',
-            'AdjOpen': 'INTEGER',
-            'AdjHigh': 'INTEGER',
-            'AdjLow': 'INTEGER',
-            'AdjClose': 'INTEGER',
-            'Volume': 'INTEGER',
-            'AdjVolume': 'INTEGER',
-            'TransactionValue': 'INTEGER',
-            'NormalizedAdjOpen': 'INTEGER',
-            'NormalizedAdjHigh': 'INTEGER',
-            'NormalizedAdjLow': 'INTEGER',
-            'NormalizedAdjClose': 'INTEGER',
-            'NormalizedAdjVolume': 'INTEGER',
-            'NormalizedTransactionValue': 'INTEGER'
-        }
+        dtyp = TableSchemaRegistry.sql_types("PreprocessedIranMarketPricesTbl")
 
-        df.to_sql("PreprocessedIranMarketPricesTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(df, "PreprocessedIranMarketPricesTbl", conn, dtype=dtyp)
+        encoder.create_key_index(conn, "PreprocessedIranMarketPricesTbl", "PriceKeyID")
         conn.close()
+        self.publish_parquet_mirror(df, "PreprocessedIranMarketPricesTbl")
 # ======================================================================================================================
 # ######################################################################################################################
 # Create RawIranIndividualCorporateTransactionsTbl table and insert data to it -> Inheritance from class DataHelper
@@ -694,25 +611,7 @@ class RawIranIndividualCorporateTransactionsTblCreator(DataHelper):
         raw_iran_individual_corporate_df["PriceKey"] = raw_iran_individual_corporate_df["Symbol"] + "_" + raw_iran_individual_corporate_df["Date"] + "_" + \
                                                           raw_iran_individual_corporate_df["TimeFrame"]
 
-        dtyp = {
-            'PriceKey': 'TEXT  PRIMARY KEY',
-            'Date': 'TEXT',
-            'TimeFrame': 'TEXT',
-            'IranSymbol': 'TEXT',
-            'individual_buy_count': 'INTEGER',
-            'individual_sell_count': 'INTEGER',
-            'corporate_buy_count': 'INTEGER',
-            'corporate_sell_count': 'INTEGER',
-            'individual_buy_vol': 'INTEGER',
-            'individual_sell_vol': 'INTEGER',
-            'corporate_buy_vol': 'INTEGER',
-            'corporate_sell_vol': 'INTEGER',
-            'individual_buy_value': 'INTEGER',
-            'individual_sell_value': 'INTEGER',
-            'corporate_buy_value': 'INTEGER',
-            'corporate_sell_value': 'INTEGER',
-            'Symbol': 'TEXT',
-        }
+        dtyp = TableSchemaRegistry.sql_types("RawIranIndividualCorporateTransactionsTbl")
 
         column_order = ["PriceKey", "Date", "TimeFrame", "IranSymbol", "Symbol","individual_buy_count",
                         "individual_sell_count", "corporate_buy_count", "corporate_sell_count", "individual_buy_vol",
@@ -725,61 +624,83 @@ class RawIranIndividualCorporateTransactionsTblCreator(DataHelper):
         raw_iran_individual_corporate_df = raw_iran_individual_corporate_df.drop_duplicates(
             subset=["PriceKey"])
 
-        raw_iran_individual_corporate_df.to_sql("RawIranIndividualCorporateTransactionsTbl", conn, index=False, if_exists='replace', dtype=dtyp)
+        self.bulk_write_table(raw_iran_individual_corporate_df, "RawIranIndividualCorporateTransactionsTbl", conn,
+                              dtype=dtyp)
 
         conn_market_maker.close()
         conn.close()
 
 class RawIranStockShareHoldersTblCreator(DataHelper):
-    # Todo: This class works correctly, but it is very time-consuming and cannot be used
-    def __init__(self, db_name):
+    """
+    Append the shareholder history of the market-maker symbols to RawIranStockShareHoldersTbl.
+
+    Each run reads the last stored date of every symbol and fetches only the days after it, concurrently under a
+    shared rate limit (see IranFinanceSource.fetch_iran_stock_share_holders_data). Every symbol is written as soon as
+    it completes, keyed by symbol, date, time frame and shareholder, so an interrupted run keeps what it fetched and
+    the next run continues from there.
+    """
+
+    SHAREHOLDERS_START_DATE = "2023-09-25"
+
+    def __init__(self, db_name, max_workers=4, requests_per_second=2.0):
         super().__init__()
         self.db_name = db_name
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+
+    @staticmethod
+    def load_last_dates(conn):
+        """
+        The last stored Date of every IranSymbol, or an empty dict when the table does not exist yet.
+        """
+        try:
+            rows = conn.execute('SELECT "IranSymbol", MAX("Date") FROM "RawIranStockShareHoldersTbl" '
+                                'GROUP BY "IranSymbol"').fetchall()
+        except sqlite3.OperationalError:
+            return {}
+        return {symbol: last_date for symbol, last_date in rows if last_date is not None}
 
     def create_RawIranStockShareHoldersTbl(self):
 
         conn = sqlite3.connect(self.db_name)
-        conn_market_maker = sqlite3.connect("../main_create_database/IranMarketMaker.db")
+        conn_market_maker = sqlite3.connect(f"{self.project_path}/Warehouse/IranMarketMaker.db")
         symbol_df = self.load_table_as_dataframe("BasicIranSymbolsInformationTbl", conn, "IranCompanyCode12")
         symbol_list_df = self.load_table_as_dataframe("MarketMakerBasicFundsInformationTbl", conn_market_maker, "IranCompanyCode12")
-        symbol_list = list(symbol_list_df["SymbolFundYekan"])
-        # symbol_list = list(symbol_df["IranSymbol"])
-
-        data_gather = IranFinanceSource(symbol_list,"1d","2023-09-25","2023-09-29")
-        raw_iran_stock_share_holders_df = data_gather.fetch_iran_stock_share_holders_data()
-
-        raw_iran_stock_share_holders_df = self.mapping_columns(raw_iran_stock_share_holders_df, symbol_df, "IranSymbol", "Symbol", drop_pivot_column=False)
-        raw_iran_stock_share_holders_df["PriceKey"] = raw_iran_stock_share_holders_df["Symbol"] + "_" + raw_iran_stock_share_holders_df["Date"] + "_" + \
-                                                                       raw_iran_stock_share_holders_df["TimeFrame"]
-
-        dtyp = {
-            'PriceKey': 'TEXT  PRIMARY KEY',
-            'Date': 'TEXT',
-            'TimeFrame': 'TEXT',
-            'IranSymbol': 'TEXT',
-            'shareholder_id': 'TEXT',
-            'shareholder_shares': 'INTEGER',
-            'shareholder_percentage': 'INTEGER',
-            'IranCompanyCode12': 'TEXT',
-            'shareholder_name': 'INTEGER',
-            "change": 'INTEGER',
+        symbol_list = list(symbol_list_df["SymbolFundYekan"].dropna())
+        conn_market_maker.close()
 
-        }
+        dtyp = TableSchemaRegistry.sql_types("RawIranStockShareHoldersTbl")
 
         column_order = ["PriceKey", "Date", "TimeFrame", "IranSymbol", "Symbol", "shareholder_id",
                         "shareholder_shares",
                         "shareholder_percentage", "IranCompanyCode12", "shareholder_name", "change"
                         ]
-
-        raw_iran_stock_share_holders_df = raw_iran_stock_share_holders_df[column_order]
-
-        raw_iran_stock_share_holders_df = raw_iran_stock_share_holders_df.drop_duplicates(
-            subset=["RawStockShareHoldersKey"])
-
-        raw_iran_stock_share_holders_df.to_sql("RawIranStockShareHoldersTbl", conn, index=False, if_exists='replace', dtype=dtyp)
-
-        conn_market_maker.close()
-        conn.close()
+        written_rows = {"rows": 0}
+
+        def write_symbol(symbol, raw_iran_stock_share_holders_df):
+            if raw_iran_stock_share_holders_df.empty:
+                return
+            raw_iran_stock_share_holders_df = self.mapping_columns(raw_iran_stock_share_holders_df, symbol_df, "IranSymbol", "Symbol", drop_pivot_column=False)
+            raw_iran_stock_share_holders_df["PriceKey"] = raw_iran_stock_share_holders_df["Symbol"] + "_" + raw_iran_stock_share_holders_df["Date"] + "_" + \
+                                                          raw_iran_stock_share_holders_df["TimeFrame"] + "_" + \
+                                                          raw_iran_stock_share_holders_df["shareholder_id"].astype(str)
+
+            raw_iran_stock_share_holders_df = raw_iran_stock_share_holders_df[column_order]
+            raw_iran_stock_share_holders_df = raw_iran_stock_share_holders_df.dropna(subset=["PriceKey"]) \
+                .drop_duplicates(subset=["PriceKey"])
+
+            written_rows["rows"] += self.bulk_write_table(raw_iran_stock_share_holders_df, "RawIranStockShareHoldersTbl",
+                                                          conn, dtype=dtyp, mode="insert_or_ignore",
+                                                          key_columns=["PriceKey"])
+
+        try:
+            data_gather = IranFinanceSource(symbol_list, "1d", self.SHAREHOLDERS_START_DATE)
+            data_gather.fetch_iran_stock_share_holders_data(self.load_last_dates(conn), write_symbol,
+                                                            max_workers=self.max_workers,
+                                                            requests_per_second=self.requests_per_second)
+        finally:
+            conn.close()
+        print(f"{written_rows['rows']} shareholder rows written to RawIranStockShareHoldersTbl.")
 
 
 class IranStockFloatingSharesTblCreator(DataHelper):
@@ -801,14 +722,7 @@ class IranStockFloatingSharesTblCreator(DataHelper):
         iran_stock_floating_shares_df["PriceKey"] = iran_stock_floating_shares_df["Symbol"] + "_" + iran_stock_floating_shares_df["Date"] + "_" + \
                                                              iran_stock_floating_shares_df["TimeFrame"]
 
-        dtyp = {
-            'PriceKey': 'TEXT  PRIMARY KEY',
-            'Date': 'TEXT',
-            'TimeFrame': 'TEXT',
-            'IranSymbol': 'TEXT',
-            "Symbol":"TEXT",
-            "FloatingShares": 'INTEGER',
-        }
+        dtyp = TableSchemaRegistry.sql_types("IranStockFloatingSharesTbl")
 
         column_order = ["PriceKey", "Date", "TimeFrame", "IranSymbol", "Symbol", "FloatingShares",
                         ]
@@ -820,7 +734,8 @@ class IranStockFloatingSharesTblCreator(DataHelper):
         iran_stock_floating_shares_df = iran_stock_floating_shares_df.dropna(
             subset=["PriceKey"])
 
-        iran_stock_floating_shares_df.to_sql("IranStockFloatingSharesTbl", conn, index=False, if_exists='append', dtype=dtyp)
+        self.bulk_write_table(iran_stock_floating_shares_df, "IranStockFloatingSharesTbl", conn,
+                              dtype=dtyp, mode="append")
 
         conn_market_maker.close()
         conn.close()
@@ -845,13 +760,16 @@ class IranStockKeyStatesTblCreator(DataHelper):
 
         key_states_df = key_states_df.dropna(subset=['KeyStatesID'])
 
-        key_states_df.to_sql("IranStockKeyStatesTbl", conn, index=False, if_exists='replace')
+        self.bulk_write_table(key_states_df, "IranStockKeyStatesTbl", conn)
 
         conn_market_maker.close()
         conn.close()
 
 
 class RawIranStockIntraMarketWatchTblCreator(DataHelper):
+    MARKET_WATCH_SNAPSHOT_COLUMNS = ["JDownloadDateTime", "GDownloadDateTime", "GDate", "Time", "IntraMarketWatchKey"]
+    MARKET_WATCH_KEYFRAME_EVERY = 60
+
     def __init__(self, db_name):
         super().__init__()
         self.db_name = db_name
@@ -890,25 +808,91 @@ class RawIranStockIntraMarketWatchTblCreator(DataHelper):
         raw_intra_market_watch_df = raw_intra_market_watch_df.dropna(
             subset=["IntraMarketWatchKey"])
 
+        # Only the symbols whose values changed since the stored state are kept, plus periodic full keyframes
+        raw_intra_market_watch_df = self.encode_market_watch_delta(conn, raw_intra_market_watch_df)
+
         raw_intra_order_book_df = raw_intra_order_book_df.drop_duplicates(
             subset=["IntraBookOrderKey"])
         raw_intra_order_book_df = raw_intra_order_book_df.dropna(
             subset=["IntraBookOrderKey"])
 
-        raw_intra_market_watch_df.to_sql("RawIranStockIntraMarketWatchTbl", conn, index=False, if_exists='append')
-        raw_intra_order_book_df.to_sql("RawIranStockIntraOrderBookTbl", conn, index=False, if_exists='append')
+        # Snapshots that are already stored are skipped by the unique keys, so repeated runs do not pile up duplicates
+        self.bulk_write_table(raw_intra_market_watch_df, "RawIranStockIntraMarketWatchTbl", conn,
+                              mode="insert_or_ignore", key_columns=["IntraMarketWatchKey"])
+        self.bulk_write_table(raw_intra_order_book_df, "RawIranStockIntraOrderBookTbl", conn,
+                              mode="insert_or_ignore", key_columns=["IntraBookOrderKey"])
+
+        # Per-symbol reads in time order, e.g. IntradayReplayEngine
+        for table_name in ("RawIranStockIntraMarketWatchTbl", "RawIranStockIntraOrderBookTbl"):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_IranSymbol_GDate_Time" '
+                         f'ON "{table_name}" ("IranSymbol", "GDate", "Time")')
+        conn.commit()
 
         conn_market_maker.close()
         conn.close()
 
+        # Level changes in integer columns, for loading full-day books of many symbols into memory
+        OrderBookLevelStore(self.db_name).append_snapshots(raw_intra_order_book_df)
+
+    def encode_market_watch_delta(self, conn, raw_intra_market_watch_df):
+        """
+        Delta-encode a market watch snapshot against the state stored in RawIranStockIntraMarketWatchTbl.
+
+        The encoder is primed with the snapshot reconstructed at the latest stored JDownloadDateTime, so the first
+        run, or a table written before delta storage, starts with a keyframe.
+        """
+        table_name = "RawIranStockIntraMarketWatchTbl"
+        encoder = SnapshotDeltaEncoder("IranSymbol", ignore_columns=self.MARKET_WATCH_SNAPSHOT_COLUMNS,
+                                       keyframe_every=self.MARKET_WATCH_KEYFRAME_EVERY)
+
+        last_download = self.read_table_watermark(conn, table_name, "JDownloadDateTime")
+        if last_download is not None:
+            last_snapshot = SnapshotDeltaEncoder.load_snapshot(conn, table_name, last_download, "JDownloadDateTime",
+                                                               "IranSymbol")
+            if not last_snapshot.empty:
+                encoder.prime(last_snapshot[raw_intra_market_watch_df.columns.intersection(last_snapshot.columns)],
+                              SnapshotDeltaEncoder.snapshots_since_last_keyframe(conn, table_name,
+                                                                                  "JDownloadDateTime"))
+
+        delta_df = encoder.encode(raw_intra_market_watch_df)
+        print(f"{len(delta_df)} of {len(raw_intra_market_watch_df)} market watch rows changed.")
+        return delta_df
+
+    @staticmethod
+    def load_market_watch_snapshot(conn, j_download_date_time):
+        """
+        Rebuild the full raw market watch snapshot at a JDownloadDateTime from the delta-encoded table.
+        """
+        return SnapshotDeltaEncoder.load_snapshot(conn, "RawIranStockIntraMarketWatchTbl", j_download_date_time,
+                                                  "JDownloadDateTime", "IranSymbol")
+
 class IranStockIntraMarketWatchTblCreator(DataHelper):
     def __init__(self, db_name):
         super().__init__()
         self.db_name = db_name
 
-    def create_IntraMarketWatchTbl(self):
+    def create_IntraMarketWatchTbl(self, incremental=True):
+        """
+        Build IranStockIntraMarketWatchTbl from the raw snapshots.
+
+        Only the raw table is delta-encoded: the full snapshot of every JDownloadDateTime is rebuilt from its keyframe
+        and delta rows first, so the processed table keeps one row per symbol and snapshot.
+
+        Args:
+            incremental (bool, optional): Process only the snapshots downloaded after the last JDownloadDateTime of
+                                          the table and append them. False rebuilds the table. Default is True.
+        """
         conn = sqlite3.connect(self.db_name)
-        intra_market_watch_df = self.load_table_as_dataframe("RawIranStockIntraMarketWatchTbl", conn, "IntraMarketWatchKey")
+        watermark = None
+        if incremental:
+            watermark = self.read_table_watermark(conn, "IranStockIntraMarketWatchTbl", "JDownloadDateTime")
+        intra_market_watch_df = self.load_table_rows_after("RawIranStockIntraMarketWatchTbl", conn,
+                                                           "JDownloadDateTime", watermark, apply_schema=False)
+        if intra_market_watch_df.empty:
+            print(f"No intraday market watch snapshots after {watermark}.")
+            conn.close()
+            return
+        intra_market_watch_df = self.expand_market_watch_snapshots(conn, intra_market_watch_df, watermark)
         symbol_df = self.load_table_as_dataframe("BasicIranSymbolsInformationTbl", conn, "IranCompanyCode12")
 
         intra_market_watch_df.rename(columns={'Time': 'IntraTseUpdateTime'})
@@ -959,44 +943,7 @@ class IranStockIntraMarketWatchTblCreator(DataHelper):
 
         intra_market_watch_df.rename(columns=rename_market_watch_dict, inplace=True)
 
-        dtyp = {
-            'IntraMarketWatchKey': 'TEXT  PRIMARY KEY',
-            'JDownloadDateTime':'TEXT',
-            'GDate': 'TEXT',
-            'JDate': 'TEXT',
-            'Time': 'TEXT',
-            'TseUpdateTime': 'TEXT',
-            'IranCompanyCode12': 'TEXT',
-            'Symbol': 'TEXT',
-            'IranSymbol': 'TEXT',
-            'CompanyPersianName': 'TEXT',
-            'TradeType': 'TEXT',
-            'IntraOpen': 'REAL' ,
-            'IntraHigh': 'REAL' ,
-            'IntraLow': 'REAL',
-            'IntraClose': 'REAL',
-            'IntraFinal': 'REAL',
-            'IntraClose(%)': 'REAL',
-            'IntraFinal(%)': 'REAL',
-            'IntraVolume': 'INTEGER',
-            'IntraTradeCount': 'INTEGER',
-            'DailyMaxAllowPrice': 'REAL',
-            'DailyMinAllowPrice': 'REAL',
-            'IntraIndividualBuyVolume': 'INTEGER',
-            'IntraCorporateBuyVolume': 'INTEGER',
-            'IntraIndividualSellVolume': 'INTEGER',
-            'IntraCorporateSellVolume': 'INTEGER',
-            'IntraIndividualBuyCount': 'INTEGER',
-            'IntraCorporateBuyCount': 'INTEGER',
-            'IntraIndividualSellCount': 'INTEGER',
-            'IntraCorporateSellCount': 'INTEGER',
-            'ShareNumber': 'INTEGER',
-            'BaseVolume': 'INTEGER',
-            'MarketCap': 'REAL',
-            'EPS': 'REAL',
-            'BQ-Value': 'REAL',
-            'SQ-Value': 'REAL',
-        }
+        dtyp = TableSchemaRegistry.sql_types("IranStockIntraMarketWatchTbl")
 
         column_order = ['IntraMarketWatchKey', 'JDownloadDateTime', 'GDate', 'JDate', 'Time', 'TseUpdateTime', 'IranCompanyCode12', 'Symbol',
                         'IranSymbol','CompanyPersianName', 'TradeType', 'IntraOpen', 'IntraHigh', 'IntraLow', 'IntraClose', 'IntraFinal',
@@ -1005,24 +952,66 @@ class IranStockIntraMarketWatchTblCreator(DataHelper):
                         'IntraIndividualBuyCount', 'IntraCorporateBuyCount', 'IntraIndividualSellCount', 'IntraCorporateSellCount',
                         'ShareNumber', 'BaseVolume', 'MarketCap', 'EPS', 'BQ-Value', 'SQ-Value'
                         ]
-
         intra_market_watch_df = intra_market_watch_df[column_order]
 
         self.round_time_column_to_strings(intra_market_watch_df, 'Time',5)
 
-        intra_market_watch_df.to_sql("IranStockIntraMarketWatchTbl", conn, index=False, if_exists='replace',
-                                             dtype=dtyp)
+        encoder = SurrogateKeyEncoder()
+        intra_market_watch_df.insert(1, 'IntraMarketWatchKeyID',
+                                     encoder.build_intra_market_watch_key(intra_market_watch_df).values)
+
+        write_mode = "replace" if watermark is None else "insert_or_ignore"
+        self.bulk_write_table(intra_market_watch_df, "IranStockIntraMarketWatchTbl", conn, dtype=dtyp, mode=write_mode)
+        encoder.create_key_index(conn, "IranStockIntraMarketWatchTbl", "IntraMarketWatchKeyID")
         conn.close()
 
 
+    @staticmethod
+    def expand_market_watch_snapshots(conn, raw_intra_market_watch_df, watermark=None):
+        """
+        Rebuild the full snapshot of every JDownloadDateTime from delta-encoded raw rows.
+
+        The snapshot at the watermark fills in the symbols that did not change in the first new snapshots, and the
+        rows carried to a later snapshot get its download time and a new IntraMarketWatchKey.
+        """
+        if SnapshotDeltaEncoder.KEYFRAME_COLUMN not in raw_intra_market_watch_df.columns:
+            return raw_intra_market_watch_df
+
+        initial_snapshot = None
+        if watermark is not None:
+            initial_snapshot = RawIranStockIntraMarketWatchTblCreator.load_market_watch_snapshot(conn, watermark)
+
+        dense_df = SnapshotDeltaEncoder.expand(raw_intra_market_watch_df, "JDownloadDateTime", "IranSymbol",
+                                               RawIranStockIntraMarketWatchTblCreator.MARKET_WATCH_SNAPSHOT_COLUMNS,
+                                               initial_snapshot)
+        dense_df["IntraMarketWatchKey"] = dense_df["Symbol"].astype(str) + "_" + dense_df["GDate"].astype(str) + \
+            "_" + dense_df["Time"].astype(str)
+        return dense_df
+
+
 class IranStockIntraOrderBookTblCreator(DataHelper):
     def __init__(self, db_name):
         super().__init__()
         self.db_name = db_name
 
-    def create_IntraOrderBookTbl(self):
+    def create_IntraOrderBookTbl(self, incremental=True):
+        """
+        Build the processed order book table from the raw snapshots.
+
+        Args:
+            incremental (bool, optional): Process only the snapshots downloaded after the last JDownloadDateTime of
+                                          the table and append them. False rebuilds the table. Default is True.
+        """
         conn = sqlite3.connect(self.db_name)
-        intra_order_book_df = self.load_table_as_dataframe("RawIranStockIntraOrderBookTbl", conn, "IntraBookOrderKey")
+        watermark = None
+        if incremental:
+            watermark = self.read_table_watermark(conn, "IranStockIntraOrderBookTblCreator", "JDownloadDateTime")
+        intra_order_book_df = self.load_table_rows_after("RawIranStockIntraOrderBookTbl", conn, "JDownloadDateTime",
+                                                         watermark)
+        if intra_order_book_df.empty:
+            print(f"No intraday order book snapshots after {watermark}.")
+            conn.close()
+            return
         symbol_df = self.load_table_as_dataframe("BasicIranSymbolsInformationTbl", conn, "IranCompanyCode12")
 
         self.mapping_columns(intra_order_book_df, symbol_df, "IranSymbol", "IranCompanyCode12", False)
@@ -1048,24 +1037,7 @@ class IranStockIntraOrderBookTblCreator(DataHelper):
         }
 
         intra_order_book_df.rename(columns=rename_market_watch_dict, inplace=True)
-        dtyp = {
-            'IntraBookOrderKey': 'TEXT  PRIMARY KEY',
-            'JDownloadDateTime':'TEXT',
-            'GDate': 'TEXT',
-            'JDate': 'TEXT',
-            'Time': 'TEXT',
-            'IntraMarketWatchKey': 'TEXT',
-            'Symbol': 'TEXT',
-            'IranSymbol': 'TEXT',
-            'CompanyPersianName': 'TEXT',
-            'OrderBookDepth': 'INTEGER',
-            'SellCount': 'INTEGER',
-            'SellVolume': 'INTEGER',
-            'SellPrice': 'REAL',
-            'BuyCount': 'INTEGER',
-            'BuyVolume': 'INTEGER',
-            'BuyPrice': 'REAL',
-        }
+        dtyp = TableSchemaRegistry.sql_types("IranStockIntraOrderBookTblCreator")
 
         column_order = [
                         'IntraBookOrderKey', 'JDownloadDateTime', 'GDate', 'JDate', 'Time', 'IntraMarketWatchKey', 'Symbol',
@@ -1076,19 +1048,30 @@ class IranStockIntraOrderBookTblCreator(DataHelper):
         intra_order_book_df = intra_order_book_df[column_order]
         self.round_time_column_to_strings(intra_order_book_df, 'Time', 5)
 
-        intra_order_book_df.to_sql("IranStockIntraOrderBookTblCreator", conn, index=False, if_exists='replace',
-                                             dtype=dtyp)
+        encoder = SurrogateKeyEncoder()
+        intra_order_book_df.insert(1, 'IntraBookOrderKeyID',
+                                   encoder.build_intra_book_order_key(intra_order_book_df).values)
+        intra_order_book_df.insert(intra_order_book_df.columns.get_loc('IntraMarketWatchKey') + 1,
+                                   'IntraMarketWatchKeyID',
+                                   encoder.build_intra_market_watch_key(intra_order_book_df).values)
+
+        write_mode = "replace" if watermark is None else "insert_or_ignore"
+        self.bulk_write_table(intra_order_book_df, "IranStockIntraOrderBookTblCreator", conn, dtype=dtyp,
+                              mode=write_mode)
+        encoder.create_key_index(conn, "IranStockIntraOrderBookTblCreator", "IntraBookOrderKeyID")
+        encoder.create_key_index(conn, "IranStockIntraOrderBookTblCreator", "IntraMarketWatchKeyID")
 
         conn.close()
 
 
 class IranStockIntraHistoricalOrderBookTblCreator(DataHelper):
+    HISTORICAL_ORDER_BOOK_BUCKET_SECONDS = 5
+
     def __init__(self, db_name):
         super().__init__()
         self.db_name = db_name
 
     def create_IntraHistoricalOrderBookTbl(self):
-        # Todo
         conn = sqlite3.connect(self.db_name)
         conn_market_maker = sqlite3.connect("../main_create_database/IranMarketMaker.db")
         # symbol_df = self.load_table_as_dataframe("BasicIranSymbolsInformationTbl", conn, "IranCompanyCode12")
@@ -1105,6 +1088,8 @@ class IranStockIntraHistoricalOrderBookTblCreator(DataHelper):
         intra_historical_order_book_df = self.mapping_columns(intra_historical_order_book_df, symbol_df, "IranSymbol", "Symbol",
                                                          drop_pivot_column=False)
 
+        intra_historical_order_book_df = self.bucket_historical_order_book(intra_historical_order_book_df)
+
         intra_historical_order_book_df["JDownloadDateTime"] = intra_historical_order_book_df["JDate"] + ' ' + \
                                                               intra_historical_order_book_df["Time"]
 
@@ -1115,10 +1100,6 @@ class IranStockIntraHistoricalOrderBookTblCreator(DataHelper):
         intra_historical_order_book_df["IntraBookOrderKey"] = intra_historical_order_book_df["Symbol"] + "_" + intra_historical_order_book_df["GDate"] + "_" + \
                                                        intra_historical_order_book_df["Time"] + "_" + intra_historical_order_book_df["Depth"].astype(str)
 
-        """
-        Todo This function was not completed because it should be rand for every 5 seconds and, for example,
-        the average seconds including those 5 seconds should be obtained -> groupBy and filter
-        """
         rename_historical_depth_dict = {
             'IranSymbol': 'IranSymbol',
             'Depth': 'OrderBookDepth',
@@ -1138,24 +1119,7 @@ class IranStockIntraHistoricalOrderBookTblCreator(DataHelper):
         }
 
         intra_historical_order_book_df.rename(columns=rename_historical_depth_dict, inplace=True)
-        dtyp = {
-            'IntraBookOrderKey': 'TEXT  PRIMARY KEY',
-            'JDownloadDateTime':'TEXT',
-            'GDate': 'TEXT',
-            'JDate': 'TEXT',
-            'Time': 'TEXT',
-            'IntraMarketWatchKey': 'TEXT',
-            'Symbol': 'TEXT',
-            'IranSymbol': 'TEXT',
-            'CompanyPersianName': 'TEXT',
-            'OrderBookDepth': 'INTEGER',
-            'SellCount': 'INTEGER',
-            'SellVolume': 'INTEGER',
-            'SellPrice': 'REAL',
-            'BuyCount': 'INTEGER',
-            'BuyVolume': 'INTEGER',
-            'BuyPrice': 'REAL',
-        }
+        dtyp = TableSchemaRegistry.sql_types("IranStockIntraHistoricalOrderBookTbl")
 
         column_order = [
                         'IntraBookOrderKey', 'JDownloadDateTime', 'GDate', 'JDate', 'Time', 'IntraMarketWatchKey', 'Symbol',
@@ -1168,12 +1132,34 @@ class IranStockIntraHistoricalOrderBookTblCreator(DataHelper):
         intra_historical_order_book_df = intra_historical_order_book_df.drop_duplicates(subset=["IntraBookOrderKey"],
                                                                                         keep='last')
 
-        intra_historical_order_book_df.to_sql("IranStockIntraOrderBookTblCreator", conn, index=False, if_exists='replace',
-                                              dtype=dtyp)
+        self.bulk_write_table(intra_historical_order_book_df, "IranStockIntraHistoricalOrderBookTbl", conn, dtype=dtyp)
 
         conn.close()
         conn_market_maker.close()
 
+    def bucket_historical_order_book(self, intra_historical_order_book_df):
+        """
+        Average the historical order book over fixed buckets per symbol, day and depth.
+
+        The history holds one row per change of a level, so each value is weighted by how long it stayed in the book
+        within the bucket. Time becomes the bucket start; counts and volumes are rounded back to integers.
+        """
+        value_columns = ['Sell_No', 'Sell_Vol', 'Sell_Price', 'Buy_Price', 'Buy_Vol', 'Buy_No']
+        aggregator = TimeBucketAggregator(self.HISTORICAL_ORDER_BOOK_BUCKET_SECONDS)
+
+        intra_historical_order_book_df = intra_historical_order_book_df.assign(
+            Seconds=TimeBucketAggregator.to_seconds(intra_historical_order_book_df["Time"]))
+        bucket_df = aggregator.aggregate(intra_historical_order_book_df,
+                                         ["IranSymbol", "Symbol", "GDate", "JDate", "Depth"], "Seconds",
+                                         value_columns, ["time_weighted"])
+
+        bucket_df = bucket_df.rename(columns={column + "TimeWeighted": column for column in value_columns})
+        for column in ['Sell_No', 'Sell_Vol', 'Buy_Vol', 'Buy_No']:
+            bucket_df[column] = bucket_df[column].round().astype("Int64")
+        bucket_df["Time"] = TimeBucketAggregator.to_times(bucket_df["BucketSeconds"])
+
+        return bucket_df.drop(columns=["BucketSeconds", "ObservationCount"])
+
 
 
 # ######################################################################################################################
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 class PortfolioManagementCalculator:
@@ -15,5 +16,42 @@ class PortfolioManagementCalculator:
 
         return dataframe
 
+    @staticmethod
+    def calculate_grouped_nav_returns(dataframe, nav_column='GeneralNAV', group_columns=None, sort_column='JDate',
+                                      base_nav=1000000, period_column='PeriodNAVReturn',
+                                      cumulative_column='CumNAVReturn'):
+        """
+        Calculate period and cumulative NAV returns for every entity of a frame in one grouped pass.
+
+        Rows are sorted once by sort_column and each row is compared with the previous row of its group. When a row
+        has no previous NAV (the first row of its group, or a missing previous value) the period return is measured
+        from base_nav, like a unit issued at the base price. The cumulative return is always measured from base_nav.
+
+        Args:
+            dataframe (pd.DataFrame): The frame holding the NAV column.
+            nav_column (str): The NAV per unit column.
+            group_columns (list, optional): The entity columns, e.g. ["TimeFrame", "HoldingName"]. The whole frame is
+                one series when not given.
+            sort_column (str): The column giving the order of the records inside each group.
+            base_nav (float): The NAV of a unit before its first record.
+            period_column (str): The name of the period return column.
+            cumulative_column (str, optional): The name of the cumulative return column; skipped when None.
+
+        Returns:
+            pd.DataFrame: The frame sorted by sort_column with the return columns added.
+        """
+        dataframe = dataframe.sort_values(by=[sort_column], kind='stable')
 
+        if group_columns:
+            previous_nav = dataframe.groupby(group_columns, sort=False, dropna=False, observed=True)[
+                nav_column].shift(1)
+        else:
+            previous_nav = dataframe[nav_column].shift(1)
 
+        reference_nav = previous_nav.where(previous_nav.notna(), base_nav)
+        dataframe[period_column] = (dataframe[nav_column] - reference_nav) / reference_nav
+
+        if cumulative_column is not None:
+            dataframe[cumulative_column] = (dataframe[nav_column] - base_nav) / base_nav
+
+        return dataframe
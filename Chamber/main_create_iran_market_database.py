@@ -29,6 +29,7 @@ from Bulkheed.iran_stock_database_opr import (
     RawIranStockIntraMarketWatchTblCreator, IranStockIntraMarketWatchTblCreator, IranStockIntraOrderBookTblCreator,
     IranStockIntraHistoricalOrderBookTblCreator
 )
+from RawMaterials.pipeline_runner_obj import PipelineStep, PipelineRunner
 
 # ======================================================================================================================
 # ######################################################################################################################
@@ -167,7 +168,6 @@ class IranMarketDatabaseManager:
         print(f"RawIranIndividualCorporateTransactionsTbl created and data inserted successfully in {self.db_name}.")
 
     def create_raw_iran_stock_share_holders_table(self):
-        # Todo: This class works correctly, but it is very time-consuming and cannot be used
         creator = RawIranStockShareHoldersTblCreator(self.db_name)
         creator.create_RawIranStockShareHoldersTbl()
         print(f"RawIranStockShareHoldersTbl created and data inserted successfully in {self.db_name}.")
@@ -199,22 +199,62 @@ class IranMarketDatabaseManager:
 
 
 
+    def build_pipeline_steps(self):
+        """
+        Declare the steps that build IranStockDataBase.db with the tables each one reads and writes.
 
+        The steps that download from the market are 'io' steps and always run; the steps that only transform tables
+        are 'cpu' steps and are skipped when their input tables did not change.
 
-iran_db = IranMarketDatabaseManager("IranStockDataBase.db")
-iran_db.create_first_iran_stock_symbol_list_table()
-iran_db.create_raw_iran_symbol_basic_information_table()
-iran_db.create_basic_iran_industries_information_table()
-iran_db.create_basic_iran_sub_industries_information_table()
-iran_db.create_basic_iran_markets_information_table()
-iran_db.create_basic_iran_symbols_information_table()
-iran_db.create_raw_iran_prices_table() #
-iran_db.create_preprocessed_iran_prices() #
+        Returns:
+            list: The PipelineStep objects of the Iran market database.
+        """
+        symbols_list_json = f"{self.project_path}/Mines/FirstIranSymbolList_Stock.json"
+        symbols_tbl = "BasicIranSymbolsInformationTbl"
+
+        steps = [
+            PipelineStep("FirstIranStockSymbolListTbl", self.create_first_iran_stock_symbol_list_table,
+                         inputs=[symbols_list_json], outputs=["FirstIranStockSymbolListTbl"]),
+            PipelineStep("RawIranSymbolsBasicInformationTbl", self.create_raw_iran_symbol_basic_information_table,
+                         inputs=["FirstIranStockSymbolListTbl"], outputs=["RawIranSymbolsBasicInformationTbl"],
+                         kind="io"),
+            PipelineStep("BasicIranIndustriesInformationTbl", self.create_basic_iran_industries_information_table,
+                         inputs=["RawIranSymbolsBasicInformationTbl"], outputs=["BasicIranIndustriesInformationTbl"]),
+            PipelineStep("BasicIranSubIndustriesInformationTbl",
+                         self.create_basic_iran_sub_industries_information_table,
+                         inputs=["RawIranSymbolsBasicInformationTbl"], outputs=["BasicIranSubIndustriesInformationTbl"]),
+            PipelineStep("BasicIranMarketsInformationTbl", self.create_basic_iran_markets_information_table,
+                         inputs=["RawIranSymbolsBasicInformationTbl"], outputs=["BasicIranMarketsInformationTbl"]),
+            PipelineStep("BasicIranSymbolsInformationTbl", self.create_basic_iran_symbols_information_table,
+                         inputs=["RawIranSymbolsBasicInformationTbl", "BasicIranMarketsInformationTbl"],
+                         outputs=[symbols_tbl]),
+            PipelineStep("RawIranPricesTbl", self.create_raw_iran_prices_table,
+                         inputs=[symbols_tbl], outputs=["RawIranPricesTbl"], always_run=True, kind="io"),
+            PipelineStep("PreprocessedIranMarketPricesTbl", self.create_preprocessed_iran_prices,
+                         inputs=["RawIranPricesTbl", symbols_tbl, "BasicDataBase.db::DateTbl"],
+                         outputs=["PreprocessedIranMarketPricesTbl"]),
+            PipelineStep("IranStockKeyStatesTbl", self.create_iran_stock_key_states_Creator,
+                         inputs=[symbols_tbl], outputs=["IranStockKeyStatesTbl"], always_run=True, kind="io"),
+            PipelineStep("IranStockFloatingSharesTbl", self.create_iran_floating_shares_table,
+                         inputs=[symbols_tbl], outputs=["IranStockFloatingSharesTbl"], always_run=True, kind="io"),
+            PipelineStep("RawIranStockShareHoldersTbl", self.create_raw_iran_stock_share_holders_table,
+                         inputs=[symbols_tbl, "IranMarketMaker.db::MarketMakerBasicFundsInformationTbl"],
+                         outputs=["RawIranStockShareHoldersTbl"], always_run=True, kind="io"),
+        ]
+        return steps
+
+
+if __name__ == "__main__":
+    iran_db = IranMarketDatabaseManager("IranStockDataBase.db")
+
+    # Network steps run in threads while the table transformations run in worker processes. After an interruption,
+    # run again with resume=True to continue from the completion markers.
+    runner = PipelineRunner(iran_db.db_name, iran_db.build_pipeline_steps(), max_workers=4, executor_type="mixed")
+    runner.run(resume=False)
 
 # iran_db.create_basic_iran_standard_symbols_information_table()
 # The following line is not implemented yet.
 # iran_db.create_raw_iran_individual_corporate_transactions_table()
-# iran_db.create_raw_iran_stock_share_holders_table() # *Todo: This class works correctly, but it is very time-consuming and cannot be used
 # iran_db.create_iran_stock_key_states_Creator()
 # iran_db.create_iran_floating_shares_table() #*
 # iran_db.create_raw_iran_market_watch_table()
@@ -4,6 +4,7 @@
 # import external libraries
 # ----------------------------------------------------------------------------------------------------------------------
 import sqlite3
+import os
 
 from Foundation.FilterFramesHelper import FilterFramesHelper
 # ======================================================================================================================
@@ -11,6 +12,7 @@ from Foundation.FilterFramesHelper import FilterFramesHelper
 # import internal libraries
 # ----------------------------------------------------------------------------------------------------------------------
 from RawMaterials.data_base_obj import DataHelper
+from RawMaterials.pipeline_runner_obj import PipelineStep, PipelineRunner
 
 from Bulkheed.create_df_from_tables import IranMarketMakerTableFrameBuilder
 
@@ -23,7 +25,8 @@ from Bulkheed.iran_market_maker_database_opr import (
     MarketMakerDailyYekanReportsTblCreator, MarketMakerAnnouncementsInformationTbl,
     FundsProcessedVfmCreator, PreprocessDailyYekanReportTblCreator, WorldDictTblCreator,
     MarketMakerHoldingsYekanTblCreator, FundsInvestorsTblCreator, FundsInvestorsProcessedVfmCreator,
-    InvestorsProcessedVfmCreator, HoldingsProcessorVfmCreator, GeneralProcessorVfmCreator
+    InvestorsProcessedVfmCreator, HoldingsProcessorVfmCreator, GeneralProcessorVfmCreator,
+    InvestorPositionLedgerTblCreator, RollupProcessedVfmCreator
 )
 
 
@@ -112,7 +115,7 @@ class MarketMakerDBManager:
 
         selected_columns = ['AdjBreakEvenPoint']
 
-        FundsProcessedTfm[selected_columns] = FundsProcessedTfm.groupby('ShortName')[selected_columns].transform(
+        FundsProcessedTfm[selected_columns] = FundsProcessedTfm.groupby('ShortName', observed=True)[selected_columns].transform(
             lambda group: group.ffill().bfill())
 
         if 'NAVReturn' in FundsProcessedTfm.columns:
@@ -122,14 +125,12 @@ class MarketMakerDBManager:
         WholeJDateDailyYekanReportHelperTfm = filter_helper.build_filter_by_column_value_df(FundsProcessedTfm, 'TimeFrame', 'JDate')
 
         conn = sqlite3.connect(self.market_maker_db)
-        FundsProcessedTfm.to_sql("BackUpFundsProcessedVfm", conn, index=False, if_exists='replace')
-        WholeJDateDailyYekanReportHelperTfm.to_sql("BackUpWholeJDateDailyYekanReportHelperTfm", conn, index=False,
-                                                  if_exists='replace')
+        helper.bulk_write_table(FundsProcessedTfm, "BackUpFundsProcessedVfm", conn)
+        helper.bulk_write_table(WholeJDateDailyYekanReportHelperTfm, "BackUpWholeJDateDailyYekanReportHelperTfm", conn)
 
         WholeJWeekYekanReportHelperTfm = filter_helper.build_filter_by_column_value_df(FundsProcessedTfm, 'TimeFrame', 'JWeekNumber')
 
-        WholeJWeekYekanReportHelperTfm.to_sql("BackUpWholeJWeekYekanReportHelperTfm", conn, index=False,
-                                                  if_exists='replace')
+        helper.bulk_write_table(WholeJWeekYekanReportHelperTfm, "BackUpWholeJWeekYekanReportHelperTfm", conn)
 
         conn.close()
 
@@ -164,6 +165,12 @@ class MarketMakerDBManager:
         creator.create_funds_investors_processed_view_frame()
         print(f"FundsInvestorsProcessedVfm created and data inserted successfully in {self.market_maker_db}.")
 
+    @DataHelper.calculate_execution_time
+    def create_InvestorPositionLedgerTbl(self):
+        creator = InvestorPositionLedgerTblCreator(self.market_maker_db)
+        creator.create_investor_position_ledger_tbl()
+        print(f"InvestorPositionLedgerTbl created and data inserted successfully in {self.market_maker_db}.")
+
     @DataHelper.calculate_execution_time
     def create_InvestorsProcessedVfm(self):
         creator = InvestorsProcessedVfmCreator(self.market_maker_db)
@@ -182,41 +189,98 @@ class MarketMakerDBManager:
         creator.create_general_processed_view_frame()
         print(f"GeneralProcessedVfm created and data inserted successfully in {self.market_maker_db}.")
 
-
-
-# Todo AnnouncementsInformation
-import concurrent.futures
-
-def manage_threads_start(which_op):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        executor.submit(which_op)
+    @DataHelper.calculate_execution_time
+    def create_RollupProcessedVfms(self):
+        creator = RollupProcessedVfmCreator(self.market_maker_db)
+        creator.create_rollup_processed_view_frames()
+        print(f"InvestorsProcessedVfm, HoldingsProcessedVfm and GeneralProcessedVfm created and data inserted "
+              f"successfully in {self.market_maker_db}.")
+
+
+    def build_pipeline_steps(self, start_report, end_report, j_date):
+        """
+        Declare the steps that build IranMarketMaker.db with the tables each one reads and writes.
+
+        Tables without a database prefix belong to IranMarketMaker.db; paths are the source files in Mines.
+        """
+        project_path = os.path.dirname(os.path.dirname(self.market_maker_db))
+        basic_funds_excel = f"{project_path}/Mines/BasicMarketMakerFundsInformation.xlsx"
+        daily_reports_path = f"{project_path}/Mines/YekanFiles/DailyReports"
+        issuance_cancellation_path = f"{project_path}/Mines/YekanFiles/IssuanceCancellation"
+        date_tbl = "BasicDataBase.db::DateTbl"
+        symbols_tbl = "IranStockDataBase.db::BasicIranSymbolsInformationTbl"
+        prices_tbl = "IranStockDataBase.db::PreprocessedIranMarketPricesTbl"
+        symbols_inputs = ["MarketMakerBasicFundsInformationTbl", symbols_tbl]
+        lookup_inputs = ["MarketMakerBasicFundsInformationTbl", "MarketMakerInvestorsYekanTbl",
+                         "MarketMakerFundsFiscalYearYekanTbl", "PreprocessDailyYekanReportTbl", symbols_tbl, date_tbl]
+
+        steps = [
+            PipelineStep("MarketMakerAssetsRayanYekanTbl", self.create_market_maker_assets_yekan_table,
+                         inputs=[basic_funds_excel], outputs=["MarketMakerAssetsRayanYekanTbl"]),
+            PipelineStep("MarketMakerBasicFundsInformationTbl", self.create_market_maker_basic_funds_information_table,
+                         inputs=[basic_funds_excel], outputs=["MarketMakerBasicFundsInformationTbl"]),
+            PipelineStep("MarketMakerFundsFiscalYearYekanTbl", self.create_market_maker_funds_fiscal_year_yekan_table,
+                         inputs=[basic_funds_excel], outputs=["MarketMakerFundsFiscalYearYekanTbl"]),
+            PipelineStep("MarketMakerAnnouncementsInformationTbl",
+                         self.create_market_maker_announcements_information_table,
+                         inputs=[basic_funds_excel, "MarketMakerBasicFundsInformationTbl"],
+                         outputs=["MarketMakerAnnouncementsInformationTbl"]),
+            PipelineStep("MarketMakerInvestorsYekanTbl", self.create_market_maker_investors_yekan_table,
+                         inputs=[basic_funds_excel], outputs=["MarketMakerInvestorsYekanTbl"]),
+            PipelineStep("MarketMakerHoldingsTbl", self.create_market_maker_holdings_table,
+                         inputs=[basic_funds_excel], outputs=["MarketMakerHoldingsTbl"]),
+            PipelineStep("MarketMakerInvestorsFundsTbl", self.create_market_maker_investors_funds_table,
+                         inputs=["MarketMakerInvestorsYekanTbl", "MarketMakerBasicFundsInformationTbl"],
+                         outputs=["MarketMakerInvestorsFundsTbl"]),
+            PipelineStep("WordDictTbl", self.create_WordDictTbl,
+                         inputs=[f"{project_path}/Mines/WordDictTbl.xlsx"], outputs=["WordDictTbl"]),
+
+            PipelineStep("MarketMakerDailyYekanReportsTbl", self.create_market_maker_daily_reports_table,
+                         args=(start_report, end_report),
+                         inputs=[daily_reports_path, date_tbl, symbols_tbl, "MarketMakerBasicFundsInformationTbl",
+                                 "MarketMakerAnnouncementsInformationTbl"],
+                         outputs=["MarketMakerDailyYekanReportsHelperTbl", "MarketMakerDailyYekanReportsTbl"]),
+            PipelineStep("PreprocessDailyYekanReportTbl", self.create_PreprocessDailyYekanReportTbl,
+                         inputs=["MarketMakerDailyYekanReportsTbl", "MarketMakerAnnouncementsInformationTbl",
+                                 "MarketMakerHoldingsTbl", prices_tbl, date_tbl] + symbols_inputs,
+                         outputs=["PreprocessDailyYekanReportTbl"]),
+            PipelineStep("WholeJDateDailyYekanReportHelperTfm", self.create_WholeJDateDailyYekanReportHelperVfm,
+                         args=(j_date,),
+                         inputs=["PreprocessDailyYekanReportTbl", "BackUpFundsProcessedVfm",
+                                 "BackUpWholeJDateDailyYekanReportHelperTfm", date_tbl] + symbols_inputs,
+                         outputs=["WholeJDateDailyYekanReportHelperTfm", "week_view_frame"]),
+            PipelineStep("FundsProcessedVfm", self.create_FundsProcessedVfm, args=(j_date,),
+                         inputs=["PreprocessDailyYekanReportTbl", "BackUpWholeJDateDailyYekanReportHelperTfm",
+                                 date_tbl] + symbols_inputs,
+                         outputs=["FundsProcessedVfm"]),
+
+            PipelineStep("RawMarketMakerIssuanceCancellationTbl", self.create_RawMarketMakerIssuanceCancellationTbl,
+                         inputs=[issuance_cancellation_path, date_tbl],
+                         outputs=["RawMarketMakerIssuanceCancellationTbl"]),
+            PipelineStep("InvestorPositionLedgerTbl", self.create_InvestorPositionLedgerTbl,
+                         inputs=["RawMarketMakerIssuanceCancellationTbl"] + lookup_inputs,
+                         outputs=["InvestorPositionLedgerTbl"]),
+            PipelineStep("FundsInvestorsProcessedHelperVfm", self.create_FundsInvestorsProcessedHelperTbl,
+                         inputs=["FundsProcessedVfm", "InvestorPositionLedgerTbl"],
+                         outputs=["FundsInvestorsProcessedHelperVfm"]),
+            PipelineStep("FundsInvestorsProcessedVfm", self.create_FundsInvestorsProcessedVfm,
+                         inputs=["FundsInvestorsProcessedHelperVfm", "FundsProcessedVfm"],
+                         outputs=["FundsInvestorsProcessedVfm"]),
+            PipelineStep("RollupProcessedVfms", self.create_RollupProcessedVfms,
+                         inputs=["FundsInvestorsProcessedVfm"],
+                         outputs=["InvestorsProcessedVfm", "HoldingsProcessedVfm", "GeneralProcessedVfm"]),
+        ]
+        return steps
 
 
 # Usage
-project_path = "/home/shakour/shakour/Programming/Codes/GitStudy/MarketMakerReporter"
-db_manager = MarketMakerDBManager(f"{project_path}/Warehouse/IranMarketMaker.db")
-
-db_manager.create_market_maker_assets_yekan_table()
-db_manager.create_market_maker_basic_funds_information_table()
-db_manager.create_market_maker_funds_fiscal_year_yekan_table()
-db_manager.create_market_maker_announcements_information_table()
-db_manager.create_market_maker_investors_yekan_table()
-db_manager.create_market_maker_holdings_table()
-db_manager.create_market_maker_investors_funds_table()
-
-db_manager.create_WordDictTbl()
-
-db_manager.create_market_maker_daily_reports_table('1397-05-08', '1403-02-21')
-db_manager.create_PreprocessDailyYekanReportTbl()
-db_manager.create_WholeJDateDailyYekanReportHelperVfm("1403-02-21")
-db_manager.create_FundsProcessedVfm("1403-02-21")
-
-db_manager.create_RawMarketMakerIssuanceCancellationTbl()
-db_manager.create_FundsInvestorsProcessedHelperTbl()
-db_manager.create_FundsInvestorsProcessedVfm()
-db_manager.create_InvestorsProcessedVfm()
-db_manager.create_HoldingsProcessedVfm()
-db_manager.create_GeneralProcessorVfm()
+if __name__ == "__main__":
+    project_path = "/home/shakour/shakour/Programming/Codes/GitStudy/MarketMakerReporter"
+    db_manager = MarketMakerDBManager(f"{project_path}/Warehouse/IranMarketMaker.db")
+
+    pipeline_steps = db_manager.build_pipeline_steps('1397-05-08', '1403-02-21', "1403-02-21")
+    runner = PipelineRunner(db_manager.market_maker_db, pipeline_steps, max_workers=4, executor_type="thread")
+    runner.run()
 
 
 # for tableau
@@ -87,7 +87,7 @@ class FilterFramesHelper(IranMarketMakerTableFrameBuilder, BasicDataBaseTableFra
         dataframe[f'{gregorian_date_column}_'] = pd.to_datetime(
             dataframe[gregorian_date_column])
 
-        last_dataframe = dataframe.groupby(group_by_column).apply(
+        last_dataframe = dataframe.groupby(group_by_column, observed=True).apply(
             lambda x: x.loc[x[f'{gregorian_date_column}_'].idxmax()])
 
         last_dataframe = last_dataframe.drop(columns=[f'{gregorian_date_column}_'])
@@ -0,0 +1,286 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+
+import pandas as pd
+import numpy as np
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+
+from RawMaterials.data_base_obj import DataHelper
+from Foundation.market_maker_tables_preprocessor import MarketMakerIssuanceCancellationPreprocessor
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class InvestorPositionLedger(MarketMakerIssuanceCancellationPreprocessor):
+    """
+    Sparse issuance/cancellation ledger of every investor position in the market maker funds.
+
+    Only the days on which a position changes are stored, each with the running totals of the position up to that day.
+    A position is the pair (NationalCode_UniversalCode, MarketMakerFundID); InvestorID is carried as an attribute
+    because it falls back to 0 for investors missing from MarketMakerInvestorsYekanTbl.
+
+    The events are kept in NumPy arrays sorted by (position code, JDate), so an as-of lookup is a binary search over
+    position_code * DATE_FACTOR + YYYYMMDD. Dense investor x date frames are only produced on request for a date range.
+
+    Usage:
+        ledger = InvestorPositionLedger()
+        ledger.build_ledger()
+        position = ledger.position_as_of('0012345678', 12, '1402-09-27')
+        positions_df = ledger.build_dense_positions('1402-09-01', '1402-09-30', short_names=['Sina Tile'])
+    """
+
+    DATE_FACTOR = 10 ** 8
+
+    def __init__(self):
+        super().__init__()
+        self.ledger_df = None
+        self.positions_df = None
+        self.position_lookup = {}
+        self.event_keys = np.empty(0, dtype=np.int64)
+        self.event_codes = np.empty(0, dtype=np.int64)
+        self.event_dates = np.empty(0, dtype=np.int64)
+        self.event_values = np.empty((0, 0), dtype=np.float64)
+
+    @staticmethod
+    def position_key_columns():
+        position_key_columns = ["NationalCode_UniversalCode", "MarketMakerFundID"]
+        return position_key_columns
+
+    @staticmethod
+    def position_attribute_columns():
+        position_attribute_columns = ["InvestorID", "InvestorName", "ShortName", "IranCompanyCode12"]
+        return position_attribute_columns
+
+    @staticmethod
+    def event_value_columns():
+        event_value_columns = [
+            "IssuedUnitsNumber",
+            "CancellationUnitsNumber",
+            "IssuedAmount",
+            "CancellationAmount",
+        ]
+        return event_value_columns
+
+    @staticmethod
+    def running_total_columns():
+        running_total_columns = [
+            "CumSumIssuedUnitsNumber",
+            "CumSumCancellationUnitsNumber",
+            "CumSumIssuedAmount",
+            "CumSumCancellationAmount",
+            "CumSumUnitsNumber",
+        ]
+        return running_total_columns
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @DataHelper.calculate_execution_time
+    def build_ledger_events(self, invest_objects_df=None):
+        """
+        Build the change events of every position with their running totals.
+
+        Args:
+            invest_objects_df (pd.DataFrame, optional): Output of InvestObjects_add_required_columns. It is built from
+                RawMarketMakerIssuanceCancellationTbl when not given.
+
+        Returns:
+            pd.DataFrame: One row per position and JDate on which the position changed.
+        """
+        if invest_objects_df is None:
+            invest_objects_df = self.InvestObjects_add_required_columns()
+
+        key_columns = self.position_key_columns()
+        value_columns = self.event_value_columns()
+        attribute_columns = [column for column in self.position_attribute_columns()
+                             if column in invest_objects_df.columns]
+
+        events_df = invest_objects_df.dropna(subset=key_columns + ['JDate']).copy()
+        events_df['NationalCode_UniversalCode'] = events_df['NationalCode_UniversalCode'].astype(str)
+        events_df['MarketMakerFundID'] = events_df['MarketMakerFundID'].astype(np.int64)
+        events_df['JDateNumber'] = self.jalali_dates_to_integers(events_df['JDate'])
+
+        # Several transactions of the same position on one day are a single change event
+        ledger_df = events_df.groupby(key_columns + ['JDateNumber'], as_index=False, sort=True)[value_columns].sum()
+
+        running_totals = ledger_df.groupby(key_columns, sort=False)[value_columns].cumsum()
+        ledger_df["CumSumIssuedUnitsNumber"] = running_totals["IssuedUnitsNumber"]
+        ledger_df["CumSumCancellationUnitsNumber"] = running_totals["CancellationUnitsNumber"]
+        ledger_df["CumSumIssuedAmount"] = running_totals["IssuedAmount"]
+        ledger_df["CumSumCancellationAmount"] = running_totals["CancellationAmount"]
+        ledger_df["CumSumUnitsNumber"] = (ledger_df["CumSumIssuedUnitsNumber"] -
+                                          ledger_df["CumSumCancellationUnitsNumber"])
+
+        if attribute_columns:
+            attributes_df = events_df.groupby(key_columns, as_index=False, sort=False)[attribute_columns].last()
+            ledger_df = ledger_df.merge(attributes_df, on=key_columns, how='left', sort=False)
+
+        ledger_df.insert(len(key_columns), 'JDate', self.integers_to_jalali_dates(ledger_df['JDateNumber']).values)
+        ledger_df["PositionEventID"] = (ledger_df['NationalCode_UniversalCode'] + '-' +
+                                        ledger_df['MarketMakerFundID'].astype(str) + '-' + ledger_df['JDate'])
+        ledger_df = self.move_column_to_first(ledger_df, "PositionEventID")
+
+        return ledger_df
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def load_ledger(self, ledger_df):
+        """
+        Index a ledger frame into the sorted arrays used by the as-of queries.
+
+        Args:
+            ledger_df (pd.DataFrame): A frame from build_ledger_events or InvestorPositionLedgerTbl.
+
+        Returns:
+            InvestorPositionLedger: The ledger itself.
+        """
+        key_columns = self.position_key_columns()
+
+        ledger_df = ledger_df.copy()
+        ledger_df['NationalCode_UniversalCode'] = ledger_df['NationalCode_UniversalCode'].astype(str)
+        ledger_df['MarketMakerFundID'] = ledger_df['MarketMakerFundID'].astype(np.int64)
+        if 'JDateNumber' not in ledger_df.columns:
+            ledger_df['JDateNumber'] = self.jalali_dates_to_integers(ledger_df['JDate'])
+        ledger_df.sort_values(by=key_columns + ['JDateNumber'], inplace=True, kind='stable')
+        ledger_df.reset_index(drop=True, inplace=True)
+
+        position_codes = ledger_df.groupby(key_columns, sort=False).ngroup().to_numpy(dtype=np.int64)
+
+        attribute_columns = [column for column in self.position_attribute_columns() if column in ledger_df.columns]
+        positions_df = ledger_df.drop_duplicates(subset=key_columns, keep='last')[key_columns + attribute_columns]
+        positions_df = positions_df.reset_index(drop=True)
+        positions_df.insert(0, 'PositionCode', np.arange(len(positions_df), dtype=np.int64))
+
+        self.ledger_df = ledger_df
+        self.positions_df = positions_df
+        self.position_lookup = dict(zip(zip(positions_df['NationalCode_UniversalCode'],
+                                            positions_df['MarketMakerFundID']),
+                                        positions_df['PositionCode']))
+        self.event_codes = position_codes
+        self.event_dates = ledger_df['JDateNumber'].to_numpy(dtype=np.int64)
+        self.event_keys = self.event_codes * self.DATE_FACTOR + self.event_dates
+        self.event_values = ledger_df[self.running_total_columns()].to_numpy(dtype=np.float64)
+        return self
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def build_ledger(self, invest_objects_df=None):
+        ledger_df = self.build_ledger_events(invest_objects_df)
+        self.load_ledger(ledger_df)
+        return self.ledger_df
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def search_events(self, position_codes, date_numbers):
+        """
+        Find the last event at or before each (position, date) pair.
+
+        Args:
+            position_codes (np.ndarray): Position codes of the queries.
+            date_numbers (np.ndarray): YYYYMMDD dates of the queries.
+
+        Returns:
+            tuple: (event positions, boolean mask of the queries that have an event on or before their date).
+        """
+        position_codes = np.asarray(position_codes, dtype=np.int64)
+        date_numbers = np.asarray(date_numbers, dtype=np.int64)
+
+        query_keys = position_codes * self.DATE_FACTOR + date_numbers
+        event_positions = np.searchsorted(self.event_keys, query_keys, side='right') - 1
+
+        found = event_positions >= 0
+        found[found] = self.event_codes[event_positions[found]] == position_codes[found]
+        return event_positions, found
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def position_as_of(self, national_code, market_maker_fund_id, j_date):
+        """
+        Running totals of one position as of a Jalali date.
+
+        Returns:
+            pd.Series: The running totals, or None when the position has no event on or before j_date.
+        """
+        position_code = self.position_lookup.get((str(national_code), int(market_maker_fund_id)))
+        if position_code is None:
+            return None
+
+        event_positions, found = self.search_events([position_code], self.jalali_dates_to_integers([j_date]))
+        if not found[0]:
+            return None
+
+        return pd.Series(self.event_values[event_positions[0]], index=self.running_total_columns())
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def select_positions(self, short_names=None, national_codes=None, market_maker_fund_ids=None):
+        positions_df = self.positions_df
+        if short_names is not None and 'ShortName' in positions_df.columns:
+            positions_df = positions_df[positions_df['ShortName'].isin(short_names)]
+        if national_codes is not None:
+            positions_df = positions_df[positions_df['NationalCode_UniversalCode'].isin([str(code) for code in
+                                                                                         national_codes])]
+        if market_maker_fund_ids is not None:
+            positions_df = positions_df[positions_df['MarketMakerFundID'].isin(market_maker_fund_ids)]
+        return positions_df
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def positions_as_of(self, j_date, short_names=None, national_codes=None, market_maker_fund_ids=None):
+        """
+        Running totals of the selected positions as of a Jalali date.
+
+        Returns:
+            pd.DataFrame: One row per position that has an event on or before j_date.
+        """
+        return self.build_dense_positions(j_date, j_date, short_names, national_codes, market_maker_fund_ids,
+                                          j_dates=[j_date])
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @DataHelper.calculate_execution_time
+    def build_dense_positions(self, start_j_date, end_j_date, short_names=None, national_codes=None,
+                              market_maker_fund_ids=None, j_dates=None, drop_empty_positions=True):
+        """
+        Expand the ledger into a position x date frame for a date range.
+
+        Args:
+            start_j_date (str): First Jalali date of the range.
+            end_j_date (str): Last Jalali date of the range.
+            short_names, national_codes, market_maker_fund_ids (list, optional): Restrict the positions.
+            j_dates (list, optional): Explicit Jalali dates to expand on, e.g. the report dates. Every date of DateTbl
+                between start_j_date and end_j_date is used when not given.
+            drop_empty_positions (bool): Drop the rows of positions that had no event yet on that date.
+
+        Returns:
+            pd.DataFrame: The running totals of each selected position on each date.
+        """
+        if j_dates is None:
+            date_tfm = self.build_DateTfm()
+            j_dates = date_tfm.loc[(date_tfm['JDate'] >= start_j_date) & (date_tfm['JDate'] <= end_j_date), 'JDate']
+
+        date_numbers = np.unique(self.jalali_dates_to_integers(pd.Series(j_dates, dtype=object)))
+        positions_df = self.select_positions(short_names, national_codes, market_maker_fund_ids)
+        position_codes = positions_df['PositionCode'].to_numpy(dtype=np.int64)
+
+        query_codes = np.repeat(position_codes, len(date_numbers))
+        query_dates = np.tile(date_numbers, len(position_codes))
+        event_positions, found = self.search_events(query_codes, query_dates)
+
+        values = np.full((len(query_codes), len(self.running_total_columns())), np.nan)
+        values[found] = self.event_values[event_positions[found]]
+
+        dense_df = positions_df.iloc[np.repeat(np.arange(len(positions_df)), len(date_numbers))].reset_index(drop=True)
+        dense_df['JDate'] = self.integers_to_jalali_dates(query_dates).values
+        dense_df[self.running_total_columns()] = values
+
+        if drop_empty_positions:
+            dense_df = dense_df[found].reset_index(drop=True)
+
+        return dense_df.drop(columns='PositionCode')
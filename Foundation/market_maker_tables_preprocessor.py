@@ -6,7 +6,6 @@
 
 import pandas as pd
 import numpy as np
-from itertools import product
 
 
 # ======================================================================================================================
@@ -154,19 +153,20 @@ class DailyYekanReportPreprocessor(FilterFramesHelper, IranMarketMakerTableFrame
         # --------------------------------------------------------------------------------------------------------------
 
     def add_nav_columns(self):
-        PreprocessedIranMarketPricesTfm = self.build_PreprocessedIranMarketPricesTfm()
-        self.mapping_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm, 'PriceKey', 'Close',
-                             drop_pivot_column=False)
-        self.mapping_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm, 'PriceKey', 'AdjClose',
-                             drop_pivot_column=False)
-        self.mapping_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm, 'PriceKey', 'AdjOpen',
-                             drop_pivot_column=False)
-        self.mapping_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm, 'PriceKey', 'Volume',
-                             drop_pivot_column=False)
-        self.mapping_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm, 'PriceKey', 'AdjVolume',
-                             drop_pivot_column=False)
-        self.mapping_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm, 'PriceKey', 'TransactionValue',
-                             drop_pivot_column=False)
+        price_columns = ['Close', 'AdjClose', 'AdjOpen', 'Volume', 'AdjVolume', 'TransactionValue']
+        PreprocessedIranMarketPricesTfm = self.build_PreprocessedIranMarketPricesTfm(
+            columns=['PriceKey', 'PriceKeyID'] + price_columns)
+
+        # Join on the integer PriceKeyID when both tables carry it, the string PriceKey otherwise
+        price_key = 'PriceKey'
+        if 'PriceKeyID' in self.main_dataframe.columns and 'PriceKeyID' in PreprocessedIranMarketPricesTfm.columns:
+            price_key = 'PriceKeyID'
+            self.main_dataframe['PriceKeyID'] = self.main_dataframe['PriceKeyID'].astype('Int64')
+            PreprocessedIranMarketPricesTfm['PriceKeyID'] = PreprocessedIranMarketPricesTfm['PriceKeyID'].astype('Int64')
+
+        PreprocessedIranMarketPricesTfm = PreprocessedIranMarketPricesTfm.dropna(subset=[price_key])
+        self.main_dataframe = self.mapping_multiple_columns(self.main_dataframe, PreprocessedIranMarketPricesTfm,
+                                                            price_key, price_columns)
 
         self.main_dataframe['AdjFactor'] = self.main_dataframe['AdjClose'] / self.main_dataframe['Close']
         self.main_dataframe['AdjFinal'] = self.main_dataframe['AdjFactor'] * self.main_dataframe['FinalPrice']
@@ -174,7 +174,7 @@ class DailyYekanReportPreprocessor(FilterFramesHelper, IranMarketMakerTableFrame
 
         selected_columns = ['AdjOpen', 'Close', 'AdjClose', 'AdjFactor', 'FinalPrice', 'AdjFinal', 'AdjBreakEvenPoint']
 
-        self.main_dataframe[selected_columns] = self.main_dataframe.groupby('ShortName')[selected_columns].ffill()
+        self.main_dataframe[selected_columns] = self.main_dataframe.groupby('ShortName', observed=True)[selected_columns].ffill()
 
         columns_to_fill = {'Volume': 0, 'AdjVolume': 0, 'TransactionValue': 0}
 
@@ -213,16 +213,16 @@ class DailyYekanReportViewFrameCreator(DailyYekanReportPreprocessor, PortfolioMa
         if self.time_frame == "JDate":
             mid_df[f"CumSum{column_name}"] = self.vfm[f"{column_name}"]
         elif self.time_frame == "JYear":
-            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "JYear"])[column_name].cumsum().fillna(method='ffill').to_frame(
+            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "JYear"], observed=True)[column_name].cumsum().fillna(method='ffill').to_frame(
                 f"CumSum{column_name}")
         elif self.time_frame == "ContractNumber":
-            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "ContractNumber"])[column_name].cumsum().fillna(
+            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "ContractNumber"], observed=True)[column_name].cumsum().fillna(
                 method='ffill').to_frame(f"CumSum{column_name}")
         elif self.time_frame == "AnnouncementID":
-            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "AnnouncementID"])[column_name].cumsum().fillna(
+            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "AnnouncementID"], observed=True)[column_name].cumsum().fillna(
                 method='ffill').to_frame(f"CumSum{column_name}")
         elif self.time_frame in ['JHalfYear', 'JSeason', 'JMonthYear', 'JWeekNumber']:
-            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "JYear", self.time_frame])[column_name].cumsum().fillna(
+            mid_df[f"CumSum{column_name}"] = self.vfm.groupby(["ShortName", "JYear", self.time_frame], observed=True)[column_name].cumsum().fillna(
                 method='ffill').to_frame(f"CumSum{column_name}")
 
         return mid_df
@@ -302,7 +302,7 @@ class DailyYekanReportViewFrameCreator(DailyYekanReportPreprocessor, PortfolioMa
                     # Filter by the specific jalali value
                     filtered_df = self.filter_by_jalali_objects_date(df, self.time_frame, jalali_value)
                     # Filter by JYear and get the last row
-                    selected_df = filtered_df.groupby("JYear").apply(lambda x: x.tail(1))
+                    selected_df = filtered_df.groupby("JYear", observed=True).apply(lambda x: x.tail(1))
                     selected_df['JalaliObject'] = jalali_value
                     selected_df['YearObjectJalali'] = selected_df['JalaliObject'].astype(str) + ' ' + selected_df[
                         "JYear"].astype(str)
@@ -581,7 +581,7 @@ class FundsProcessor(FilterFramesHelper, PortfolioManagementCalculator):
 
         selected_columns = ['AdjOpen', 'Close', 'AdjClose', 'AdjFactor', 'FinalPrice', 'AdjFinal', 'AdjBreakEvenPoint']
 
-        funds_processed_vfm[selected_columns] = funds_processed_vfm.groupby('ShortName')[selected_columns].ffill()
+        funds_processed_vfm[selected_columns] = funds_processed_vfm.groupby('ShortName', observed=True)[selected_columns].ffill()
 
         return funds_processed_vfm
 
@@ -634,37 +634,26 @@ class MarketMakerIssuanceCancellationPreprocessor(FilterFramesHelper, IranMarket
         self.mapping_columns(InvestObjects_df, MarketMakerFundsFiscalYearYekanTfm, "MarketMakerFundName",
                              "MarketMakerFundID", False)
 
-        PreprocessDailyYekanReportTfm = self.build_PreprocessDailyYekanReportTfm()
         short_names = self.fetch_market_maker_symbols()
 
-        # تابع برای تبدیل مقادیر
-        def replace_values(value):
-            if value < threshold:
-                return threshold
-            else:
-                return value
+        # First report date of each fund; transactions before it are moved to that date
+        reported_df = PreprocessDailyYekanReportTfm[PreprocessDailyYekanReportTfm['ShortName'].isin(short_names)]
+        first_report_dates = reported_df.dropna(subset=['JDate']).groupby('ShortName', observed=True)['JDate'].min()
 
-        filtered_InvestObjects_dfs = []
         for short_name in short_names:
-            filtered_PreprocessDailyYekanReportTfm = self.filter_by_short_name(PreprocessDailyYekanReportTfm,
-                                                                               short_name)
-            filtered_PreprocessDailyYekanReportTfm = filtered_PreprocessDailyYekanReportTfm.reset_index()
-
-            if not filtered_PreprocessDailyYekanReportTfm.empty:
-                first_value_A = filtered_PreprocessDailyYekanReportTfm.head(1)['JDate'].iloc[0]
-                threshold = first_value_A  # عدد خاص
-
-                filtered_InvestObjects_df = self.filter_by_short_name(InvestObjects_df, short_name)
-                filtered_InvestObjects_df['JDate'] = filtered_InvestObjects_df['JDate'].apply(
-                    lambda x: threshold if x < threshold else x)
-
-                filtered_InvestObjects_dfs.append(filtered_InvestObjects_df)
-            else:
+            if short_name not in first_report_dates.index:
                 print(f"filtered_PreprocessDailyYekanReportTfm for {short_name} is empty or does not contain any rows.")
 
-        # ادامه کار با filtered_InvestObjects_dfs...
+        InvestObjects_df = InvestObjects_df[InvestObjects_df['ShortName'].isin(first_report_dates.index)].copy()
+
+        first_report_numbers = pd.Series(self.jalali_dates_to_integers(first_report_dates),
+                                         index=first_report_dates.index)
+        threshold_numbers = InvestObjects_df['ShortName'].map(first_report_numbers).to_numpy(dtype=np.int64)
+        j_date_numbers = np.maximum(self.jalali_dates_to_integers(InvestObjects_df['JDate']), threshold_numbers)
+        InvestObjects_df['JDate'] = self.integers_to_jalali_dates(j_date_numbers).values
 
-        InvestObjects_df = pd.concat(filtered_InvestObjects_dfs, ignore_index=True)
+        InvestObjects_df.sort_values(by=['JDate'], kind='stable', inplace=True)
+        InvestObjects_df.reset_index(drop=True, inplace=True)
 
         InvestObjects_df['ReportID'] = InvestObjects_df['MarketMakerFundID'].astype(str) + ".0" + '-' + InvestObjects_df['JDate'].astype(str)
 
@@ -736,262 +725,212 @@ class FundsInvestorsProcessor(MarketMakerIssuanceCancellationPreprocessor):
     def __init__(self):
         super().__init__()
 
-    @DataHelper.calculate_execution_time
-    def create_funds_investors_processed_helper_vfm(self):
-        FundsProcessedTfm = self.build_FundsProcessedTfm()
-        MarketMakerIssuanceCancellation_df = self.InvestObjects_add_required_columns()
-
-        # ایجاد تمام ترکیبات بین دو جدول با استفاده از تابع product
-        funds_investors_processed_helper_df = list(product(FundsProcessedTfm['TimeFrameReportID'], MarketMakerIssuanceCancellation_df['NationalCode_UniversalCode']))
-
-        # ساخت DataFrame از تمام ترکیبات
-        funds_investors_processed_helper_df = pd.DataFrame(funds_investors_processed_helper_df, columns=['TimeFrameReportID', 'NationalCode_UniversalCode'])
-
-        funds_investors_processed_helper_df["ReportTimeFrameIssuanceCancellationID"] = (
-                funds_investors_processed_helper_df['NationalCode_UniversalCode'].astype(str) + '-' + funds_investors_processed_helper_df['TimeFrameReportID'].astype(str))
-
-        new_order = ['ReportTimeFrameIssuanceCancellationID', 'TimeFrameReportID', 'NationalCode_UniversalCode']
-        funds_investors_processed_helper_df = funds_investors_processed_helper_df[new_order]
-
-        # --------------------------------------------------------------------------------------------------------------
-        # Add columns from FundsProcessedTfm
-
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'ReportID', False)
-        funds_investors_processed_helper_df["ReportInvestorID"] = (
-                funds_investors_processed_helper_df['NationalCode_UniversalCode'].astype(str) + '-' + funds_investors_processed_helper_df['ReportID'].astype(str))
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JDate', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'GDate', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'TimeFrame', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'ContractNumber', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JYear', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JHalfYear', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JSeason', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JMonthYear', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JMonthNumber', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JWeekNumber', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JDayOfMonth', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'DayOfWeek', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'JalaliObject', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'ShortName', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'IranSymbol', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'HoldingName', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'TotalUnits', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'CancellationPrice', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'IssuePrice', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'PriceKey', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'AnnouncementID', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'AnnouncementType', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'ContractNumber', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'IranSymbol', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'Commitment', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'CumulativeOrderVolume', False)
-        self.mapping_columns(funds_investors_processed_helper_df, FundsProcessedTfm,
-                             'TimeFrameReportID', 'QuoteDomain', False)
-
-
-
-        # --------------------------------------------------------------------------------------------------------------
-        # Add columns from MarketMakerIssuanceCancellation_df
+    @staticmethod
+    def report_attribute_columns():
+        report_attribute_columns = [
+            "ReportID",
+            "JDate",
+            "GDate",
+            "TimeFrame",
+            "ContractNumber",
+            "JYear",
+            "JHalfYear",
+            "JSeason",
+            "JMonthYear",
+            "JMonthNumber",
+            "JWeekNumber",
+            "JDayOfMonth",
+            "DayOfWeek",
+            "JalaliObject",
+            "ShortName",
+            "IranSymbol",
+            "HoldingName",
+            "TotalUnits",
+            "CancellationPrice",
+            "IssuePrice",
+            "PriceKey",
+            "AnnouncementID",
+            "AnnouncementType",
+            "Commitment",
+            "CumulativeOrderVolume",
+            "QuoteDomain",
+        ]
+        return report_attribute_columns
 
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'NationalCode_UniversalCode', 'InvestorName', False)
+    @staticmethod
+    def fund_cumsum_columns():
+        fund_cumsum_columns = [
+            "FundCumSumIssuedUnitsNumber",
+            "FundCumSumIssuedAmount",
+            "FundCumSumCancellationUnitsNumber",
+            "FundCumSumCancellationAmount",
+        ]
+        return fund_cumsum_columns
 
-        # --------------------------------------------------------------------------------------------------------------
-        # Add Funds columns
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'FundCumSumIssuedUnitsNumber', False)
+    @staticmethod
+    def investor_cumsum_columns():
+        investor_cumsum_columns = [
+            "CumSumIssuedUnitsNumber",
+            "CumSumCancellationUnitsNumber",
+            "CumSumIssuedAmount",
+            "CumSumCancellationAmount",
+        ]
+        return investor_cumsum_columns
 
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'FundCumSumIssuedAmount', False)
+    @staticmethod
+    def calendar_group_columns():
+        calendar_group_columns = [
+            "JDate",
+            "GDate",
+            "TimeFrame",
+            "JYear",
+            "JHalfYear",
+            "JSeason",
+            "JMonthYear",
+            "JMonthNumber",
+            "JWeekNumber",
+            "JalaliObject",
+            "JDayOfMonth",
+            "DayOfWeek",
+        ]
+        return calendar_group_columns
 
+    @staticmethod
+    def aggregate_funds_investors_level(funds_investors_processed_df, level_columns, dropna=True):
         """
-        In this case, the "FundCumSumIssuedUnitsNumber" is not being utilized, and instead, the column "TotalUnits" from
-         the table "FundsProcessedTfm" is being used. Reason being: in cases where the dates are the same, 
-         calculations encounter issues.
-        """
-
-        # In this case
-
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'FundCumSumCancellationUnitsNumber', False)
+        Sum the numeric columns of a funds investors frame over an entity level and the calendar columns.
 
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'FundCumSumCancellationAmount', False)
+        Only numeric columns are summed; the text columns of the source are identifiers that the rollups drop anyway,
+        and so are the integer surrogate key columns (*KeyID).
 
+        Args:
+            funds_investors_processed_df (pd.DataFrame): FundsInvestorsProcessedTfm or a finer rollup of it.
+            level_columns (list): The entity columns of the level (empty for the market-wide level).
+            dropna (bool): Drop groups whose keys contain missing values.
 
-        # --------------------------------------------------------------------------------------------------------------
-        # Add Investor Columns
-        # --------------------------------------------------------------------------------------------------------------
-        # Add FundsInvestor Columns
-
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'CumSumIssuedUnitsNumber', False)
-
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'CumSumCancellationUnitsNumber', False)
-
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'CumSumIssuedAmount', False)
+        Returns:
+            pd.DataFrame: One row per entity and calendar record.
+        """
+        group_columns = level_columns + FundsInvestorsProcessor.calendar_group_columns()
+        measure_columns = [column for column in funds_investors_processed_df.select_dtypes(include='number').columns
+                           if column not in group_columns and not column.endswith('KeyID')]
 
-        self.mapping_columns(funds_investors_processed_helper_df, MarketMakerIssuanceCancellation_df,
-                             'ReportInvestorID', 'CumSumCancellationAmount', False)
+        level_df = funds_investors_processed_df.groupby(group_columns, as_index=False, dropna=dropna,
+                                                        observed=True)[measure_columns].sum()
+        return level_df
 
+    @staticmethod
+    def add_rollup_ratio_columns(rollup_df, total_units_column):
+        rollup_df["CumSumNetInputMoney"] = rollup_df['CumSumIssuedAmount'] - rollup_df['CumSumCancellationAmount']
 
+        rollup_df[total_units_column] = rollup_df['CumSumIssuedUnitsNumber'] - rollup_df['CumSumCancellationUnitsNumber']
 
-        # ==============================================================================================================
-        #  Add Funds Columns
-        # ==============================================================================================================
-        # FundCumSumIssuedUnitsNumber
-        group_cols = ["ShortName", "TimeFrame"]
-        fill_cols = ["FundCumSumIssuedUnitsNumber"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+        rollup_df["CumSumProfitLoss"] = rollup_df["NetAssetsValue"] + rollup_df['CumSumCancellationAmount'] - \
+                                        rollup_df['CumSumIssuedAmount']
+        rollup_df["CumSumReturn"] = rollup_df["CumSumProfitLoss"] / rollup_df['CumSumIssuedAmount']
 
-        group_cols = ["ShortName", "TimeFrame"]
-        fill_cols = ["FundCumSumIssuedAmount"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+        rollup_df["AverageIssuedPrice"] = rollup_df["CumSumIssuedAmount"] / rollup_df["CumSumIssuedUnitsNumber"]
+        rollup_df["AverageCancellationPrice"] = rollup_df["CumSumCancellationAmount"] / \
+                                                rollup_df["CumSumCancellationUnitsNumber"]
 
-        # FundCumSumCancellationUnitsNumber
-        group_cols = ["ShortName", "TimeFrame"]
-        fill_cols = ["FundCumSumCancellationUnitsNumber"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+        rollup_df["GeneralNAV"] = rollup_df["NetAssetsValue"] / rollup_df[total_units_column]
+        return rollup_df
 
-        group_cols = ["ShortName", "TimeFrame"]
-        fill_cols = ["FundCumSumCancellationAmount"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
-        # --------------------------------------------------------------------------------------------------------------
-        # FundCumSumBuyNumber
-        # group_cols = ["ShortName", "TimeFrame"]
-        # fill_cols = ["FundCumSumBuyNumber"]
-        # funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
-        # --------------------------------------------------------------------------------------------------------------
-        # FundCumSumSellNumber
-        # group_cols = ["ShortName", "TimeFrame"]
-        # fill_cols = ["FundCumSumSellNumber"]
-        # funds_investors_processed_helper_df = self.fillna_groupby_previous(
-        #     funds_investors_processed_helper_df, group_cols, fill_cols)
-
-        # ==============================================================================================================
-        # Add Investor Columns
-        # ==============================================================================================================
-
-        # ==============================================================================================================
-
-        # ==============================================================================================================
-        # CumSumUnitsNumber
-        group_cols = ["ShortName", "TimeFrame", "ReportInvestorID"]
-        fill_cols = ["CumSumIssuedUnitsNumber"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
-
-        group_cols = ["ShortName", "TimeFrame", "NationalCode_UniversalCode"]
-        fill_cols = ["CumSumIssuedUnitsNumber"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
-        # --------------------------------------------------------------------------------------------------------------
-        group_cols = ["ShortName", "TimeFrame", "ReportInvestorID"]
-        fill_cols = ["CumSumCancellationUnitsNumber"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+    @staticmethod
+    def time_frame_report_join_column(main_df, FundsProcessedTfm):
+        """
+        The column to join FundsProcessedTfm on: the integer TimeFrameReportKeyID when both frames carry it, the
+        string TimeFrameReportID for tables built before the surrogate keys.
+        """
+        if 'TimeFrameReportKeyID' in main_df.columns and 'TimeFrameReportKeyID' in FundsProcessedTfm.columns:
+            main_df['TimeFrameReportKeyID'] = main_df['TimeFrameReportKeyID'].astype('Int64')
+            FundsProcessedTfm['TimeFrameReportKeyID'] = FundsProcessedTfm['TimeFrameReportKeyID'].astype('Int64')
+            return 'TimeFrameReportKeyID'
+        return 'TimeFrameReportID'
 
-        group_cols = ["ShortName", "TimeFrame", "NationalCode_UniversalCode"]
-        fill_cols = ["CumSumCancellationUnitsNumber"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
-        # --------------------------------------------------------------------------------------------------------------
-        # CumSumIssuedAmount
-        group_cols = ["ShortName", "TimeFrame", "ReportInvestorID"]
-        fill_cols = ["CumSumIssuedAmount"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+    @DataHelper.calculate_execution_time
+    def create_funds_investors_processed_helper_vfm(self, ledger=None):
+        """
+        Build one row per report time frame and investor of the report's fund from the investor position ledger.
 
-        group_cols = ["ShortName", "TimeFrame", "NationalCode_UniversalCode"]
-        fill_cols = ["CumSumIssuedAmount"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+        Every report row is joined only with the positions of its own fund, and the running totals of each position
+        are taken as of the report date with the ledger's as-of lookup, so there is no report x investor product.
+        Positions without an event on or before the report date get no row. The fund totals are the running sums of
+        the ledger events of the fund as of the report date.
 
-        # --------------------------------------------------------------------------------------------------------------
-        # CumSumCancellationAmount
-        group_cols = ["ShortName", "TimeFrame", "ReportInvestorID"]
-        fill_cols = ["CumSumCancellationAmount"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+        Args:
+            ledger (InvestorPositionLedger, optional): A loaded ledger. It is read from InvestorPositionLedgerTbl
+                                                       when not given.
 
-        group_cols = ["ShortName", "TimeFrame", "NationalCode_UniversalCode"]
-        fill_cols = ["CumSumCancellationAmount"]
-        funds_investors_processed_helper_df = self.fillna_groupby_previous(funds_investors_processed_helper_df, group_cols, fill_cols)
+        Returns:
+            pd.DataFrame: FundsInvestorsProcessedHelperVfm.
+        """
+        # Imported here because the ledger module builds on this one
+        from Foundation.investor_position_ledger import InvestorPositionLedger
 
-        # ==============================================================================================================
-        # Add Holding Columns
-        # ==============================================================================================================
-        # HoldingCumSumUnitsNumbers
+        FundsProcessedTfm = self.build_FundsProcessedTfm()
+        if ledger is None:
+            ledger = InvestorPositionLedger().load_ledger(self.build_InvestorPositionLedgerTfm())
 
-        # ==============================================================================================================
-        # Add General columns
+        report_key_columns = [column for column in ['TimeFrameReportID', 'TimeFrameReportKeyID']
+                              if column in FundsProcessedTfm.columns]
+        reports_df = FundsProcessedTfm[report_key_columns + ['ShortName', 'JDate']].dropna(
+            subset=['TimeFrameReportID', 'ShortName', 'JDate'])
+        reports_df = reports_df.drop_duplicates(subset=['TimeFrameReportID']).astype(object)
+        reports_df['JDateNumber'] = self.jalali_dates_to_integers(reports_df['JDate'])
 
         # --------------------------------------------------------------------------------------------------------------
+        # Positions of each report's fund as of the report date
 
-        # --------------------------------------------------------------------------------------------------------------
+        position_columns = [column for column in ['PositionCode', 'NationalCode_UniversalCode', 'ShortName',
+                                                  'InvestorName'] if column in ledger.positions_df.columns]
+        positions_df = ledger.positions_df[position_columns].astype({'ShortName': object})
+        funds_investors_processed_helper_df = reports_df.merge(positions_df, on='ShortName', how='inner', sort=False)
 
-        # --------------------------------------------------------------------------------------------------------------
+        event_positions, found = ledger.search_events(funds_investors_processed_helper_df['PositionCode'],
+                                                      funds_investors_processed_helper_df['JDateNumber'])
+        funds_investors_processed_helper_df = funds_investors_processed_helper_df[found].reset_index(drop=True)
+        funds_investors_processed_helper_df[ledger.running_total_columns()] = \
+            ledger.event_values[event_positions[found]]
 
         # --------------------------------------------------------------------------------------------------------------
-        # Assuming df is the name of your DataFrame and 'ReportInvestorID' and 'UnitsNumber' are the column names you are working with
-        # Finding unique UnitsNumber values for each group of records with the same ReportInvestorID
-        # --------------------------------------------------------------------------------------------------------------
-        # FundCumSumIssuedUnitsNumber
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['FundCumSumIssuedUnitsNumber'].transform('max')
-        funds_investors_processed_helper_df['FundCumSumIssuedUnitsNumber'] = unique_units_numbers
+        # Fund running totals as of the report date
 
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['FundCumSumIssuedAmount'].transform('max')
-        funds_investors_processed_helper_df['FundCumSumIssuedAmount'] = unique_units_numbers
+        fund_cumsum_columns = self.fund_cumsum_columns()
+        fund_events_df = ledger.ledger_df.astype({'ShortName': object}).groupby(
+            ['ShortName', 'JDateNumber'], as_index=False, sort=True)[ledger.event_value_columns()].sum()
+        fund_totals = fund_events_df.groupby('ShortName', sort=False)[ledger.event_value_columns()].cumsum()
+        for value_column in ledger.event_value_columns():
+            fund_events_df[f"FundCumSum{value_column}"] = fund_totals[value_column]
 
-        # --------------------------------------------------------------------------------------------------------------
-        # FundCumSumCancellationUnitsNumber
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['FundCumSumCancellationUnitsNumber'].transform('max')
-        funds_investors_processed_helper_df['FundCumSumCancellationUnitsNumber'] = unique_units_numbers
+        funds_investors_processed_helper_df = pd.merge_asof(
+            funds_investors_processed_helper_df.sort_values('JDateNumber', kind='stable'),
+            fund_events_df[['ShortName', 'JDateNumber'] + fund_cumsum_columns].sort_values('JDateNumber'),
+            on='JDateNumber', by='ShortName')
 
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['FundCumSumCancellationAmount'].transform('max')
-        funds_investors_processed_helper_df['FundCumSumCancellationAmount'] = unique_units_numbers
+        funds_investors_processed_helper_df["ReportTimeFrameIssuanceCancellationID"] = (
+                funds_investors_processed_helper_df['NationalCode_UniversalCode'].astype(str) + '-' +
+                funds_investors_processed_helper_df['TimeFrameReportID'].astype(str))
 
-        # --------------------------------------------------------------------------------------------------------------
-        # CumSumIssuedUnitsNumber
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['CumSumIssuedUnitsNumber'].transform('max')
-        funds_investors_processed_helper_df['CumSumIssuedUnitsNumber'] = unique_units_numbers
+        investor_cumsum_columns = self.investor_cumsum_columns()
+        id_columns = ['ReportTimeFrameIssuanceCancellationID'] + report_key_columns + ['NationalCode_UniversalCode']
+        value_columns = [column for column in ['InvestorName'] if column in funds_investors_processed_helper_df.columns] + \
+                        fund_cumsum_columns + investor_cumsum_columns
+        funds_investors_processed_helper_df = funds_investors_processed_helper_df[id_columns + value_columns]
 
         # --------------------------------------------------------------------------------------------------------------
-        # CumSumCancellationUnitsNumber
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['CumSumCancellationUnitsNumber'].transform('max')
-        funds_investors_processed_helper_df['CumSumCancellationUnitsNumber'] = unique_units_numbers
+        # Add columns from FundsProcessedTfm (one join for every report attribute)
 
-        # --------------------------------------------------------------------------------------------------------------
-        # CumSumIssuedAmount
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['CumSumIssuedAmount'].transform('max')
-        funds_investors_processed_helper_df['CumSumIssuedAmount'] = unique_units_numbers
+        join_column = self.time_frame_report_join_column(funds_investors_processed_helper_df, FundsProcessedTfm)
+        funds_investors_processed_helper_df = self.mapping_multiple_columns(
+            funds_investors_processed_helper_df, FundsProcessedTfm, join_column, self.report_attribute_columns())
+        funds_investors_processed_helper_df = funds_investors_processed_helper_df[
+            id_columns + self.report_attribute_columns() + value_columns]
 
-        # --------------------------------------------------------------------------------------------------------------
-        # CumSumCancellationAmount
-        unique_units_numbers = funds_investors_processed_helper_df.groupby('ReportInvestorID')['CumSumCancellationAmount'].transform('max')
-        funds_investors_processed_helper_df['CumSumCancellationAmount'] = unique_units_numbers
+        funds_investors_processed_helper_df.insert(
+            funds_investors_processed_helper_df.columns.get_loc('ReportID') + 1, "ReportInvestorID",
+            funds_investors_processed_helper_df['NationalCode_UniversalCode'].astype(str) + '-' +
+            funds_investors_processed_helper_df['ReportID'].astype(str))
 
         # --------------------------------------------------------------------------------------------------------------
         # Add calculated columns
@@ -1044,10 +983,12 @@ class FundsInvestorsProcessor(MarketMakerIssuanceCancellationPreprocessor):
                             "CumSumBuySellNumber", "CumSumNetBuySellAmount"
                             ]
 
-        for col in add_columns_list:
-            self.mapping_columns(funds_investors_processed_df, FundsProcessedTfm,
-                             'TimeFrameReportID', col, False)
+        add_columns_list = list(dict.fromkeys(add_columns_list))
+        join_column = self.time_frame_report_join_column(funds_investors_processed_df, FundsProcessedTfm)
+        funds_investors_processed_df = self.mapping_multiple_columns(funds_investors_processed_df, FundsProcessedTfm,
+                                                                     join_column, add_columns_list)
 
+        for col in add_columns_list:
             # Multiplying each column by the selected multiplier column and replacing the results in the same column
             funds_investors_processed_df[col] = funds_investors_processed_df[col] * funds_investors_processed_df["OwnershipPercentage"]
 
@@ -1072,77 +1013,30 @@ class InvestorsProcessor(FundsInvestorsProcessor):
         super().__init__()
 
     @DataHelper.calculate_execution_time
-    def create_investors_process_vfm(self):
-        FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
-        investors_processed_vfm = FundsInvestorsProcessedTfm.groupby(["NationalCode_UniversalCode", 'InvestorName', 'JDate',
-                                                                      'GDate', "TimeFrame", "JYear","JHalfYear", "JSeason",
-                                                                      "JMonthYear", "JMonthNumber", "JWeekNumber", "JalaliObject",
-                                                                      "JDayOfMonth", "DayOfWeek"], as_index=False).sum()
-
-        investors_processed_vfm["CumSumNetInputMoney"] = investors_processed_vfm['CumSumIssuedAmount'] - investors_processed_vfm['CumSumCancellationAmount']
-
-        investors_processed_vfm["InvestorTotalUnits"] = investors_processed_vfm['CumSumIssuedUnitsNumber'] - \
-                                                     investors_processed_vfm['CumSumCancellationUnitsNumber']
+    def create_investors_process_vfm(self, investors_processed_vfm=None):
+        if investors_processed_vfm is None:
+            FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
+            investors_processed_vfm = self.aggregate_funds_investors_level(
+                FundsInvestorsProcessedTfm, ["NationalCode_UniversalCode", 'InvestorName'])
 
-        investors_processed_vfm["CumSumProfitLoss"] = investors_processed_vfm["NetAssetsValue"] + investors_processed_vfm['CumSumCancellationAmount'] - investors_processed_vfm['CumSumIssuedAmount']
-        investors_processed_vfm["CumSumReturn"] = investors_processed_vfm["CumSumProfitLoss"] / investors_processed_vfm['CumSumIssuedAmount']
-
-        investors_processed_vfm["AverageIssuedPrice"] = investors_processed_vfm["CumSumIssuedAmount"] / investors_processed_vfm["CumSumIssuedUnitsNumber"]
-        investors_processed_vfm["AverageCancellationPrice"] = investors_processed_vfm["CumSumCancellationAmount"] / investors_processed_vfm["CumSumCancellationUnitsNumber"]
+        investors_processed_vfm = self.add_rollup_ratio_columns(investors_processed_vfm, "InvestorTotalUnits")
 
         investors_processed_vfm["FundUnitsPercentage"] = investors_processed_vfm["InvestorTotalUnits"] / investors_processed_vfm["TotalUnits"] # Todo 1402-10-18
 
-        investors_processed_vfm["GeneralNAV"] = investors_processed_vfm["NetAssetsValue"] / investors_processed_vfm[
-            "InvestorTotalUnits"]
-
         columns_to_drop = [
             "ReportTimeFrameIssuanceCancellationID", "TimeFrameReportID", "ReportID", "ReportInvestorID", "ShortName",
             "HoldingName", "IranSymbol", "AnnouncementType", "ContractNumber", "CancellationPrice", "IssuePrice",
             "PriceKey", "AnnouncementID", "IranSymbol", "Commitment", "CumulativeOrderVolume", "QuoteDomain"
         ]
 
-        investors_processed_vfm.sort_values(by=['JDate'], inplace=True)
-
-        # Get unique time frames and investor names from the DataFrame
-        time_frames = list(set(investors_processed_vfm["TimeFrame"]))
-        investor_names = list(set(investors_processed_vfm["InvestorName"]))
-        period_nav_returns = []
-
-        # Loop through each unique time frame
-        for time_frame in time_frames:
-            print(time_frame)
-            try:
-                # Create a DataFrame filtered by the current time frame
-                period_nav_return_df = self.build_filter_by_column_value_df(investors_processed_vfm, "TimeFrame",
-                                                                            time_frame)
-
-                # Loop through each unique investor for the current time frame
-                for investor in investor_names:
-                    # Create a copy of the original DataFrame
-                    temp_df = period_nav_return_df.copy()
-
-                    # Filter by investor name
-                    temp_df = self.build_filter_by_column_value_df(temp_df, "InvestorName", investor)
-
-                    # Calculate PeriodNAVReturn
-                    temp_df["PeriodNAVReturn"] = np.where(
-                        temp_df['GeneralNAV'].shift(1).notna(),
-                        ((temp_df['GeneralNAV'] - temp_df['GeneralNAV'].shift(1)) / temp_df['GeneralNAV'].shift(1)),
-                        ((temp_df['GeneralNAV'] - 1000000) / 1000000)
-                    )
-
-                    # Append to the list
-                    period_nav_returns.append(temp_df)
-
-            except:
-                print(f'in {time_frame} has not return')
-
-        # Concatenate all DataFrames in the list into one DataFrame
-        investors_processed_vfm = pd.concat(period_nav_returns, ignore_index=True)
+        # PeriodNAVReturn and CumNAVReturn of every investor in every time frame in one grouped pass
+        investors_processed_vfm = PortfolioManagementCalculator.calculate_grouped_nav_returns(
+            investors_processed_vfm, nav_column='GeneralNAV', group_columns=["TimeFrame", "NationalCode_UniversalCode"],
+            sort_column='JDate')
 
         # Sort and reset the index of the final DataFrame
         investors_processed_vfm.sort_values(by=['JDate'], inplace=True)
-        investors_processed_vfm.drop(columns=columns_to_drop, inplace=True)
+        investors_processed_vfm.drop(columns=columns_to_drop, inplace=True, errors='ignore')
         investors_processed_vfm.reset_index(drop=True, inplace=True)
 
         # investors_processed_vfm.to_excel("investors_processed_vfm.xlsx")
@@ -1153,26 +1047,12 @@ class HoldingsProcessor(FundsInvestorsProcessor):
         super().__init__()
 
     @DataHelper.calculate_execution_time
-    def create_holdings_process_vfm(self):
-        FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
-        Holdings_processed_vfm = FundsInvestorsProcessedTfm.groupby(["HoldingName", 'JDate',
-                                                                      'GDate', "TimeFrame", "JYear","JHalfYear", "JSeason",
-                                                                      "JMonthYear", "JMonthNumber", "JWeekNumber", "JalaliObject",
-                                                                      "JDayOfMonth", "DayOfWeek"], as_index=False).sum()
-
-        Holdings_processed_vfm["CumSumNetInputMoney"] = Holdings_processed_vfm['CumSumIssuedAmount'] - Holdings_processed_vfm['CumSumCancellationAmount']
-
-        Holdings_processed_vfm["HoldingTotalUnits"] = Holdings_processed_vfm['CumSumIssuedUnitsNumber'] - \
-                                                       Holdings_processed_vfm['CumSumCancellationUnitsNumber']
-
-        Holdings_processed_vfm["CumSumProfitLoss"] = Holdings_processed_vfm["NetAssetsValue"] + Holdings_processed_vfm['CumSumCancellationAmount'] - Holdings_processed_vfm['CumSumIssuedAmount']
-        Holdings_processed_vfm["CumSumReturn"] = Holdings_processed_vfm["CumSumProfitLoss"] / Holdings_processed_vfm['CumSumIssuedAmount']
-
-        Holdings_processed_vfm["AverageIssuedPrice"] = Holdings_processed_vfm["CumSumIssuedAmount"] / Holdings_processed_vfm["CumSumIssuedUnitsNumber"]
-        Holdings_processed_vfm["AverageCancellationPrice"] = Holdings_processed_vfm["CumSumCancellationAmount"] / Holdings_processed_vfm["CumSumCancellationUnitsNumber"]
+    def create_holdings_process_vfm(self, Holdings_processed_vfm=None):
+        if Holdings_processed_vfm is None:
+            FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
+            Holdings_processed_vfm = self.aggregate_funds_investors_level(FundsInvestorsProcessedTfm, ["HoldingName"])
 
-        Holdings_processed_vfm["GeneralNAV"] = Holdings_processed_vfm["NetAssetsValue"] / Holdings_processed_vfm[
-            "HoldingTotalUnits"]
+        Holdings_processed_vfm = self.add_rollup_ratio_columns(Holdings_processed_vfm, "HoldingTotalUnits")
 
         columns_to_drop = [
             "ReportTimeFrameIssuanceCancellationID", "TimeFrameReportID", "ReportID", "ReportInvestorID", "ShortName",
@@ -1181,46 +1061,14 @@ class HoldingsProcessor(FundsInvestorsProcessor):
             "FundAverageCancellationPrice", "NationalCode_UniversalCode", "FundCumSumIssuedUnitsNumber","FundCumSumIssuedAmount",
             "FundCumSumCancellationUnitsNumber", "FundCumSumCancellationAmount", "FundCumSumUnitsNumber", "TotalUnits"
         ]
-        # Get unique time frames and investor names from the DataFrame
-        time_frames = list(set(Holdings_processed_vfm["TimeFrame"]))
-        holding_names = list(set(Holdings_processed_vfm["HoldingName"]))
-        period_nav_returns = []
-
-        # Loop through each unique time frame
-        for time_frame in time_frames:
-            print(time_frame)
-            try:
-                # Create a DataFrame filtered by the current time frame
-                period_nav_return_df = self.build_filter_by_column_value_df(Holdings_processed_vfm, "TimeFrame",
-                                                                            time_frame)
-
-                # Loop through each unique investor for the current time frame
-                for holding in holding_names:
-                    # Create a copy of the original DataFrame
-                    temp_df = period_nav_return_df.copy()
-
-                    # Filter by investor name
-                    temp_df = self.build_filter_by_column_value_df(temp_df, "HoldingName", holding)
-
-                    # Calculate PeriodNAVReturn
-                    temp_df["PeriodNAVReturn"] = np.where(
-                        temp_df['GeneralNAV'].shift(1).notna(),
-                        ((temp_df['GeneralNAV'] - temp_df['GeneralNAV'].shift(1)) / temp_df['GeneralNAV'].shift(1)),
-                        ((temp_df['GeneralNAV'] - 1000000) / 1000000)
-                    )
-
-                    # Append to the list
-                    period_nav_returns.append(temp_df)
-
-            except:
-                print(f'in {time_frame} has not return')
-
-        # Concatenate all DataFrames in the list into one DataFrame
-        Holdings_processed_vfm = pd.concat(period_nav_returns, ignore_index=True)
+        # PeriodNAVReturn and CumNAVReturn of every holding in every time frame in one grouped pass
+        Holdings_processed_vfm = PortfolioManagementCalculator.calculate_grouped_nav_returns(
+            Holdings_processed_vfm, nav_column='GeneralNAV', group_columns=["TimeFrame", "HoldingName"],
+            sort_column='JDate')
 
         # Sort and reset the index of the final DataFrame
         Holdings_processed_vfm.sort_values(by=['JDate'], inplace=True)
-        Holdings_processed_vfm.drop(columns=columns_to_drop, inplace=True)
+        Holdings_processed_vfm.drop(columns=columns_to_drop, inplace=True, errors='ignore')
         Holdings_processed_vfm.reset_index(drop=True, inplace=True)
 
         return Holdings_processed_vfm
@@ -1230,26 +1078,12 @@ class GeneralProcessor(FundsInvestorsProcessor):
         super().__init__()
 
     @DataHelper.calculate_execution_time
-    def create_general_process_vfm(self):
-        FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
-        general_processed_vfm = FundsInvestorsProcessedTfm.groupby(['JDate',
-                                                                      'GDate', "TimeFrame", "JYear","JHalfYear", "JSeason",
-                                                                      "JMonthYear", "JMonthNumber", "JWeekNumber", "JalaliObject",
-                                                                      "JDayOfMonth", "DayOfWeek"], as_index=False).sum()
-
-        general_processed_vfm["CumSumNetInputMoney"] = general_processed_vfm['CumSumIssuedAmount'] - general_processed_vfm['CumSumCancellationAmount']
-
-        general_processed_vfm["GeneralTotalUnits"] = general_processed_vfm['CumSumIssuedUnitsNumber'] - \
-                                                     general_processed_vfm['CumSumCancellationUnitsNumber']
-
-        general_processed_vfm["CumSumProfitLoss"] = general_processed_vfm["NetAssetsValue"] + general_processed_vfm['CumSumCancellationAmount'] - general_processed_vfm['CumSumIssuedAmount']
-        general_processed_vfm["CumSumReturn"] = general_processed_vfm["CumSumProfitLoss"] / general_processed_vfm['CumSumIssuedAmount']
+    def create_general_process_vfm(self, general_processed_vfm=None):
+        if general_processed_vfm is None:
+            FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
+            general_processed_vfm = self.aggregate_funds_investors_level(FundsInvestorsProcessedTfm, [])
 
-        general_processed_vfm["AverageIssuedPrice"] = general_processed_vfm["CumSumIssuedAmount"] / general_processed_vfm["CumSumIssuedUnitsNumber"]
-        general_processed_vfm["AverageCancellationPrice"] = general_processed_vfm["CumSumCancellationAmount"] / general_processed_vfm["CumSumCancellationUnitsNumber"]
-
-        general_processed_vfm["GeneralNAV"] = general_processed_vfm["NetAssetsValue"] / general_processed_vfm[
-            "GeneralTotalUnits"]
+        general_processed_vfm = self.add_rollup_ratio_columns(general_processed_vfm, "GeneralTotalUnits")
 
         columns_to_drop = [
             "ReportTimeFrameIssuanceCancellationID", "TimeFrameReportID", "ReportID", "ReportInvestorID", "ShortName",
@@ -1259,40 +1093,13 @@ class GeneralProcessor(FundsInvestorsProcessor):
             "FundCumSumCancellationUnitsNumber", "FundCumSumCancellationAmount", "FundCumSumUnitsNumber", "HoldingName", "TotalUnits"
         ]
 
-        # Get unique time frames and investor names from the DataFrame
-        time_frames = list(set(general_processed_vfm["TimeFrame"]))
-        period_nav_returns = []
-
-        # Loop through each unique time frame
-        for time_frame in time_frames:
-            print(time_frame)
-            try:
-                # Create a DataFrame filtered by the current time frame
-                period_nav_return_df = self.build_filter_by_column_value_df(general_processed_vfm, "TimeFrame",
-                                                                            time_frame)
-
-                # Create a copy of the original DataFrame
-                temp_df = period_nav_return_df.copy()
-
-                # Calculate PeriodNAVReturn
-                temp_df["PeriodNAVReturn"] = np.where(
-                    temp_df['GeneralNAV'].shift(1).notna(),
-                    ((temp_df['GeneralNAV'] - temp_df['GeneralNAV'].shift(1)) / temp_df['GeneralNAV'].shift(1)),
-                    ((temp_df['GeneralNAV'] - 1000000) / 1000000)
-                )
-
-                # Append to the list
-                period_nav_returns.append(temp_df)
-
-            except:
-                print(f'in {time_frame} has not return')
-
-        # Concatenate all DataFrames in the list into one DataFrame
-        general_processed_vfm = pd.concat(period_nav_returns, ignore_index=True)
+        # PeriodNAVReturn and CumNAVReturn of every time frame in one grouped pass
+        general_processed_vfm = PortfolioManagementCalculator.calculate_grouped_nav_returns(
+            general_processed_vfm, nav_column='GeneralNAV', group_columns=["TimeFrame"], sort_column='JDate')
 
         # Sort and reset the index of the final DataFrame
         general_processed_vfm.sort_values(by=['JDate'], inplace=True)
-        general_processed_vfm.drop(columns=columns_to_drop, inplace=True)
+        general_processed_vfm.drop(columns=columns_to_drop, inplace=True, errors='ignore')
         general_processed_vfm.reset_index(drop=True, inplace=True)
 
         return general_processed_vfm
@@ -1301,6 +1108,48 @@ class GeneralProcessor(FundsInvestorsProcessor):
 # holding.create_general_process_vfm()
 
 
+class MarketMakerRollupProcessor(InvestorsProcessor, HoldingsProcessor, GeneralProcessor):
+    """
+    Build the investors, holdings and general view frames from a single read of FundsInvestorsProcessedTfm.
+
+    The source is summed once on the finest level (investor x holding x calendar record); the three levels are then
+    re-aggregated from that cube, which is much smaller than the source, instead of each processor grouping the full
+    table on its own.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    @DataHelper.calculate_execution_time
+    def build_rollup_levels(self):
+        FundsInvestorsProcessedTfm = self.build_FundsInvestorsProcessedTfm()
+
+        investor_columns = ["NationalCode_UniversalCode", "InvestorName"]
+        holding_columns = ["HoldingName"]
+
+        # Missing keys are kept in the cube so every coarser level still sees all of their rows
+        rollup_cube = self.aggregate_funds_investors_level(FundsInvestorsProcessedTfm,
+                                                           investor_columns + holding_columns, dropna=False)
+
+        rollup_levels = {
+            "InvestorsProcessedVfm": self.aggregate_funds_investors_level(rollup_cube, investor_columns),
+            "HoldingsProcessedVfm": self.aggregate_funds_investors_level(rollup_cube, holding_columns),
+            "GeneralProcessedVfm": self.aggregate_funds_investors_level(rollup_cube, []),
+        }
+        return rollup_levels
+
+    @DataHelper.calculate_execution_time
+    def create_rollup_process_vfms(self):
+        rollup_levels = self.build_rollup_levels()
+
+        rollup_vfms = {
+            "InvestorsProcessedVfm": self.create_investors_process_vfm(rollup_levels["InvestorsProcessedVfm"]),
+            "HoldingsProcessedVfm": self.create_holdings_process_vfm(rollup_levels["HoldingsProcessedVfm"]),
+            "GeneralProcessedVfm": self.create_general_process_vfm(rollup_levels["GeneralProcessedVfm"]),
+        }
+        return rollup_vfms
+
+
 
 class FundsRatio:
     pass
@@ -1400,10 +1249,34 @@ class AnnouncementsInformationViewFrames(FilterFramesHelper, AnnouncementsInform
         return AnnouncementEffectiveJDate_set, AnnouncementEffectiveGDate_set, FinishMarketMakingJDate_set, FinishMarketMakingGDate
 
     def add_announcement_assets_column(self, symbols_list, j_date):
+        """
+        Attach to the daily assets of each fund the announcement in force on each report date.
+
+        All funds are matched at once with an interval join on ShortName over the
+        [AnnouncementEffectiveJDate, FinishMarketMakingJDate] window of each announcement.
+
+        Args:
+            symbols_list (list): Short names of the funds.
+            j_date (str): The last Jalali date of the reports.
+
+        Returns:
+            pd.DataFrame: The assets columns of each report with its announcement columns.
+        """
         AnnouncementsInformation_vfm = self.build_general_Announcements_vfm()
-        dyr_vfm = DailyYekanReportViewFrameCreator(symbols_list, j_date)
+        PreprocessDailyYekanReportTfm = self.build_PreprocessDailyYekanReportTfm()
 
-        vfms = []
-        for short_name in symbols_list:
-            announcement_vfm = dyr_vfm.build_costume_vfm("AnnouncementID", 'EachSymbolsAssets', j_date=None)
-            vfms.append(announcement_vfm)
+        reports_df = PreprocessDailyYekanReportTfm[PreprocessDailyYekanReportTfm['ShortName'].isin(symbols_list) &
+                                                   (PreprocessDailyYekanReportTfm['JDate'] <= j_date)]
+
+        announcement_columns = ['AnnouncementID', 'AnnouncementType', 'AnnouncementEffectiveJDate',
+                                'FinishMarketMakingJDate', 'Commitment']
+        assets_columns = [column for column in DailyYekanReportViewFrameCreator.select_each_symbols_assets_columns()
+                          if column in reports_df.columns]
+        reports_df = reports_df[['ReportID', 'ShortName', 'JDate'] + assets_columns]
+
+        announcement_assets_vfm = self.interval_join(reports_df, AnnouncementsInformation_vfm, 'JDate',
+                                                     'AnnouncementEffectiveJDate', 'FinishMarketMakingJDate',
+                                                     'ShortName', announcement_columns)
+        announcement_assets_vfm = announcement_assets_vfm.sort_values(by=['ShortName', 'JDate'], kind='stable')
+        announcement_assets_vfm.reset_index(drop=True, inplace=True)
+        return announcement_assets_vfm
@@ -0,0 +1,159 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class AdaptiveIntradaySampler:
+    """
+    Decide which symbols of a market watch snapshot are stored, and when the next poll is due.
+
+    Tiers:
+        watchlist  The market-maker symbols: stored on every poll, with their order book.
+        hot        Symbols whose last price just reached the daily limit (Day_UL / Day_LL) or whose volume since the
+                   previous poll exceeded spike_factor times its running average. They are treated like the watchlist
+                   until cooldown_seconds after the last trigger, and while any symbol is hot the collector polls
+                   every hot_interval_seconds instead of its normal interval.
+        others     Stored once every slow_interval_seconds.
+
+    The limit trigger is edge-triggered: it fires on the poll a symbol moves onto its limit, not on every poll it
+    stays there, so a symbol locked at the limit all day cools down like any other and does not keep the collector
+    at hot_interval_seconds.
+
+    The per-symbol state (last volume, running volume average, at-limit flag, hot-until time, last stored time) is
+    kept in Series indexed by symbol and updated with vectorized operations on every snapshot.
+
+    Usage:
+        sampler = AdaptiveIntradaySampler(market_maker_symbols)
+        keep_mask = sampler.select(snapshot_df, now_seconds)
+        order_book_df = order_book_df[order_book_df["Ticker"].isin(sampler.capture_symbols)]
+    """
+
+    def __init__(self, watchlist=None, symbol_column="Ticker", slow_interval_seconds=60, hot_interval_seconds=2,
+                 cooldown_seconds=120, spike_factor=5.0, min_spike_volume=10000, volume_average_alpha=0.2):
+        self.watchlist = {str(symbol) for symbol in (watchlist or [])}
+        self.symbol_column = symbol_column
+        self.slow_interval_seconds = slow_interval_seconds
+        self.hot_interval_seconds = hot_interval_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.spike_factor = spike_factor
+        self.min_spike_volume = min_spike_volume
+        self.volume_average_alpha = volume_average_alpha
+
+        self.state = pd.DataFrame({"LastVolume": pd.Series(dtype=np.float64),
+                                   "VolumeAverage": pd.Series(dtype=np.float64),
+                                   "AtLimit": pd.Series(dtype=np.float64),
+                                   "HotUntil": pd.Series(dtype=np.float64),
+                                   "LastStored": pd.Series(dtype=np.float64)})
+        self.hot_symbols = set()
+        self.capture_symbols = set(self.watchlist)
+        self.metrics = {"snapshots": 0, "rows_seen": 0, "rows_kept": 0, "triggers": 0}
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def set_watchlist(self, watchlist):
+        self.watchlist = {str(symbol) for symbol in watchlist}
+        self.capture_symbols = self.watchlist | self.hot_symbols
+
+    def reset(self):
+        """
+        Forget the per-symbol state, e.g. at the start of a new day.
+        """
+        self.state = self.state.iloc[0:0]
+        self.hot_symbols = set()
+        self.capture_symbols = set(self.watchlist)
+
+    def is_hot(self):
+        return bool(self.hot_symbols)
+
+    def interval_seconds(self, normal_interval_seconds):
+        """
+        The poll interval to use now: hot_interval_seconds while any symbol is hot.
+        """
+        if self.is_hot():
+            return min(normal_interval_seconds, self.hot_interval_seconds)
+        return normal_interval_seconds
+
+    @staticmethod
+    def numeric_column(snapshot_df, column):
+        if column not in snapshot_df.columns:
+            return pd.Series(np.nan, index=snapshot_df.index)
+        return pd.to_numeric(snapshot_df[column], errors="coerce")
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def triggers(self, snapshot_df, previous):
+        """
+        True for the rows that moved onto a price limit or had a volume spike since the previous poll.
+        """
+        close = self.numeric_column(snapshot_df, "Close").to_numpy()
+        upper_limit = self.numeric_column(snapshot_df, "Day_UL").to_numpy()
+        lower_limit = self.numeric_column(snapshot_df, "Day_LL").to_numpy()
+        with np.errstate(invalid="ignore"):
+            at_limit = ((upper_limit > 0) & (close >= upper_limit)) | ((lower_limit > 0) & (close <= lower_limit))
+            reached_limit = at_limit & ~(previous["AtLimit"].to_numpy() == 1)
+
+            volume = self.numeric_column(snapshot_df, "Volume").to_numpy()
+            traded = volume - previous["LastVolume"].to_numpy()
+            average = previous["VolumeAverage"].to_numpy()
+            spike = (traded >= self.min_spike_volume) & (traded > self.spike_factor * average)
+        return reached_limit | spike, at_limit, volume, traded
+
+    def select(self, snapshot_df, now_seconds, store_all=False):
+        """
+        Update the state with a full snapshot and return the rows to store.
+
+        Args:
+            snapshot_df (pd.DataFrame): The full market watch snapshot.
+            now_seconds (float): A monotonic time of the snapshot in seconds.
+            store_all (bool, optional): Keep every row, e.g. for a keyframe. Default is False.
+
+        Returns:
+            np.ndarray: Boolean mask aligned with the rows of snapshot_df.
+        """
+        symbols = snapshot_df[self.symbol_column].astype(str)
+        unique_symbols = pd.Index(symbols.drop_duplicates())
+        self.state = self.state.reindex(self.state.index.union(unique_symbols))
+        previous = self.state.loc[symbols.to_numpy()]
+
+        triggered, at_limit, volume, traded = self.triggers(snapshot_df, previous)
+        self.metrics["triggers"] += int(triggered.sum())
+
+        # Running average of the volume traded between polls, for the next spike test
+        alpha = self.volume_average_alpha
+        previous_average = previous["VolumeAverage"].to_numpy()
+        new_average = np.where(np.isnan(previous_average), traded, alpha * traded + (1 - alpha) * previous_average)
+        new_average = np.where(np.isnan(traded), previous_average, new_average)
+
+        hot_until = previous["HotUntil"].to_numpy()
+        hot_until = np.where(triggered, now_seconds + self.cooldown_seconds, hot_until)
+        with np.errstate(invalid="ignore"):
+            is_hot = hot_until > now_seconds
+
+        last_stored = previous["LastStored"].to_numpy()
+        with np.errstate(invalid="ignore"):
+            is_due = np.isnan(last_stored) | (now_seconds - last_stored >= self.slow_interval_seconds)
+        in_watchlist = symbols.isin(self.watchlist).to_numpy()
+        keep = np.ones(len(snapshot_df), dtype=bool) if store_all else (in_watchlist | is_hot | is_due)
+
+        update = pd.DataFrame({"LastVolume": np.where(np.isnan(volume), previous["LastVolume"].to_numpy(), volume),
+                               "VolumeAverage": new_average, "AtLimit": at_limit.astype(np.float64),
+                               "HotUntil": hot_until,
+                               "LastStored": np.where(keep, now_seconds, last_stored)},
+                              index=symbols.to_numpy())
+        update = update[~update.index.duplicated(keep="last")]
+        self.state.loc[update.index, update.columns] = update
+
+        with np.errstate(invalid="ignore"):
+            self.hot_symbols = set(self.state.index[self.state["HotUntil"].to_numpy() > now_seconds])
+        self.capture_symbols = self.watchlist | self.hot_symbols
+
+        self.metrics["snapshots"] += 1
+        self.metrics["rows_seen"] += len(snapshot_df)
+        self.metrics["rows_kept"] += int(keep.sum())
+        return keep
@@ -66,10 +66,11 @@ class IranMarketMakerTableFrameBuilder(DataHelper):
                                                                   'TimeFrameReportID')
         return WholeTimeFramesWeeklyYekanReportTfm
 
-    def build_FundsProcessedTfm(self):
+    def build_FundsProcessedTfm(self, columns=None, filters=None):
         FundsProcessedVfm = self.build_table_dataframe('IranMarketMaker.db',
-                                                                  'FundsProcessedVfm',
-                                                                  'TimeFrameReportID')
+                                                       'FundsProcessedVfm',
+                                                       'TimeFrameReportID',
+                                                       columns=columns, filters=filters)
         return FundsProcessedVfm
 
     # def build_GeneralHoldingsProcessedTfm(self):
@@ -113,11 +114,11 @@ class IranMarketMakerTableFrameBuilder(DataHelper):
 
         return FundsInvestorsHelperTfm
 
-    def build_FundsInvestorsProcessedTfm(self):
+    def build_FundsInvestorsProcessedTfm(self, columns=None, filters=None):
         FundsInvestorsProcessedTfm = self.build_table_dataframe('IranMarketMaker.db',
-                                                                        'FundsInvestorsProcessedVfm',
-                                                                        'ReportTimeFrameIssuanceCancellationID')
-
+                                                                'FundsInvestorsProcessedVfm',
+                                                                'ReportTimeFrameIssuanceCancellationID',
+                                                                columns=columns, filters=filters)
         return FundsInvestorsProcessedTfm
 
     def build_InvestorsProcessedTfm(self):
@@ -141,6 +142,13 @@ class IranMarketMakerTableFrameBuilder(DataHelper):
 
         return GeneralInvestorsProcessedTfm
 
+    def build_InvestorPositionLedgerTfm(self):
+        InvestorPositionLedgerTfm = self.build_table_dataframe('IranMarketMaker.db',
+                                                               'InvestorPositionLedgerTbl',
+                                                               'PositionEventID')
+
+        return InvestorPositionLedgerTfm
+
 class BasicDataBaseTableFrame(DataHelper):
     # Todo: All classes that use dataframe tables must inherit from this class ->1402/08/10 -> 1402/08/30
     def __init__(self):
@@ -184,13 +192,13 @@ class IranStockTableFrameBuilder(DataHelper):
     def build_IranStockIntraMarketWatchTfm(self):
         IranStockIntraMarketWatchTfm = self.build_table_dataframe('IranStockDataBase.db',
                                                                   'IranStockIntraMarketWatchTbl',
-                                                                  'IntraMarketWatchKey')
+                                                                  'IntraMarketWatchKey', apply_schema=True)
         return IranStockIntraMarketWatchTfm
 
     def build_IranStockIntraOrderBookTfm(self):
         IranStockIntraMarketWatchTfm = self.build_table_dataframe('IranStockDataBase.db',
                                                                   'IranStockIntraOrderBookTblCreator',
-                                                                  'IntraMarketWatchKey')
+                                                                  'IntraMarketWatchKey', apply_schema=True)
         return IranStockIntraMarketWatchTfm
 
     def build_IranStockKeyStatesTfm(self):
@@ -199,10 +207,11 @@ class IranStockTableFrameBuilder(DataHelper):
                                                            'IntraMarketWatchKey')
         return IranStockKeyStatesTfm
 
-    def build_PreprocessedIranMarketPricesTfm(self):
+    def build_PreprocessedIranMarketPricesTfm(self, columns=None, filters=None):
         PreprocessedIranMarketPricesTfm = self.build_table_dataframe('IranStockDataBase.db',
                                                                      'PreprocessedIranMarketPricesTbl',
-                                                                     'PriceKey')
+                                                                     'PriceKey',
+                                                                     columns=columns, filters=filters)
         return PreprocessedIranMarketPricesTfm
 
 
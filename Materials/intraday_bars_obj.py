@@ -0,0 +1,231 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+from RawMaterials.table_schema_obj import TableSchemaRegistry
+from RawMaterials.time_bucket_obj import TimeBucketAggregator
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class StreamingBarBuilder(DataHelper):
+    """
+    Build 1, 5 and 15 minute OHLCV bars from market watch snapshots as they arrive.
+
+    Snapshots carry the last price and the cumulative day volume of every symbol. The builder keeps, per symbol, the
+    last cumulative volume and one open bar per time frame, so memory stays O(symbols) however long the stream is.
+    A bar is closed as soon as a snapshot arrives past its end, whether or not the symbol is in that snapshot, so
+    delta-encoded snapshots (only the changed symbols) work as well as full ones. A symbol without trades in a bar
+    has no bar.
+
+    Closed bars are buffered and written to IntraOHLCVBarsTbl with flush(); bars are keyed by
+    (Symbol, TimeFrame, GDate, BarTime), so replaying the same snapshots again rewrites the same rows.
+
+    Usage:
+        builder = StreamingBarBuilder(db_name)
+        builder.consume(snapshot_df)            # live, one snapshot at a time
+        builder.flush()
+        builder.replay_table()                  # or rebuild from RawIranStockIntraMarketWatchTbl
+    """
+
+    BARS_TABLE = "IntraOHLCVBarsTbl"
+    SOURCE_TABLE = "RawIranStockIntraMarketWatchTbl"
+    TIME_FRAMES = {"1min": 60, "5min": 300, "15min": 900}
+    BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "SnapshotCount"]
+
+    def __init__(self, db_name, symbol_column="IranSymbol", date_column="GDate", time_column="Time",
+                 price_column="Close", volume_column="Volume", time_frames=None):
+        super().__init__()
+        self.db_name = db_name
+        self.symbol_column = symbol_column
+        self.date_column = date_column
+        self.time_column = time_column
+        self.price_column = price_column
+        self.volume_column = volume_column
+        self.time_frames = time_frames or self.TIME_FRAMES
+
+        self.current_date = None
+        self.last_seconds = None
+        self.last_volume = pd.Series(dtype=np.float64)
+        self.open_bars = {time_frame: self.empty_bars() for time_frame in self.time_frames}
+        self.closed_bars = []
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def empty_bars(self):
+        return pd.DataFrame({"BarSeconds": pd.Series(dtype=np.int64),
+                             **{column: pd.Series(dtype=np.float64) for column in self.BAR_COLUMNS}},
+                            index=pd.Index([], name="Symbol"))
+
+    def reset(self):
+        """
+        Close every open bar and forget the volume state, e.g. at the end of a day.
+        """
+        for time_frame in self.time_frames:
+            self.close_bars(time_frame, None)
+        self.last_volume = pd.Series(dtype=np.float64)
+        self.last_seconds = None
+
+    def close_bars(self, time_frame, before_seconds):
+        """
+        Move the open bars of a time frame that started before before_seconds (all bars when None) to the buffer.
+        """
+        open_bars = self.open_bars[time_frame]
+        if open_bars.empty:
+            return
+        closing = np.ones(len(open_bars), dtype=bool) if before_seconds is None else \
+            open_bars["BarSeconds"].to_numpy() < before_seconds
+
+        if closing.any():
+            bars = open_bars[closing].reset_index()
+            bars.insert(1, "TimeFrame", time_frame)
+            bars.insert(2, "GDate", self.current_date)
+            bars.insert(3, "BarTime", TimeBucketAggregator.to_times(bars["BarSeconds"]).to_numpy())
+            self.closed_bars.append(bars)
+            self.open_bars[time_frame] = open_bars[~closing]
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def consume(self, snapshot_df):
+        """
+        Update the bars with one snapshot. Snapshots must arrive in time order; an older one is ignored.
+
+        Args:
+            snapshot_df (pd.DataFrame): One snapshot with the symbol, date, time, price and cumulative volume columns.
+
+        Returns:
+            int: Number of closed bars waiting in the buffer.
+        """
+        if snapshot_df.empty:
+            return sum(len(bars) for bars in self.closed_bars)
+
+        snapshot_date = str(snapshot_df[self.date_column].iat[0])
+        snapshot_seconds = int(TimeBucketAggregator.to_seconds(snapshot_df[self.time_column].iloc[:1]).iat[0])
+        if snapshot_date != self.current_date:
+            self.reset()
+            self.current_date = snapshot_date
+        elif self.last_seconds is not None and snapshot_seconds < self.last_seconds:
+            return sum(len(bars) for bars in self.closed_bars)
+        self.last_seconds = snapshot_seconds
+
+        snapshot_df = snapshot_df.drop_duplicates(subset=[self.symbol_column], keep="last")
+        symbols = pd.Index(snapshot_df[self.symbol_column].astype(str), name="Symbol")
+        prices = pd.Series(pd.to_numeric(snapshot_df[self.price_column], errors="coerce").to_numpy(), index=symbols)
+        volumes = pd.Series(pd.to_numeric(snapshot_df[self.volume_column], errors="coerce").to_numpy(), index=symbols)
+
+        # Volume traded since the previous snapshot; a symbol seen for the first time brings its whole day volume
+        previous_volumes = self.last_volume.reindex(symbols).fillna(0)
+        traded = (volumes - previous_volumes).clip(lower=0).fillna(0)
+        self.last_volume = volumes.combine_first(self.last_volume) if len(self.last_volume) else volumes.copy()
+
+        # Symbols without a trade price yet do not open bars
+        prices = prices.where(prices > 0)
+        active = prices.notna()
+
+        for time_frame, frame_seconds in self.time_frames.items():
+            bar_seconds = snapshot_seconds // frame_seconds * frame_seconds
+            self.close_bars(time_frame, bar_seconds)
+            self.update_bars(time_frame, bar_seconds, prices[active], traded[active])
+
+        return sum(len(bars) for bars in self.closed_bars)
+
+    def update_bars(self, time_frame, bar_seconds, prices, traded):
+        open_bars = self.open_bars[time_frame]
+        continuing = prices.index.isin(open_bars.index)
+
+        existing = open_bars.loc[prices.index[continuing]]
+        existing_prices = prices[continuing]
+        open_bars.loc[existing.index, "High"] = np.maximum(existing["High"], existing_prices)
+        open_bars.loc[existing.index, "Low"] = np.minimum(existing["Low"], existing_prices)
+        open_bars.loc[existing.index, "Close"] = existing_prices
+        open_bars.loc[existing.index, "Volume"] = existing["Volume"] + traded[continuing]
+        open_bars.loc[existing.index, "SnapshotCount"] = existing["SnapshotCount"] + 1
+
+        new_prices = prices[~continuing]
+        if len(new_prices):
+            new_bars = pd.DataFrame({"BarSeconds": bar_seconds, "Open": new_prices, "High": new_prices,
+                                     "Low": new_prices, "Close": new_prices, "Volume": traded[~continuing],
+                                     "SnapshotCount": 1.0}, index=new_prices.index)
+            open_bars = new_bars if open_bars.empty else pd.concat([open_bars, new_bars])
+        self.open_bars[time_frame] = open_bars
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def pop_closed_bars(self):
+        """
+        Return and clear the buffered closed bars.
+        """
+        if not self.closed_bars:
+            return pd.DataFrame()
+        bars_df = pd.concat(self.closed_bars, ignore_index=True)
+        self.closed_bars = []
+        bars_df["Volume"] = bars_df["Volume"].round().astype("int64")
+        bars_df["SnapshotCount"] = bars_df["SnapshotCount"].astype("int64")
+        return bars_df
+
+    def write_bars(self, bars_df, conn):
+        if bars_df.empty:
+            return 0
+        return self.bulk_write_table(bars_df, self.BARS_TABLE, conn, dtype=TableSchemaRegistry.sql_types(self.BARS_TABLE),
+                                     mode="upsert", key_columns=["Symbol", "TimeFrame", "GDate", "BarTime"])
+
+    def flush(self):
+        """
+        Write the closed bars to IntraOHLCVBarsTbl.
+
+        Returns:
+            int: Number of bars written.
+        """
+        bars_df = self.pop_closed_bars()
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        try:
+            return self.write_bars(bars_df, conn)
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def replay_table(self, incremental=True):
+        """
+        Rebuild bars from the snapshots in RawIranStockIntraMarketWatchTbl.
+
+        Args:
+            incremental (bool, optional): Start from the last day that already has bars; that day is replayed again
+                                          so its bars are completed. False replays the whole table. Default is True.
+
+        Returns:
+            int: Number of bars written.
+        """
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        try:
+            start_date = self.read_table_watermark(conn, self.BARS_TABLE, "GDate") if incremental else None
+            columns = ", ".join(f'"{column}"' for column in
+                                [self.symbol_column, self.date_column, self.time_column, self.price_column,
+                                 self.volume_column])
+            condition = f' WHERE "{self.date_column}" >= ?' if start_date is not None else ""
+            snapshots_df = pd.read_sql_query(
+                f'SELECT {columns} FROM "{self.SOURCE_TABLE}"{condition} '
+                f'ORDER BY "{self.date_column}", "{self.time_column}"', conn,
+                params=(start_date,) if start_date is not None else None)
+
+            bars_written = 0
+            for _, snapshot_df in snapshots_df.groupby([self.date_column, self.time_column], sort=False):
+                if self.consume(snapshot_df) >= 50000:
+                    bars_written += self.write_bars(self.pop_closed_bars(), conn)
+            self.reset()
+            bars_written += self.write_bars(self.pop_closed_bars(), conn)
+        finally:
+            conn.close()
+
+        print(f"{bars_written} bars written to {self.BARS_TABLE}.")
+        return bars_written
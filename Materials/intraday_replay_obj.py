@@ -0,0 +1,281 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import heapq
+import itertools
+import sqlite3
+import time
+from datetime import datetime
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class IntradayReplayEngine(DataHelper):
+    """
+    Replay stored intraday snapshots in timestamp order, merged across tables.
+
+    Every source table is read through one cursor per symbol, ordered by its stored date and time columns and fetched
+    in small chunks, so memory holds chunk_rows rows per cursor and not whole tables. The filters and the sort use the
+    stored columns, not a computed timestamp, so the (symbol, date, time) index that the collectors create on their
+    tables serves both. The replay opens the database read-only and never creates indexes on the source tables. The
+    cursors are merged with a heap keyed by (timestamp, source, symbol). Rows of one source with the same timestamp
+    are emitted together as one event frame, i.e. one snapshot as the collector saw it.
+
+    Pacing:
+        speed=None   As fast as possible, for benchmarks and regression runs.
+        speed=1.0    Real time.
+        speed=N      N times faster than real time.
+    Gaps longer than max_gap_seconds (nights, market breaks) are shortened to max_gap_seconds of replay time.
+
+    Usage:
+        engine = IntradayReplayEngine(db_name, speed=10, start="2024-01-06 09:00:00", end="2024-01-06 12:30:00")
+        engine.add_raw_market_watch()
+        engine.add_raw_order_book()
+        engine.add_legacy_daily_tables()
+        bars = StreamingBarBuilder(db_name)
+        stats = engine.run({"RawIranStockIntraMarketWatchTbl": lambda timestamp, frame: bars.consume(frame)})
+    """
+
+    TIMESTAMP_COLUMN = "ReplayTimestamp"
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+    LEGACY_TABLE_PREFIX = "market_data_"
+
+    def __init__(self, db_name, speed=None, start=None, end=None, symbols=None, chunk_rows=256, max_gap_seconds=60):
+        super().__init__()
+        self.db_name = db_name
+        self.speed = speed
+        self.start = start
+        self.end = end
+        self.symbols = None if symbols is None else [str(symbol) for symbol in symbols]
+        self.chunk_rows = chunk_rows
+        self.max_gap_seconds = max_gap_seconds
+        self.sources = []
+        self.source_columns = []
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def connect_read_only(self):
+        return sqlite3.connect(f"file:{self.db_name}?mode=ro", uri=True, timeout=60)
+
+    def add_source(self, name, table_name, symbol_column, time_column, date_column=None, table_date=None):
+        """
+        Register a table to replay.
+
+        Args:
+            name (str): The source name given to consumers.
+            table_name (str): The table.
+            symbol_column (str): The symbol column; one cursor is opened per symbol.
+            time_column (str): The 'HH:MM:SS' snapshot time column.
+            date_column (str, optional): The 'YYYY-MM-DD' snapshot date column.
+            table_date (str, optional): The date of every row, for tables without a date column.
+        """
+        if (date_column is None) == (table_date is None):
+            raise ValueError(f"{table_name} needs exactly one of date_column and table_date")
+        self.sources.append({"name": name, "table": table_name, "symbol_column": symbol_column,
+                             "time_column": time_column, "date_column": date_column, "table_date": table_date})
+
+    def add_raw_market_watch(self):
+        self.add_source("RawIranStockIntraMarketWatchTbl", "RawIranStockIntraMarketWatchTbl", "IranSymbol", "Time",
+                        date_column="GDate")
+
+    def add_raw_order_book(self):
+        self.add_source("RawIranStockIntraOrderBookTbl", "RawIranStockIntraOrderBookTbl", "IranSymbol", "Time",
+                        date_column="GDate")
+
+    def add_collector_snapshots(self):
+        self.add_source("IntraMarketWatchSnapshotsTbl", "IntraMarketWatchSnapshotsTbl", "Ticker", "SnapshotTime",
+                        date_column="SnapshotDate")
+
+    def add_legacy_daily_tables(self):
+        """
+        Register the market_data_<date> tables of the old collector under the source name 'market_data'. They have
+        no snapshot time, so the TSE update time of each row (the Time column) is used with the date of the table.
+        """
+        conn = self.connect_read_only()
+        try:
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name",
+                (self.LEGACY_TABLE_PREFIX + "%",)).fetchall()]
+        finally:
+            conn.close()
+
+        for table_name in tables:
+            table_date = table_name[len(self.LEGACY_TABLE_PREFIX):]
+            if (self.start is not None and table_date < self.start[:10]) or \
+                    (self.end is not None and table_date > self.end[:10]):
+                continue
+            self.add_source("market_data", table_name, "Ticker", "Time", table_date=table_date)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def split_bound(bound):
+        """
+        Split a 'YYYY-MM-DD HH:MM:SS' bound into its date and time; the time is '' for a date alone.
+        """
+        return bound[:10], bound[11:19]
+
+    def range_conditions(self, source):
+        """
+        WHERE conditions and parameters of the start/end window on the stored date and time columns.
+        """
+        time_column, date_column = f'"{source["time_column"]}"', source["date_column"]
+        conditions, bounds = [f"{time_column} IS NOT NULL"], []
+        for bound, operator in ((self.start, ">="), (self.end, "<=")):
+            if bound is None:
+                continue
+            bound_date, bound_time = self.split_bound(bound)
+            if date_column is not None:
+                conditions.append(f'("{date_column}", {time_column}) {operator} (?, ?)')
+                bounds.extend([bound_date, bound_time])
+            elif source["table_date"] == bound_date:
+                conditions.append(f"{time_column} {operator} ?")
+                bounds.append(bound_time)
+        if date_column is not None:
+            conditions.append(f'"{date_column}" IS NOT NULL')
+        return conditions, bounds
+
+    def open_symbol_cursors(self, conn, source):
+        """
+        One ordered row iterator per symbol of a source.
+        """
+        table_name, symbol_column = source["table"], source["symbol_column"]
+        symbols = [row[0] for row in conn.execute(f'SELECT DISTINCT "{symbol_column}" FROM "{table_name}"')]
+        if self.symbols is not None:
+            symbols = [symbol for symbol in symbols if str(symbol) in self.symbols]
+
+        time_column = f'"{source["time_column"]}"'
+        if source["date_column"] is not None:
+            date_sql = f'"{source["date_column"]}"'
+            order_sql = f"{date_sql}, {time_column}, rowid"
+        else:
+            date_sql = f"'{source['table_date']}'"
+            order_sql = f"{time_column}, rowid"
+
+        conditions, bounds = self.range_conditions(source)
+        sql = f'SELECT {date_sql} || \' \' || {time_column} AS "{self.TIMESTAMP_COLUMN}", * FROM "{table_name}" ' \
+              f'WHERE "{symbol_column}" = ? AND {" AND ".join(conditions)} ORDER BY {order_sql}'
+
+        cursors = []
+        for symbol in symbols:
+            cursor = conn.cursor()
+            cursor.execute(sql, (symbol, *bounds))
+            cursors.append((symbol, cursor))
+        return cursors
+
+    def iterate_cursor(self, cursor):
+        rows = cursor.fetchmany(self.chunk_rows)
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(self.chunk_rows)
+
+    def merged_rows(self, conn):
+        """
+        Yield (timestamp, source index, row) in timestamp order with a heap over the per-symbol cursors.
+        """
+        heap = []
+        tie_breaker = itertools.count()
+        self.source_columns = []
+
+        for source_index, source in enumerate(self.sources):
+            cursors = self.open_symbol_cursors(conn, source)
+            columns = None
+            for symbol, cursor in cursors:
+                columns = [description[0] for description in cursor.description]
+                rows = self.iterate_cursor(cursor)
+                first_row = next(rows, None)
+                if first_row is not None:
+                    heapq.heappush(heap, (first_row[0], source_index, next(tie_breaker), first_row, rows))
+            self.source_columns.append(columns)
+
+        while heap:
+            timestamp, source_index, _, row, rows = heap[0]
+            yield timestamp, source_index, row
+            next_row = next(rows, None)
+            if next_row is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (next_row[0], source_index, next(tie_breaker), next_row, rows))
+
+    def events(self):
+        """
+        Yield (timestamp, source name, frame) events, one per source and timestamp, paced by speed.
+        """
+        conn = self.connect_read_only()
+        try:
+            batch, batch_key = [], None
+            clock = {"replay_seconds": 0.0, "last_timestamp": None, "started": time.perf_counter()}
+
+            for timestamp, source_index, row in self.merged_rows(conn):
+                if batch and (timestamp, source_index) != batch_key:
+                    yield self.make_event(batch_key, batch, clock)
+                    batch = []
+                batch_key = (timestamp, source_index)
+                batch.append(row)
+            if batch:
+                yield self.make_event(batch_key, batch, clock)
+        finally:
+            conn.close()
+
+    def make_event(self, batch_key, batch, clock):
+        timestamp, source_index = batch_key
+        self.wait_for(timestamp, clock)
+        frame = pd.DataFrame.from_records(batch, columns=self.source_columns[source_index])
+        return timestamp, self.sources[source_index]["name"], frame
+
+    def wait_for(self, timestamp, clock):
+        """
+        Sleep until the replay clock reaches timestamp; no-op when replaying as fast as possible.
+        """
+        if self.speed is None:
+            return
+        try:
+            current = datetime.strptime(timestamp[:19], self.TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            return
+        if clock["last_timestamp"] is not None:
+            gap = (current - clock["last_timestamp"]).total_seconds()
+            clock["replay_seconds"] += min(max(gap, 0.0), self.max_gap_seconds)
+        clock["last_timestamp"] = current
+
+        delay = clock["started"] + clock["replay_seconds"] / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def run(self, consumers):
+        """
+        Replay all sources into consumers and return throughput statistics.
+
+        Args:
+            consumers (dict): Callables by source name, called as consumer(timestamp, frame). The key '*' receives
+                              the events of every source.
+
+        Returns:
+            dict: events, rows, wall_seconds and rows_per_second.
+        """
+        started = time.perf_counter()
+        events, rows = 0, 0
+        for timestamp, source_name, frame in self.events():
+            for consumer in (consumers.get(source_name), consumers.get("*")):
+                if consumer is not None:
+                    consumer(timestamp, frame)
+            events += 1
+            rows += len(frame)
+
+        wall_seconds = time.perf_counter() - started
+        stats = {"events": events, "rows": rows, "wall_seconds": wall_seconds,
+                 "rows_per_second": rows / wall_seconds if wall_seconds else 0.0}
+        print(f"Replayed {rows} rows in {events} events in {wall_seconds:.2f}s "
+              f"({stats['rows_per_second']:.0f} rows/s).")
+        return stats
@@ -0,0 +1,244 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pandas as pd
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class SnapshotDeltaEncoder:
+    """
+    Store market watch snapshots as changes against the previous snapshot, with periodic full keyframes.
+
+    The encoder keeps the last snapshot of every symbol in memory. encode() returns all rows of a keyframe snapshot
+    (IsKeyframe = 1) and, between keyframes, only the rows of symbols whose values changed or that are new
+    (IsKeyframe = 0). A keyframe is written every keyframe_every snapshots, so reconstruction never has to reach far
+    back. A symbol that disappears from a snapshot keeps its last values until the next keyframe.
+
+    Usage:
+        encoder = SnapshotDeltaEncoder("IranSymbol", ignore_columns=["JDownloadDateTime"])
+        rows_to_store = encoder.encode(snapshot_df)
+        snapshot_df = SnapshotDeltaEncoder.reconstruct(stored_df, "1402-10-05 10:30:00", "JDownloadDateTime", "IranSymbol")
+        dense_df = SnapshotDeltaEncoder.expand(stored_df, "JDownloadDateTime", "IranSymbol")
+    """
+
+    KEYFRAME_COLUMN = "IsKeyframe"
+
+    def __init__(self, key_column, ignore_columns=None, keyframe_every=60):
+        self.key_column = key_column
+        self.ignore_columns = set(ignore_columns or [])
+        self.keyframe_every = keyframe_every
+        self.last_snapshot = None
+        self.snapshots_since_keyframe = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def reset(self):
+        self.last_snapshot = None
+        self.snapshots_since_keyframe = 0
+
+    def prime(self, last_snapshot, snapshots_since_keyframe=0):
+        """
+        Continue from a stored state, e.g. the snapshot reconstructed from the table at its latest time.
+        """
+        if last_snapshot is None or last_snapshot.empty:
+            self.reset()
+            return
+        last_snapshot = last_snapshot.drop(columns=[self.KEYFRAME_COLUMN], errors="ignore")
+        self.last_snapshot = last_snapshot.drop_duplicates(subset=[self.key_column], keep="last") \
+            .set_index(self.key_column)
+        self.snapshots_since_keyframe = snapshots_since_keyframe
+
+    def next_is_keyframe(self):
+        return self.last_snapshot is None or self.snapshots_since_keyframe >= self.keyframe_every - 1
+
+    def value_columns(self, df):
+        return [column for column in df.columns if column != self.key_column and column not in self.ignore_columns]
+
+    def changed_rows_mask(self, snapshot):
+        """
+        True for the rows of snapshot that are new or differ from the last snapshot in a value column.
+        """
+        indexed = snapshot.set_index(self.key_column)
+        previous = self.last_snapshot.reindex(indexed.index)
+        is_new = ~indexed.index.isin(self.last_snapshot.index)
+
+        changed = pd.Series(is_new, index=indexed.index)
+        for column in self.value_columns(snapshot):
+            if column not in previous.columns:
+                return pd.Series(True, index=snapshot.index)
+            current_values = indexed[column]
+            previous_values = previous[column]
+            both_missing = current_values.isna() & previous_values.isna()
+            differs = (current_values != previous_values) & ~both_missing
+            changed |= differs.to_numpy()
+        return pd.Series(changed.to_numpy(), index=snapshot.index)
+
+    def encode(self, snapshot):
+        """
+        Return the rows of a snapshot that have to be stored, with the IsKeyframe column.
+
+        Args:
+            snapshot (pd.DataFrame): One full snapshot, one row per key.
+
+        Returns:
+            pd.DataFrame: The full snapshot on keyframes, only the changed rows otherwise.
+        """
+        snapshot = snapshot.drop_duplicates(subset=[self.key_column], keep="last")
+        is_keyframe = self.next_is_keyframe()
+
+        if is_keyframe:
+            rows = snapshot.copy()
+            self.snapshots_since_keyframe = 0
+        else:
+            rows = snapshot[self.changed_rows_mask(snapshot)].copy()
+            self.snapshots_since_keyframe += 1
+
+        rows[self.KEYFRAME_COLUMN] = int(is_keyframe)
+
+        indexed = snapshot.set_index(self.key_column)
+        if self.last_snapshot is None or is_keyframe:
+            self.last_snapshot = indexed
+        else:
+            missing = self.last_snapshot.loc[~self.last_snapshot.index.isin(indexed.index)]
+            self.last_snapshot = pd.concat([indexed, missing]) if len(missing) else indexed
+        return rows
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def reconstruct(cls, stored_df, at, time_column, key_column):
+        """
+        Rebuild the full snapshot at a timestamp from stored keyframe and delta rows.
+
+        Args:
+            stored_df (pd.DataFrame): Stored rows with the IsKeyframe column, covering at least the last keyframe
+                                      before `at`.
+            at: The timestamp, comparable with time_column.
+            time_column (str): The snapshot time column, e.g. 'JDownloadDateTime'.
+            key_column (str): The symbol column.
+
+        Returns:
+            pd.DataFrame: One row per key with the latest values at `at`; empty when no keyframe precedes it.
+        """
+        stored_df = stored_df[stored_df[time_column] <= at]
+        keyframe_times = stored_df.loc[stored_df[cls.KEYFRAME_COLUMN] == 1, time_column]
+        if keyframe_times.empty:
+            return stored_df.iloc[0:0].drop(columns=[cls.KEYFRAME_COLUMN])
+
+        stored_df = stored_df[stored_df[time_column] >= keyframe_times.max()]
+        snapshot = stored_df.sort_values(time_column, kind="stable") \
+            .drop_duplicates(subset=[key_column], keep="last")
+        snapshot = snapshot.sort_values(key_column, kind="stable")
+        return snapshot.drop(columns=[cls.KEYFRAME_COLUMN]).reset_index(drop=True)
+
+    @staticmethod
+    def match_dtypes(df, reference_df):
+        """
+        Cast the columns of df to the dtypes of reference_df where the values allow it, so frames read in different
+        ways (e.g. a raw snapshot and compacted rows) can be concatenated without mixing dtypes.
+        """
+        for column_name, dtype in reference_df.dtypes.items():
+            if column_name in df.columns and df[column_name].dtype != dtype:
+                try:
+                    df[column_name] = df[column_name].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return df
+
+    @classmethod
+    def expand(cls, stored_df, time_column, key_column, snapshot_columns=(), initial_snapshot=None):
+        """
+        Rebuild the full snapshot of every stored time, in time order, from keyframe and delta rows.
+
+        The rows a snapshot carries over from earlier times get the snapshot_columns (download time, date, ...) of
+        the time they are carried to. A time at which no symbol changed has no stored rows and cannot be rebuilt.
+
+        Args:
+            stored_df (pd.DataFrame): Stored rows with the IsKeyframe column.
+            time_column (str): The snapshot time column, e.g. 'JDownloadDateTime'.
+            key_column (str): The symbol column.
+            snapshot_columns (list, optional): Columns that belong to the snapshot time rather than to the symbol.
+            initial_snapshot (pd.DataFrame, optional): The full snapshot before the first stored time, e.g. from
+                                                       load_snapshot, for stored rows that do not start with a
+                                                       keyframe.
+
+        Returns:
+            pd.DataFrame: One row per time and key, without the IsKeyframe column.
+        """
+        if stored_df.empty:
+            return stored_df.drop(columns=[cls.KEYFRAME_COLUMN], errors="ignore")
+
+        # Categoricals of the two inputs have different categories; the rows are combined as plain values
+        categorical_columns = [column_name for column_name, dtype in stored_df.dtypes.items()
+                               if isinstance(dtype, pd.CategoricalDtype)]
+        if categorical_columns:
+            stored_df = stored_df.astype({column_name: object for column_name in categorical_columns})
+
+        current = None
+        if initial_snapshot is not None and not initial_snapshot.empty:
+            initial_snapshot = cls.match_dtypes(initial_snapshot.reindex(columns=stored_df.columns), stored_df)
+            current = initial_snapshot.set_index(key_column)
+
+        snapshot_columns = [column for column in snapshot_columns if column in stored_df.columns]
+        snapshots = []
+        for _, rows in stored_df.sort_values(time_column, kind="stable").groupby(time_column, sort=True):
+            rows = rows.drop_duplicates(subset=[key_column], keep="last").set_index(key_column)
+            if current is None or (rows[cls.KEYFRAME_COLUMN] == 1).any():
+                current = rows
+            else:
+                carried = current.loc[~current.index.isin(rows.index)].copy()
+                for column in snapshot_columns:
+                    carried[column] = rows[column].iloc[0]
+                current = pd.concat([rows, carried])
+            snapshots.append(current)
+
+        expanded_df = pd.concat(snapshots).reset_index()
+        return expanded_df.drop(columns=[cls.KEYFRAME_COLUMN])[stored_df.columns.drop(cls.KEYFRAME_COLUMN)]
+
+    @classmethod
+    def load_snapshot(cls, conn, table_name, at, time_column, key_column, where_sql="", params=()):
+        """
+        Read only the rows needed to rebuild the snapshot at `at` from a table and reconstruct it.
+
+        Args:
+            conn: The database connection object.
+            table_name (str): The delta-encoded table.
+            at: The timestamp.
+            time_column (str): The snapshot time column.
+            key_column (str): The symbol column.
+            where_sql (str, optional): An extra condition, e.g. '"SnapshotDate" = ?'.
+            params (tuple, optional): Parameters of where_sql.
+
+        Returns:
+            pd.DataFrame: The snapshot at `at`.
+        """
+        condition = f" AND {where_sql}" if where_sql else ""
+        try:
+            keyframe_time = conn.execute(
+                f'SELECT MAX("{time_column}") FROM "{table_name}" WHERE "{cls.KEYFRAME_COLUMN}" = 1 '
+                f'AND "{time_column}" <= ?{condition}', (at, *params)).fetchone()[0]
+        except sqlite3.OperationalError:
+            return pd.DataFrame()
+        if keyframe_time is None:
+            return pd.DataFrame()
+
+        stored_df = pd.read_sql_query(
+            f'SELECT * FROM "{table_name}" WHERE "{time_column}" >= ? AND "{time_column}" <= ?{condition}', conn,
+            params=(keyframe_time, at, *params))
+        return cls.reconstruct(stored_df, at, time_column, key_column)
+
+    @classmethod
+    def snapshots_since_last_keyframe(cls, conn, table_name, time_column, where_sql="", params=()):
+        condition = f" AND {where_sql}" if where_sql else ""
+        try:
+            row = conn.execute(
+                f'SELECT COUNT(DISTINCT "{time_column}") - 1 FROM "{table_name}" WHERE "{time_column}" >= '
+                f'(SELECT MAX("{time_column}") FROM "{table_name}" WHERE "{cls.KEYFRAME_COLUMN}" = 1{condition})'
+                f'{condition}', (*params, *params)).fetchone()
+        except sqlite3.OperationalError:
+            return 0
+        return max(row[0] or 0, 0)
@@ -0,0 +1,239 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import threading
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class LatestSnapshotStore:
+    """
+    The latest market watch row of every symbol, kept in memory as NumPy columns.
+
+    Every symbol gets a fixed row (its symbol ID) the first time it is seen. Numeric columns are float64 arrays and
+    the other columns object arrays, all of the same capacity, which doubles when it runs out. update() writes a
+    snapshot with one fancy assignment per column, so a snapshot of only the changed symbols updates just those rows.
+    latest() is a dict lookup plus one index per column; cross_section() gathers any set of rows with one fancy index
+    per column. Named groups (e.g. the market-maker symbols) are stored as row arrays.
+
+    Updates and reads take a lock, so the collector can update the store while the local query endpoint serves
+    readers from its own threads.
+
+    Usage:
+        store = LatestSnapshotStore("Ticker")
+        store.update(snapshot_df)
+        store.set_group("market_maker", market_maker_symbols)
+        row = store.latest("فولاد")
+        df = store.cross_section(group="market_maker")
+        store.start_server(8765)          # GET http://127.0.0.1:8765/latest?symbol=...
+    """
+
+    def __init__(self, key_column, initial_capacity=1024):
+        self.key_column = key_column
+        self.capacity = initial_capacity
+        self.symbol_ids = {}
+        self.symbols = np.empty(initial_capacity, dtype=object)
+        self.columns = {}
+        self.groups = {}
+        self.lock = threading.RLock()
+        self.server = None
+        self.server_thread = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.symbol_ids)
+
+    def grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        for column, values in self.columns.items():
+            grown = np.full(capacity, np.nan) if values.dtype == np.float64 else np.empty(capacity, dtype=object)
+            grown[:self.capacity] = values
+            self.columns[column] = grown
+        symbols = np.empty(capacity, dtype=object)
+        symbols[:self.capacity] = self.symbols
+        self.symbols = symbols
+        self.capacity = capacity
+
+    def rows_of(self, symbols, create=False):
+        """
+        Row numbers of symbols; unknown symbols get new rows when create is True and -1 otherwise.
+        """
+        rows = np.fromiter((self.symbol_ids.get(symbol, -1) for symbol in symbols), dtype=np.int64, count=len(symbols))
+        if create and (rows < 0).any():
+            new_symbols = list(dict.fromkeys(np.asarray(symbols, dtype=object)[rows < 0]))
+            first_row = len(self.symbol_ids)
+            self.grow(first_row + len(new_symbols))
+            for offset, symbol in enumerate(new_symbols):
+                self.symbol_ids[symbol] = first_row + offset
+                self.symbols[first_row + offset] = symbol
+            rows = np.fromiter((self.symbol_ids[symbol] for symbol in symbols), dtype=np.int64, count=len(symbols))
+        return rows
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def update(self, snapshot_df):
+        """
+        Write the rows of a snapshot over the stored rows of their symbols.
+
+        Args:
+            snapshot_df (pd.DataFrame): Snapshot rows with the key column; the key may also be the index.
+
+        Returns:
+            int: Number of rows written.
+        """
+        if self.key_column not in snapshot_df.columns and snapshot_df.index.name == self.key_column:
+            snapshot_df = snapshot_df.reset_index()
+        snapshot_df = snapshot_df.drop_duplicates(subset=[self.key_column], keep="last")
+        symbols = snapshot_df[self.key_column].astype(str).to_numpy(dtype=object)
+
+        with self.lock:
+            rows = self.rows_of(symbols, create=True)
+            for column in snapshot_df.columns:
+                if column == self.key_column:
+                    continue
+                series = snapshot_df[column]
+                is_numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+                if column not in self.columns:
+                    self.columns[column] = np.full(self.capacity, np.nan) if is_numeric else \
+                        np.empty(self.capacity, dtype=object)
+                target = self.columns[column]
+                if target.dtype == np.float64 and not is_numeric:
+                    target = self.columns[column] = target.astype(object)
+                target[rows] = series.to_numpy(dtype=np.float64, na_value=np.nan) if target.dtype == np.float64 \
+                    else series.to_numpy(dtype=object)
+        return len(rows)
+
+    def set_group(self, name, symbols):
+        """
+        Register a named set of symbols for cross-section queries. Symbols not seen yet get empty rows.
+        """
+        symbols = np.asarray([str(symbol) for symbol in symbols], dtype=object)
+        with self.lock:
+            self.groups[name] = self.rows_of(symbols, create=True)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def latest(self, symbol, columns=None):
+        """
+        The latest values of one symbol as a dict, or None when it has not been seen.
+        """
+        with self.lock:
+            row = self.symbol_ids.get(str(symbol))
+            if row is None:
+                return None
+            columns = columns or list(self.columns)
+            values = {self.key_column: symbol}
+            for column in columns:
+                value = self.columns[column][row]
+                values[column] = value.item() if isinstance(value, np.generic) else value
+        return values
+
+    def cross_section(self, symbols=None, group=None, column=None, value=None, columns=None):
+        """
+        The latest rows of many symbols at once.
+
+        Args:
+            symbols (list, optional): Symbols to return.
+            group (str, optional): A group registered with set_group.
+            column (str, optional): Filter on a column, e.g. 'Sector', together with value.
+            value (optional): The value of column to keep.
+            columns (list, optional): Columns to return. Default is all columns.
+
+        Returns:
+            pd.DataFrame: One row per matching symbol that has values.
+        """
+        with self.lock:
+            if symbols is not None:
+                rows = self.rows_of(np.asarray([str(symbol) for symbol in symbols], dtype=object))
+                rows = rows[rows >= 0]
+            elif group is not None:
+                rows = self.groups.get(group, np.empty(0, dtype=np.int64))
+            else:
+                rows = np.arange(len(self.symbol_ids))
+
+            if column is not None:
+                stored = self.columns[column][rows]
+                if stored.dtype == np.float64:
+                    rows = rows[stored == float(value)]
+                else:
+                    rows = rows[stored.astype(str) == str(value)]
+
+            columns = columns or list(self.columns)
+            df = pd.DataFrame({column_name: self.columns[column_name][rows].copy() for column_name in columns},
+                              index=pd.Index(self.symbols[rows].copy(), name=self.key_column))
+
+        return df.dropna(how="all").reset_index()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def make_handler(self):
+        store = self
+
+        class LatestSnapshotRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                columns = query["columns"].split(",") if "columns" in query else None
+                try:
+                    if url.path == "/latest":
+                        body, status = store.latest(query["symbol"], columns), 200
+                        if body is None:
+                            body, status = {"error": f"Unknown symbol {query['symbol']}"}, 404
+                    elif url.path == "/cross-section":
+                        symbols = query["symbols"].split(",") if "symbols" in query else None
+                        column, value = (("Sector", query["sector"]) if "sector" in query
+                                         else (query.get("column"), query.get("value")))
+                        df = store.cross_section(symbols, query.get("group"), column, value, columns)
+                        body, status = json.loads(df.to_json(orient="records", force_ascii=False)), 200
+                    elif url.path == "/symbols":
+                        body, status = sorted(store.symbol_ids), 200
+                    else:
+                        body, status = {"error": f"Unknown path {url.path}"}, 404
+                except (KeyError, ValueError) as e:
+                    body, status = {"error": str(e)}, 400
+
+                payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return LatestSnapshotRequestHandler
+
+    def start_server(self, port=8765, host="127.0.0.1"):
+        """
+        Serve the store as JSON on a local port in a background thread.
+
+        Paths:
+            /latest?symbol=<symbol>[&columns=a,b]
+            /cross-section?symbols=a,b | group=<name> | sector=<sector> | column=<column>&value=<value>
+            /symbols
+        """
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        print(f"Latest snapshot endpoint listening on http://{host}:{self.server.server_address[1]}")
+        return self.server.server_address[1]
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.server_thread = None
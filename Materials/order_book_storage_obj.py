@@ -0,0 +1,248 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+from RawMaterials.surrogate_keys_obj import SurrogateKeyEncoder
+from RawMaterials.table_schema_obj import TableSchemaRegistry
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class OrderBookLevelStore(DataHelper):
+    """
+    Order book snapshots stored as level changes in integer columns.
+
+    A snapshot of the 5-level book is split into one record per (symbol, side, depth). Only the records whose price,
+    volume or order count differ from the previous state of that level are stored, in IntraOrderBookLevelDiffTbl:
+
+        SnapshotSeconds  INTEGER  Unix seconds of the snapshot
+        SymbolCode       INTEGER  Symbol code from SurrogateKeysTbl
+        Side             INTEGER  0 = buy, 1 = sell
+        Depth            INTEGER  1..5
+        Price, Volume, OrderCount INTEGER
+
+    An empty level is stored as zeros, so a level that disappears is a change like any other. The times of all
+    snapshots are kept in IntraOrderBookSnapshotTimesTbl, because a snapshot with no change has no level rows.
+    reconstruct_book rebuilds the full book at every snapshot of a time range with one searchsorted over the sorted
+    (level, time) keys.
+
+    Usage:
+        store = OrderBookLevelStore(db_name)
+        store.append_snapshots(raw_order_book_df)
+        book_df = store.load_book("2024-01-06 09:00:00", "2024-01-06 12:30:00", symbols=["فولاد"])
+    """
+
+    LEVELS_TABLE = "IntraOrderBookLevelDiffTbl"
+    TIMES_TABLE = "IntraOrderBookSnapshotTimesTbl"
+    SIDES = {0: ("Buy-Price", "Buy-Vol", "Buy-No"), 1: ("Sell-Price", "Sell-Vol", "Sell-No")}
+    VALUE_COLUMNS = ["Price", "Volume", "OrderCount"]
+    DEPTH_FACTOR = 16
+
+    def __init__(self, db_name):
+        super().__init__()
+        self.db_name = db_name
+        self.encoder = SurrogateKeyEncoder()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def level_ids(cls, symbol_codes, sides, depths):
+        return (np.asarray(symbol_codes, dtype=np.int64) * 2 + np.asarray(sides, dtype=np.int64)) * cls.DEPTH_FACTOR \
+            + np.asarray(depths, dtype=np.int64)
+
+    @staticmethod
+    def snapshot_seconds(gregorian_dates, times):
+        date_times = pd.to_datetime(gregorian_dates.astype(str) + " " + times.astype(str), errors="coerce")
+        return (date_times - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+
+    def to_levels(self, raw_order_book_df):
+        """
+        Convert raw order book rows (one row per symbol, time and depth with Buy-* and Sell-* columns) to level
+        records in integer columns.
+        """
+        base = pd.DataFrame({
+            "SnapshotSeconds": self.snapshot_seconds(raw_order_book_df["GDate"], raw_order_book_df["Time"]),
+            "SymbolCode": self.encoder.encode_entity("Symbol", raw_order_book_df["Symbol"]),
+            "Depth": pd.to_numeric(raw_order_book_df["OB-Depth"], errors="coerce"),
+        })
+
+        sides = []
+        for side, (price_column, volume_column, count_column) in self.SIDES.items():
+            side_df = base.copy()
+            side_df.insert(2, "Side", side)
+            side_df["Price"] = pd.to_numeric(raw_order_book_df[price_column], errors="coerce").fillna(0)
+            side_df["Volume"] = pd.to_numeric(raw_order_book_df[volume_column], errors="coerce").fillna(0)
+            side_df["OrderCount"] = pd.to_numeric(raw_order_book_df[count_column], errors="coerce").fillna(0)
+            sides.append(side_df)
+
+        levels_df = pd.concat(sides, ignore_index=True).dropna(subset=["SnapshotSeconds", "SymbolCode", "Depth"])
+        levels_df = levels_df.astype({"SnapshotSeconds": "int64", "SymbolCode": "int64", "Side": "int8", "Depth": "int8",
+                                      "Price": "int64", "Volume": "int64", "OrderCount": "int32"})
+        return levels_df.drop_duplicates(subset=["SymbolCode", "Side", "Depth", "SnapshotSeconds"], keep="last")
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def load_last_levels(self, conn):
+        """
+        The last stored state of every level, used as the base of the next diff.
+        """
+        try:
+            return pd.read_sql_query(
+                f'SELECT l.* FROM "{self.LEVELS_TABLE}" l JOIN (SELECT SymbolCode, Side, Depth, '
+                f'MAX(SnapshotSeconds) AS SnapshotSeconds FROM "{self.LEVELS_TABLE}" GROUP BY SymbolCode, Side, Depth) m '
+                f'USING (SymbolCode, Side, Depth, SnapshotSeconds)', conn)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError):
+            return pd.DataFrame(columns=["SnapshotSeconds", "SymbolCode", "Side", "Depth"] + self.VALUE_COLUMNS)
+
+    def diff_levels(self, levels_df, last_levels_df):
+        """
+        Keep the level records that differ from the previous record of the same level.
+
+        The previous record is the stored state for the first snapshot of a level and the preceding snapshot for the
+        rest; both cases are handled in one sort-and-shift over the concatenated records.
+        """
+        last_levels_df = last_levels_df.assign(IsStored=True)
+        combined = pd.concat([last_levels_df, levels_df.assign(IsStored=False)], ignore_index=True)
+        combined = combined.sort_values(["SymbolCode", "Side", "Depth", "SnapshotSeconds", "IsStored"],
+                                        ascending=[True, True, True, True, False], kind="stable")
+
+        same_level = (combined[["SymbolCode", "Side", "Depth"]] ==
+                      combined[["SymbolCode", "Side", "Depth"]].shift()).all(axis=1)
+        same_values = (combined[self.VALUE_COLUMNS] == combined[self.VALUE_COLUMNS].shift()).all(axis=1)
+        changed = ~(same_level & same_values)
+
+        diff_df = combined[changed & ~combined["IsStored"].astype(bool)].drop(columns=["IsStored"])
+        return diff_df.reset_index(drop=True)
+
+    def append_snapshots(self, raw_order_book_df):
+        """
+        Store the level changes of raw order book snapshots newer than the last stored snapshot.
+
+        Args:
+            raw_order_book_df (pd.DataFrame): Rows of fetch_intra_tse_market_watch's order book with Symbol, GDate,
+                                              Time and OB-Depth columns.
+
+        Returns:
+            int: Number of level records written.
+        """
+        levels_df = self.to_levels(raw_order_book_df)
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        try:
+            # Diffs follow time order, so snapshots at or before the last stored one are not encoded again
+            last_snapshot_seconds = self.read_table_watermark(conn, self.TIMES_TABLE, "SnapshotSeconds")
+            if last_snapshot_seconds is not None:
+                levels_df = levels_df[levels_df["SnapshotSeconds"] > last_snapshot_seconds]
+            diff_df = self.diff_levels(levels_df, self.load_last_levels(conn))
+            times_df = pd.DataFrame({"SnapshotSeconds": np.unique(levels_df["SnapshotSeconds"].to_numpy())})
+
+            self.bulk_write_table(times_df, self.TIMES_TABLE, conn, dtype=TableSchemaRegistry.sql_types(self.TIMES_TABLE),
+                                  mode="insert_or_ignore")
+            self.bulk_write_table(diff_df, self.LEVELS_TABLE, conn, dtype=TableSchemaRegistry.sql_types(self.LEVELS_TABLE),
+                                  mode="insert_or_ignore",
+                                  key_columns=["SymbolCode", "Side", "Depth", "SnapshotSeconds"])
+        finally:
+            conn.close()
+
+        print(f"{len(diff_df)} of {len(levels_df)} order book levels changed.")
+        return len(diff_df)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def reconstruct_book(cls, levels_df, snapshot_seconds):
+        """
+        Rebuild the full book of every level at every snapshot time.
+
+        Args:
+            levels_df (pd.DataFrame): Level records, including the last record of each level before the first
+                                      snapshot time.
+            snapshot_seconds (array-like): The snapshot times to rebuild.
+
+        Returns:
+            pd.DataFrame: One row per snapshot time and level that had a state at that time.
+        """
+        snapshot_seconds = np.unique(np.asarray(snapshot_seconds, dtype=np.int64))
+        if levels_df.empty or snapshot_seconds.size == 0:
+            return pd.DataFrame(columns=["SnapshotSeconds", "SymbolCode", "Side", "Depth"] + cls.VALUE_COLUMNS)
+
+        level_ids = cls.level_ids(levels_df["SymbolCode"], levels_df["Side"], levels_df["Depth"])
+        times = levels_df["SnapshotSeconds"].to_numpy(dtype=np.int64)
+        time_span = np.int64(max(times.max(), snapshot_seconds.max()) + 1)
+
+        order = np.lexsort((times, level_ids))
+        sorted_keys = level_ids[order] * time_span + times[order]
+        sorted_levels = level_ids[order]
+
+        unique_levels = np.unique(level_ids)
+        query_levels = np.repeat(unique_levels, snapshot_seconds.size)
+        query_times = np.tile(snapshot_seconds, unique_levels.size)
+        positions = np.searchsorted(sorted_keys, query_levels * time_span + query_times, side="right") - 1
+
+        valid = positions >= 0
+        valid[valid] = sorted_levels[positions[valid]] == query_levels[valid]
+        source_rows = order[positions[valid]]
+
+        book_df = pd.DataFrame({
+            "SnapshotSeconds": query_times[valid],
+            "SymbolCode": levels_df["SymbolCode"].to_numpy(dtype=np.int64)[source_rows],
+            "Side": levels_df["Side"].to_numpy(dtype=np.int8)[source_rows],
+            "Depth": levels_df["Depth"].to_numpy(dtype=np.int8)[source_rows],
+        })
+        for column in cls.VALUE_COLUMNS:
+            book_df[column] = levels_df[column].to_numpy()[source_rows]
+        return book_df
+
+    def load_book(self, start_datetime, end_datetime, symbols=None):
+        """
+        Load the full order book of every snapshot between two Gregorian datetimes.
+
+        Args:
+            start_datetime (str): 'YYYY-MM-DD HH:MM:SS'.
+            end_datetime (str): 'YYYY-MM-DD HH:MM:SS'.
+            symbols (list, optional): Symbols to load. Default is all symbols.
+
+        Returns:
+            pd.DataFrame: The reconstructed book in integer columns with a Symbol column.
+        """
+        start_seconds = int((pd.Timestamp(start_datetime) - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1))
+        end_seconds = int((pd.Timestamp(end_datetime) - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1))
+
+        symbol_codes = self.encoder.load_entity_codes("Symbol")
+        symbol_names = {code: symbol for symbol, code in symbol_codes.items()}
+        symbol_filter, params = "", []
+        if symbols is not None:
+            codes = [symbol_codes[symbol] for symbol in symbols if symbol in symbol_codes]
+            symbol_filter = f" AND SymbolCode IN ({', '.join('?' for _ in codes) or 'NULL'})"
+            params = codes
+
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        try:
+            snapshot_seconds = pd.read_sql_query(
+                f'SELECT SnapshotSeconds FROM "{self.TIMES_TABLE}" WHERE SnapshotSeconds BETWEEN ? AND ?', conn,
+                params=(start_seconds, end_seconds))["SnapshotSeconds"].to_numpy()
+
+            # The state of each level at the start of the range, plus the changes inside it
+            base_df = pd.read_sql_query(
+                f'SELECT l.* FROM "{self.LEVELS_TABLE}" l JOIN (SELECT SymbolCode, Side, Depth, '
+                f'MAX(SnapshotSeconds) AS SnapshotSeconds FROM "{self.LEVELS_TABLE}" WHERE SnapshotSeconds <= ?'
+                f'{symbol_filter} GROUP BY SymbolCode, Side, Depth) m USING (SymbolCode, Side, Depth, SnapshotSeconds)',
+                conn, params=(start_seconds, *params))
+            changes_df = pd.read_sql_query(
+                f'SELECT * FROM "{self.LEVELS_TABLE}" WHERE SnapshotSeconds > ? AND SnapshotSeconds <= ?{symbol_filter}',
+                conn, params=(start_seconds, end_seconds, *params))
+        finally:
+            conn.close()
+
+        book_df = self.reconstruct_book(pd.concat([base_df, changes_df], ignore_index=True), snapshot_seconds)
+        book_df.insert(2, "Symbol", book_df["SymbolCode"].map(symbol_names))
+        return book_df
@@ -0,0 +1,218 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import pandas as pd
+from itertools import islice
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class SQLiteBulkWriter:
+    """
+    Write DataFrames to SQLite in one transaction with executemany.
+
+    The table is created from the dtyp dict of the creator (the same dict that was passed to to_sql), rows are streamed
+    in batches inside a single BEGIN/COMMIT, and the connection is tuned for the load with PRAGMAs. For large loads
+    into an existing table the non-unique indexes are dropped before the insert and rebuilt afterwards; unique indexes
+    are kept because the insert_or_ignore and upsert modes depend on them.
+
+    Modes:
+        replace           Drop and recreate the table, then insert.
+        append            Create the table if needed, then insert.
+        upsert            Insert, updating the existing row when key_columns conflict.
+        insert_or_ignore  Insert, skipping rows that conflict with a unique key (key_columns, when given, get one).
+
+    Usage:
+        writer = SQLiteBulkWriter(conn)
+        writer.write(df, "MarketMakerHoldingsTbl", dtype=dtyp, mode="replace")
+    """
+
+    MODES = ("replace", "append", "upsert", "insert_or_ignore")
+
+    def __init__(self, conn, batch_size=50000, index_rebuild_rows=100000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.index_rebuild_rows = index_rebuild_rows
+        self.duplicates_removed = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def quote(name):
+        return '"' + str(name).replace('"', '""') + '"'
+
+    @staticmethod
+    def sql_type_of(series):
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+            return "INTEGER"
+        if pd.api.types.is_float_dtype(series):
+            return "REAL"
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return "TIMESTAMP"
+        return "TEXT"
+
+    def table_exists(self, table_name):
+        row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+        return row is not None
+
+    def create_table_sql(self, df, table_name, dtype):
+        dtype = dtype or {}
+        columns_sql = [f"{self.quote(column)} {dtype.get(column, self.sql_type_of(df[column]))}" for column in df.columns]
+        return f"CREATE TABLE IF NOT EXISTS {self.quote(table_name)} ({', '.join(columns_sql)})"
+
+    def insert_sql(self, df, table_name, mode, key_columns):
+        columns = ", ".join(self.quote(column) for column in df.columns)
+        placeholders = ", ".join("?" for _ in df.columns)
+        verb = "INSERT OR IGNORE" if mode == "insert_or_ignore" else "INSERT"
+        sql = f"{verb} INTO {self.quote(table_name)} ({columns}) VALUES ({placeholders})"
+
+        if mode == "upsert":
+            update_columns = [column for column in df.columns if column not in key_columns]
+            conflict = ", ".join(self.quote(column) for column in key_columns)
+            if update_columns:
+                updates = ", ".join(f"{self.quote(column)} = excluded.{self.quote(column)}" for column in update_columns)
+                sql += f" ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+            else:
+                sql += f" ON CONFLICT ({conflict}) DO NOTHING"
+        return sql
+
+    @staticmethod
+    def dataframe_rows(df):
+        """
+        Rows of df as tuples of plain Python values, with NaN/NA as None and timestamps as text like to_sql.
+        """
+        columns = []
+        for column in df.columns:
+            series = df[column]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                # Like str(Timestamp): the fraction is written only when the time has one
+                whole_seconds = series.dt.microsecond.eq(0) & series.dt.nanosecond.eq(0)
+                series = series.dt.strftime("%Y-%m-%d %H:%M:%S").where(
+                    whole_seconds, series.dt.strftime("%Y-%m-%d %H:%M:%S.%f"))
+            if series.isna().any():
+                series = series.astype(object).where(series.notna(), None)
+            columns.append(series.tolist())
+        return zip(*columns)
+
+    def add_missing_columns(self, df, table_name, dtype):
+        """
+        Add the columns of df that an existing table does not have yet, so appends can carry new columns.
+        """
+        dtype = dtype or {}
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({self.quote(table_name)})").fetchall()}
+        for column in df.columns:
+            if column not in existing:
+                column_type = dtype.get(column, self.sql_type_of(df[column])).replace("PRIMARY KEY", "").strip()
+                self.conn.execute(f"ALTER TABLE {self.quote(table_name)} ADD COLUMN {self.quote(column)} {column_type}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def drop_secondary_indexes(self, table_name):
+        """
+        Drop the non-unique indexes of a table and return their CREATE statements.
+        """
+        indexes = self.conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                                    "AND sql IS NOT NULL", (table_name,)).fetchall()
+        dropped = []
+        for index_name, index_sql in indexes:
+            if index_sql.upper().startswith("CREATE UNIQUE"):
+                continue
+            self.conn.execute(f"DROP INDEX {self.quote(index_name)}")
+            dropped.append(index_sql)
+        return dropped
+
+    def ensure_key_index(self, table_name, key_columns):
+        """
+        Create the unique index on key_columns. When the index is new, rows that already repeat a key are removed
+        first (the earliest row is kept), so tables filled by plain appends can be converted once.
+
+        Returns:
+            int: Number of duplicate rows deleted; 0 when the index already existed.
+        """
+        index_name = f"uidx_{table_name}_{'_'.join(key_columns)}"
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                   (index_name,)).fetchone()
+        if exists:
+            return 0
+
+        columns = ", ".join(self.quote(column) for column in key_columns)
+        deleted = self.conn.execute(f"DELETE FROM {self.quote(table_name)} WHERE rowid NOT IN "
+                                    f"(SELECT MIN(rowid) FROM {self.quote(table_name)} GROUP BY {columns})").rowcount
+        self.conn.execute(f"CREATE UNIQUE INDEX {self.quote(index_name)} ON {self.quote(table_name)} ({columns})")
+        return max(deleted, 0)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def write(self, df, table_name, dtype=None, mode="replace", key_columns=None, index=False, index_label=None):
+        """
+        Write a DataFrame to a table in one transaction.
+
+        Args:
+            df (pd.DataFrame): The rows to write.
+            table_name (str): The target table.
+            dtype (dict, optional): SQL types by column, e.g. from TableSchemaRegistry.sql_types.
+            mode (str, optional): One of MODES. Default is 'replace'.
+            key_columns (list, optional): Conflict columns for 'upsert' and 'insert_or_ignore'; a unique index is
+                                          created on them.
+            index (bool, optional): Write the DataFrame index as a column, like to_sql. Default is False.
+            index_label (str, optional): Column name of the written index.
+
+        Returns:
+            int: Number of rows sent to SQLite. The duplicate rows deleted while creating the key index are left in
+                 duplicates_removed.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown write mode '{mode}', expected one of {self.MODES}")
+        if mode == "upsert" and not key_columns:
+            raise ValueError("The upsert mode needs key_columns")
+
+        if index:
+            df = df.reset_index()
+            if index_label is not None:
+                df = df.rename(columns={df.columns[0]: index_label})
+
+        isolation_level = self.conn.isolation_level
+        self.conn.commit()
+        self.conn.isolation_level = None
+        synchronous = self.conn.execute("PRAGMA synchronous").fetchone()[0]
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        self.conn.execute("PRAGMA cache_size = -200000")
+
+        rows_written = 0
+        self.duplicates_removed = 0
+        try:
+            self.conn.execute("BEGIN")
+            if mode == "replace":
+                self.conn.execute(f"DROP TABLE IF EXISTS {self.quote(table_name)}")
+            rebuild_indexes = mode != "replace" and len(df) >= self.index_rebuild_rows and \
+                self.table_exists(table_name)
+            self.conn.execute(self.create_table_sql(df, table_name, dtype))
+            if mode != "replace":
+                self.add_missing_columns(df, table_name, dtype)
+            if key_columns and mode in ("upsert", "insert_or_ignore"):
+                self.duplicates_removed = self.ensure_key_index(table_name, key_columns)
+
+            dropped_indexes = self.drop_secondary_indexes(table_name) if rebuild_indexes else []
+
+            sql = self.insert_sql(df, table_name, mode, key_columns)
+            rows = self.dataframe_rows(df)
+            batch = list(islice(rows, self.batch_size))
+            while batch:
+                self.conn.executemany(sql, batch)
+                rows_written += len(batch)
+                batch = list(islice(rows, self.batch_size))
+
+            for index_sql in dropped_indexes:
+                self.conn.execute(index_sql)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+            self.conn.isolation_level = isolation_level
+
+        return rows_written
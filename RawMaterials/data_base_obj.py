@@ -20,6 +20,10 @@ from datetime import timedelta
 # ######################################################################################################################
 # import internal libraries
 # ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.table_schema_obj import TableSchemaRegistry
+from RawMaterials.parquet_mirror_obj import ParquetMirror
+from RawMaterials.bulk_writer_obj import SQLiteBulkWriter
+from RawMaterials.time_bucket_obj import TimeBucketAggregator
 
 # ======================================================================================================================
 # ######################################################################################################################
@@ -47,8 +51,8 @@ class DataHelper:
     Methods:
         - mapping_columns(main_df, data_df, pivot_column, Target_column): Map columns in the main DataFrame based on
           a mapping dictionary from another DataFrame.
-        - load_table_as_dataframe(table_name, conn, column_check_duplicate): Load data from a database table into a
-          DataFrame and remove duplicate rows.
+        - load_table_as_dataframe(table_name, conn, column_check_duplicate, apply_schema): Load data from a database
+          table into a DataFrame, remove duplicate rows and optionally apply the compact table schema.
         - gregorian_to_jalali(gregorian_date): Convert a Gregorian date to Jalali (Persian) date.
         - save_dict_to_json(data, filename): Save a dictionary to a JSON file.
         - load_json_to_dict(filename): Load a JSON file and return its contents as a dictionary.
@@ -87,31 +91,177 @@ class DataHelper:
         mapping_dict = data_df.set_index(pivot_column)[target_column].to_dict()
         # Apply the mapping to create SectorID column in df
         main_df[target_column] = main_df[pivot_column].map(mapping_dict)
+        if isinstance(main_df[target_column].dtype, pd.CategoricalDtype):
+            main_df[target_column] = main_df[target_column].astype(object)
         if drop_pivot_column:
             main_df.drop(columns=[pivot_column], inplace=True)
         return main_df
 
     # ------------------------------------------------------------------------------------------------------------------
     @staticmethod
-    def load_table_as_dataframe(table_name, conn, column_check_duplicate):
+    def mapping_multiple_columns(main_df, data_df, pivot_column, target_columns):
+        """
+        Map several columns in the main DataFrame from another DataFrame with a single join.
+
+        This is the multi-column form of mapping_columns: the lookup frame is reduced once to the pivot column and
+        the requested target columns, and all of them are attached with one left merge instead of one dictionary
+        per column. As with mapping_columns, when the pivot value is repeated in data_df the last record wins, and
+        target columns that already exist in main_df are overwritten.
+
+        Args:
+            main_df (pd.DataFrame): The main DataFrame to be updated.
+            data_df (pd.DataFrame): The DataFrame containing the mapping information.
+            pivot_column (str): The column used as the key for mapping.
+            target_columns (list): The columns in the mapping DataFrame to be mapped to the main DataFrame.
+
+        Returns:
+            pd.DataFrame: The main DataFrame with mapped values, keeping its original row order and index.
+        """
+        target_columns = [column for column in target_columns if column != pivot_column]
+        lookup_df = data_df[[pivot_column] + target_columns].drop_duplicates(subset=[pivot_column], keep='last')
+
+        base_df = main_df.drop(columns=[column for column in target_columns if column in main_df.columns])
+        mapped_df = base_df.merge(lookup_df, on=pivot_column, how='left', sort=False)
+        mapped_df.index = main_df.index
+        return mapped_df
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def interval_join(main_df, intervals_df, date_column, start_column, end_column, by_column, target_columns):
+        """
+        Attach to each row of main_df the interval of intervals_df whose [start, end] window contains the row's date.
+
+        Dates are 'YYYY-MM-DD' strings (Jalali or Gregorian) and are compared as YYYYMMDD integers. Both frames are
+        sorted once and matched with merge_asof per by_column, so the join is linear after sorting. Each row is
+        matched to the interval that started last on or before its date, and the match is kept only if that interval
+        has not ended yet; an interval with an empty end is open-ended. Rows without a containing interval get NaN in
+        the target columns.
+
+        Args:
+            main_df (pd.DataFrame): The rows to be matched, e.g. daily reports.
+            intervals_df (pd.DataFrame): The intervals, e.g. announcements.
+            date_column (str): The date column of main_df.
+            start_column (str): The inclusive start date column of intervals_df.
+            end_column (str): The inclusive end date column of intervals_df.
+            by_column (str): The column both frames are matched on before comparing dates.
+            target_columns (list): The columns of intervals_df to attach. Existing columns are overwritten.
+
+        Returns:
+            pd.DataFrame: main_df with the target columns, keeping its original row order and index.
+        """
+        def dates_to_numbers(dates):
+            return pd.to_numeric(dates.astype(str).str.replace('-', '', regex=False), errors='coerce')
+
+        target_columns = [column for column in target_columns if column != by_column]
+
+        left_df = main_df[[by_column]].copy()
+        left_df['_RowPosition'] = np.arange(len(main_df))
+        left_df['_DateNumber'] = dates_to_numbers(main_df[date_column])
+        left_df = left_df.dropna(subset=[by_column, '_DateNumber'])
+
+        right_df = intervals_df[[by_column] + target_columns].copy()
+        right_df['_StartNumber'] = dates_to_numbers(intervals_df[start_column])
+        right_df['_EndNumber'] = dates_to_numbers(intervals_df[end_column]).fillna(np.inf)
+        right_df = right_df.dropna(subset=[by_column, '_StartNumber'])
+
+        if pd.api.types.is_numeric_dtype(left_df[by_column]) and pd.api.types.is_numeric_dtype(right_df[by_column]):
+            left_df[by_column] = left_df[by_column].astype(np.float64)
+            right_df[by_column] = right_df[by_column].astype(np.float64)
+        else:
+            left_df[by_column] = left_df[by_column].astype(str)
+            right_df[by_column] = right_df[by_column].astype(str)
+
+        left_df['_DateNumber'] = left_df['_DateNumber'].astype(np.float64)
+        right_df['_StartNumber'] = right_df['_StartNumber'].astype(np.float64)
+
+        matched_df = pd.merge_asof(left_df.sort_values('_DateNumber', kind='stable'),
+                                   right_df.sort_values('_StartNumber', kind='stable'),
+                                   left_on='_DateNumber', right_on='_StartNumber', by=by_column,
+                                   direction='backward', allow_exact_matches=True)
+        matched_df = matched_df[matched_df['_DateNumber'] <= matched_df['_EndNumber']]
+
+        result_df = main_df.drop(columns=[column for column in target_columns if column in main_df.columns])
+        for column in target_columns:
+            values = pd.Series(np.nan, index=range(len(main_df)), dtype=object)
+            values.iloc[matched_df['_RowPosition'].to_numpy()] = matched_df[column].to_numpy()
+            result_df[column] = values.infer_objects().to_numpy()
+        return result_df
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def load_table_as_dataframe(table_name, conn, column_check_duplicate, apply_schema=False):
         """
         Load data from a database table into a DataFrame and remove duplicate rows.
 
         Args:
             table_name (str): The name of the database table to load data from.
             conn: The database connection object.
-            column_check_duplicate (str): The column to check for duplicate rows.
+            column_check_duplicate (str): The column to check for duplicate rows. None skips the check, for tables
+                                          whose key is already enforced by a unique index.
+            apply_schema (bool, optional): Convert the frame to the compact in-memory types that
+                                           TableSchemaRegistry.COMPACT_SCHEMAS lists for the table (categoricals,
+                                           downcast numerics, Arrow strings). Default is False.
 
         Returns:
             pd.DataFrame: The loaded DataFrame.
         """
         query = f"SELECT * FROM {table_name}"
         df = pd.read_sql_query(query, conn)
-        df = df.drop_duplicates(subset=[column_check_duplicate])
+        if column_check_duplicate is not None:
+            df = df.drop_duplicates(subset=[column_check_duplicate])
+        if apply_schema:
+            df = TableSchemaRegistry.compact_dataframe(df, table_name)
         return df
 
     # ------------------------------------------------------------------------------------------------------------------
 
+    @staticmethod
+    def read_table_watermark(conn, table_name, column_name):
+        """
+        Return the largest value of a column, or None when the table does not exist or is empty.
+
+        Args:
+            conn: The database connection object.
+            table_name (str): The processed table that holds the watermark.
+            column_name (str): The ordered column, e.g. 'JDownloadDateTime'.
+
+        Returns:
+            The watermark value or None.
+        """
+        try:
+            row = conn.execute(f'SELECT MAX("{column_name}") FROM "{table_name}"').fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0]
+
+    @staticmethod
+    def load_table_rows_after(table_name, conn, column_name, watermark, apply_schema=False):
+        """
+        Load the rows of a table whose column is greater than the watermark; all rows when the watermark is None.
+
+        An index on the column is created if needed, so the query reads only the new rows.
+
+        Args:
+            table_name (str): The source table.
+            conn: The database connection object.
+            column_name (str): The ordered column compared with the watermark.
+            watermark: The last processed value, or None.
+            apply_schema (bool, optional): Apply the compact table schema. Default is False.
+
+        Returns:
+            pd.DataFrame: The new rows.
+        """
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_{column_name}" ON "{table_name}" ("{column_name}")')
+        conn.commit()
+        if watermark is None:
+            df = pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+        else:
+            df = pd.read_sql_query(f'SELECT * FROM "{table_name}" WHERE "{column_name}" > ?', conn,
+                                   params=(watermark,))
+        if apply_schema:
+            df = TableSchemaRegistry.compact_dataframe(df, table_name)
+        return df
+
     @staticmethod
     def gregorian_to_jalali(gregorian_date):
         """
@@ -147,6 +297,41 @@ class DataHelper:
 
     # ------------------------------------------------------------------------------------------------------------------
 
+    @staticmethod
+    def jalali_dates_to_integers(jalali_dates):
+        """
+        Convert 'YYYY-MM-DD' Jalali date strings to YYYYMMDD integers.
+
+        The integers keep the calendar order of the dates, so they can be compared, sorted and searched with NumPy
+        without parsing every value into a date object.
+
+        Args:
+            jalali_dates (pd.Series): Jalali dates in 'YYYY-MM-DD' format.
+
+        Returns:
+            np.ndarray: int64 array of YYYYMMDD values.
+        """
+        jalali_dates = pd.Series(jalali_dates).astype(str).str.replace('-', '', regex=False)
+        return jalali_dates.astype(np.int64).to_numpy()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def integers_to_jalali_dates(date_numbers):
+        """
+        Convert YYYYMMDD integers back to 'YYYY-MM-DD' Jalali date strings.
+
+        Args:
+            date_numbers (array-like): YYYYMMDD integers.
+
+        Returns:
+            pd.Series: Jalali dates in 'YYYY-MM-DD' format.
+        """
+        date_numbers = pd.Series(np.asarray(date_numbers, dtype=np.int64)).astype(str)
+        return date_numbers.str[:4] + '-' + date_numbers.str[4:6] + '-' + date_numbers.str[6:8]
+
+    # ------------------------------------------------------------------------------------------------------------------
+
     def add_converted_date(self, df, conversion_type, source_column, target_column):
         """
         Converts dates in a DataFrame from Jalali to Gregorian or vice versa.
@@ -498,14 +683,14 @@ class DataHelper:
 
     @staticmethod
     def round_time_column_to_strings(df, column_name, n):
-        def round_time_to_nearest_n_seconds(time_str):
-            time_format = '%H:%M:%S'
-            time_obj = datetime.datetime.strptime(time_str, time_format)
-            rounded_seconds = round(time_obj.second / n) * n
-            rounded_time = time_obj.replace(second=int(rounded_seconds))
-            return rounded_time.strftime(time_format)
-
-        df[column_name] = df[column_name].apply(round_time_to_nearest_n_seconds)
+        """
+        Round 'HH:MM:SS' times to the nearest n seconds in place. Rounding carries into the minute and hour, so
+        09:00:58 with n=5 becomes 09:01:00.
+        """
+        seconds = TimeBucketAggregator.to_seconds(df[column_name])
+        valid = seconds.notna().to_numpy()
+        rounded = TimeBucketAggregator(n).round_seconds(seconds[valid].to_numpy(dtype=np.int64))
+        df.loc[valid, column_name] = TimeBucketAggregator.to_times(rounded).to_numpy()
         return df
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -534,16 +719,20 @@ class DataHelper:
             result_df = calculate_seconds_avg(df, datetime_column, seconds)
             print(result_df)
         """
-        # Convert datetime to a format suitable for calculation
-        df[datetime_column] = pd.to_datetime(df[datetime_column])
+        # Convert datetime to day and seconds since midnight for the bucketing
+        date_times = pd.to_datetime(df[datetime_column])
+        bucket_df = df.assign(Day=date_times.dt.normalize(),
+                              Seconds=(date_times - date_times.dt.normalize()) // pd.Timedelta(seconds=1))
 
-        # Group by specified time intervals (in seconds)
-        df['Time_Group'] = df[datetime_column].dt.floor(f'{seconds}s')
+        # Average the numeric columns within each interval
+        value_columns = [column for column in df.select_dtypes("number").columns if column != datetime_column]
+        average_values = TimeBucketAggregator(seconds).aggregate(bucket_df, ["Day"], "Seconds", value_columns)
+        average_values.index = pd.DatetimeIndex(average_values["Day"] +
+                                                pd.to_timedelta(average_values["BucketSeconds"], unit="s"),
+                                                name="Time_Group")
+        average_values = average_values.rename(columns={column + "Mean": column for column in value_columns})
 
-        # Calculate the average within each group
-        average_values = df.groupby('Time_Group').mean()
-
-        return average_values
+        return average_values[value_columns]
 
     # ------------------------------------------------------------------------------------------------------------------
 
@@ -830,12 +1019,62 @@ class DataHelper:
     # ------------------------------------------------------------------------------------------------------------------
 
     # Todo This function is newly written and should be replaced in all functions and classes. 1402-07-14 -> 1402/08/30
-    def build_table_dataframe(self, db_name, table_name, column_check_duplicate):
+    def build_table_dataframe(self, db_name, table_name, column_check_duplicate, apply_schema=False, columns=None,
+                              filters=None):
         conn = sqlite3.connect(f'{self.project_path}/Warehouse/{db_name}')
-        # Read data from DateTbl table
-        table_dataframe = self.load_table_as_dataframe(table_name, conn, column_check_duplicate)
+        try:
+            # Mirrored tables are read from their Parquet copy with column and partition pruning, when the copy has
+            # as many rows as the SQLite table
+            mirror = ParquetMirror(self.project_path)
+            if table_name in ParquetMirror.PARTITION_COLUMNS and mirror.has_table(table_name):
+                source_rows = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+                table_dataframe = mirror.read_table(table_name, columns, filters, source_rows)
+                if table_dataframe is not None:
+                    if column_check_duplicate in table_dataframe.columns:
+                        table_dataframe = table_dataframe.drop_duplicates(subset=[column_check_duplicate])
+                    if apply_schema:
+                        table_dataframe = TableSchemaRegistry.compact_dataframe(table_dataframe, table_name)
+                    return table_dataframe
+
+            table_dataframe = self.load_table_as_dataframe(table_name, conn, column_check_duplicate, apply_schema)
+        finally:
+            conn.close()
+        if filters:
+            table_dataframe = ParquetMirror.filter_dataframe(table_dataframe, filters)
+        if columns:
+            table_dataframe = table_dataframe[[column for column in columns if column in table_dataframe.columns]]
         return table_dataframe
 
+    def publish_parquet_mirror(self, df, table_name):
+        return ParquetMirror(self.project_path).publish_table(df, table_name)
+
+    @staticmethod
+    def bulk_write_table(df, table_name, conn, dtype=None, mode="replace", key_columns=None, index=False,
+                         index_label=None):
+        """
+        Write a DataFrame to a warehouse table with SQLiteBulkWriter (one transaction, executemany).
+
+        Args:
+            df (pd.DataFrame): The rows to write.
+            table_name (str): The target table.
+            conn: The database connection object.
+            dtype (dict, optional): SQL types by column, as for to_sql.
+            mode (str, optional): 'replace', 'append', 'upsert' or 'insert_or_ignore'. Default is 'replace'.
+            key_columns (list, optional): Unique key of the upsert and insert_or_ignore modes.
+            index (bool, optional): Write the index as a column. Default is False.
+            index_label (str, optional): Column name of the written index.
+
+        Returns:
+            int: Number of rows sent to SQLite.
+        """
+        writer = SQLiteBulkWriter(conn)
+        rows_written = writer.write(df, table_name, dtype=dtype, mode=mode, key_columns=key_columns, index=index,
+                                    index_label=index_label)
+        if writer.duplicates_removed > 0:
+            print(f"{writer.duplicates_removed} duplicate rows removed from {table_name} before indexing "
+                  f"{', '.join(key_columns)}.")
+        return rows_written
+
     # ------------------------------------------------------------------------------------------------------------------
 
     @staticmethod
@@ -1048,7 +1287,7 @@ class DataHelper:
     @staticmethod
     def fillna_groupby_previous(df, group_cols, fill_cols):
         # پر کردن مقادیر خالی با مقدار قبلی در ستون‌های مورد نظر
-        df[fill_cols] = df.groupby(group_cols)[fill_cols].fillna(method='ffill')
+        df[fill_cols] = df.groupby(group_cols, observed=True)[fill_cols].fillna(method='ffill')
         return df
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -1081,7 +1320,7 @@ class DataHelper:
     @staticmethod
     def fill_empty_with_record_value(dataframe, group_column, fill_column):
         # Create a new column 'valid_values' to store the first valid values for each group
-        dataframe['valid_values'] = dataframe.groupby(group_column)[fill_column].transform(
+        dataframe['valid_values'] = dataframe.groupby(group_column, observed=True)[fill_column].transform(
             lambda x: x.loc[x.first_valid_index()])
 
         # Fill empty records in 'fill_column' with values from 'valid_values' column
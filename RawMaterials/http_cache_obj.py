@@ -0,0 +1,192 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class ResponseCache:
+    """
+    A content-addressed disk cache for the results of finpy_tse and pytse_client calls.
+
+    The libraries do their HTTP requests internally, so the cache wraps their entry points: call() runs a fetch
+    function only when no valid entry exists for its request. A request is identified by the endpoint name, the
+    function name and its arguments (hashed from their canonical JSON). The result is pickled and stored once under
+    the SHA-256 of its bytes in objects/, and a small JSON ref in refs/ points the request at that content with its
+    expiry, so identical responses of different requests (e.g. empty histories) share one object.
+
+    Expiry:
+        An endpoint in ENDPOINT_TTL_SECONDS gets that TTL. History endpoints whose range ends before today (closed
+        dates) never expire, because closed trading days do not change; a range that includes today gets the open
+        TTL of the endpoint. A TTL of 0 disables caching of the endpoint.
+
+    Offline mode serves every cached entry regardless of expiry and raises LookupError for requests that were never
+    cached, so rebuilds and backtests run at disk speed without touching the network. It is enabled with
+    offline=True or the environment variable MARKET_MAKER_OFFLINE=1.
+
+    Usage:
+        cache = ResponseCache(project_path)
+        df = cache.call("get_price_history", fpy.get_price_history, closed_date="2023-09-29",
+                        stock="فولاد", start_date="1402-06-10", end_date="1402-07-07")
+    """
+
+    ENDPOINT_TTL_SECONDS = {
+        "get_price_history": 6 * 3600,
+        "index_history": 6 * 3600,
+        "sector_index_history": 6 * 3600,
+        "intraday_order_book_history": 6 * 3600,
+        "shareholders_history": 12 * 3600,
+        "shareholders": 12 * 3600,
+        "client_types_records": 12 * 3600,
+        "key_stats": 12 * 3600,
+        "market_watch": 5,
+    }
+    DEFAULT_TTL_SECONDS = 3600
+
+    def __init__(self, project_path, offline=None, cache_path=None):
+        self.cache_path = cache_path or f"{project_path}/Warehouse/HttpCache"
+        self.offline = os.environ.get("MARKET_MAKER_OFFLINE") == "1" if offline is None else offline
+        self.metrics = {"hits": 0, "misses": 0, "stale": 0, "stored": 0}
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def request_key(endpoint, arguments):
+        canonical = json.dumps({"endpoint": endpoint, "arguments": arguments}, sort_keys=True, ensure_ascii=False,
+                               default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def ref_path(self, key):
+        return f"{self.cache_path}/refs/{key[:2]}/{key}.json"
+
+    def object_path(self, digest):
+        return f"{self.cache_path}/objects/{digest[:2]}/{digest}.pkl"
+
+    @staticmethod
+    def write_atomic(path, payload):
+        """
+        Write payload to path through a unique temp file, so concurrent writers (threads or processes) never share
+        a temp file. When the replace fails but another writer already created path, the write counts as done: objects
+        are content-addressed, and any ref of a request is as good as another.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as cache_file:
+                cache_file.write(payload)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if not os.path.isfile(path):
+                raise
+
+    def ttl_seconds(self, endpoint, closed_date=None):
+        """
+        The TTL of a request: None (never expires) for a closed date range, the endpoint TTL otherwise.
+        """
+        if closed_date is not None and str(closed_date)[:10] < datetime.date.today().isoformat():
+            return None
+        return self.ENDPOINT_TTL_SECONDS.get(endpoint, self.DEFAULT_TTL_SECONDS)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def get(self, endpoint, arguments):
+        """
+        The cached result of a request and whether it is still fresh, or (None, False) when it is not cached.
+        """
+        key = self.request_key(endpoint, arguments)
+        try:
+            with open(self.ref_path(key), encoding="utf-8") as ref_file:
+                ref = json.load(ref_file)
+            with open(self.object_path(ref["content"]), "rb") as object_file:
+                result = pickle.load(object_file)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+            return None, False
+        fresh = ref["expires_at"] is None or ref["expires_at"] > time.time()
+        return result, fresh
+
+    def put(self, endpoint, arguments, result, ttl_seconds):
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(payload).hexdigest()
+        if not os.path.isfile(self.object_path(digest)):
+            self.write_atomic(self.object_path(digest), payload)
+
+        fetched_at = time.time()
+        ref = {"endpoint": endpoint, "arguments": arguments, "content": digest, "fetched_at": fetched_at,
+               "expires_at": None if ttl_seconds is None else fetched_at + ttl_seconds}
+        self.write_atomic(self.ref_path(self.request_key(endpoint, arguments)),
+                          json.dumps(ref, ensure_ascii=False, default=str).encode("utf-8"))
+        self.metrics["stored"] += 1
+
+    def call(self, endpoint, fetch, *args, closed_date=None, cache_arguments=None, **kwargs):
+        """
+        Return the cached result of fetch(*args, **kwargs), fetching and storing it when missing or expired.
+
+        Args:
+            endpoint (str): The endpoint name, a key of ENDPOINT_TTL_SECONDS.
+            fetch (callable): The library function that does the request.
+            closed_date (str, optional): Last date of the requested range, 'YYYY-MM-DD'. A date before today makes
+                                         the entry immutable.
+            cache_arguments (dict, optional): The arguments that identify the request, when args and kwargs contain
+                                              values that change between equal requests (e.g. datetime.now()).
+
+        Returns:
+            The result of fetch.
+        """
+        ttl_seconds = self.ttl_seconds(endpoint, closed_date)
+        if ttl_seconds == 0 and not self.offline:
+            return fetch(*args, **kwargs)
+
+        arguments = cache_arguments if cache_arguments is not None else \
+            {"function": getattr(fetch, "__qualname__", repr(fetch)), "args": list(args), "kwargs": kwargs}
+        result, fresh = self.get(endpoint, arguments)
+        if fresh or (self.offline and result is not None):
+            self.metrics["hits"] += 1
+            return result
+        if self.offline:
+            raise LookupError(f"{endpoint} {arguments} is not cached and the cache is offline")
+
+        self.metrics["stale" if result is not None else "misses"] += 1
+        result = fetch(*args, **kwargs)
+        self.put(endpoint, arguments, result, ttl_seconds)
+        return result
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def purge_expired(self):
+        """
+        Delete expired refs and the objects no ref points to any more.
+
+        Returns:
+            int: Number of refs deleted.
+        """
+        now, deleted, referenced = time.time(), 0, set()
+        for directory, _, file_names in os.walk(f"{self.cache_path}/refs"):
+            for file_name in file_names:
+                path = f"{directory}/{file_name}"
+                try:
+                    with open(path, encoding="utf-8") as ref_file:
+                        ref = json.load(ref_file)
+                except (OSError, ValueError):
+                    continue
+                if ref.get("expires_at") is not None and ref["expires_at"] <= now:
+                    os.remove(path)
+                    deleted += 1
+                else:
+                    referenced.add(ref.get("content"))
+
+        for directory, _, file_names in os.walk(f"{self.cache_path}/objects"):
+            for file_name in file_names:
+                if file_name.endswith(".pkl") and file_name[:-4] not in referenced:
+                    os.remove(f"{directory}/{file_name}")
+        return deleted
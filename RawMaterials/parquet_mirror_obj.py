@@ -0,0 +1,203 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class ParquetMirror:
+    """
+    Partitioned Parquet copies of the heavy warehouse tables.
+
+    The writers of the tables in PARTITION_COLUMNS publish the frame they write to SQLite as a hive-partitioned Parquet
+    dataset under Warehouse/ParquetMirror/<table_name>. Readers ask for the columns they need and pass partition
+    filters in the pyarrow form [("JYear", "=", 1402), ("ShortName", "in", [...])], so only the matching partitions
+    and columns are scanned. SQLite stays the source of truth: when pyarrow is not installed, a table has no mirror
+    yet or the mirror's row count differs from the SQLite table, read_table returns None and the caller reads SQLite.
+
+    Each mirror keeps a _mirror.json manifest (ignored by the Parquet readers) with the source columns in SQLite
+    order, the row count, and which partition columns were derived or filled with placeholders. read_table uses it
+    to return the SQLite column set and order, with the placeholders turned back into missing values.
+
+    Usage:
+        mirror = ParquetMirror(project_path)
+        mirror.publish_table(df, "FundsProcessedVfm")
+        df = mirror.read_table("FundsProcessedVfm", columns=["JDate", "NAV"], filters=[("JYear", "=", 1402)])
+    """
+
+    PARTITION_COLUMNS = {
+        "FundsProcessedVfm": ["JYear", "ShortName"],
+        "FundsInvestorsProcessedVfm": ["JYear", "ShortName"],
+        "PreprocessedIranMarketPricesTbl": ["JYear"],
+    }
+    PLACEHOLDERS = {"numeric": 0, "text": "Unknown"}
+    MANIFEST_FILE = "_mirror.json"
+
+    def __init__(self, project_path):
+        self.mirror_path = f"{project_path}/Warehouse/ParquetMirror"
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def table_path(self, table_name):
+        return f"{self.mirror_path}/{table_name}"
+
+    def has_table(self, table_name):
+        return PARQUET_AVAILABLE and os.path.isfile(f"{self.table_path(table_name)}/{self.MANIFEST_FILE}")
+
+    def load_manifest(self, table_name):
+        with open(f"{self.table_path(table_name)}/{self.MANIFEST_FILE}", encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    @classmethod
+    def add_partition_columns(cls, df, partition_columns):
+        """
+        Derive JYear from JDate for tables that do not carry it, and give missing partition values a placeholder.
+
+        Returns:
+            tuple: The frame, the derived columns and the columns whose missing values got a placeholder.
+        """
+        df = df.copy()
+        derived_columns, filled_columns = [], []
+        if "JYear" in partition_columns and "JYear" not in df.columns and "JDate" in df.columns:
+            df["JYear"] = pd.to_numeric(df["JDate"].astype(str).str[:4], errors="coerce")
+            derived_columns.append("JYear")
+
+        for column_name in [column for column in partition_columns if column in df.columns]:
+            if isinstance(df[column_name].dtype, pd.CategoricalDtype):
+                df[column_name] = df[column_name].astype(object)
+            if df[column_name].isna().any():
+                filled_columns.append(column_name)
+            if pd.api.types.is_numeric_dtype(df[column_name]):
+                df[column_name] = df[column_name].fillna(cls.PLACEHOLDERS["numeric"]).astype("int64")
+            else:
+                df[column_name] = df[column_name].fillna(cls.PLACEHOLDERS["text"]).astype(str)
+        return df, derived_columns, filled_columns
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def publish_table(self, df, table_name):
+        """
+        Replace the Parquet mirror of a table with the given frame.
+
+        The dataset is written to a temporary directory and moved into place when complete, so readers never see a
+        half-written mirror.
+
+        Args:
+            df (pd.DataFrame): The frame that was written to SQLite.
+            table_name (str): A table listed in PARTITION_COLUMNS.
+
+        Returns:
+            bool: True when the mirror was written.
+        """
+        if not PARQUET_AVAILABLE:
+            print(f"pyarrow is not installed, the Parquet mirror of {table_name} was not written.")
+            return False
+
+        source_columns = [str(column) for column in df.columns]
+        df, derived_columns, filled_columns = self.add_partition_columns(df, self.PARTITION_COLUMNS[table_name])
+        partition_columns = [column for column in self.PARTITION_COLUMNS[table_name] if column in df.columns]
+        partition_count = len(df[partition_columns].drop_duplicates()) if partition_columns else 1
+
+        target_path = self.table_path(table_name)
+        temp_path = f"{target_path}.tmp-{os.getpid()}"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(self.mirror_path, exist_ok=True)
+
+        # pyarrow refuses more than 1024 partitions by default
+        df.to_parquet(temp_path, engine="pyarrow", index=False, partition_cols=partition_columns,
+                      max_partitions=max(1024, partition_count))
+        manifest = {"table": table_name, "rows": int(len(df)), "columns": source_columns,
+                    "derived_columns": derived_columns, "filled_columns": filled_columns}
+        with open(f"{temp_path}/{self.MANIFEST_FILE}", "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+
+        old_path = f"{target_path}.old-{os.getpid()}"
+        if os.path.isdir(target_path):
+            os.replace(target_path, old_path)
+        os.replace(temp_path, target_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        print(f"Parquet mirror of {table_name} published in {target_path}.")
+        return True
+
+    def read_table(self, table_name, columns=None, filters=None, source_rows=None):
+        """
+        Read a mirrored table with column and partition pruning.
+
+        Args:
+            table_name (str): The mirrored table.
+            columns (list, optional): Columns to read. Default is all columns.
+            filters (list, optional): pyarrow filters, e.g. [("JYear", ">=", 1401)].
+            source_rows (int, optional): Row count of the SQLite table; a mirror with another count is stale.
+
+        Returns:
+            pd.DataFrame or None: The frame with the SQLite columns in their order, or None when the table has no
+                                  current mirror.
+        """
+        if not self.has_table(table_name):
+            return None
+        manifest = self.load_manifest(table_name)
+        if source_rows is not None and manifest["rows"] != source_rows:
+            print(f"The Parquet mirror of {table_name} is stale ({manifest['rows']} rows, SQLite has {source_rows}).")
+            return None
+
+        output_columns = [column for column in (columns or manifest["columns"]) if column in manifest["columns"]]
+        read_columns = list(dict.fromkeys(output_columns + [column for column, _, _ in (filters or [])]))
+        df = pd.read_parquet(self.table_path(table_name), engine="pyarrow", columns=read_columns, filters=filters)
+
+        for column_name in self.PARTITION_COLUMNS[table_name]:
+            if column_name not in df.columns:
+                continue
+            if isinstance(df[column_name].dtype, pd.CategoricalDtype):
+                df[column_name] = df[column_name].astype(object)
+            if column_name in manifest["filled_columns"]:
+                placeholder = self.PLACEHOLDERS["text"] if df[column_name].dtype == object else \
+                    self.PLACEHOLDERS["numeric"]
+                df[column_name] = df[column_name].where(df[column_name] != placeholder, np.nan)
+        return df[output_columns]
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def filter_dataframe(df, filters):
+        """
+        Apply pyarrow-style filters to a frame read from SQLite, so both read paths return the same rows.
+        """
+        if not filters:
+            return df
+
+        operators = {
+            "=": lambda series, value: series == value,
+            "==": lambda series, value: series == value,
+            "!=": lambda series, value: series != value,
+            "<": lambda series, value: series < value,
+            "<=": lambda series, value: series <= value,
+            ">": lambda series, value: series > value,
+            ">=": lambda series, value: series >= value,
+            "in": lambda series, value: series.isin(value),
+            "not in": lambda series, value: ~series.isin(value),
+        }
+
+        mask = pd.Series(True, index=df.index)
+        for column_name, operator, value in filters:
+            if column_name == "JYear" and "JYear" not in df.columns:
+                series = df["JDate"].astype(str).str[:4]
+            else:
+                series = df[column_name]
+            if column_name == "JYear" or isinstance(value, (int, float)):
+                series = pd.to_numeric(series, errors="coerce")
+            mask &= operators[operator](series, value)
+        return df[mask]
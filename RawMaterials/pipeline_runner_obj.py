@@ -0,0 +1,467 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import hashlib
+import os
+import pickle
+import time
+import traceback
+import concurrent.futures
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class PipelineStep:
+    """
+    One table or view frame step of a warehouse pipeline.
+
+    A resource in inputs/outputs is written as:
+        - "TableName": a table of the pipeline's default database.
+        - "OtherDataBase.db::TableName": a table of another database in the Warehouse folder.
+        - an existing file or directory path (e.g. the Excel files in Mines).
+
+    Args:
+        name (str): Unique name of the step.
+        function (callable): The function that builds the outputs. It must be picklable for a process pool, e.g. a
+            method of a manager object defined at module level.
+        inputs (list): Resources read by the step.
+        outputs (list): Resources written by the step.
+        args (tuple): Positional arguments of function.
+        kwargs (dict): Keyword arguments of function.
+        always_run (bool): Run the step even when its inputs did not change, e.g. for steps that download data.
+        kind (str): 'cpu' for processing steps or 'io' for network and disk bound steps. With executor_type='mixed'
+            the runner sends 'io' steps to a thread pool and 'cpu' steps to a process pool, so both overlap.
+    """
+
+    def __init__(self, name, function, inputs=None, outputs=None, args=(), kwargs=None, always_run=False, kind="cpu"):
+        if kind not in ("cpu", "io"):
+            raise ValueError(f"Unknown pipeline step kind: {kind}")
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.always_run = always_run
+        self.kind = kind
+
+    def __repr__(self):
+        return f"PipelineStep({self.name!r})"
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def run_step_function(step_name, function, args, kwargs, lock_retries, lock_wait_seconds):
+    """
+    Call the function of a step in a worker and retry when SQLite reports a locked database.
+
+    It is a module-level function of plain arguments, so a process pool pickles only the step function and its
+    arguments, not the runner.
+
+    Returns:
+        tuple: (step name, status, seconds, error text)
+    """
+    start_time = time.time()
+    for attempt in range(lock_retries + 1):
+        try:
+            function(*args, **kwargs)
+            return step_name, "done", time.time() - start_time, None
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error) or attempt == lock_retries:
+                return step_name, "failed", time.time() - start_time, traceback.format_exc()
+            print(f"{step_name}: database is locked, retry {attempt + 1} of {lock_retries}")
+            time.sleep(lock_wait_seconds * (attempt + 1))
+        except Exception:
+            return step_name, "failed", time.time() - start_time, traceback.format_exc()
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class PipelineRunner(DataHelper):
+    """
+    Run PipelineSteps in dependency order, overlapping the independent ones.
+
+    A step depends on every step that writes one of its inputs. Steps are submitted to a thread or process pool as soon
+    as all their upstream steps are finished. Before running, a step fingerprints its inputs (table signature or file
+    size and modification time) together with its arguments; when the fingerprint equals the one stored after its last
+    successful run and all its outputs exist, the step is skipped. The fingerprints are kept in PipelineStepsStateTbl of
+    the default database.
+
+    A table signature is read without scanning the rows: its schema, COUNT(*), MAX(rowid) and a write counter kept in
+    PipelineTableVersionsTbl of the table's own database. The runner bumps the counter of every table output of a step
+    that finished, so a rewrite with the same number of rows still changes the signature.
+
+    The fingerprint check runs in the runner; only the steps that must run are sent to the pool, through
+    run_step_function. With executor_type='process' every step, and with 'mixed' every 'cpu' step, runs in another
+    process, so its function, args and kwargs must be picklable; the constructor checks this and raises a ValueError
+    naming the step otherwise.
+
+    Every finished step also leaves a completion marker in PipelineRunMarkersTbl. A run started with resume=True treats
+    the marked steps as finished, so an interrupted run continues where it stopped, including the always_run steps
+    that would otherwise download their data again. The markers are cleared once a run finishes without failures.
+
+    Usage:
+        runner = PipelineRunner(db_name, steps, max_workers=4)
+        summary = runner.run()
+    """
+
+    STATE_TABLE = "PipelineStepsStateTbl"
+    MARKERS_TABLE = "PipelineRunMarkersTbl"
+    VERSIONS_TABLE = "PipelineTableVersionsTbl"
+    RESOURCE_SEPARATOR = "::"
+
+    def __init__(self, db_name, steps, max_workers=4, executor_type="thread", lock_retries=5, lock_wait_seconds=2):
+        super().__init__()
+        self.db_name = db_name
+        self.warehouse_path = os.path.dirname(db_name)
+        self.steps = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate pipeline step name: {step.name}")
+            self.steps[step.name] = step
+        if executor_type not in ("thread", "process", "mixed"):
+            raise ValueError(f"Unknown pipeline executor type: {executor_type}")
+        self.max_workers = max_workers
+        self.executor_type = executor_type
+        self.lock_retries = lock_retries
+        self.lock_wait_seconds = lock_wait_seconds
+        self.upstream_steps = self.build_dependencies()
+        self.check_picklable_steps()
+
+    def check_picklable_steps(self):
+        """
+        Check that the steps sent to a process pool can be pickled, before any of them runs.
+        """
+        for step in self.steps.values():
+            if self.executor_type == "thread" or (self.executor_type == "mixed" and step.kind == "io"):
+                continue
+            try:
+                pickle.dumps((step.function, step.args, step.kwargs))
+            except Exception as error:
+                raise ValueError(f"Pipeline step {step.name} runs in a process pool but its function or arguments "
+                                 f"cannot be pickled: {error}. Use a module-level function or an object that can be "
+                                 f"pickled, or mark the step kind='io' with executor_type='mixed'.") from error
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def resolve_resource(self, resource):
+        """
+        Resolve a resource name to ('table', database, table_name) or ('path', path, None).
+        """
+        if self.RESOURCE_SEPARATOR in resource:
+            database, table_name = resource.split(self.RESOURCE_SEPARATOR, 1)
+            if not os.path.isabs(database):
+                database = os.path.join(self.warehouse_path, database)
+            return "table", database, table_name
+
+        if os.sep in resource or os.path.exists(resource):
+            return "path", resource, None
+
+        return "table", self.db_name, resource
+
+    def resource_key(self, resource):
+        kind, location, table_name = self.resolve_resource(resource)
+        if kind == "table":
+            return f"{os.path.abspath(location)}{self.RESOURCE_SEPARATOR}{table_name}"
+        return os.path.abspath(location)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def build_dependencies(self):
+        """
+        Map each step name to the names of the steps that write its inputs and check the graph has no cycle.
+
+        Returns:
+            dict: step name -> set of upstream step names.
+        """
+        producers = {}
+        for step in self.steps.values():
+            for resource in step.outputs:
+                key = self.resource_key(resource)
+                if key in producers:
+                    raise ValueError(f"{resource} is written by both {producers[key]} and {step.name}")
+                producers[key] = step.name
+
+        upstream_steps = {}
+        for step in self.steps.values():
+            upstream = {producers[self.resource_key(resource)] for resource in step.inputs
+                        if self.resource_key(resource) in producers}
+            upstream.discard(step.name)
+            upstream_steps[step.name] = upstream
+
+        self.topological_order(upstream_steps)
+        return upstream_steps
+
+    @staticmethod
+    def topological_order(upstream_steps):
+        remaining = {name: set(upstream) for name, upstream in upstream_steps.items()}
+        order = []
+        while remaining:
+            ready = sorted(name for name, upstream in remaining.items() if not upstream)
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle between: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for upstream in remaining.values():
+                upstream.difference_update(ready)
+        return order
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def fingerprint_table(cls, database, table_name):
+        """
+        Signature of a table from its schema, COUNT(*), MAX(rowid) and write counter, without reading its rows.
+        """
+        if not os.path.exists(database):
+            return "missing"
+
+        conn = sqlite3.connect(database, timeout=60)
+        try:
+            schema = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?",
+                                  (table_name,)).fetchone()
+            if schema is None:
+                return "missing"
+
+            row_count, max_rowid = conn.execute(f'SELECT COUNT(*), MAX(rowid) FROM "{table_name}"').fetchone()
+            version = 0
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                            (cls.VERSIONS_TABLE,)).fetchone():
+                row = conn.execute(f"SELECT Version FROM {cls.VERSIONS_TABLE} WHERE TableName = ?",
+                                   (table_name,)).fetchone()
+                version = row[0] if row else 0
+        finally:
+            conn.close()
+
+        digest = hashlib.sha1(str(schema[0]).encode())
+        return f"{row_count}-{max_rowid}-{version}-{digest.hexdigest()}"
+
+    @staticmethod
+    def fingerprint_path(path):
+        """
+        Fingerprint of a file or directory from the names, sizes and modification times of its files.
+        """
+        if not os.path.exists(path):
+            return "missing"
+
+        if os.path.isfile(path):
+            file_stat = os.stat(path)
+            return f"{file_stat.st_size}-{file_stat.st_mtime_ns}"
+
+        digest = hashlib.sha1()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                file_stat = os.stat(file_path)
+                digest.update(f"{os.path.relpath(file_path, path)}|{file_stat.st_size}|{file_stat.st_mtime_ns}\n"
+                              .encode())
+        return digest.hexdigest()
+
+    def fingerprint_resource(self, resource):
+        kind, location, table_name = self.resolve_resource(resource)
+        if kind == "table":
+            return self.fingerprint_table(location, table_name)
+        return self.fingerprint_path(location)
+
+    def fingerprint_step(self, step):
+        digest = hashlib.sha1(f"{step.name}|{step.args!r}|{sorted(step.kwargs.items())!r}".encode())
+        for resource in step.inputs:
+            digest.update(f"{resource}={self.fingerprint_resource(resource)}\n".encode())
+        return digest.hexdigest()
+
+    def outputs_exist(self, step):
+        return all(self.fingerprint_resource(resource) != "missing" for resource in step.outputs)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def enable_wal_mode(self):
+        """
+        Switch the databases of the pipeline to WAL so readers of one step do not block the writer of another.
+        """
+        databases = {self.db_name}
+        for step in self.steps.values():
+            for resource in step.inputs + step.outputs:
+                kind, location, _ = self.resolve_resource(resource)
+                if kind == "table" and os.path.exists(location):
+                    databases.add(location)
+
+        for database in sorted(databases):
+            conn = sqlite3.connect(database, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.close()
+
+    def load_state(self):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.STATE_TABLE} "
+                     f"(StepName TEXT PRIMARY KEY, Fingerprint TEXT, LastRunDateTime TEXT, Seconds REAL)")
+        state = dict(conn.execute(f"SELECT StepName, Fingerprint FROM {self.STATE_TABLE}").fetchall())
+        conn.close()
+        return state
+
+    def save_step_state(self, step_name, fingerprint, seconds):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        with conn:
+            conn.execute(f"INSERT OR REPLACE INTO {self.STATE_TABLE} VALUES (?, ?, ?, ?)",
+                         (step_name, fingerprint, time.strftime("%Y-%m-%d %H:%M:%S"), seconds))
+        conn.close()
+
+    def bump_table_versions(self, step):
+        """
+        Increase the write counter of every table output of a finished step.
+        """
+        for resource in step.outputs:
+            kind, database, table_name = self.resolve_resource(resource)
+            if kind != "table" or not os.path.exists(database):
+                continue
+            conn = sqlite3.connect(database, timeout=60)
+            with conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {self.VERSIONS_TABLE} "
+                             f"(TableName TEXT PRIMARY KEY, Version INTEGER)")
+                conn.execute(f"INSERT INTO {self.VERSIONS_TABLE} VALUES (?, 1) "
+                             f"ON CONFLICT (TableName) DO UPDATE SET Version = Version + 1", (table_name,))
+            conn.close()
+
+    def load_markers(self):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.MARKERS_TABLE} "
+                     f"(StepName TEXT PRIMARY KEY, Status TEXT, CompletedDateTime TEXT)")
+        markers = dict(conn.execute(f"SELECT StepName, Status FROM {self.MARKERS_TABLE}").fetchall())
+        conn.close()
+        return markers
+
+    def save_marker(self, step_name, status):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        with conn:
+            conn.execute(f"INSERT OR REPLACE INTO {self.MARKERS_TABLE} VALUES (?, ?, ?)",
+                         (step_name, status, time.strftime("%Y-%m-%d %H:%M:%S")))
+        conn.close()
+
+    def clear_markers(self):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        with conn:
+            conn.execute(f"DELETE FROM {self.MARKERS_TABLE}")
+        conn.close()
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def should_skip(self, step, fingerprint, stored_fingerprint, force=False):
+        return not force and not step.always_run and fingerprint == stored_fingerprint and self.outputs_exist(step)
+
+    def build_executors(self):
+        """
+        Build the pools of the run as a dict step kind -> executor.
+        """
+        if self.executor_type == "mixed":
+            return {"io": concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers),
+                    "cpu": concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)}
+        if self.executor_type == "process":
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return {"io": executor, "cpu": executor}
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @DataHelper.calculate_execution_time
+    def run(self, step_names=None, force=False, resume=False):
+        """
+        Run the pipeline.
+
+        Args:
+            step_names (list, optional): Run only these steps and the steps downstream of them. Upstream steps that are
+                not selected are treated as finished.
+            force (bool): Run the selected steps even when their inputs did not change.
+            resume (bool): Do not run the steps that have a completion marker from an interrupted run.
+
+        Returns:
+            dict: step name -> status ('done', 'skipped', 'resumed', 'failed' or 'blocked').
+        """
+        selected = set(self.steps) if step_names is None else self.downstream_steps(step_names)
+        state = self.load_state()
+        markers = self.load_markers()
+        if not resume:
+            self.clear_markers()
+            markers = {}
+        self.enable_wal_mode()
+
+        status = {name: "resumed" for name in selected if name in markers}
+        pending = {name: self.upstream_steps[name] & selected for name in selected if name not in markers}
+        running = {}
+        fingerprints = {}
+        for name in status:
+            print(f"{name} resumed from a completion marker.")
+
+        executors = self.build_executors()
+        try:
+            while pending or running:
+                for name in sorted(pending):
+                    upstream = pending[name]
+                    if any(status.get(upstream_name) in ("failed", "blocked") for upstream_name in upstream):
+                        status[name] = "blocked"
+                        del pending[name]
+                        print(f"{name} blocked by a failed upstream step.")
+                    elif all(upstream_name in status for upstream_name in upstream):
+                        del pending[name]
+                        step = self.steps[name]
+                        fingerprints[name] = self.fingerprint_step(step)
+                        if self.should_skip(step, fingerprints[name], state.get(name), force):
+                            status[name] = "skipped"
+                            self.save_marker(name, "skipped")
+                            print(f"{name} skipped, its inputs did not change.")
+                            continue
+                        future = executors[step.kind].submit(run_step_function, name, step.function, step.args,
+                                                             step.kwargs, self.lock_retries, self.lock_wait_seconds)
+                        running[future] = name
+                        print(f"{name} started.")
+
+                if not running:
+                    continue
+
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+                    name, step_status, seconds, error = future.result()
+                    fingerprint = fingerprints[name]
+                    status[name] = step_status
+                    if step_status == "done":
+                        self.bump_table_versions(self.steps[name])
+                        self.save_step_state(name, fingerprint, seconds)
+                    if step_status == "failed":
+                        print(f"{name} failed after {seconds:.2f} seconds:\n{error}")
+                    else:
+                        self.save_marker(name, step_status)
+                        print(f"{name} {step_status} in {seconds:.2f} seconds.")
+        finally:
+            for executor in set(executors.values()):
+                executor.shutdown(wait=True)
+
+        if all(step_status in ("done", "skipped", "resumed") for step_status in status.values()):
+            self.clear_markers()
+
+        return status
+
+    def downstream_steps(self, step_names):
+        selected = set(step_names)
+        unknown = selected - set(self.steps)
+        if unknown:
+            raise ValueError(f"Unknown pipeline steps: {sorted(unknown)}")
+
+        changed = True
+        while changed:
+            changed = False
+            for name, upstream in self.upstream_steps.items():
+                if name not in selected and upstream & selected:
+                    selected.add(name)
+                    changed = True
+        return selected
@@ -0,0 +1,58 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import threading
+import time
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class TokenBucketRateLimiter:
+    """
+    A thread-safe token bucket shared by concurrent fetch workers.
+
+    The bucket holds up to capacity tokens and refills at rate_per_second. acquire() takes tokens and blocks the
+    calling thread until enough are available, so any number of workers together stay under the rate while short
+    bursts of up to capacity requests go through at once.
+
+    Usage:
+        limiter = TokenBucketRateLimiter(rate_per_second=2, capacity=4)
+        limiter.acquire()
+        response = fetch()
+    """
+
+    def __init__(self, rate_per_second, capacity=None):
+        self.rate_per_second = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_second))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, waiting until they are available.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill(time.monotonic())
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.waited_seconds += waited
+                    return waited
+                delay = (tokens - self.tokens) / self.rate_per_second
+            time.sleep(delay)
+            waited += delay
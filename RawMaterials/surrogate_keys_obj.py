@@ -0,0 +1,231 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pandas as pd
+import numpy as np
+import jdatetime
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class SurrogateKeyEncoder(DataHelper):
+    """
+    Encode the warehouse keys as packed int64 surrogate keys.
+
+    Entities (symbols, investors, time frames) are mapped to small integers that are kept in SurrogateKeysTbl of
+    BasicDataBase.db, so the same value gets the same code in every database and on every run. Dates become day
+    ordinals since 1900-01-01 and intraday times become seconds of the day. A composite key is the bit concatenation
+    of its parts, most significant part first, so the packed keys sort like the string keys they replace:
+
+        PriceKeyID              symbol(20) | day(17) | time frame(8)
+        ReportKeyID             fund(20) | day(17)
+        TimeFrameReportKeyID    fund(20) | day(17) | time frame(8)
+        ReportInvestorKeyID     investor(24) | fund(20) | day(17)
+        IntraMarketWatchKeyID   symbol(20) | day(17) | second(17)
+        IntraBookOrderKeyID     symbol(20) | day(17) | second(17) | depth(4)
+
+    A key is <NA> when one of its parts is missing. The string keys (PriceKey, ReportID, ...) stay in the tables as
+    display columns; joins should use the integer columns.
+
+    Usage:
+        encoder = SurrogateKeyEncoder()
+        df["PriceKeyID"] = encoder.build_price_key(df)
+    """
+
+    KEYS_TABLE = "SurrogateKeysTbl"
+    ORDINAL_EPOCH = pd.Timestamp("1900-01-01")
+
+    SYMBOL_BITS = 20
+    FUND_BITS = 20
+    INVESTOR_BITS = 24
+    DAY_BITS = 17
+    TIME_FRAME_BITS = 8
+    SECONDS_BITS = 17
+    DEPTH_BITS = 4
+
+    def __init__(self, db_name=None):
+        super().__init__()
+        self.db_name = db_name or f"{self.project_path}/Warehouse/BasicDataBase.db"
+        self.entity_codes = {}
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def load_entity_codes(self, entity):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.KEYS_TABLE} "
+                     f"(Entity TEXT, Value TEXT, Code INTEGER, PRIMARY KEY (Entity, Value))")
+        rows = conn.execute(f"SELECT Value, Code FROM {self.KEYS_TABLE} WHERE Entity = ?", (entity,)).fetchall()
+        conn.close()
+        self.entity_codes[entity] = dict(rows)
+        return self.entity_codes[entity]
+
+    def register_entity_values(self, entity, values):
+        """
+        Give codes to new values of an entity. Codes start at 1 and are never reused or changed.
+        """
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.KEYS_TABLE} "
+                         f"(Entity TEXT, Value TEXT, Code INTEGER, PRIMARY KEY (Entity, Value))")
+            conn.executemany(f"INSERT OR IGNORE INTO {self.KEYS_TABLE} (Entity, Value, Code) "
+                             f"SELECT ?, ?, COALESCE(MAX(Code), 0) + 1 FROM {self.KEYS_TABLE} WHERE Entity = ?",
+                             [(entity, value, entity) for value in values])
+        conn.close()
+        return self.load_entity_codes(entity)
+
+    def encode_entity(self, entity, values):
+        """
+        Map the values of an entity to their integer codes.
+
+        Args:
+            entity (str): Entity name, e.g. 'Symbol', 'Investor' or 'TimeFrame'.
+            values (pd.Series): The values to encode.
+
+        Returns:
+            pd.Series: Int64 codes aligned with values, <NA> for missing values.
+        """
+        values = pd.Series(values)
+        valid = values.notna()
+        text_values = values[valid].astype(str)
+
+        codes = self.entity_codes.get(entity)
+        if codes is None:
+            codes = self.load_entity_codes(entity)
+
+        new_values = [value for value in text_values.unique() if value not in codes]
+        if new_values:
+            codes = self.register_entity_values(entity, new_values)
+
+        encoded = pd.Series(pd.NA, index=values.index, dtype="Int64")
+        encoded[valid] = text_values.map(codes).astype("Int64")
+        return encoded
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def gregorian_day_ordinals(cls, gregorian_dates):
+        gregorian_dates = pd.to_datetime(pd.Series(gregorian_dates), errors="coerce")
+        return ((gregorian_dates - cls.ORDINAL_EPOCH).dt.days).astype("Int64")
+
+    @classmethod
+    def jalali_day_ordinals(cls, jalali_dates):
+        """
+        Day ordinals of 'YYYY-MM-DD' Jalali dates. Only the distinct dates are converted with jdatetime.
+        """
+        jalali_dates = pd.Series(jalali_dates)
+        unique_dates = jalali_dates.dropna().astype(str).unique()
+
+        gregorian_dates = {}
+        for jalali_date in unique_dates:
+            try:
+                year, month, day = (int(part) for part in jalali_date.split("-"))
+                gregorian_dates[jalali_date] = jdatetime.date(year, month, day).togregorian().isoformat()
+            except ValueError:
+                gregorian_dates[jalali_date] = None
+
+        return cls.gregorian_day_ordinals(jalali_dates.astype(str).map(gregorian_dates))
+
+    @staticmethod
+    def seconds_of_day(times):
+        times = pd.Series(times).astype(str).str.split(":", expand=True)
+        if times.shape[1] < 3:
+            return pd.Series(pd.NA, index=times.index, dtype="Int64")
+        hours, minutes, seconds = (pd.to_numeric(times[i], errors="coerce") for i in range(3))
+        return (hours * 3600 + minutes * 60 + seconds.round()).astype("Int64")
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def pack_key_parts(parts):
+        """
+        Pack integer parts into one int64 key, the first part in the most significant bits.
+
+        Args:
+            parts (list): (values, bits) pairs; values are non-negative integers smaller than 2 ** bits.
+
+        Returns:
+            pd.Series: Int64 keys, <NA> where a part is missing.
+        """
+        total_bits = sum(bits for _, bits in parts)
+        if total_bits > 63:
+            raise ValueError(f"A surrogate key of {total_bits} bits does not fit in int64")
+
+        index = pd.Series(parts[0][0]).index
+        missing = np.zeros(len(index), dtype=bool)
+        keys = np.zeros(len(index), dtype=np.int64)
+        for values, bits in parts:
+            values = pd.Series(values).astype("Int64")
+            missing |= values.isna().to_numpy()
+            numbers = values.fillna(0).to_numpy(dtype=np.int64)
+            if (numbers < 0).any() or (numbers >= (1 << bits)).any():
+                raise ValueError(f"A surrogate key part does not fit in {bits} bits")
+            keys = (keys << bits) | numbers
+
+        packed = pd.Series(keys, index=index, dtype="Int64")
+        packed[missing] = pd.NA
+        return packed
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def build_price_key(self, df, symbol_column="Symbol", date_column="GDate", time_frame_column="TimeFrame"):
+        return self.pack_key_parts([
+            (self.encode_entity("Symbol", df[symbol_column]), self.SYMBOL_BITS),
+            (self.gregorian_day_ordinals(df[date_column]), self.DAY_BITS),
+            (self.encode_entity("TimeFrame", df[time_frame_column]), self.TIME_FRAME_BITS),
+        ])
+
+    def build_report_key(self, df, fund_column="MarketMakerFundID", date_column="JDate"):
+        return self.pack_key_parts([
+            (pd.to_numeric(df[fund_column], errors="coerce").round().astype("Int64"), self.FUND_BITS),
+            (self.jalali_day_ordinals(df[date_column]), self.DAY_BITS),
+        ])
+
+    def build_time_frame_report_key(self, df, fund_column="MarketMakerFundID", date_column="JDate",
+                                    time_frame_column="TimeFrame"):
+        return self.pack_key_parts([
+            (pd.to_numeric(df[fund_column], errors="coerce").round().astype("Int64"), self.FUND_BITS),
+            (self.jalali_day_ordinals(df[date_column]), self.DAY_BITS),
+            (self.encode_entity("TimeFrame", df[time_frame_column]), self.TIME_FRAME_BITS),
+        ])
+
+    def build_report_investor_key(self, df, investor_column="NationalCode_UniversalCode",
+                                  fund_column="MarketMakerFundID", date_column="JDate"):
+        return self.pack_key_parts([
+            (self.encode_entity("Investor", df[investor_column]), self.INVESTOR_BITS),
+            (pd.to_numeric(df[fund_column], errors="coerce").round().astype("Int64"), self.FUND_BITS),
+            (self.jalali_day_ordinals(df[date_column]), self.DAY_BITS),
+        ])
+
+    def build_intra_market_watch_key(self, df, symbol_column="Symbol", date_column="GDate", time_column="Time"):
+        return self.pack_key_parts([
+            (self.encode_entity("Symbol", df[symbol_column]), self.SYMBOL_BITS),
+            (self.gregorian_day_ordinals(df[date_column]), self.DAY_BITS),
+            (self.seconds_of_day(df[time_column]), self.SECONDS_BITS),
+        ])
+
+    def build_intra_book_order_key(self, df, symbol_column="Symbol", date_column="GDate", time_column="Time",
+                                   depth_column="OrderBookDepth"):
+        return self.pack_key_parts([
+            (self.encode_entity("Symbol", df[symbol_column]), self.SYMBOL_BITS),
+            (self.gregorian_day_ordinals(df[date_column]), self.DAY_BITS),
+            (self.seconds_of_day(df[time_column]), self.SECONDS_BITS),
+            (pd.to_numeric(df[depth_column], errors="coerce").astype("Int64"), self.DEPTH_BITS),
+        ])
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def create_key_index(conn, table_name, column_name, unique=False):
+        unique_sql = "UNIQUE " if unique else ""
+        conn.execute(f'CREATE {unique_sql}INDEX IF NOT EXISTS "idx_{table_name}_{column_name}" '
+                     f'ON "{table_name}" ("{column_name}")')
+        conn.commit()
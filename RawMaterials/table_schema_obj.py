@@ -0,0 +1,533 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = None
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class TableSchemaRegistry:
+    """
+    One place for the column types of the warehouse tables.
+
+    TABLE_SCHEMAS holds the SQL types the creators pass to to_sql. COMPACT_SCHEMAS holds, by table, the in-memory
+    types of a loaded frame: low-cardinality labels become categoricals and measures whose precision is not needed
+    become int32/int8/float32. The remaining text columns of those tables are stored as Arrow strings when pyarrow is
+    installed. Compaction is opt-in: the loaders apply it only when asked with apply_schema=True, and tables without
+    an entry are returned unchanged.
+
+    ID and key columns, and the columns that string keys are built from (KEY_PART_COLUMNS, e.g. Symbol + '_' + GDate),
+    are never converted: ReportID and the other string keys are built with astype(str) and string concatenation, which
+    categoricals break. OwnershipPercentage and FundUnitsPercentage stay float64 because they are rounded and compared
+    in reports.
+
+    Usage:
+        dtyp = TableSchemaRegistry.sql_types("MarketMakerHoldingsTbl")
+        df = TableSchemaRegistry.compact_dataframe(df, "IranStockIntraMarketWatchTbl")
+    """
+
+    TABLE_SCHEMAS = {
+        # --------------------------------------------------------------------------------------------------------
+        # IranMarketMaker.db
+        "MarketMakerAssetsRayanYekanTbl": {
+            "IranCompanyCode12": "TEXT PRIMARY KEY",
+            "AssetNameYekan": "TEXT",
+            "AssetSymbolYekan": "TEXT",
+            "AssetTypeYekan": "TEXT",
+            "AssetNameRayan": "TEXT",
+            "AssetSymbolRayan": "TEXT",
+        },
+        "MarketMakerBasicFundsInformationTbl": {
+            "MarketMakerFundID": "INTEGER PRIMARY KEY",
+            "IranCompanyCode12": "TEXT",
+            "FundMarketMakerName": "TEXT",
+            "SymbolFundYekan": "TEXT",
+        },
+        "MarketMakerFundsFiscalYearYekanTbl": {
+            "FundFiscalYearID": "INTEGER PRIMARY KEY",
+            "IranCompanyCode12": "TEXT",
+            "MarketMakerFundID": "INTEGER",
+            "SymbolFundYekan": "TEXT",
+            "FundFiscalMarketMakerYekan": "TEXT",
+        },
+        "MarketMakerInvestorsYekanTbl": {
+            "InvestorID": "INTEGER",
+            "InvestorName": "TEXT",
+            "NationalCode_UniversalCode": "TEXT PRIMARY KEY",
+        },
+        "MarketMakerAnnouncementsInformationTbl": {
+            "AnnouncementID": "TEXT PRIMARY KEY",
+            "AnnouncementJDate": "TEXT",
+            "AnnouncementType": "TEXT",
+            "MarketMakerFundID": "INTEGER",
+            "SymbolFundYekan": "TEXT",
+            "AnnouncementEffectiveJDate": "TEXT",
+            "StartMarketMakingJDate": "TEXT",
+            "FinishMarketMakingJDate": "TEXT",
+            "Commitment": "INTEGER",
+            "CumulativeOrderVolume": "TEXT",
+            "QuoteDomain": "REAL",
+            "StockVolatilityRange": "INTEGER",
+            "IranCompanyCode12": "TEXT",
+        },
+        "MarketMakerHoldingsTbl": {
+            "HoldingID": "INTEGER PRIMARY KEY",
+            "HoldingName": "TEXT",
+        },
+        "MarketMakerInvestorsFundsTbl": {
+            "InvestorFundsID": "TEXT PRIMARY KEY",
+            "InvestorID": "INTEGER",
+            "MarketMakerFundID": "INTEGER",
+            "InvestorName": "TEXT",
+            "SymbolFundYekan": "TEXT",
+        },
+        "MarketMakerDailyYekanReportsHelperTbl": {
+            "ReportID": "TEXT PRIMARY KEY",
+            "JDate": "TEXT",
+            "MarketMakerFundID": "INTEGER",
+            "FundFiscalMarketMakerYekan": "TEXT",
+            "SymbolFundYekan": "TEXT",
+            "NumberOfStock": "INTEGER",
+            "FinalPrice": "REAL",
+            "BreakEvenPoint": "REAL",
+            "NetSalesValue(FinalPrice)": "REAL",
+            "BuyNumber": "REAL",
+            "NetBuyAmount": "REAL",
+            "SellNumber": "REAL",
+            "NetSellAmount": "REAL",
+            "Cash_CurrentBrokerage": "REAL",
+            "Cash_BankDeposit": "REAL",
+            "FundsFixedIncome": "REAL",
+            "BondsFixedIncome": "REAL",
+            "BoughtPower": "REAL",
+            "NetCancellationAssets": "REAL",
+            "TotalUnits": "REAL",
+            "CancellationPrice": "REAL",
+            "IssuePrice": "REAL",
+            "FiscalYearReturn": "TEXT",
+            "GDate": "TEXT",
+            "Symbol": "TEXT",
+            "PriceKey": "TEXT",
+            "AnnouncementID": "TEXT",
+            "HoldingID": "INTEGER",
+        },
+        "MarketMakerDailyYekanReportsTbl": {
+            "ReportID": "TEXT PRIMARY KEY",
+            "ReportKeyID": "INTEGER",
+            "JDate": "TEXT",
+            "MarketMakerFundID": "INTEGER",
+            "FundFiscalMarketMakerYekan": "TEXT",
+            "SymbolFundYekan": "TEXT",
+            "NumberOfStock": "INTEGER",
+            "FinalPrice": "REAL",
+            "BreakEvenPoint": "REAL",
+            "NetSalesValue(FinalPrice)": "REAL",
+            "BuyNumber": "REAL",
+            "NetBuyAmount": "REAL",
+            "SellNumber": "REAL",
+            "NetSellAmount": "REAL",
+            "Cash_CurrentBrokerage": "REAL",
+            "Cash_BankDeposit": "REAL",
+            "FundsFixedIncome": "REAL",
+            "BondsFixedIncome": "REAL",
+            "BoughtPower": "REAL",
+            "NetCancellationAssets": "REAL",
+            "TotalUnits": "REAL",
+            "CancellationPrice": "REAL",
+            "IssuePrice": "REAL",
+            "FiscalYearReturn": "TEXT",
+            "GDate": "TEXT",
+            "Symbol": "TEXT",
+            "PriceKey": "TEXT",
+            "PriceKeyID": "INTEGER",
+            "AnnouncementID": "TEXT",
+            "HoldingID": "INTEGER",
+        },
+        "RawMarketMakerIssuanceCancellationTbl": {
+            "ID": "INTEGER PRIMARY KEY",
+            "FundFiscalMarketMakerYekan": "TEXT",
+            "ShareholdingCode": "TEXT",
+            "InvestorName": "TEXT",
+            "NationalCode_UniversalCode": "TEXT",
+            "OperationType": "TEXT",
+            "DepositPlace": "TEXT",
+            "UnitType": "TEXT",
+            "DateTime": "TEXT",
+            "IssuedCancellationUnitsNumber": "INTEGER",
+            "IssuedCancellationPrice": "INTEGER",
+            "Amount": "INTEGER",
+            "ReceiptNumber": "TEXT",
+            "situation": "TEXT",
+        },
+        "InvestorPositionLedgerTbl": {
+            "PositionEventID": "TEXT PRIMARY KEY",
+            "NationalCode_UniversalCode": "TEXT",
+            "MarketMakerFundID": "INTEGER",
+            "JDate": "TEXT",
+            "JDateNumber": "INTEGER",
+            "IssuedUnitsNumber": "INTEGER",
+            "CancellationUnitsNumber": "INTEGER",
+            "IssuedAmount": "INTEGER",
+            "CancellationAmount": "INTEGER",
+            "CumSumIssuedUnitsNumber": "INTEGER",
+            "CumSumCancellationUnitsNumber": "INTEGER",
+            "CumSumIssuedAmount": "INTEGER",
+            "CumSumCancellationAmount": "INTEGER",
+            "CumSumUnitsNumber": "INTEGER",
+            "InvestorID": "INTEGER",
+            "InvestorName": "TEXT",
+            "ShortName": "TEXT",
+            "IranCompanyCode12": "TEXT",
+        },
+        # --------------------------------------------------------------------------------------------------------
+        # IranStockDataBase.db
+        "FirstIranStockSymbolListTbl": {
+            'Ticker': 'TEXT',
+            'Name': 'TEXT',
+            'Market': 'TEXT',
+            'Panel': 'TEXT',
+            'Sector': 'TEXT',
+            'Sub-Sector': 'TEXT',
+            'Comment': 'TEXT',
+            'Name(EN)': 'TEXT',
+            'Company Code(12)': 'TEXT PRIMARY KEY',
+            'Ticker(4)': 'TEXT',
+            'Ticker(5)': 'TEXT',
+            'Ticker(12)': 'TEXT',
+            'Sector Code': 'TEXT',
+            'Sub-Sector Code': 'TEXT',
+            'Panel Code': 'TEXT',
+        },
+        "RawIranSymbolsBasicInformationTbl": {
+            'IranCompanyCode12': 'TEXT PRIMARY KEY',
+            'IranSymbol':'TEXT',
+            'CompanyPersianName': 'TEXT',
+            'IranMarket': 'TEXT',
+            'IranPanel': 'TEXT',
+            'IranIndustry': 'TEXT',
+            'IranSubIndustry': 'TEXT',
+            'ShortName': 'TEXT',
+            'Symbol': 'TEXT',
+            'Ticker5': 'TEXT',
+            'Ticker12': 'TEXT',
+            'IndustryIranCode': 'TEXT',
+            'SubIndustryIranCode': 'TEXT',
+            'PanelIranCode': 'TEXT',
+        },
+        "RawIranPricesTbl": {
+            'PriceKey': 'TEXT  PRIMARY KEY',
+            'Date': 'TEXT',
+            'TimeFrame': 'TEXT',
+            'Open': 'INTEGER',
+            'High': 'INTEGER',
+            'Low': 'INTEGER',
+            'Close': 'INTEGER',
+            'AdjOpen': 'INTEGER',
+            'AdjHigh': 'INTEGER',
+            'AdjLow': 'INTEGER',
+            'AdjClose': 'INTEGER',
+            'Volume': 'INTEGER',
+            'IranSymbol': 'TEXT',
+            'Symbol': 'TEXT',
+        },
+        "BasicIranIndustriesInformationTbl": {
+            "IndustryIranCode": "INTEGER PRIMARY KEY",
+            "IndustryIranName": "TEXT",
+        },
+        "BasicIranSubIndustriesInformationTbl": {
+            "SubIndustryIranCode": "INTEGER PRIMARY KEY",
+            "SubIndustryName": "TEXT",
+            "IndustryIranCode": "INTEGER",
+        },
+        "BasicIranMarketsInformationTbl": {
+            "IranMarketID": "INTEGER PRIMARY KEY",
+            "IranMarketName": "TEXT",
+        },
+        "BasicIranSymbolsInformationTbl": {
+            "IranCompanyCode12": "TEXT PRIMARY KEY",
+            "Symbol": "TEXT",
+            "ShortName": "TEXT",
+            "IranSymbol": "TEXT",
+            "CompanyPersianName": "TEXT",
+            "IranMarketID": "INTEGER",
+            "IndustryIranCode": "INTEGER",
+            "SubIndustryIranCode": "INTEGER",
+        },
+        "PreprocessedIranMarketPricesTbl": {
+            'PriceKey': 'TEXT PRIMARY KEY',
+            'PriceKeyID': 'INTEGER',
+            'GDate': 'TEXT',
+            'JDate': 'TEXT',
+            'TimeFrame': 'TEXT',
+            'IranSymbol': 'TEXT',
+            'Symbol': 'TEXT',
+            'IranCompanyCode12': 'TEXT',
+            'Open': 'INTEGER',
+            'High': 'INTEGER',
+            'Low': 'INTEGER',
+            'Close': 'INTEGER',
+            'AdjOpen': 'INTEGER',
+            'AdjHigh': 'INTEGER',
+            'AdjLow': 'INTEGER',
+            'AdjClose': 'INTEGER',
+            'Volume': 'INTEGER',
+            'AdjVolume': 'INTEGER',
+            'TransactionValue': 'INTEGER',
+            'NormalizedAdjOpen': 'INTEGER',
+            'NormalizedAdjHigh': 'INTEGER',
+            'NormalizedAdjLow': 'INTEGER',
+            'NormalizedAdjClose': 'INTEGER',
+            'NormalizedAdjVolume': 'INTEGER',
+            'NormalizedTransactionValue': 'INTEGER',
+        },
+        "RawIranIndividualCorporateTransactionsTbl": {
+            'PriceKey': 'TEXT  PRIMARY KEY',
+            'Date': 'TEXT',
+            'TimeFrame': 'TEXT',
+            'IranSymbol': 'TEXT',
+            'individual_buy_count': 'INTEGER',
+            'individual_sell_count': 'INTEGER',
+            'corporate_buy_count': 'INTEGER',
+            'corporate_sell_count': 'INTEGER',
+            'individual_buy_vol': 'INTEGER',
+            'individual_sell_vol': 'INTEGER',
+            'corporate_buy_vol': 'INTEGER',
+            'corporate_sell_vol': 'INTEGER',
+            'individual_buy_value': 'INTEGER',
+            'individual_sell_value': 'INTEGER',
+            'corporate_buy_value': 'INTEGER',
+            'corporate_sell_value': 'INTEGER',
+            'Symbol': 'TEXT',
+        },
+        "RawIranStockShareHoldersTbl": {
+            'PriceKey': 'TEXT  PRIMARY KEY',
+            'Date': 'TEXT',
+            'TimeFrame': 'TEXT',
+            'IranSymbol': 'TEXT',
+            'Symbol': 'TEXT',
+            'shareholder_id': 'TEXT',
+            'shareholder_shares': 'INTEGER',
+            'shareholder_percentage': 'INTEGER',
+            'IranCompanyCode12': 'TEXT',
+            'shareholder_name': 'INTEGER',
+            "change": 'INTEGER',
+        },
+        "IranStockFloatingSharesTbl": {
+            'PriceKey': 'TEXT  PRIMARY KEY',
+            'Date': 'TEXT',
+            'TimeFrame': 'TEXT',
+            'IranSymbol': 'TEXT',
+            "Symbol":"TEXT",
+            "FloatingShares": 'INTEGER',
+        },
+        "IranStockIntraMarketWatchTbl": {
+            'IntraMarketWatchKey': 'TEXT  PRIMARY KEY',
+            'IntraMarketWatchKeyID': 'INTEGER',
+            'JDownloadDateTime':'TEXT',
+            'GDate': 'TEXT',
+            'JDate': 'TEXT',
+            'Time': 'TEXT',
+            'TseUpdateTime': 'TEXT',
+            'IranCompanyCode12': 'TEXT',
+            'Symbol': 'TEXT',
+            'IranSymbol': 'TEXT',
+            'CompanyPersianName': 'TEXT',
+            'TradeType': 'TEXT',
+            'IntraOpen': 'REAL' ,
+            'IntraHigh': 'REAL' ,
+            'IntraLow': 'REAL',
+            'IntraClose': 'REAL',
+            'IntraFinal': 'REAL',
+            'IntraClose(%)': 'REAL',
+            'IntraFinal(%)': 'REAL',
+            'IntraVolume': 'INTEGER',
+            'IntraTradeCount': 'INTEGER',
+            'DailyMaxAllowPrice': 'REAL',
+            'DailyMinAllowPrice': 'REAL',
+            'IntraIndividualBuyVolume': 'INTEGER',
+            'IntraCorporateBuyVolume': 'INTEGER',
+            'IntraIndividualSellVolume': 'INTEGER',
+            'IntraCorporateSellVolume': 'INTEGER',
+            'IntraIndividualBuyCount': 'INTEGER',
+            'IntraCorporateBuyCount': 'INTEGER',
+            'IntraIndividualSellCount': 'INTEGER',
+            'IntraCorporateSellCount': 'INTEGER',
+            'ShareNumber': 'INTEGER',
+            'BaseVolume': 'INTEGER',
+            'MarketCap': 'REAL',
+            'EPS': 'REAL',
+            'BQ-Value': 'REAL',
+            'SQ-Value': 'REAL',
+            'IsKeyframe': 'INTEGER',
+        },
+        "IranStockIntraOrderBookTblCreator": {
+            'IntraBookOrderKey': 'TEXT  PRIMARY KEY',
+            'IntraBookOrderKeyID': 'INTEGER',
+            'JDownloadDateTime':'TEXT',
+            'GDate': 'TEXT',
+            'JDate': 'TEXT',
+            'Time': 'TEXT',
+            'IntraMarketWatchKey': 'TEXT',
+            'IntraMarketWatchKeyID': 'INTEGER',
+            'Symbol': 'TEXT',
+            'IranSymbol': 'TEXT',
+            'CompanyPersianName': 'TEXT',
+            'OrderBookDepth': 'INTEGER',
+            'SellCount': 'INTEGER',
+            'SellVolume': 'INTEGER',
+            'SellPrice': 'REAL',
+            'BuyCount': 'INTEGER',
+            'BuyVolume': 'INTEGER',
+            'BuyPrice': 'REAL',
+        },
+        "IranStockIntraHistoricalOrderBookTbl": {
+            'IntraBookOrderKey': 'TEXT  PRIMARY KEY',
+            'JDownloadDateTime':'TEXT',
+            'GDate': 'TEXT',
+            'JDate': 'TEXT',
+            'Time': 'TEXT',
+            'IntraMarketWatchKey': 'TEXT',
+            'Symbol': 'TEXT',
+            'IranSymbol': 'TEXT',
+            'CompanyPersianName': 'TEXT',
+            'OrderBookDepth': 'INTEGER',
+            'SellCount': 'INTEGER',
+            'SellVolume': 'INTEGER',
+            'SellPrice': 'REAL',
+            'BuyCount': 'INTEGER',
+            'BuyVolume': 'INTEGER',
+            'BuyPrice': 'REAL',
+        },
+        "IntraOrderBookLevelDiffTbl": {
+            'SnapshotSeconds': 'INTEGER',
+            'SymbolCode': 'INTEGER',
+            'Side': 'INTEGER',
+            'Depth': 'INTEGER',
+            'Price': 'INTEGER',
+            'Volume': 'INTEGER',
+            'OrderCount': 'INTEGER',
+        },
+        "IntraOrderBookSnapshotTimesTbl": {
+            'SnapshotSeconds': 'INTEGER PRIMARY KEY',
+        },
+        "IntraOHLCVBarsTbl": {
+            'Symbol': 'TEXT',
+            'TimeFrame': 'TEXT',
+            'GDate': 'TEXT',
+            'BarTime': 'TEXT',
+            'BarSeconds': 'INTEGER',
+            'Open': 'REAL',
+            'High': 'REAL',
+            'Low': 'REAL',
+            'Close': 'REAL',
+            'Volume': 'INTEGER',
+            'SnapshotCount': 'INTEGER',
+        },
+    }
+
+    KEY_PART_COLUMNS = {
+        "ShortName", "IranSymbol", "Symbol", "Ticker", "TimeFrame", "NationalCode_UniversalCode", "JDate", "GDate",
+        "Time", "JDownloadDateTime", "JHalfYear", "JSeason", "JMonthYear", "JWeekNumber",
+    }
+
+    ORDER_BOOK_COMPACT_SCHEMA = {
+        "category": [],
+        "downcast": {"BuyCount": "int32", "SellCount": "int32", "OrderBookDepth": "int8"},
+    }
+
+    COMPACT_SCHEMAS = {
+        "MarketMakerHoldingsTbl": {"category": ["HoldingName"], "downcast": {}},
+        "MarketMakerAnnouncementsInformationTbl": {"category": ["AnnouncementType"], "downcast": {}},
+        "PreprocessedIranMarketPricesTbl": {"category": [], "downcast": {"NormalizedAdjVolume": "float32"}},
+        "IranStockIntraMarketWatchTbl": {
+            "category": ["TradeType"],
+            "downcast": {
+                "IntraTradeCount": "int32",
+                "IntraIndividualBuyCount": "int32",
+                "IntraIndividualSellCount": "int32",
+                "IntraCorporateBuyCount": "int32",
+                "IntraCorporateSellCount": "int32",
+            },
+        },
+        "IranStockIntraOrderBookTblCreator": ORDER_BOOK_COMPACT_SCHEMA,
+        "IranStockIntraHistoricalOrderBookTbl": ORDER_BOOK_COMPACT_SCHEMA,
+    }
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @classmethod
+    def sql_types(cls, table_name):
+        """
+        Return a copy of the SQL column types of a table, ready for to_sql(dtype=...).
+        """
+        return dict(cls.TABLE_SCHEMAS[table_name])
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def is_key_column(column_name):
+        return column_name.endswith("ID") or column_name.endswith("Key") or column_name.endswith("Code12")
+
+    @classmethod
+    def downcast_column(cls, series, target_dtype):
+        """
+        Downcast a numeric column when it has no nulls and every value fits the target type; otherwise return it
+        unchanged.
+        """
+        values = pd.to_numeric(series, errors="coerce")
+        if values.isna().any():
+            return series
+
+        if np.issubdtype(np.dtype(target_dtype), np.integer):
+            limits = np.iinfo(target_dtype)
+            if (values % 1 != 0).any() or values.min() < limits.min or values.max() > limits.max:
+                return series
+        else:
+            limits = np.finfo(target_dtype)
+            if values.abs().max() > limits.max:
+                return series
+
+        return values.astype(target_dtype)
+
+    @classmethod
+    def is_protected_column(cls, column_name):
+        return cls.is_key_column(column_name) or column_name in cls.KEY_PART_COLUMNS
+
+    @classmethod
+    def compact_dataframe(cls, df, table_name):
+        """
+        Convert a frame loaded from a table to the compact in-memory types of that table.
+
+        Args:
+            df (pd.DataFrame): A frame read from the warehouse.
+            table_name (str): The table it was read from; tables without a COMPACT_SCHEMAS entry are not changed.
+
+        Returns:
+            pd.DataFrame: The same frame with categorical, downcast and (when available) Arrow string columns.
+        """
+        schema = cls.COMPACT_SCHEMAS.get(table_name)
+        if schema is None:
+            return df
+
+        for column_name in df.columns:
+            if cls.is_protected_column(column_name):
+                continue
+
+            if column_name in schema["category"]:
+                df[column_name] = df[column_name].astype("category")
+            elif column_name in schema["downcast"]:
+                df[column_name] = cls.downcast_column(df[column_name], schema["downcast"][column_name])
+            elif STRING_DTYPE and df[column_name].dtype == object:
+                if pd.api.types.infer_dtype(df[column_name], skipna=True) == "string":
+                    df[column_name] = df[column_name].astype(STRING_DTYPE)
+
+        return df
@@ -0,0 +1,161 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class TimeBucketAggregator:
+    """
+    Aggregate intraday observations into fixed time buckets on integer seconds since midnight.
+
+    The rows are sorted once on a single int64 key built from the series columns (e.g. symbol, date and depth) and
+    the time; when the product of the column cardinalities does not fit in an int64, the series are numbered with a
+    groupby on the raw columns instead. Bucket boundaries are then found on the sorted arrays, and every aggregate is
+    computed with np.add.reduceat over those boundaries, so the cost is one sort plus a few linear passes for any
+    bucket size.
+
+    Aggregates, per series and bucket:
+        mean           Plain mean of the observations in the bucket.
+        last           The last observation in the bucket, i.e. the state at the bucket close.
+        time_weighted  Mean weighted by how long each value held inside the bucket. A value holds until the next
+                       observation of its series; the value from the previous bucket covers the start of the bucket,
+                       and the last value of a series holds until the bucket end.
+
+    Usage:
+        aggregator = TimeBucketAggregator(bucket_seconds=5)
+        df["Seconds"] = TimeBucketAggregator.to_seconds(df["Time"])
+        bucket_df = aggregator.aggregate(df, ["IranSymbol", "GDate", "Depth"], "Seconds", ["Buy_Vol"], ["time_weighted"])
+    """
+
+    AGGREGATES = ("mean", "last", "time_weighted")
+    SUFFIXES = {"mean": "Mean", "last": "Last", "time_weighted": "TimeWeighted"}
+
+    def __init__(self, bucket_seconds=5):
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        self.bucket_seconds = int(bucket_seconds)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def to_seconds(times):
+        """
+        Seconds since midnight of 'HH:MM:SS' strings, parsed in one vectorized call. Invalid times become <NA>.
+        """
+        seconds = pd.to_timedelta(pd.Series(times).astype(str), errors="coerce") // pd.Timedelta(seconds=1)
+        return seconds.astype("Int64")
+
+    @staticmethod
+    def to_times(seconds):
+        """
+        'HH:MM:SS' strings of seconds since midnight.
+        """
+        seconds = pd.Series(seconds).astype("int64") % 86400
+        hours = (seconds // 3600).astype(str).str.zfill(2)
+        minutes = (seconds % 3600 // 60).astype(str).str.zfill(2)
+        return hours + ":" + minutes + ":" + (seconds % 60).astype(str).str.zfill(2)
+
+    def round_seconds(self, seconds):
+        """
+        Round seconds to the nearest bucket boundary, halves to even like Python's round.
+        """
+        return (np.round(np.asarray(seconds, dtype=np.float64) / self.bucket_seconds) * self.bucket_seconds) \
+            .astype(np.int64)
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def aggregate(self, df, series_columns, seconds_column, value_columns, aggregates=("mean",)):
+        """
+        Aggregate value columns per series and bucket.
+
+        Args:
+            df (pd.DataFrame): The observations; rows with a missing time are ignored.
+            series_columns (list): Columns that identify one series, e.g. ['IranSymbol', 'GDate', 'Depth'].
+            seconds_column (str): Integer seconds since midnight.
+            value_columns (list): Numeric columns to aggregate.
+            aggregates (iterable, optional): Any of AGGREGATES. Default is ('mean',).
+
+        Returns:
+            pd.DataFrame: One row per series and bucket with the series columns, BucketSeconds (bucket start),
+                          ObservationCount and a '<column><Suffix>' column per value column and aggregate.
+        """
+        unknown = [aggregate for aggregate in aggregates if aggregate not in self.AGGREGATES]
+        if unknown:
+            raise ValueError(f"Unknown aggregates {unknown}, expected any of {self.AGGREGATES}")
+
+        if df[seconds_column].isna().any():
+            df = df[df[seconds_column].notna()]
+        seconds = df[seconds_column].to_numpy(dtype=np.int64)
+
+        # One int64 sort key: the series id in mixed radix over the factorized columns, then the seconds
+        seconds_span = int(seconds.max()) + 1 if len(seconds) else 1
+        factorized = [pd.factorize(df[column], sort=True) for column in series_columns]
+        key_span = seconds_span
+        for _, uniques in factorized:
+            key_span *= len(uniques) + 1
+        if key_span <= np.iinfo(np.int64).max:
+            series_ids = np.zeros(len(df), dtype=np.int64)
+            for codes, uniques in factorized:
+                series_ids = series_ids * (len(uniques) + 1) + codes + 1
+            order = np.argsort(series_ids * seconds_span + seconds, kind="stable")
+        else:
+            # Too many distinct series values for one int64 key: number the series that occur with groupby instead
+            series_ids = df.groupby(list(series_columns), sort=True, dropna=False).ngroup().to_numpy(dtype=np.int64)
+            order = np.lexsort((seconds, series_ids))
+        seconds = seconds[order]
+        series_ids = series_ids[order]
+        buckets = seconds // self.bucket_seconds * self.bucket_seconds
+
+        row_count = len(seconds)
+        new_series = np.ones(row_count, dtype=bool)
+        new_series[1:] = series_ids[1:] != series_ids[:-1]
+        new_bucket = new_series.copy()
+        new_bucket[1:] |= buckets[1:] != buckets[:-1]
+
+        starts = np.flatnonzero(new_bucket)
+        ends = np.append(starts[1:], row_count) - 1
+        result = df[list(series_columns)].iloc[order[starts]].reset_index(drop=True)
+        result["BucketSeconds"] = buckets[starts]
+        result["ObservationCount"] = np.diff(np.append(starts, row_count))
+        if not row_count:
+            return result
+
+        if "time_weighted" in aggregates:
+            bucket_ends = buckets + self.bucket_seconds
+            next_seconds = np.append(seconds[1:], 0)
+            last_of_series = np.append(new_series[1:], True)
+            holds_until = np.where(last_of_series, bucket_ends, np.minimum(next_seconds, bucket_ends))
+            weights = (holds_until - seconds).astype(np.float64)
+            # The previous value of the series covers the bucket from its start to the first observation
+            carried = ~new_series[starts]
+            carried_weights = np.where(carried, seconds[starts] - buckets[starts], 0).astype(np.float64)
+
+        for column in value_columns:
+            values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=np.float64)[order]
+            valid = ~np.isnan(values)
+            filled = np.where(valid, values, 0.0)
+
+            if "mean" in aggregates:
+                counts = np.add.reduceat(valid.astype(np.int64), starts)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result[column + self.SUFFIXES["mean"]] = np.add.reduceat(filled, starts) / counts
+
+            if "last" in aggregates:
+                result[column + self.SUFFIXES["last"]] = values[ends]
+
+            if "time_weighted" in aggregates:
+                value_weights = np.where(valid, weights, 0.0)
+                previous_values = values[np.maximum(starts - 1, 0)]
+                previous_weights = np.where(carried & ~np.isnan(previous_values), carried_weights, 0.0)
+                weighted_sum = np.add.reduceat(filled * value_weights, starts) + \
+                    np.nan_to_num(previous_values) * previous_weights
+                total_weight = np.add.reduceat(value_weights, starts) + previous_weights
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result[column + self.SUFFIXES["time_weighted"]] = np.where(total_weight > 0,
+                                                                               weighted_sum / total_weight, np.nan)
+        return result
@@ -0,0 +1,30 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+@pytest.fixture
+def project_path(tmp_path, monkeypatch):
+    """
+    A temporary project folder with a Warehouse directory, used as DataHelper.project_path by every helper object.
+    """
+    (tmp_path / "Warehouse").mkdir()
+    original_init = DataHelper.__init__
+
+    def init_in_tmp_path(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.project_path = str(tmp_path)
+
+    monkeypatch.setattr(DataHelper, "__init__", init_in_tmp_path)
+    return str(tmp_path)
@@ -0,0 +1,59 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Materials.adaptive_sampler_obj import AdaptiveIntradaySampler
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def market_watch(closes, volumes):
+    return pd.DataFrame({"Ticker": ["MM", "A", "B"], "Close": closes, "Day_UL": 110.0, "Day_LL": 90.0,
+                         "Volume": volumes})
+
+
+def kept(sampler, closes, volumes, now_seconds, store_all=False):
+    keep = sampler.select(market_watch(closes, volumes), now_seconds, store_all=store_all)
+    return market_watch(closes, volumes)["Ticker"][keep].tolist()
+
+
+def test_watchlist_every_poll_and_others_once_per_slow_interval():
+    sampler = AdaptiveIntradaySampler(["MM"], slow_interval_seconds=60)
+
+    assert kept(sampler, [100, 100, 100], [0, 0, 0], 0) == ["MM", "A", "B"]
+    assert kept(sampler, [100, 100, 100], [0, 0, 0], 30) == ["MM"]
+    assert kept(sampler, [100, 100, 100], [0, 0, 0], 45, store_all=True) == ["MM", "A", "B"]
+    assert kept(sampler, [100, 100, 100], [0, 0, 0], 90) == ["MM"]
+    assert kept(sampler, [100, 100, 100], [0, 0, 0], 105) == ["MM", "A", "B"]
+    assert sampler.metrics["rows_kept"] == 11
+
+
+def test_price_limit_trigger_is_edge_triggered_and_cools_down():
+    sampler = AdaptiveIntradaySampler(["MM"], slow_interval_seconds=600, hot_interval_seconds=2, cooldown_seconds=20)
+    kept(sampler, [100, 100, 100], [0, 0, 0], 0)
+
+    assert kept(sampler, [100, 110, 100], [0, 0, 0], 5) == ["MM", "A"]
+    assert sampler.capture_symbols == {"MM", "A"} and sampler.interval_seconds(5) == 2
+    # Staying at the limit does not trigger again, so A cools down 20 seconds after reaching it
+    assert kept(sampler, [100, 110, 100], [0, 0, 0], 20) == ["MM", "A"]
+    assert kept(sampler, [100, 110, 100], [0, 0, 0], 26) == ["MM"]
+    assert not sampler.is_hot() and sampler.interval_seconds(5) == 5
+
+
+def test_volume_spike_makes_a_symbol_hot():
+    sampler = AdaptiveIntradaySampler(["MM"], slow_interval_seconds=600, spike_factor=5, min_spike_volume=1000)
+    kept(sampler, [100, 100, 100], [0, 0, 0], 0)
+    kept(sampler, [100, 100, 100], [0, 500, 500], 5)
+
+    assert kept(sampler, [100, 100, 100], [0, 1000, 5000], 10) == ["MM", "B"]
+    assert sampler.hot_symbols == {"B"}
+
+    sampler.reset()
+    assert sampler.capture_symbols == {"MM"} and len(sampler.state) == 0
@@ -0,0 +1,69 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.bulk_writer_obj import SQLiteBulkWriter
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    yield conn
+    conn.close()
+
+
+def read_rows(conn, table_name):
+    return conn.execute(f'SELECT * FROM "{table_name}" ORDER BY rowid').fetchall()
+
+
+def test_replace_writes_like_to_sql(conn):
+    df = pd.DataFrame({"Symbol": ["A", None], "Close": [1.5, np.nan], "Volume": [10, 20],
+                       "Stamp": pd.to_datetime(["2024-01-01 09:00:00", "2024-01-01 09:00:00.250000"], format="ISO8601")})
+
+    rows_written = SQLiteBulkWriter(conn, batch_size=1).write(df, "PricesTbl", dtype={"Symbol": "TEXT"})
+
+    assert rows_written == 2
+    df.to_sql("PricesToSqlTbl", conn, index=False)
+    assert read_rows(conn, "PricesTbl") == read_rows(conn, "PricesToSqlTbl")
+    assert read_rows(conn, "PricesTbl")[1] == (None, None, 20, "2024-01-01 09:00:00.250000")
+
+
+def test_upsert_and_insert_or_ignore_use_the_key_columns(conn):
+    writer = SQLiteBulkWriter(conn)
+    writer.write(pd.DataFrame({"Key": [1, 2], "Value": ["a", "b"]}), "KeysTbl", mode="append")
+    writer.write(pd.DataFrame({"Key": [1, 2], "Value": ["a", "b"]}), "KeysTbl", mode="append")
+
+    writer.write(pd.DataFrame({"Key": [2, 3], "Value": ["B", "c"]}), "KeysTbl", mode="upsert", key_columns=["Key"])
+    assert writer.duplicates_removed == 2
+    assert read_rows(conn, "KeysTbl") == [(1, "a"), (2, "B"), (3, "c")]
+
+    writer.write(pd.DataFrame({"Key": [3, 4], "Value": ["x", "d"], "Extra": [1.0, 2.0]}), "KeysTbl",
+                 mode="insert_or_ignore", key_columns=["Key"])
+    assert read_rows(conn, "KeysTbl") == [(1, "a", None), (2, "B", None), (3, "c", None), (4, "d", 2.0)]
+
+
+def test_a_failed_write_is_rolled_back(conn):
+    writer = SQLiteBulkWriter(conn, index_rebuild_rows=1)
+    writer.write(pd.DataFrame({"Key": [1], "Value": ["a"]}), "KeysTbl", mode="append")
+    conn.execute('CREATE INDEX "idx_KeysTbl_Value" ON "KeysTbl" ("Value")')
+    conn.execute('CREATE UNIQUE INDEX "uidx_KeysTbl_Key" ON "KeysTbl" ("Key")')
+
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.write(pd.DataFrame({"Key": [2, 1], "Value": ["b", "c"]}), "KeysTbl", mode="append")
+
+    assert read_rows(conn, "KeysTbl") == [(1, "a")]
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0] == 2
+    with pytest.raises(ValueError, match="key_columns"):
+        writer.write(pd.DataFrame({"Key": [1]}), "KeysTbl", mode="upsert")
@@ -0,0 +1,49 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.data_base_obj import DataHelper
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def test_interval_join_matches_the_interval_in_force_on_each_date():
+    reports_df = pd.DataFrame({
+        "MarketMakerFundID": [1, 1, 1, 1, 2, 3],
+        "JDate": ["1402-01-05", "1402-01-10", "1402-01-11", "1402-02-01", "1402-01-10", "1402-01-10"],
+        "AnnouncementID": [99, 99, 99, 99, 99, 99],
+    }, index=[10, 11, 12, 13, 14, 15])
+    announcements_df = pd.DataFrame({
+        "MarketMakerFundID": [1, 1, 2],
+        "EffectiveDate": ["1402-01-01", "1402-01-20", "1402-01-01"],
+        "FinishDate": ["1402-01-10", None, "1402-01-05"],
+        "AnnouncementID": [100, 101, 200],
+    })
+
+    result_df = DataHelper.interval_join(reports_df, announcements_df, "JDate", "EffectiveDate", "FinishDate",
+                                         "MarketMakerFundID", ["AnnouncementID"])
+
+    assert result_df.index.tolist() == reports_df.index.tolist()
+    # The finish date belongs to the interval, an empty finish date is open-ended and gaps get NaN
+    values = result_df["AnnouncementID"].tolist()
+    assert values[0] == 100 and values[1] == 100 and np.isnan(values[2]) and values[3] == 101
+    assert np.isnan(values[4]) and np.isnan(values[5])
+
+
+def test_interval_join_matches_string_keys_and_ignores_rows_without_a_date():
+    main_df = pd.DataFrame({"Symbol": ["A", "A", "B"], "GDate": ["2024-01-02", None, "2024-01-02"]})
+    intervals_df = pd.DataFrame({"Symbol": ["A", "B"], "Start": ["2024-01-01", "2024-01-03"],
+                                 "End": ["2024-01-31", "2024-01-31"], "Label": ["a", "b"]})
+
+    result_df = DataHelper.interval_join(main_df, intervals_df, "GDate", "Start", "End", "Symbol", ["Label"])
+
+    assert result_df["Label"].tolist()[0] == "a"
+    assert result_df["Label"].isna().tolist() == [False, True, True]
@@ -0,0 +1,84 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import glob
+import time
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.http_cache_obj import ResponseCache
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def counting_fetch(result):
+    def fetch(*args, **kwargs):
+        fetch.calls += 1
+        return result
+
+    fetch.calls = 0
+    return fetch
+
+
+def test_a_fresh_entry_is_served_without_fetching(tmp_path):
+    cache = ResponseCache(str(tmp_path), offline=False)
+    fetch = counting_fetch(pd.DataFrame({"Close": [1.0, 2.0]}))
+
+    first = cache.call("get_price_history", fetch, stock="A", start_date="1402-01-01")
+    second = cache.call("get_price_history", fetch, stock="A", start_date="1402-01-01")
+    cache.call("get_price_history", fetch, stock="B", start_date="1402-01-01")
+
+    assert fetch.calls == 2
+    assert second.equals(first)
+    assert cache.metrics == {"hits": 1, "misses": 2, "stale": 0, "stored": 2}
+    # Equal responses of different requests share one object
+    assert len(glob.glob(f"{tmp_path}/Warehouse/HttpCache/objects/*/*.pkl")) == 1
+
+
+def test_expired_entries_are_refetched_unless_the_range_is_closed(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), offline=False)
+    fetch = counting_fetch([1, 2, 3])
+    cache.call("market_watch", fetch)
+    cache.call("get_price_history", fetch, closed_date="2020-01-01", stock="A")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 30 * 24 * 3600)
+    cache.call("market_watch", fetch)
+    cache.call("get_price_history", fetch, closed_date="2020-01-01", stock="A")
+
+    assert fetch.calls == 3
+    assert cache.metrics["stale"] == 1
+    assert cache.purge_expired() == 0
+    monkeypatch.setattr(time, "time", lambda: now + 60 * 24 * 3600)
+    assert cache.purge_expired() == 1
+
+
+def test_offline_mode_serves_stale_entries_and_refuses_new_requests(tmp_path, monkeypatch):
+    ResponseCache(str(tmp_path), offline=False).call("market_watch", counting_fetch("cached"))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 3600)
+    monkeypatch.setenv("MARKET_MAKER_OFFLINE", "1")
+    cache = ResponseCache(str(tmp_path))
+    fetch = counting_fetch("fetched")
+
+    assert cache.call("market_watch", fetch) == "cached"
+    with pytest.raises(LookupError):
+        cache.call("key_stats", fetch)
+    assert fetch.calls == 0
+
+
+def test_a_zero_ttl_endpoint_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setitem(ResponseCache.ENDPOINT_TTL_SECONDS, "live", 0)
+    cache = ResponseCache(str(tmp_path), offline=False)
+    fetch = counting_fetch("live")
+
+    cache.call("live", fetch)
+    cache.call("live", fetch)
+
+    assert fetch.calls == 2 and cache.metrics["stored"] == 0
@@ -0,0 +1,66 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import datetime
+import sqlite3
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Bulkheed.intraday_archive_opr import IntradayArchiveCompactor
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def create_daily_table(db_name, table_date, rows):
+    conn = sqlite3.connect(db_name)
+    pd.DataFrame(rows, columns=["Ticker", "Time", "Close"]).to_sql(f"market_data_{table_date}", conn, index=False)
+    conn.close()
+
+
+def table_names(db_name):
+    conn = sqlite3.connect(db_name)
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    conn.close()
+    return names
+
+
+def test_finished_days_are_archived_by_month_and_dropped(project_path):
+    db_name = f"{project_path}/Warehouse/IranInterDayData.db"
+    today = datetime.date.today().isoformat()
+    create_daily_table(db_name, "2024-01-06", [("B", "09:00:01", 2.0), ("A", "09:00:02", 1.0)])
+    create_daily_table(db_name, "2024-01-07", [("A", "09:00:00", 1.5)])
+    create_daily_table(db_name, "2024-02-01", [("A", "09:00:00", 3.0)])
+    create_daily_table(db_name, today, [("A", "09:00:00", 9.0)])
+    compactor = IntradayArchiveCompactor()
+
+    assert compactor.compact() == {"2024-01": 3, "2024-02": 1}
+    assert table_names(db_name) == [f"market_data_{today}"]
+    manifest = compactor.load_manifest()
+    assert manifest["months"]["2024-01"]["days"] == ["2024-01-06", "2024-01-07"]
+    assert manifest["tables"]["market_data_2024-01-06"]["rows"] == 2
+
+    # A late table of an archived month is merged into the month file
+    create_daily_table(db_name, "2024-01-08", [("A", "09:00:00", 1.8)])
+    assert compactor.compact(vacuum=False) == {"2024-01": 1}
+    assert compactor.load_manifest()["months"]["2024-01"]["rows"] == 4
+
+
+def test_query_reads_the_archive_and_the_tables_not_archived_yet(project_path):
+    db_name = f"{project_path}/Warehouse/IranInterDayData.db"
+    create_daily_table(db_name, "2024-01-06", [("B", "09:00:01", 2.0), ("A", "09:00:02", 1.0)])
+    compactor = IntradayArchiveCompactor()
+    compactor.compact()
+    create_daily_table(db_name, "2024-01-07", [("A", "09:00:00", 1.5)])
+
+    df = compactor.query("2024-01-01", "2024-01-31", symbols=["A"], columns=["Ticker", "Time", "Close"])
+
+    assert list(df.columns) == ["SnapshotDate", "Ticker", "Time", "Close"]
+    assert df[["SnapshotDate", "Close"]].values.tolist() == [["2024-01-06", 1.0], ["2024-01-07", 1.5]]
@@ -0,0 +1,63 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Materials.intraday_bars_obj import StreamingBarBuilder
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def snapshot(time_value, rows, date_value="2024-01-06"):
+    return pd.DataFrame({"IranSymbol": list(rows), "GDate": date_value, "Time": time_value,
+                         "Close": [price for price, _ in rows.values()],
+                         "Volume": [volume for _, volume in rows.values()]})
+
+
+def test_bars_close_when_a_later_snapshot_arrives(project_path):
+    builder = StreamingBarBuilder(f"{project_path}/Warehouse/Intra.db", time_frames={"1min": 60})
+    builder.consume(snapshot("09:00:05", {"A": (100, 10), "B": (0, 0)}))
+    builder.consume(snapshot("09:00:30", {"A": (104, 15)}))
+    builder.consume(snapshot("09:00:50", {"A": (98, 40)}))
+    builder.consume(snapshot("09:00:40", {"A": (500, 90)}))
+
+    # B has no trade price, and the late 09:00:40 snapshot is ignored
+    assert builder.consume(snapshot("09:01:10", {"B": (50, 5)})) == 1
+
+    bars_df = builder.pop_closed_bars()
+    assert bars_df[["Symbol", "TimeFrame", "GDate", "BarTime"]].iloc[0].tolist() == ["A", "1min", "2024-01-06",
+                                                                                      "09:00:00"]
+    assert bars_df[["Open", "High", "Low", "Close", "Volume", "SnapshotCount"]].iloc[0].tolist() == \
+        [100, 104, 98, 98, 40, 3]
+
+
+def test_a_new_day_closes_every_bar_and_flush_upserts(project_path):
+    db_name = f"{project_path}/Warehouse/Intra.db"
+    builder = StreamingBarBuilder(db_name, time_frames={"1min": 60, "5min": 300})
+    builder.consume(snapshot("12:29:00", {"A": (100, 10)}))
+    builder.consume(snapshot("09:00:00", {"A": (101, 3)}, date_value="2024-01-07"))
+    assert builder.flush() == 2
+
+    builder.consume(snapshot("09:00:30", {"A": (102, 7)}, date_value="2024-01-07"))
+    builder.reset()
+    assert builder.flush() == 2
+
+    # Replaying a day rewrites its bars instead of adding new rows
+    replay = StreamingBarBuilder(db_name, time_frames={"1min": 60, "5min": 300})
+    replay.consume(snapshot("12:29:00", {"A": (100, 12)}))
+    replay.reset()
+    assert replay.flush() == 2
+
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute('SELECT TimeFrame, GDate, BarTime, Close, Volume FROM "IntraOHLCVBarsTbl" '
+                        'ORDER BY GDate, TimeFrame').fetchall()
+    conn.close()
+    assert rows == [("1min", "2024-01-06", "12:29:00", 100, 12), ("5min", "2024-01-06", "12:25:00", 100, 12),
+                    ("1min", "2024-01-07", "09:00:00", 102, 7), ("5min", "2024-01-07", "09:00:00", 102, 7)]
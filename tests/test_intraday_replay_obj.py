@@ -0,0 +1,67 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Materials.intraday_replay_obj import IntradayReplayEngine
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+@pytest.fixture
+def db_name(project_path):
+    db_name = f"{project_path}/Warehouse/Intra.db"
+    conn = sqlite3.connect(db_name)
+    pd.DataFrame({
+        "IranSymbol": ["A", "B", "A", "B", "A"],
+        "GDate": ["2024-01-06", "2024-01-06", "2024-01-06", "2024-01-06", "2024-01-07"],
+        "Time": ["09:00:00", "09:00:00", "09:00:10", "09:00:05", "09:00:00"],
+        "Close": [1, 2, 3, 4, 5],
+    }).to_sql("RawIranStockIntraMarketWatchTbl", conn, index=False)
+    pd.DataFrame({"Ticker": ["A", "B"], "Time": ["09:00:07", "09:00:07"], "Final": [10, 20]}) \
+        .to_sql("market_data_2024-01-06", conn, index=False)
+    conn.close()
+    return db_name
+
+
+def test_sources_are_merged_in_timestamp_order_one_snapshot_per_event(db_name):
+    engine = IntradayReplayEngine(db_name, chunk_rows=1)
+    engine.add_raw_market_watch()
+    engine.add_legacy_daily_tables()
+    events = []
+
+    stats = engine.run({"*": lambda timestamp, frame: events.append((timestamp, len(frame)))})
+
+    assert events == [("2024-01-06 09:00:00", 2), ("2024-01-06 09:00:05", 1), ("2024-01-06 09:00:07", 2),
+                      ("2024-01-06 09:00:10", 1), ("2024-01-07 09:00:00", 1)]
+    assert stats["events"] == 5 and stats["rows"] == 7
+
+
+def test_window_and_symbol_filters_use_the_stored_columns(db_name):
+    engine = IntradayReplayEngine(db_name, start="2024-01-06 09:00:05", end="2024-01-06 23:59:59", symbols=["A"])
+    engine.add_raw_market_watch()
+    engine.add_legacy_daily_tables()
+    frames = {}
+
+    engine.run({"RawIranStockIntraMarketWatchTbl": lambda timestamp, frame: frames.setdefault("raw", frame),
+                "market_data": lambda timestamp, frame: frames.setdefault("legacy", frame)})
+
+    assert frames["raw"][["IranSymbol", "Time", "Close"]].values.tolist() == [["A", "09:00:10", 3]]
+    assert frames["legacy"]["Final"].tolist() == [10]
+    conn = sqlite3.connect(db_name)
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0] == 0
+    conn.close()
+
+
+def test_a_source_needs_exactly_one_date(db_name):
+    engine = IntradayReplayEngine(db_name)
+    with pytest.raises(ValueError, match="exactly one"):
+        engine.add_source("raw", "RawIranStockIntraMarketWatchTbl", "IranSymbol", "Time")
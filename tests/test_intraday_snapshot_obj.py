@@ -0,0 +1,76 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Materials.intraday_snapshot_obj import SnapshotDeltaEncoder
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+SNAPSHOT_COLUMNS = ["JDownloadDateTime", "GDate", "Time", "IntraMarketWatchKey"]
+SNAPSHOTS = [("09:00:00", [1, 2, 3]), ("09:00:05", [1, 5, 3]), ("09:00:10", [1, 5, 4]), ("09:00:15", [9, 5, 4])]
+
+
+def snapshot_frame(time_value, closes):
+    df = pd.DataFrame({"JDownloadDateTime": f"1402-10-16 {time_value}", "GDate": "2024-01-06", "Time": time_value,
+                       "IranSymbol": ["a", "b", "c"], "Symbol": ["A", "B", "C"], "Close": closes})
+    df["IntraMarketWatchKey"] = df["Symbol"] + "_" + df["GDate"] + "_" + df["Time"]
+    return df
+
+
+def stored_rows(keyframe_every=3):
+    encoder = SnapshotDeltaEncoder("IranSymbol", ignore_columns=SNAPSHOT_COLUMNS, keyframe_every=keyframe_every)
+    return pd.concat([encoder.encode(snapshot_frame(*snapshot)) for snapshot in SNAPSHOTS], ignore_index=True)
+
+
+def test_encode_stores_keyframes_and_changed_rows_only():
+    stored_df = stored_rows()
+
+    assert stored_df.groupby("Time")["IsKeyframe"].max().tolist() == [1, 0, 0, 1]
+    assert stored_df.groupby("Time").size().tolist() == [3, 1, 1, 3]
+
+
+def test_reconstruct_returns_full_snapshot_between_keyframes():
+    snapshot_df = SnapshotDeltaEncoder.reconstruct(stored_rows(), "1402-10-16 09:00:10", "JDownloadDateTime",
+                                                   "IranSymbol")
+
+    assert snapshot_df["Close"].tolist() == [1, 5, 4]
+
+
+def test_expand_rebuilds_every_snapshot_with_its_own_time():
+    dense_df = SnapshotDeltaEncoder.expand(stored_rows(), "JDownloadDateTime", "IranSymbol", SNAPSHOT_COLUMNS)
+
+    assert len(dense_df) == 12
+    assert "IsKeyframe" not in dense_df.columns
+    for time_value, closes in SNAPSHOTS:
+        snapshot_df = dense_df[dense_df["Time"] == time_value].sort_values("IranSymbol")
+        assert snapshot_df["Close"].tolist() == closes
+        assert (snapshot_df["JDownloadDateTime"] == f"1402-10-16 {time_value}").all()
+
+
+def test_expand_continues_from_a_raw_initial_snapshot():
+    stored_df = stored_rows()
+    conn = sqlite3.connect(":memory:")
+    stored_df.to_sql("RawIranStockIntraMarketWatchTbl", conn, index=False)
+    initial_snapshot = SnapshotDeltaEncoder.load_snapshot(conn, "RawIranStockIntraMarketWatchTbl",
+                                                          "1402-10-16 09:00:05", "JDownloadDateTime", "IranSymbol")
+
+    # The new rows are compacted, the initial snapshot is read raw from SQLite
+    new_rows = stored_df[stored_df["Time"] == "09:00:10"].reset_index(drop=True)
+    new_rows["Symbol"] = new_rows["Symbol"].astype("category")
+    dense_df = SnapshotDeltaEncoder.expand(new_rows, "JDownloadDateTime", "IranSymbol", SNAPSHOT_COLUMNS,
+                                           initial_snapshot)
+
+    dense_df = dense_df.sort_values("IranSymbol")
+    assert dense_df["Close"].tolist() == [1, 5, 4]
+    assert dense_df["Symbol"].tolist() == ["A", "B", "C"]
+    assert (dense_df["Time"] == "09:00:10").all()
+    assert dense_df["Close"].dtype == stored_df["Close"].dtype
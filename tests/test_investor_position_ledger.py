@@ -0,0 +1,65 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Foundation.investor_position_ledger import InvestorPositionLedger
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def invest_objects():
+    return pd.DataFrame({
+        "NationalCode_UniversalCode": ["001", "001", "001", "002", "001"],
+        "MarketMakerFundID": [7, 7, 7, 7, 9],
+        "JDate": ["1402-09-01", "1402-09-01", "1402-09-05", "1402-09-03", "1402-09-02"],
+        "InvestorID": [1, 1, 1, 2, 1],
+        "ShortName": ["Fund7", "Fund7", "Fund7", "Fund7", "Fund9"],
+        "IssuedUnitsNumber": [10.0, 5.0, 0.0, 4.0, 8.0],
+        "CancellationUnitsNumber": [0.0, 0.0, 6.0, 0.0, 0.0],
+        "IssuedAmount": [100.0, 50.0, 0.0, 40.0, 80.0],
+        "CancellationAmount": [0.0, 0.0, 66.0, 0.0, 0.0],
+    })
+
+
+def test_ledger_keeps_one_event_per_position_and_changed_day(project_path):
+    ledger = InvestorPositionLedger()
+    ledger_df = ledger.build_ledger(invest_objects())
+
+    assert ledger_df["PositionEventID"].tolist() == ["001-7-1402-09-01", "001-7-1402-09-05", "001-9-1402-09-02",
+                                                     "002-7-1402-09-03"]
+    assert ledger_df["CumSumUnitsNumber"].tolist() == [15.0, 9.0, 8.0, 4.0]
+    assert ledger_df["CumSumCancellationAmount"].tolist() == [0.0, 66.0, 0.0, 0.0]
+
+
+def test_position_as_of_uses_the_last_event_on_or_before_the_date(project_path):
+    ledger = InvestorPositionLedger()
+    ledger.build_ledger(invest_objects())
+
+    assert ledger.position_as_of("001", 7, "1402-08-30") is None
+    assert ledger.position_as_of("001", 7, "1402-09-04")["CumSumUnitsNumber"] == 15.0
+    assert ledger.position_as_of("001", 7, "1402-09-05")["CumSumUnitsNumber"] == 9.0
+    assert ledger.position_as_of("003", 7, "1402-09-05") is None
+
+
+def test_dense_positions_expand_only_the_requested_dates(project_path):
+    ledger = InvestorPositionLedger()
+    ledger.build_ledger(invest_objects())
+    j_dates = ["1402-09-02", "1402-09-04", "1402-09-06"]
+
+    dense_df = ledger.build_dense_positions(None, None, short_names=["Fund7"], j_dates=j_dates)
+    assert list(zip(dense_df["NationalCode_UniversalCode"], dense_df["JDate"], dense_df["CumSumUnitsNumber"])) == [
+        ("001", "1402-09-02", 15.0), ("001", "1402-09-04", 15.0), ("001", "1402-09-06", 9.0),
+        ("002", "1402-09-04", 4.0), ("002", "1402-09-06", 4.0)]
+
+    sparse_df = ledger.build_dense_positions(None, None, national_codes=["002"], j_dates=j_dates,
+                                             drop_empty_positions=False)
+    assert np.isnan(sparse_df["CumSumUnitsNumber"].iloc[0])
+    assert len(ledger.positions_as_of("1402-09-02")) == 2
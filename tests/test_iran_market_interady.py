@@ -0,0 +1,80 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import asyncio
+import glob
+import pandas as pd
+import pytest
+
+pytest.importorskip("finpy_tse")
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Bulkheed.iran_market_interady import MarketDataCollector
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def market_watch(time_value, closes):
+    return pd.DataFrame({"Ticker": list(closes), "SnapshotDate": "2024-01-01", "SnapshotTime": time_value,
+                         "Final": list(closes.values())})
+
+
+def sqlite_error():
+    return OSError("database is locked")
+
+
+def run_writer(collector, snapshots):
+    async def writer():
+        queue = asyncio.Queue()
+        for snapshot in snapshots:
+            queue.put_nowait((snapshot,))
+        queue.put_nowait(None)
+        await collector.writer_loop(queue)
+
+    asyncio.run(writer())
+
+
+def test_final_flush_retries_until_the_write_succeeds(project_path):
+    collector = MarketDataCollector(db_name=f"{project_path}/Warehouse/Intra.db", build_bars=False,
+                                    final_flush_retries=3, final_flush_wait_seconds=0)
+    written = []
+
+    def flaky_write(snapshots_df, bars_df=None, order_book_df=None):
+        written.append(len(snapshots_df))
+        if len(written) < 3:
+            raise sqlite_error()
+
+    collector.write_snapshots = flaky_write
+    run_writer(collector, [market_watch("09:00:00", {"A": 1.0, "B": 2.0})])
+
+    assert written == [2, 2, 2]
+    assert collector.metrics["flush_errors"] == 2
+    assert collector.metrics["rows_written"] == 2
+
+
+def test_final_flush_spills_to_disk_and_raises_when_every_attempt_fails(project_path):
+    db_name = f"{project_path}/Warehouse/Intra.db"
+    collector = MarketDataCollector(db_name=db_name, build_bars=False, final_flush_retries=2,
+                                    final_flush_wait_seconds=0)
+    attempts = []
+
+    def failing_write(snapshots_df, bars_df=None, order_book_df=None):
+        attempts.append(len(snapshots_df))
+        raise sqlite_error()
+
+    collector.write_snapshots = failing_write
+    with pytest.raises(RuntimeError, match="spilled"):
+        run_writer(collector, [market_watch("09:00:00", {"A": 1.0, "B": 2.0}),
+                               market_watch("09:00:05", {"A": 1.5, "B": 2.0})])
+
+    assert len(attempts) == 3
+    spilled = glob.glob(f"{project_path}/Warehouse/Intra_unflushed_*-snapshots.pkl")
+    assert len(spilled) == 1
+    spilled_df = pd.read_pickle(spilled[0])
+    assert len(spilled_df) == 3
+    assert spilled_df["SnapshotTime"].tolist() == ["09:00:00", "09:00:00", "09:00:05"]
@@ -0,0 +1,68 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pandas as pd
+import pytest
+
+pytest.importorskip("finpy_tse")
+pytest.importorskip("pytse_client")
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Bulkheed.iran_stock_database_opr import IranStockIntraMarketWatchTblCreator, \
+    RawIranStockIntraMarketWatchTblCreator
+from Materials.intraday_snapshot_obj import SnapshotDeltaEncoder
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+RAW_VALUE_COLUMNS = ["Trade Type", "Open", "High", "Low", "Final", "Close(%)", "Final(%)", "Day_UL", "Day_LL",
+                     "BQ-Value", "SQ-Value", "Volume", "Vol_Buy_R", "Vol_Buy_I", "Vol_Sell_R", "Vol_Sell_I", "No",
+                     "No_Buy_R", "No_Buy_I", "No_Sell_R", "No_Sell_I", "Name", "Share-No", "Base-Vol", "Market Cap",
+                     "EPS", "TseUpdateTime", "BQPC", "SQPC", "Market", "Sector"]
+
+
+def raw_snapshot(time_value, closes):
+    df = pd.DataFrame({"IranSymbol": ["a", "b", "c"], "Symbol": ["A", "B", "C"], "Close": closes,
+                       "JDownloadDateTime": f"1402-10-16 {time_value}",
+                       "GDownloadDateTime": f"2024-01-06 {time_value}", "GDate": "2024-01-06", "Time": time_value})
+    for column_name in RAW_VALUE_COLUMNS:
+        df[column_name] = 1
+    df["IntraMarketWatchKey"] = df["Symbol"] + "_" + df["GDate"] + "_" + df["Time"]
+    return df
+
+
+@pytest.fixture
+def stock_db(project_path):
+    db_name = f"{project_path}/Warehouse/IranStockDataBase.db"
+    encoder = SnapshotDeltaEncoder("IranSymbol",
+                                   ignore_columns=RawIranStockIntraMarketWatchTblCreator.MARKET_WATCH_SNAPSHOT_COLUMNS,
+                                   keyframe_every=3)
+    snapshots = [("09:00:00", [1, 2, 3]), ("09:00:05", [1, 5, 3]), ("09:00:10", [1, 5, 4])]
+    stored_df = pd.concat([encoder.encode(raw_snapshot(*snapshot)) for snapshot in snapshots], ignore_index=True)
+
+    conn = sqlite3.connect(db_name)
+    stored_df.to_sql("RawIranStockIntraMarketWatchTbl", conn, index=False)
+    pd.DataFrame({"IranSymbol": ["a", "b", "c"], "IranCompanyCode12": ["IRO1A", "IRO1B", "IRO1C"]}) \
+        .to_sql("BasicIranSymbolsInformationTbl", conn, index=False)
+    conn.close()
+    return db_name
+
+
+def test_rebuild_from_delta_rows_is_dense(stock_db):
+    IranStockIntraMarketWatchTblCreator(stock_db).create_IntraMarketWatchTbl(incremental=False)
+
+    conn = sqlite3.connect(stock_db)
+    processed_df = pd.read_sql_query('SELECT * FROM "IranStockIntraMarketWatchTbl"', conn)
+    conn.close()
+
+    assert len(processed_df) == 9
+    assert processed_df["IntraMarketWatchKey"].is_unique
+    last_df = processed_df[processed_df["Time"] == "09:00:10"].sort_values("Symbol")
+    assert last_df["IntraClose"].tolist() == [1, 5, 4]
+    assert (last_df["IntraMarketWatchKey"] == last_df["Symbol"] + "_2024-01-06_09:00:10").all()
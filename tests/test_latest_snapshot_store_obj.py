@@ -0,0 +1,66 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import pandas as pd
+import pytest
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Materials.latest_snapshot_store_obj import LatestSnapshotStore
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def filled_store():
+    store = LatestSnapshotStore("Ticker", initial_capacity=2)
+    store.update(pd.DataFrame({"Ticker": ["A", "B", "C"], "Final": [10.0, 20.0, 30.0],
+                               "Sector": ["Metals", "Banks", "Metals"]}))
+    store.update(pd.DataFrame({"Ticker": ["B", "D"], "Final": [21.0, 40.0], "Sector": ["Banks", "Metals"]}))
+    return store
+
+
+def test_updates_overwrite_only_the_given_symbols():
+    store = filled_store()
+
+    assert len(store) == 4 and store.capacity == 4
+    assert store.latest("A") == {"Ticker": "A", "Final": 10.0, "Sector": "Metals"}
+    assert store.latest("B", columns=["Final"]) == {"Ticker": "B", "Final": 21.0}
+    assert store.latest("Z") is None
+
+
+def test_cross_sections_by_symbols_group_and_column():
+    store = filled_store()
+    store.set_group("market_maker", ["C", "A", "E"])
+
+    assert store.cross_section(symbols=["D", "Z", "A"])["Ticker"].tolist() == ["D", "A"]
+    # E is registered but has no values yet
+    assert store.cross_section(group="market_maker")["Ticker"].tolist() == ["C", "A"]
+    assert store.cross_section(column="Sector", value="Metals")["Ticker"].tolist() == ["A", "C", "D"]
+    assert store.cross_section(column="Final", value=21)["Ticker"].tolist() == ["B"]
+
+
+def test_http_endpoint_serves_latest_rows_and_errors():
+    store = filled_store()
+    port = store.start_server(port=0)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with urlopen(f"{base_url}/latest?symbol=B&columns=Final") as response:
+            assert json.loads(response.read()) == {"Ticker": "B", "Final": 21.0}
+        with urlopen(f"{base_url}/cross-section?sector={quote('Metals')}&columns=Final") as response:
+            assert [row["Ticker"] for row in json.loads(response.read())] == ["A", "C", "D"]
+        with pytest.raises(HTTPError) as error:
+            urlopen(f"{base_url}/latest?symbol=Z")
+        assert error.value.code == 404
+        with pytest.raises(HTTPError) as error:
+            urlopen(f"{base_url}/latest")
+        assert error.value.code == 400
+    finally:
+        store.stop_server()
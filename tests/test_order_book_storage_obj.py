@@ -0,0 +1,50 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Materials.order_book_storage_obj import OrderBookLevelStore
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def raw_order_book(time_value, buy_prices, symbol="A"):
+    return pd.DataFrame({
+        "Symbol": symbol, "GDate": "2024-01-06", "Time": time_value, "OB-Depth": range(1, len(buy_prices) + 1),
+        "Buy-Price": buy_prices, "Buy-Vol": 100, "Buy-No": 1,
+        "Sell-Price": [price + 10 for price in buy_prices], "Sell-Vol": 50, "Sell-No": 2,
+    })
+
+
+def test_only_changed_levels_are_stored(project_path):
+    store = OrderBookLevelStore(f"{project_path}/Warehouse/Intra.db")
+
+    assert store.append_snapshots(pd.concat([raw_order_book("09:00:00", [100, 99]),
+                                             raw_order_book("09:00:05", [100, 98])], ignore_index=True)) == 6
+    # Times at or before the last stored snapshot are not encoded again
+    assert store.append_snapshots(raw_order_book("09:00:05", [1, 1])) == 0
+    assert store.append_snapshots(raw_order_book("09:00:10", [100, 98])) == 0
+
+
+def test_load_book_rebuilds_every_stored_snapshot(project_path):
+    store = OrderBookLevelStore(f"{project_path}/Warehouse/Intra.db")
+    raw_df = pd.concat([raw_order_book("09:00:00", [100, 99]), raw_order_book("09:00:05", [100, 98]),
+                        raw_order_book("09:00:10", [100, 98]), raw_order_book("09:00:00", [500, 499], "B")],
+                       ignore_index=True)
+    store.append_snapshots(raw_df)
+
+    book_df = store.load_book("2024-01-06 09:00:05", "2024-01-06 09:00:10", symbols=["A"])
+
+    buy_df = book_df[book_df["Side"] == 0].sort_values(["SnapshotSeconds", "Depth"])
+    assert buy_df["Symbol"].unique().tolist() == ["A"]
+    assert buy_df["Price"].tolist() == [100, 98, 100, 98]
+    assert buy_df["SnapshotSeconds"].nunique() == 2
+    assert len(book_df) == 8
+    assert store.load_book("2024-01-06 09:00:00", "2024-01-06 09:00:00", symbols=["B"])["Price"].tolist() == \
+        [500, 499, 510, 509]
@@ -0,0 +1,59 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials import parquet_mirror_obj
+from RawMaterials.parquet_mirror_obj import ParquetMirror
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def funds_frame():
+    return pd.DataFrame({"ShortName": ["Fund1", "Fund1", None, "Fund2"],
+                         "JDate": ["1401-12-28", "1402-01-05", "1402-01-05", "1402-02-01"],
+                         "NAV": [1.0, 2.0, 3.0, 4.0]})
+
+
+def test_partition_columns_are_derived_and_filled():
+    df, derived_columns, filled_columns = ParquetMirror.add_partition_columns(funds_frame(), ["JYear", "ShortName"])
+
+    assert derived_columns == ["JYear"] and filled_columns == ["ShortName"]
+    assert df["JYear"].tolist() == [1401, 1402, 1402, 1402]
+    assert df["ShortName"].tolist()[2] == ParquetMirror.PLACEHOLDERS["text"]
+
+
+def test_filter_dataframe_matches_the_parquet_filters_on_sqlite_rows():
+    df = funds_frame()
+
+    filtered_df = ParquetMirror.filter_dataframe(df, [("JYear", "=", 1402), ("ShortName", "in", ["Fund1", "Fund2"])])
+
+    assert filtered_df["NAV"].tolist() == [2.0, 4.0]
+    assert ParquetMirror.filter_dataframe(df, None) is df
+
+
+def test_without_pyarrow_the_mirror_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_mirror_obj, "PARQUET_AVAILABLE", False)
+    mirror = ParquetMirror(str(tmp_path))
+
+    assert mirror.publish_table(funds_frame(), "FundsProcessedVfm") is False
+    assert mirror.read_table("FundsProcessedVfm") is None
+
+
+def test_published_mirror_reads_back_the_sqlite_columns(tmp_path):
+    pytest.importorskip("pyarrow")
+    mirror = ParquetMirror(str(tmp_path))
+    assert mirror.publish_table(funds_frame(), "FundsProcessedVfm")
+
+    df = mirror.read_table("FundsProcessedVfm", filters=[("JYear", "=", 1402)], source_rows=4)
+    assert list(df.columns) == ["ShortName", "JDate", "NAV"]
+    assert sorted(df["NAV"].tolist()) == [2.0, 3.0, 4.0]
+    assert df["ShortName"].isna().sum() == 1
+    assert mirror.read_table("FundsProcessedVfm", source_rows=5) is None
@@ -0,0 +1,126 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import sqlite3
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.pipeline_runner_obj import PipelineStep, PipelineRunner
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def write_table(db_name, table_name, rows=1):
+    conn = sqlite3.connect(db_name)
+    with conn:
+        conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        conn.execute(f'CREATE TABLE "{table_name}" (Value INTEGER)')
+        conn.executemany(f'INSERT INTO "{table_name}" VALUES (?)', [(value,) for value in range(rows)])
+    conn.close()
+
+
+def recording_step(db_name, calls, name, inputs, outputs, fail=None, **kwargs):
+    def build():
+        calls.append(name)
+        if fail and fail[0]:
+            raise RuntimeError(f"{name} failed")
+        for table_name in outputs:
+            write_table(db_name, table_name)
+
+    return PipelineStep(name, build, inputs=inputs, outputs=outputs, **kwargs)
+
+
+@pytest.fixture
+def db_name(project_path):
+    db_name = f"{project_path}/Warehouse/Pipeline.db"
+    write_table(db_name, "SourceTbl", rows=3)
+    return db_name
+
+
+def test_steps_run_after_the_steps_that_write_their_inputs(db_name):
+    calls = []
+    steps = [
+        recording_step(db_name, calls, "C", ["BTbl"], ["CTbl"]),
+        recording_step(db_name, calls, "B", ["ATbl"], ["BTbl"]),
+        recording_step(db_name, calls, "A", ["SourceTbl"], ["ATbl"]),
+        recording_step(db_name, calls, "D", ["SourceTbl"], ["DTbl"]),
+    ]
+
+    status = PipelineRunner(db_name, steps, max_workers=2).run()
+
+    assert status == {"A": "done", "B": "done", "C": "done", "D": "done"}
+    assert calls.index("A") < calls.index("B") < calls.index("C")
+
+
+def test_dependency_cycle_and_shared_output_are_rejected(db_name):
+    calls = []
+    with pytest.raises(ValueError, match="cycle"):
+        PipelineRunner(db_name, [recording_step(db_name, calls, "A", ["BTbl"], ["ATbl"]),
+                                 recording_step(db_name, calls, "B", ["ATbl"], ["BTbl"])])
+    with pytest.raises(ValueError, match="written by both"):
+        PipelineRunner(db_name, [recording_step(db_name, calls, "A", [], ["ATbl"]),
+                                 recording_step(db_name, calls, "B", [], ["ATbl"])])
+
+
+def test_unchanged_inputs_skip_the_step_until_an_input_changes(db_name):
+    calls = []
+    steps = [recording_step(db_name, calls, "A", ["SourceTbl"], ["ATbl"]),
+             recording_step(db_name, calls, "B", ["ATbl"], ["BTbl"])]
+    runner = PipelineRunner(db_name, steps)
+
+    assert runner.run() == {"A": "done", "B": "done"}
+    assert runner.run() == {"A": "skipped", "B": "skipped"}
+    assert runner.run(force=True) == {"A": "done", "B": "done"}
+
+    # A rewrite of ATbl by its step bumps the write counter, so B runs even with the same rows
+    write_table(db_name, "ATbl")
+    runner.bump_table_versions(steps[0])
+    assert runner.run() == {"A": "skipped", "B": "done"}
+
+    write_table(db_name, "SourceTbl", rows=4)
+    assert runner.run() == {"A": "done", "B": "done"}
+    assert calls == ["A", "B", "A", "B", "B", "A", "B"]
+
+
+def test_resume_continues_from_the_completion_markers(db_name):
+    calls = []
+    fail = [True]
+    steps = [recording_step(db_name, calls, "A", ["SourceTbl"], ["ATbl"], always_run=True),
+             recording_step(db_name, calls, "B", ["ATbl"], ["BTbl"], fail=fail),
+             recording_step(db_name, calls, "C", ["BTbl"], ["CTbl"])]
+    runner = PipelineRunner(db_name, steps)
+
+    assert runner.run() == {"A": "done", "B": "failed", "C": "blocked"}
+    assert runner.load_markers() == {"A": "done"}
+
+    fail[0] = False
+    assert runner.run(resume=True) == {"A": "resumed", "B": "done", "C": "done"}
+    assert calls == ["A", "B", "B", "C"]
+    assert runner.load_markers() == {}
+
+
+def test_process_steps_must_be_picklable(db_name):
+    with pytest.raises(ValueError, match="cannot be pickled"):
+        PipelineRunner(db_name, [PipelineStep("A", lambda: None, outputs=["ATbl"])], executor_type="process")
+    with pytest.raises(ValueError, match="executor type"):
+        PipelineRunner(db_name, [], executor_type="fibers")
+
+    # An io step of a mixed run stays in the thread pool, so it does not need to be picklable
+    PipelineRunner(db_name, [PipelineStep("A", lambda: None, outputs=["ATbl"], kind="io")], executor_type="mixed")
+
+
+def test_mixed_run_sends_cpu_steps_to_a_process_pool(db_name):
+    steps = [PipelineStep("A", write_table, inputs=["SourceTbl"], outputs=["ATbl"], args=(db_name, "ATbl", 2)),
+             PipelineStep("B", write_table, inputs=["ATbl"], outputs=["BTbl"], args=(db_name, "BTbl", 5), kind="io")]
+
+    status = PipelineRunner(db_name, steps, max_workers=2, executor_type="mixed").run()
+
+    assert status == {"A": "done", "B": "done"}
+    conn = sqlite3.connect(db_name)
+    assert conn.execute('SELECT COUNT(*) FROM "BTbl"').fetchone()[0] == 5
+    conn.close()
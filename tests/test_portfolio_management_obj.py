@@ -0,0 +1,47 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from Bulkheed.portfolio_management_obj import PortfolioManagementCalculator
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def test_grouped_nav_returns_use_the_previous_nav_of_each_group():
+    df = pd.DataFrame({
+        "NationalCode_UniversalCode": ["1", "2", "1", "2", "1"],
+        "JDate": ["1402-01-02", "1402-01-01", "1402-01-01", "1402-01-03", "1402-01-03"],
+        "GeneralNAV": [1100000.0, 900000.0, 1000000.0, np.nan, 1210000.0],
+    })
+
+    result = PortfolioManagementCalculator.calculate_grouped_nav_returns(
+        df, group_columns=["NationalCode_UniversalCode"])
+
+    assert result["JDate"].is_monotonic_increasing
+    by_row = result.set_index(["NationalCode_UniversalCode", "JDate"])
+    assert by_row.loc[("1", "1402-01-01"), "PeriodNAVReturn"] == 0.0
+    assert by_row.loc[("1", "1402-01-02"), "PeriodNAVReturn"] == pytest.approx(0.1)
+    assert by_row.loc[("1", "1402-01-03"), "PeriodNAVReturn"] == pytest.approx(0.1)
+    assert by_row.loc[("1", "1402-01-03"), "CumNAVReturn"] == pytest.approx(0.21)
+    # The first record of a group is measured from the base NAV
+    assert by_row.loc[("2", "1402-01-01"), "PeriodNAVReturn"] == pytest.approx(-0.1)
+    assert np.isnan(by_row.loc[("2", "1402-01-03"), "PeriodNAVReturn"])
+
+
+def test_missing_previous_nav_falls_back_to_the_base():
+    df = pd.DataFrame({"JDate": ["1402-01-01", "1402-01-02", "1402-01-03"],
+                       "GeneralNAV": [np.nan, 1050000.0, 1102500.0]})
+
+    result = PortfolioManagementCalculator.calculate_grouped_nav_returns(df, cumulative_column=None)
+
+    assert result["PeriodNAVReturn"].tolist()[1:] == pytest.approx([0.05, 0.05])
+    assert "CumNAVReturn" not in result.columns
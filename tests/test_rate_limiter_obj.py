@@ -0,0 +1,72 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import threading
+import time
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials import rate_limiter_obj
+from RawMaterials.rate_limiter_obj import TokenBucketRateLimiter
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_obj.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter_obj.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_a_burst_up_to_capacity_goes_through_then_the_rate_applies(clock):
+    limiter = TokenBucketRateLimiter(rate_per_second=2, capacity=3)
+
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert limiter.acquire(2) == pytest.approx(1.0)
+    assert limiter.waited_seconds == pytest.approx(1.5)
+
+    clock.sleep(10)
+    assert limiter.tokens == 0.0 and limiter.acquire(3) == 0.0
+    # A request larger than the bucket is charged the whole bucket instead of blocking forever
+    clock.sleep(10)
+    assert limiter.acquire(10) == 0.0 and limiter.tokens == 0.0
+
+
+def test_concurrent_workers_share_one_rate():
+    limiter = TokenBucketRateLimiter(rate_per_second=200, capacity=1)
+    waits = []
+
+    def worker():
+        for _ in range(10):
+            waits.append(limiter.acquire())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    # 40 tokens at 200 per second with one token in the bucket at the start
+    assert len(waits) == 40
+    assert elapsed >= 39 / 200 * 0.9
@@ -0,0 +1,52 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.surrogate_keys_obj import SurrogateKeyEncoder
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def test_entity_codes_are_stable_across_encoders(project_path):
+    encoder = SurrogateKeyEncoder()
+    first = encoder.encode_entity("Symbol", pd.Series(["B", "A", None, "B"]))
+    assert first.tolist()[:2] == [1, 2] and first.isna().tolist() == [False, False, True, False]
+
+    second = SurrogateKeyEncoder().encode_entity("Symbol", pd.Series(["C", "A", "B"]))
+    assert second.tolist() == [3, 2, 1]
+
+
+def test_packed_keys_sort_like_the_string_keys(project_path):
+    df = pd.DataFrame({"Symbol": ["A", "A", "A", "B"], "GDate": ["2024-01-02", "2024-01-01", "2024-01-01", None],
+                       "Time": ["09:00:05", "12:00:00", "09:00:05", "09:00:00"]})
+    encoder = SurrogateKeyEncoder()
+
+    keys = encoder.build_intra_market_watch_key(df)
+
+    assert keys.isna().tolist() == [False, False, False, True]
+    assert keys.iloc[:3].argsort().tolist() == [2, 1, 0]
+
+
+def test_jalali_report_keys_follow_calendar_days(project_path):
+    df = pd.DataFrame({"MarketMakerFundID": [7, 7], "JDate": ["1402-12-29", "1403-01-01"]})
+
+    ordinals = SurrogateKeyEncoder.jalali_day_ordinals(df["JDate"])
+    keys = SurrogateKeyEncoder().build_report_key(df)
+
+    assert ordinals.iloc[1] - ordinals.iloc[0] == 1
+    assert keys.iloc[1] - keys.iloc[0] == 1
+
+
+def test_pack_key_parts_rejects_parts_that_do_not_fit():
+    with pytest.raises(ValueError, match="does not fit in 4 bits"):
+        SurrogateKeyEncoder.pack_key_parts([(pd.Series([1, 16]), 4)])
+    with pytest.raises(ValueError, match="does not fit in int64"):
+        SurrogateKeyEncoder.pack_key_parts([(pd.Series([1]), 40), (pd.Series([1]), 24)])
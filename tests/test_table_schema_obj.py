@@ -0,0 +1,56 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.table_schema_obj import TableSchemaRegistry
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def market_watch_frame():
+    return pd.DataFrame({
+        "IntraMarketWatchKey": ["A_2024-01-06_09:00:00", "B_2024-01-06_09:00:00"],
+        "Symbol": ["A", "B"],
+        "GDate": ["2024-01-06", "2024-01-06"],
+        "Time": ["09:00:00", "09:00:00"],
+        "TradeType": ["Normal", "Normal"],
+        "IntraTradeCount": [10, 20],
+        "OwnershipPercentage": [0.123456789, 0.5],
+    })
+
+
+def test_unknown_table_is_not_changed():
+    df = market_watch_frame()
+    dtypes = df.dtypes.copy()
+
+    compact_df = TableSchemaRegistry.compact_dataframe(df, "SomeOtherTbl")
+
+    pd.testing.assert_series_equal(compact_df.dtypes, dtypes)
+
+
+def test_table_rules_apply_and_key_parts_stay_plain():
+    df = TableSchemaRegistry.compact_dataframe(market_watch_frame(), "IranStockIntraMarketWatchTbl")
+
+    assert isinstance(df["TradeType"].dtype, pd.CategoricalDtype)
+    assert df["IntraTradeCount"].dtype == np.int32
+    assert df["OwnershipPercentage"].dtype == np.float64
+    for column in ["IntraMarketWatchKey", "Symbol", "GDate", "Time"]:
+        assert df[column].dtype == object
+
+    # Keys can still be built from the key parts
+    key = df["Symbol"] + "_" + df["GDate"] + "_" + df["Time"]
+    assert key.tolist() == df["IntraMarketWatchKey"].tolist()
+
+
+def test_downcast_keeps_column_with_nulls_or_overflow():
+    assert TableSchemaRegistry.downcast_column(pd.Series([1.0, np.nan]), "int32").dtype == np.float64
+    assert TableSchemaRegistry.downcast_column(pd.Series([1, 300]), "int8").dtype == np.int64
+    assert TableSchemaRegistry.downcast_column(pd.Series([1, 100]), "int8").dtype == np.int8
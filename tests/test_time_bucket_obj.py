@@ -0,0 +1,67 @@
+# developed by: Shakour Alishahi
+# ======================================================================================================================
+# ######################################################################################################################
+# import external libraries
+# ----------------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import pytest
+
+# ======================================================================================================================
+# ######################################################################################################################
+# import internal libraries
+# ----------------------------------------------------------------------------------------------------------------------
+from RawMaterials.time_bucket_obj import TimeBucketAggregator
+
+
+# ======================================================================================================================
+# ######################################################################################################################
+def observations():
+    return pd.DataFrame({
+        "Symbol": ["A", "A", "A", "A", "B"],
+        "Time": ["09:00:01", "09:00:03", "09:00:06", "09:00:09", "09:00:02"],
+        "Value": [10.0, 20.0, 30.0, np.nan, 5.0],
+    })
+
+
+def test_to_seconds_and_to_times_round_trip():
+    seconds = TimeBucketAggregator.to_seconds(["09:00:01", "12:30:00", "bad"])
+
+    assert seconds.tolist()[:2] == [32401, 45000]
+    assert seconds.isna().tolist() == [False, False, True]
+    assert TimeBucketAggregator.to_times([32401, 45000]).tolist() == ["09:00:01", "12:30:00"]
+
+
+def test_aggregate_mean_last_and_time_weighted():
+    df = observations()
+    df["Seconds"] = TimeBucketAggregator.to_seconds(df["Time"])
+
+    result = TimeBucketAggregator(bucket_seconds=5).aggregate(df, ["Symbol"], "Seconds", ["Value"],
+                                                               ["mean", "last", "time_weighted"])
+
+    assert result["Symbol"].tolist() == ["A", "A", "B"]
+    assert result["BucketSeconds"].tolist() == [32400, 32405, 32400]
+    assert result["ObservationCount"].tolist() == [2, 2, 1]
+    assert result["ValueMean"].tolist() == [15.0, 30.0, 5.0]
+    assert result["ValueLast"].iloc[0] == 20.0 and np.isnan(result["ValueLast"].iloc[1])
+    # A: 10 holds 09:00:01-03 and 20 until the bucket end; the second bucket carries 20 for one second
+    assert result["ValueTimeWeighted"].tolist() == pytest.approx([(10 * 2 + 20 * 2) / 4, (20 * 1 + 30 * 3) / 4, 5.0])
+
+
+def test_aggregate_falls_back_to_groupby_when_the_series_key_overflows():
+    row_count = 200
+    df = pd.DataFrame({f"Part{index}": [f"{index}-{row}" for row in range(row_count)] for index in range(8)})
+    df["Seconds"] = np.arange(row_count) % 10 + 32400
+    df["Value"] = np.arange(row_count, dtype=np.float64)
+    df = pd.concat([df, df.assign(Seconds=df["Seconds"] + 1, Value=df["Value"] + 1)], ignore_index=True)
+    series_columns = [f"Part{index}" for index in range(8)]
+    # 201 ** 8 series values times 32410 seconds does not fit in an int64 sort key
+    assert 201 ** 8 * 32410 > np.iinfo(np.int64).max
+
+    result = TimeBucketAggregator(bucket_seconds=60).aggregate(df.sample(frac=1, random_state=1), series_columns,
+                                                                "Seconds", ["Value"], ["mean", "last"])
+
+    expected = df.groupby(series_columns, sort=True).agg(ValueMean=("Value", "mean"), ValueLast=("Value", "last"))
+    assert len(result) == row_count
+    assert result["ObservationCount"].eq(2).all()
+    assert result.set_index(series_columns)[["ValueMean", "ValueLast"]].equals(expected)